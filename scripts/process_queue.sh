@@ -31,7 +31,7 @@ if [ -z "$JOBS" ]; then
     echo "✓ No jobs in ElasticPrinter queue"
     echo
     echo "Recent documents in Elasticsearch:"
-    echo "  (Check with: curl -H \"Authorization: ApiKey YOUR_KEY\" https://your-cluster:443/print-jobs/_search?size=5&sort=indexed_at:desc)"
+    echo "  (Check with: curl -H \"Authorization: ApiKey YOUR_KEY\" https://your-cluster:443/print-jobs/_search?size=5&sort=indexed_at:desc&track_total_hits=false)"
     exit 0
 fi
 
@@ -108,7 +108,7 @@ echo
 if [ $PROCESSED -gt 0 ]; then
     echo "✓ Check Elasticsearch for your documents:"
     echo "  curl -s -H \"Authorization: ApiKey YOUR_KEY\" \\"
-    echo "    \"https://your-cluster:443/print-jobs/_search?size=10&sort=indexed_at:desc\" | jq '.hits.hits[]._source.print_job.title'"
+    echo "    \"https://your-cluster:443/print-jobs/_search?size=10&sort=indexed_at:desc&track_total_hits=false\" | jq '.hits.hits[]._source.print_job.title'"
 fi
 
 echo
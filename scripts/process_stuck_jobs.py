@@ -124,7 +124,7 @@ def main():
     if processed > 0:
         print("✓ Check Elasticsearch for your documents:")
         print('  curl -s -H "Authorization: ApiKey YOUR_KEY" \\')
-        print('    "https://your-cluster:443/print-jobs/_search?size=10&sort=indexed_at:desc"')
+        print('    "https://your-cluster:443/print-jobs/_search?size=10&sort=indexed_at:desc&track_total_hits=false"')
     
     print("\nDone!")
     return 0 if failed == 0 else 1
@@ -34,9 +34,14 @@ setup(
         "requests>=2.28.0",
         "python-dateutil>=2.8.0",
     ],
+    extras_require={
+        "async": ["aiohttp>=3.8.0"],
+        "dedupe": ["numpy>=1.20.0"],
+    },
     entry_points={
         "console_scripts": [
             "elasticprinter=main:main",
+            "elasticprinter-admin=cli:main",
         ],
     },
 )
@@ -0,0 +1,542 @@
+"""Administrative command-line interface for ElasticPrinter.
+
+The CUPS backend (main.py) handles one print job per invocation. This CLI
+hosts the long-running and bulk operations.
+
+Usage:
+    elasticprinter-admin [--config CONFIG] import DIRECTORY [options]
+    elasticprinter-admin [--config CONFIG] watch [DIRECTORY] [options]
+    elasticprinter-admin [--config CONFIG] dedupe [--max-distance N] [--tag]
+    elasticprinter-admin [--config CONFIG] report [--group-by ...] [--format csv|json]
+    elasticprinter-admin [--config CONFIG] search TEXT [--user USER] [--local]
+    elasticprinter-admin [--config CONFIG] latest [--user USER] [--size N] [--local]
+    elasticprinter-admin [--config CONFIG] reconcile [--source ...] [--dry-run] [--output FILE]
+    elasticprinter-admin [--config CONFIG] queue-stats [--format table|json]
+    elasticprinter-admin [--config CONFIG] preview-server [--host HOST] [--port PORT]
+    elasticprinter-admin [--config CONFIG] profile-pipeline SAMPLE... [--variants ...] [--format table|json]
+    elasticprinter-admin [--config CONFIG] check-mapping [--update] [--warn-ratio RATIO]
+"""
+import argparse
+import json
+import logging
+import sys
+from typing import List, Optional
+
+from utils.config_loader import ConfigLoader
+from utils.logger import setup_logger
+
+MB = 1024 * 1024
+
+
+def _load(args: argparse.Namespace):
+    """Load configuration and set up logging.
+    
+    Returns:
+        (config, logger)
+    """
+    config = ConfigLoader(args.config)
+    log_config = config.logging_config
+    log_level = args.log_level or log_config.get('level', 'INFO')
+    
+    logging.basicConfig(level=getattr(logging, log_level.upper()))
+    logger = setup_logger(
+        name='elasticprinter',
+        log_file=log_config.get('file'),
+        level=log_level,
+        console=True
+    )
+    return config, logger
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    """Backfill a directory tree of existing PDFs."""
+    from elastic.client import ElasticClient
+    from ingest.importer import BackfillImporter
+    
+    config, logger = _load(args)
+    import_config = config.get('import', {}) or {}
+    
+    client = ElasticClient.from_config(config)
+    try:
+        client.ensure_index_exists()
+        client.ensure_pipeline_exists()
+        
+        importer = BackfillImporter(
+            client=client,
+            checkpoint_path=args.checkpoint or import_config.get(
+                'checkpoint_file', '/var/lib/elasticprinter/import-checkpoint.jsonl'
+            ),
+            workers=args.workers or import_config.get('workers'),
+            upload_threads=args.upload_threads or import_config.get('upload_threads', 2),
+            batch_bytes=int((args.batch_mb or import_config.get('batch_mb', 20)) * MB),
+            max_in_flight_bytes=int((args.max_in_flight_mb or import_config.get('max_in_flight_mb', 256)) * MB),
+            extensions=tuple(args.extensions or import_config.get('extensions', ['.pdf'])),
+            user=args.user
+        )
+        stats = importer.run(args.directory)
+    finally:
+        client.close()
+    
+    print(json.dumps(stats, indent=2))
+    return 0 if stats["failed"] == 0 else 1
+
+
+def cmd_watch(args: argparse.Namespace) -> int:
+    """Index files dropped into a hot folder until interrupted."""
+    from ingest.scheduler import scheduler_from_config
+    from ingest.watcher import HotFolderWatcher
+    
+    config, logger = _load(args)
+    watch_config = config.get('watch', {}) or {}
+    
+    directory = args.directory or watch_config.get('directory')
+    if not directory:
+        logger.error("No directory given and watch.directory is not configured")
+        return 2
+    
+    watcher = HotFolderWatcher(
+        config=config,
+        logger_=logger,
+        watch_dir=directory,
+        done_dir=args.done_dir or watch_config.get('done_dir'),
+        failed_dir=args.failed_dir or watch_config.get('failed_dir'),
+        settle_seconds=args.settle if args.settle is not None else watch_config.get('settle_seconds', 2.0),
+        batch_window=watch_config.get('batch_window', 1.0),
+        max_batch=watch_config.get('max_batch', 20),
+        workers=args.workers or watch_config.get('workers', 2),
+        extensions=tuple(watch_config.get('extensions', ['.pdf', '.ps'])),
+        scheduler=scheduler_from_config(config)
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    return 0
+
+
+def cmd_dedupe(args: argparse.Namespace) -> int:
+    """Cluster near-duplicate documents in the index."""
+    from converter.fingerprint import cluster_fingerprints, parse_fingerprint
+    from elastic.client import ElasticClient
+    
+    config, logger = _load(args)
+    dedupe_config = config.processing.get('near_duplicates', {}) or {}
+    max_distance = args.max_distance if args.max_distance is not None else dedupe_config.get('max_distance', 3)
+    
+    client = ElasticClient.from_config(config)
+    try:
+        doc_ids, indexed_at, fingerprints, routings = [], [], [], {}
+        for hit in client.scan(
+            {"query": {"exists": {"field": "document.fingerprint.simhash"}}},
+            source=["document.fingerprint.simhash", "indexed_at"]
+        ):
+            doc_ids.append(hit["_id"])
+            if "_routing" in hit:
+                routings[hit["_id"]] = hit["_routing"]
+            indexed_at.append(hit["_source"].get("indexed_at") or "")
+            fingerprints.append(parse_fingerprint(hit["_source"]["document"]["fingerprint"]))
+        logger.info(f"Loaded {len(fingerprints)} fingerprints")
+        
+        clusters = []
+        for members in cluster_fingerprints(fingerprints, max_distance=max_distance):
+            # The earliest indexed document is the original
+            members.sort(key=lambda i: (indexed_at[i], doc_ids[i]))
+            clusters.append([doc_ids[i] for i in members])
+        
+        if args.tag:
+            operations = []
+            for cluster in clusters:
+                for doc_id in cluster[1:]:
+                    action = {"_id": doc_id}
+                    if doc_id in routings:
+                        action["routing"] = routings[doc_id]
+                    operations.append({"update": action})
+                    operations.append({"doc": {"document": {"near_duplicate_of": [cluster[0]]}}})
+            for start in range(0, len(operations), 1000):
+                client.bulk(operations[start:start + 1000])
+            logger.info(f"Tagged {len(operations) // 2} near-duplicate documents")
+    finally:
+        client.close()
+    
+    print(json.dumps({"documents": len(doc_ids), "clusters": clusters}, indent=2))
+    return 0
+
+
+def cmd_report(args: argparse.Namespace) -> int:
+    """Write a usage report (jobs, pages, bytes per user/host/day)."""
+    from elastic.client import ElasticClient
+    from elastic.reporting import iter_usage, write_csv, write_json
+    
+    config, logger = _load(args)
+    client = ElasticClient.from_config(config)
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        rows = iter_usage(
+            client,
+            group_by=args.group_by,
+            interval=args.interval,
+            start=getattr(args, 'from'),
+            end=args.to,
+            time_zone=args.time_zone,
+            page_size=args.page_size
+        )
+        if args.format == "csv":
+            count = write_csv(rows, output, args.group_by)
+        else:
+            count = write_json(rows, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        client.close()
+    
+    logger.info(f"Wrote {count} report rows")
+    return 0
+
+
+def _search_with_fallback(args: argparse.Namespace, body, search) -> int:
+    """Run a search in Elasticsearch, or in the local mirror when the cluster is unreachable, and print the hits.
+    
+    Args:
+        args: Parsed arguments (size, user and local are used)
+        body: Search body, also used for the mirror
+        search: Called with the client to search Elasticsearch
+    
+    Returns:
+        Exit status
+    """
+    from elastic.client import ElasticClient
+    from mirror.local_mirror import mirror_from_config
+    
+    config, logger = _load(args)
+    
+    response, source = None, "Elasticsearch"
+    if not args.local:
+        try:
+            client = ElasticClient.from_config(config)
+            try:
+                response = search(client)
+            finally:
+                client.close()
+        except Exception as e:
+            logger.warning(f"Search in Elasticsearch failed, using the local mirror: {e}")
+    
+    if response is None:
+        mirror = mirror_from_config(config)
+        if mirror is None:
+            logger.error("The local mirror is not enabled (mirror.enabled)")
+            return 1
+        with mirror:
+            response = mirror.search(body, size=args.size)
+        source = "the local mirror"
+    
+    for hit in response["hits"]["hits"]:
+        print_job = hit["_source"].get("print_job", {})
+        print(f"{hit['_id']}  {hit['_source'].get('indexed_at', '')}  {print_job.get('user', '')}  {print_job.get('title', '')}")
+        for snippet in hit.get("highlight", {}).get("attachment.content", []):
+            print(f"    {snippet}")
+    # Not counted when track_total_hits is disabled
+    total = response["hits"].get("total", {}).get("value", len(response["hits"]["hits"]))
+    logger.info(f"{total} matches in {source}")
+    return 0
+
+
+def cmd_search(args: argparse.Namespace) -> int:
+    """Full-text search, falling back to the local mirror when the cluster is unreachable."""
+    query = {"multi_match": {"query": args.text, "fields": ["attachment.content", "print_job.title"]}}
+    if args.user:
+        query = {"bool": {"must": [query], "filter": [{"term": {"print_job.user": args.user}}]}}
+    body = {
+        "query": query,
+        "_source": ["print_job", "indexed_at"],
+        "highlight": {"fields": {"attachment.content": {}}},
+    }
+    return _search_with_fallback(args, body, lambda client: client.search(body, size=args.size, user=args.user))
+
+
+def cmd_latest(args: argparse.Namespace) -> int:
+    """Most recently indexed jobs, falling back to the local mirror when the cluster is unreachable."""
+    from elastic.client import latest_query
+    
+    source = ["print_job", "indexed_at"]
+    return _search_with_fallback(
+        args,
+        latest_query(args.user, source),
+        lambda client: client.latest(size=args.size, user=args.user, source=source)
+    )
+
+
+def cmd_reconcile(args: argparse.Namespace) -> int:
+    """Check local copies of jobs against the index and re-index missing ones."""
+    from elastic.client import ElasticClient
+    from ingest.reconcile import Reconciler, local_items
+    
+    config, logger = _load(args)
+    reconcile_config = config.get('reconcile', {}) or {}
+    
+    items = list(local_items(
+        config,
+        sources=tuple(args.source or reconcile_config.get('sources', ["temp_dir", "spool", "hotfolder", "archive"])),
+        spool_dir=args.spool_dir or reconcile_config.get('spool_dir', '/var/spool/cups'),
+        archive_dirs=tuple(args.archive or reconcile_config.get('archive_dirs', []))
+    ))
+    logger.info(f"Found {len(items)} local jobs")
+    
+    client = ElasticClient.from_config(config)
+    try:
+        if not args.dry_run:
+            client.ensure_index_exists()
+            client.ensure_pipeline_exists()
+        
+        reconciler = Reconciler(
+            client,
+            batch_size=args.batch_size or reconcile_config.get('batch_size', 500),
+            workers=args.workers or reconcile_config.get('workers', 4),
+            dry_run=args.dry_run
+        )
+        report = reconciler.run(items)
+    finally:
+        client.close()
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 0 if report["failed"] == 0 else 1
+
+
+def cmd_queue_stats(args: argparse.Namespace) -> int:
+    """Show the fair scheduler's queue depth and wait times per user."""
+    config, logger = _load(args)
+    scheduler_config = config.processing.get('scheduler') or {}
+    
+    path = args.stats_file or scheduler_config.get('stats_file')
+    if not path:
+        logger.error("No statistics file given and processing.scheduler.stats_file is not configured")
+        return 2
+    try:
+        with open(path) as f:
+            stats = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Cannot read scheduler statistics {path}: {e}")
+        return 1
+    
+    if args.format == "json":
+        print(json.dumps(stats, indent=2))
+        return 0
+    
+    def seconds(value):
+        return "-" if value is None else f"{value:.1f}s"
+    
+    print(f"{'user':<20} {'queued':>6} {'queued MB':>9} {'oldest':>8} {'done':>6} {'throttled':>9} {'wait p50':>8} {'wait max':>8}")
+    for user, row in stats["users"].items():
+        print(
+            f"{user:<20} {row['queued']:>6} {row['queued_bytes'] / MB:>9.1f} {seconds(row['oldest_wait']):>8} "
+            f"{row['dispatched']:>6} {row['throttled']:>9} {seconds(row['wait_p50']):>8} {seconds(row['wait_max']):>8}"
+        )
+    print(f"{stats['queued']} queued, {stats['in_flight']} running, wait p50 {seconds(stats['wait_p50'])}, "
+          f"p90 {seconds(stats['wait_p90'])}")
+    return 0
+
+
+def cmd_preview_server(args: argparse.Namespace) -> int:
+    """Serve first-page thumbnails of kept print jobs over HTTP."""
+    from preview.thumbnails import PreviewServer, thumbnail_service_from_config
+    
+    config, logger = _load(args)
+    preview_config = config.get('preview', {}) or {}
+    
+    service = thumbnail_service_from_config(config)
+    server = PreviewServer(
+        service,
+        host=args.host or preview_config.get('host', '127.0.0.1'),
+        port=args.port if args.port is not None else preview_config.get('port', 8089)
+    )
+    logger.info(f"Serving thumbnails on {server.url}/thumbnails/<document id>.png")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopping preview server")
+    finally:
+        server.shutdown()
+        service.close()
+        logger.info(f"Thumbnail statistics: {service.stats()}")
+    return 0
+
+
+def cmd_profile_pipeline(args: argparse.Namespace) -> int:
+    """Compare the cluster cost of attachment pipeline variants on sample files."""
+    import os
+    from elastic.client import ElasticClient
+    from elastic.pipeline_profile import PipelineProfiler, format_table
+    
+    config, logger = _load(args)
+    
+    paths = []
+    for sample in args.samples:
+        if os.path.isdir(sample):
+            for dirpath, dirnames, filenames in os.walk(sample):
+                dirnames.sort()
+                paths.extend(os.path.join(dirpath, filename) for filename in sorted(filenames))
+        else:
+            paths.append(sample)
+    if not paths:
+        logger.error("No sample files found")
+        return 2
+    
+    client = ElasticClient.from_config(config)
+    try:
+        profiler = PipelineProfiler(
+            client,
+            rounds=args.rounds,
+            batch_mb=args.batch_mb,
+            indexed_chars=args.indexed_chars,
+            properties=args.properties
+        )
+        rows = profiler.profile(paths, args.variants)
+    finally:
+        client.close()
+    
+    if args.format == "json":
+        print(json.dumps(rows, indent=2))
+    else:
+        print(format_table(rows))
+    return 0
+
+
+def cmd_check_mapping(args: argparse.Namespace) -> int:
+    """Warn when the index mapping approaches the total field limit."""
+    from elastic.client import ElasticClient
+    
+    config, logger = _load(args)
+    
+    client = ElasticClient.from_config(config)
+    try:
+        if args.update and not client.update_mapping():
+            return 1
+        usage = client.field_usage(args.warn_ratio)
+    finally:
+        client.close()
+    
+    print(f"{usage['fields']} of {usage['limit']} fields mapped ({usage['ratio']:.0%})")
+    return 3 if usage["warning"] else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser."""
+    parser = argparse.ArgumentParser(
+        prog="elasticprinter-admin",
+        description="ElasticPrinter administration commands"
+    )
+    parser.add_argument("--config", help="Path to config.yaml (default: standard locations)")
+    parser.add_argument("--log-level", help="Override the configured log level")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    import_parser = subparsers.add_parser("import", help="Backfill existing PDFs from a directory tree")
+    import_parser.add_argument("directory", help="Directory to import recursively")
+    import_parser.add_argument("--checkpoint", help="Checkpoint file used to resume (default: import.checkpoint_file)")
+    import_parser.add_argument("--workers", type=int, help="Metadata extraction processes")
+    import_parser.add_argument("--upload-threads", type=int, help="Concurrent bulk requests")
+    import_parser.add_argument("--batch-mb", type=float, help="Target size of one bulk request in MB")
+    import_parser.add_argument("--max-in-flight-mb", type=float, help="Maximum file data in flight in MB")
+    import_parser.add_argument("--extensions", nargs="+", help="File extensions to import (default: .pdf)")
+    import_parser.add_argument("--user", help="User recorded for imported files (default: file owner)")
+    import_parser.set_defaults(func=cmd_import)
+    
+    watch_parser = subparsers.add_parser("watch", help="Index files dropped into a hot folder")
+    watch_parser.add_argument("directory", nargs="?", help="Directory to watch (default: watch.directory)")
+    watch_parser.add_argument("--done-dir", help="Where indexed files are moved (default: DIRECTORY/done)")
+    watch_parser.add_argument("--failed-dir", help="Where failed files are moved (default: DIRECTORY/failed)")
+    watch_parser.add_argument("--settle", type=float, help="Seconds a file must stay unchanged before processing")
+    watch_parser.add_argument("--workers", type=int, help="Files processed in parallel")
+    watch_parser.set_defaults(func=cmd_watch)
+    
+    dedupe_parser = subparsers.add_parser("dedupe", help="Cluster near-duplicate documents in the index")
+    dedupe_parser.add_argument("--max-distance", type=int,
+                               help="Maximum fingerprint Hamming distance (default: processing.near_duplicates.max_distance)")
+    dedupe_parser.add_argument("--tag", action="store_true",
+                               help="Set document.near_duplicate_of on all but the earliest document of each cluster")
+    dedupe_parser.set_defaults(func=cmd_dedupe)
+    
+    report_parser = subparsers.add_parser("report", help="Usage report from composite aggregations")
+    report_parser.add_argument("--group-by", nargs="+", default=["user", "host", "day"],
+                               choices=["user", "host", "day"], help="Report dimensions (default: user host day)")
+    report_parser.add_argument("--interval", default="day", choices=["day", "week", "month"],
+                               help="Bucket size of the date dimension")
+    report_parser.add_argument("--from", help="Only jobs indexed on or after this date (YYYY-MM-DD)")
+    report_parser.add_argument("--to", help="Only jobs indexed before this date (YYYY-MM-DD)")
+    report_parser.add_argument("--time-zone", default="UTC", help="Time zone for date buckets")
+    report_parser.add_argument("--format", default="csv", choices=["csv", "json"], help="Output format")
+    report_parser.add_argument("--output", help="Output file (default: stdout)")
+    report_parser.add_argument("--page-size", type=int, default=1000, help="Buckets per aggregation request")
+    report_parser.set_defaults(func=cmd_report)
+    
+    search_parser = subparsers.add_parser("search", help="Search printed jobs (falls back to the local mirror)")
+    search_parser.add_argument("text", help="Words to search for")
+    search_parser.add_argument("--user", help="Only jobs printed by this user")
+    search_parser.add_argument("--size", type=int, default=10, help="Number of results")
+    search_parser.add_argument("--local", action="store_true", help="Search only the local mirror")
+    search_parser.set_defaults(func=cmd_search)
+    
+    latest_parser = subparsers.add_parser("latest", help="Most recently printed jobs, newest first")
+    latest_parser.add_argument("--user", help="Only jobs printed by this user")
+    latest_parser.add_argument("--size", type=int, default=10, help="Number of jobs")
+    latest_parser.add_argument("--local", action="store_true", help="Read only the local mirror")
+    latest_parser.set_defaults(func=cmd_latest)
+    
+    reconcile_parser = subparsers.add_parser("reconcile", help="Re-index local jobs missing from the index")
+    reconcile_parser.add_argument("--source", nargs="+", choices=["temp_dir", "spool", "hotfolder", "archive"],
+                                  help="Local sources to check (default: reconcile.sources)")
+    reconcile_parser.add_argument("--spool-dir", help="CUPS spool directory (default: reconcile.spool_dir)")
+    reconcile_parser.add_argument("--archive", nargs="+",
+                                  help="Archive directories checked in addition to the import checkpoint")
+    reconcile_parser.add_argument("--batch-size", type=int, help="Document IDs per _mget request")
+    reconcile_parser.add_argument("--workers", type=int, help="Documents re-indexed in parallel")
+    reconcile_parser.add_argument("--dry-run", action="store_true", help="Only report missing documents")
+    reconcile_parser.add_argument("--output", help="Write the JSON report to this file (default: stdout)")
+    reconcile_parser.set_defaults(func=cmd_reconcile)
+    
+    queue_stats_parser = subparsers.add_parser("queue-stats", help="Show per-user queue depth and wait times")
+    queue_stats_parser.add_argument("--stats-file", help="Statistics file (default: processing.scheduler.stats_file)")
+    queue_stats_parser.add_argument("--format", default="table", choices=["table", "json"], help="Output format")
+    queue_stats_parser.set_defaults(func=cmd_queue_stats)
+    
+    preview_parser = subparsers.add_parser("preview-server", help="Serve first-page thumbnails for search results")
+    preview_parser.add_argument("--host", help="Interface to bind (default: preview.host)")
+    preview_parser.add_argument("--port", type=int, help="Port to bind (default: preview.port)")
+    preview_parser.set_defaults(func=cmd_preview_server)
+    
+    variants = ["current", "capped", "properties", "remove_binary", "combined"]
+    profile_parser = subparsers.add_parser("profile-pipeline",
+                                           help="Cost per MB of attachment pipeline variants on sample files")
+    profile_parser.add_argument("samples", nargs="+", help="Sample spool files or directories of them")
+    profile_parser.add_argument("--variants", nargs="+", default=variants, choices=variants,
+                                help="Pipeline variants to compare (default: all)")
+    profile_parser.add_argument("--rounds", type=int, default=3, help="Simulations of every sample per variant")
+    profile_parser.add_argument("--batch-mb", type=float, default=20, help="Sample data per simulate request in MB")
+    profile_parser.add_argument("--indexed-chars", type=int, default=100000,
+                                help="Characters extracted by the capped variants")
+    profile_parser.add_argument("--properties", nargs="+", default=["content", "title", "content_type", "content_length"],
+                                help="Attachment properties kept by the restricted variants")
+    profile_parser.add_argument("--format", default="table", choices=["table", "json"], help="Output format")
+    profile_parser.set_defaults(func=cmd_profile_pipeline)
+    
+    mapping_parser = subparsers.add_parser("check-mapping",
+                                           help="Check the index field count against the mapping limit")
+    mapping_parser.add_argument("--update", action="store_true",
+                                help="First stop PDF metadata from adding fields to an existing index")
+    mapping_parser.add_argument("--warn-ratio", type=float, default=0.8,
+                                help="Fraction of the field limit that is reported (exit status 3)")
+    mapping_parser.set_defaults(func=cmd_check_mapping)
+    
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point."""
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Single-pass analysis of a print job file.
+
+JobArtifact maps the job file into memory and reads it once, computing
+size, SHA-256 and format signature in the same pass. PDF parsing and the
+base64 encoding for the attachment pipeline reuse the mapping, so
+conversion, metadata extraction and indexing share one read of the file
+instead of reopening it for every stage. The encoding is only built when
+the job is indexed, so a job indexed from its slimmed copy never holds
+the encoding of the original.
+"""
+import base64
+import hashlib
+import io
+import mmap
+import os
+from typing import Any, List, Optional
+
+from PyPDF2 import PdfReader
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Bytes hashed and encoded per step; a multiple of 3 so base64 chunks concatenate
+ANALYSIS_CHUNK_SIZE = 3 * 1024 * 1024
+
+# Pages whose text is extracted (near-duplicate fingerprint, local mirror, boilerplate)
+TEXT_MAX_PAGES = 50
+
+# Leading bytes -> format name
+SIGNATURES = (
+    (b"%PDF-", "pdf"),
+    (b"%!", "postscript"),
+    (b"\x1b%-12345X", "pjl"),
+)
+
+
+def detect_format(head: bytes) -> str:
+    """Identify a print job format from its first bytes.
+    
+    Args:
+        head: First bytes of the file
+    
+    Returns:
+        "pdf", "postscript", "pjl" or "unknown"
+    """
+    for signature, name in SIGNATURES:
+        if head.startswith(signature):
+            return name
+    return "unknown"
+
+
+def extract_pages(reader: PdfReader, max_pages: int = TEXT_MAX_PAGES) -> List[str]:
+    """Extract the text of each of the first pages of a PDF.
+    
+    Args:
+        reader: Parsed PDF
+        max_pages: Number of pages to extract
+    
+    Returns:
+        Text of each page
+    """
+    return [page.extract_text() or "" for page in reader.pages[:max_pages]]
+
+
+def extract_text(reader: PdfReader, max_pages: int = TEXT_MAX_PAGES) -> str:
+    """Extract the text of the first pages of a PDF.
+    
+    Args:
+        reader: Parsed PDF
+        max_pages: Number of pages to extract
+    
+    Returns:
+        Page texts separated by newlines
+    """
+    return "\n".join(extract_pages(reader, max_pages))
+
+
+class JobArtifact:
+    """A job file analyzed in a single read."""
+    
+    def __init__(self, path: str, mapped: Optional[mmap.mmap], size: int, sha256: str, file_format: str):
+        """Use JobArtifact.load() instead."""
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.format = file_format
+        self._base64: Optional[str] = None
+        self._mapped = mapped
+        self._reader: Optional[PdfReader] = None
+        self._pages: Optional[List[str]] = None
+    
+    @classmethod
+    def load(cls, path: str) -> "JobArtifact":
+        """Map and analyze a file.
+        
+        Args:
+            path: Job file
+        
+        Returns:
+            Analyzed artifact (close it when the job is done)
+        """
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            # The mapping stays valid after the file is closed (or deleted)
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        
+        digest = hashlib.sha256()
+        file_format = "unknown"
+        if mapped is not None:
+            with memoryview(mapped) as view:
+                file_format = detect_format(bytes(view[:16]))
+                for offset in range(0, size, ANALYSIS_CHUNK_SIZE):
+                    chunk = view[offset:offset + ANALYSIS_CHUNK_SIZE]
+                    digest.update(chunk)
+                    chunk.release()
+        
+        logger.info(f"Analyzed {path}: {size} bytes, format {file_format}")
+        return cls(path, mapped, size, digest.hexdigest(), file_format)
+    
+    @property
+    def base64(self) -> str:
+        """Base64 encoding of the content for the attachment pipeline (built on first use, then cached)."""
+        if self._base64 is None:
+            if self._mapped is None:
+                return ""
+            encoded = bytearray(4 * ((self.size + 2) // 3))
+            with memoryview(self._mapped) as view:
+                for offset in range(0, self.size, ANALYSIS_CHUNK_SIZE):
+                    chunk = view[offset:offset + ANALYSIS_CHUNK_SIZE]
+                    start = offset // 3 * 4
+                    piece = base64.b64encode(chunk)
+                    encoded[start:start + len(piece)] = piece
+                    chunk.release()
+            self._base64 = encoded.decode('ascii')
+        return self._base64
+    
+    def stream(self) -> Any:
+        """Return a seekable binary stream over the content (positioned at 0)."""
+        if self._mapped is None:
+            return io.BytesIO(b"")
+        self._mapped.seek(0)
+        return self._mapped
+    
+    def pdf_reader(self) -> Optional[PdfReader]:
+        """Parse the content as PDF (cached).
+        
+        Returns:
+            PdfReader over the mapped content, or None if this is not a PDF
+        """
+        if self._reader is None and self.format == "pdf":
+            self._reader = PdfReader(self.stream())
+        return self._reader
+    
+    @property
+    def page_count(self) -> int:
+        """Number of pages (0 for non-PDF content)."""
+        reader = self.pdf_reader()
+        return len(reader.pages) if reader is not None else 0
+    
+    def pages(self) -> List[str]:
+        """Text of each of the first TEXT_MAX_PAGES pages (cached; empty for non-PDF content)."""
+        if self._pages is None:
+            reader = self.pdf_reader()
+            self._pages = extract_pages(reader) if reader is not None else []
+        return self._pages
+    
+    def text(self) -> str:
+        """Text of the first TEXT_MAX_PAGES pages ("" for non-PDF content)."""
+        return "\n".join(self.pages())
+    
+    def write_to(self, path: str) -> None:
+        """Write the content to another file without reading the source again.
+        
+        Args:
+            path: Destination file
+        """
+        with open(path, 'wb') as f:
+            if self._mapped is not None:
+                f.write(self._mapped)
+    
+    def close(self) -> None:
+        """Release the mapping and parsed PDF."""
+        self._reader = None
+        self._pages = None
+        self._base64 = None
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+    
+    def __enter__(self) -> "JobArtifact":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -0,0 +1,258 @@
+"""Removal of repeated headers, footers and banners from extracted text.
+
+Browser prints repeat the same lines on every page: the page title and
+date in the header, the URL and page number in the footer, navigation and
+cookie banners. Indexed as they are, these lines end up in
+``attachment.content`` of thousands of documents.
+
+A line counts as boilerplate when it appears on a large fraction of the
+pages of one job. Lines are compared after normalization (case, whitespace
+and digits), so "Page 3 of 10" and "Page 4 of 10" match. Boilerplate found
+in jobs from the same site (the host of the first URL in the text) is
+remembered in a small JSON file; once a line was seen in ``min_jobs`` jobs
+of a site it is also removed from single-page jobs of that site. Only
+hashes of normalized lines are stored, never the text itself.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# A line is boilerplate if it is on at least this fraction of a job's pages
+DEFAULT_MIN_PAGE_FRACTION = 0.5
+
+# Jobs of a site that must share a line before it is removed from every job of the site
+DEFAULT_MIN_SITE_JOBS = 3
+
+# Learned lines kept per site (the most frequent ones)
+DEFAULT_MAX_LINES_PER_SITE = 500
+
+_URL_RE = re.compile(r"https?://(?:www\.)?([a-z0-9.-]+)", re.IGNORECASE)
+_DIGITS_RE = re.compile(r"\d+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_line(line: str) -> str:
+    """Normalize a line for comparison (case, whitespace and numbers)."""
+    return _DIGITS_RE.sub("#", _SPACE_RE.sub(" ", line.strip().lower()))
+
+
+def line_key(normalized: str) -> str:
+    """Short hash of a normalized line, as stored in the site file."""
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def site_of(pages: Sequence[str]) -> Optional[str]:
+    """Host of the first URL in a job's text (browser prints show it in the header or footer)."""
+    for page in pages:
+        match = _URL_RE.search(page)
+        if match:
+            return match.group(1).lower().rstrip(".")
+    return None
+
+
+def find_repeated_lines(pages: Sequence[str], min_page_fraction: float = DEFAULT_MIN_PAGE_FRACTION) -> Set[str]:
+    """Find normalized lines that appear on many pages of a job.
+    
+    Args:
+        pages: Text of each page
+        min_page_fraction: Fraction of pages a line must appear on
+    
+    Returns:
+        Normalized boilerplate lines (empty for single-page jobs)
+    """
+    if len(pages) < 2:
+        return set()
+    
+    min_pages = max(2, math.ceil(min_page_fraction * len(pages)))
+    counts: Dict[str, int] = {}
+    for page in pages:
+        for normalized in {normalize_line(line) for line in page.splitlines()}:
+            if normalized:
+                counts[normalized] = counts.get(normalized, 0) + 1
+    return {normalized for normalized, count in counts.items() if count >= min_pages}
+
+
+class SiteBoilerplate:
+    """Boilerplate lines learned per site, persisted in a JSON file."""
+    
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        min_jobs: int = DEFAULT_MIN_SITE_JOBS,
+        max_lines_per_site: int = DEFAULT_MAX_LINES_PER_SITE
+    ):
+        """Load learned lines.
+        
+        Args:
+            path: JSON file shared by all backend processes (None keeps them in memory)
+            min_jobs: Jobs of a site that must contain a line before it is known
+            max_lines_per_site: Learned lines kept per site
+        """
+        self.path = path
+        self.min_jobs = min_jobs
+        self.max_lines_per_site = max_lines_per_site
+        self.sites: Dict[str, Dict[str, int]] = {}
+        
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.sites = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable boilerplate file {path}: {e}")
+    
+    def known(self, site: str) -> Set[str]:
+        """Keys of the lines known to be boilerplate on ``site``."""
+        return {key for key, jobs in self.sites.get(site, {}).items() if jobs >= self.min_jobs}
+    
+    def learn(self, site: str, lines: Set[str]) -> None:
+        """Record the boilerplate lines found in one job of ``site``.
+        
+        Args:
+            site: Site of the job
+            lines: Normalized boilerplate lines of the job
+        """
+        if not lines:
+            return
+        counts = self.sites.setdefault(site, {})
+        for normalized in lines:
+            key = line_key(normalized)
+            counts[key] = counts.get(key, 0) + 1
+        if len(counts) > self.max_lines_per_site:
+            keep = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:self.max_lines_per_site]
+            self.sites[site] = dict(keep)
+        self.save()
+    
+    def save(self) -> None:
+        """Write the learned lines (concurrent jobs may lose an update, which only delays learning)."""
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.sites, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save boilerplate file {self.path}: {e}")
+
+
+class BoilerplateStripper:
+    """Remove boilerplate lines from the text of a job."""
+    
+    def __init__(
+        self,
+        min_page_fraction: float = DEFAULT_MIN_PAGE_FRACTION,
+        site_boilerplate: Optional[SiteBoilerplate] = None
+    ):
+        """Initialize stripper.
+        
+        Args:
+            min_page_fraction: Fraction of pages a line must appear on
+            site_boilerplate: Lines learned across jobs (None disables learning)
+        """
+        self.min_page_fraction = min_page_fraction
+        self.site_boilerplate = site_boilerplate
+    
+    def strip(self, pages: Sequence[str]) -> Tuple[str, Dict[str, Any]]:
+        """Remove boilerplate from a job.
+        
+        Args:
+            pages: Text of each page
+        
+        Returns:
+            (cleaned text with pages separated by newlines, statistics with
+            removed_bytes, removed_lines and site)
+        """
+        repeated = find_repeated_lines(pages, self.min_page_fraction)
+        site = site_of(pages)
+        known: Set[str] = set()
+        if site and self.site_boilerplate is not None:
+            known = self.site_boilerplate.known(site)
+        
+        kept: List[str] = []
+        removed_lines = 0
+        removed_bytes = 0
+        for page in pages:
+            for line in page.splitlines():
+                normalized = normalize_line(line)
+                if normalized and (normalized in repeated or line_key(normalized) in known):
+                    removed_lines += 1
+                    # Including the line break
+                    removed_bytes += len(line.encode("utf-8")) + 1
+                else:
+                    kept.append(line)
+        
+        if site and self.site_boilerplate is not None:
+            self.site_boilerplate.learn(site, repeated)
+        
+        stats = {"removed_bytes": removed_bytes, "removed_lines": removed_lines}
+        if site:
+            stats["site"] = site
+        return "\n".join(kept), stats
+
+
+def stripper_from_config(config) -> Optional[BoilerplateStripper]:
+    """Build the boilerplate stripper from ``processing.boilerplate``.
+    
+    Args:
+        config: Configuration loader
+    
+    Returns:
+        BoilerplateStripper, or None if stripping is disabled
+    """
+    settings = config.processing.get('boilerplate') or {}
+    if not settings.get('enabled', False):
+        return None
+    
+    site_boilerplate = None
+    if settings.get('learn_sites', True):
+        site_boilerplate = SiteBoilerplate(
+            settings.get('site_file', '/var/lib/elasticprinter/boilerplate.json'),
+            min_jobs=settings.get('min_site_jobs', DEFAULT_MIN_SITE_JOBS),
+            max_lines_per_site=settings.get('max_lines_per_site', DEFAULT_MAX_LINES_PER_SITE)
+        )
+    return BoilerplateStripper(
+        min_page_fraction=settings.get('min_page_fraction', DEFAULT_MIN_PAGE_FRACTION),
+        site_boilerplate=site_boilerplate
+    )
+
+
+def strip_job_text(config, artifact, metadata: Dict[str, Any]) -> Optional[str]:
+    """Strip boilerplate from a job's text if enabled.
+    
+    The statistics are recorded in ``metadata["document"]["boilerplate"]``.
+    Jobs longer than TEXT_MAX_PAGES are left alone because only their first
+    pages are extracted locally. A failure is logged and does not fail the job.
+    
+    Args:
+        config: Configuration loader
+        artifact: Analyzed job (JobArtifact)
+        metadata: Combined job metadata (updated in place)
+    
+    Returns:
+        Cleaned text for ElasticClient.index_pdf(content=...), or None to
+        index the extracted text unchanged
+    """
+    try:
+        stripper = stripper_from_config(config)
+        if stripper is None:
+            return None
+        
+        pages = artifact.pages()
+        if not pages or artifact.page_count > len(pages):
+            return None
+        
+        cleaned, stats = stripper.strip(pages)
+        metadata.setdefault("document", {})["boilerplate"] = stats
+        logger.info(f"Removed {stats['removed_lines']} boilerplate lines ({stats['removed_bytes']} bytes)")
+        return cleaned
+    except Exception as e:
+        logger.warning(f"Boilerplate stripping failed: {e}")
+        return None
@@ -0,0 +1,185 @@
+"""Text fingerprints for near-duplicate detection.
+
+A 64-bit SimHash is computed from word shingles of the extracted text.
+Numbers are dropped before shingling, so reprints that only differ in
+timestamps, page numbers or similar counters get identical fingerprints;
+small edits (ads, headers) change only a few bits.
+
+The fingerprint is stored as a hex string plus four 16-bit band keys. Two
+fingerprints within Hamming distance 3 share at least one band, so a
+``terms`` query on the bands finds all candidates and the exact distance
+is checked afterwards.
+
+Batch clustering of many fingerprints uses NumPy, which is optional
+(``pip install elasticprinter[dedupe]``).
+"""
+import hashlib
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+FINGERPRINT_BITS = 64
+BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Near-duplicate threshold; BANDS - 1 is the largest distance bands can guarantee to find
+DEFAULT_MAX_DISTANCE = BANDS - 1
+
+SHINGLE_SIZE = 3
+
+# Fewer words than this give unstable fingerprints
+MIN_WORDS = 8
+
+_WORD_RE = re.compile(r"[^\W\d_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words without digits or punctuation."""
+    return _WORD_RE.findall(text.lower())
+
+
+def simhash(text: str) -> Optional[int]:
+    """Compute the 64-bit SimHash of a text.
+    
+    Args:
+        text: Extracted document text
+    
+    Returns:
+        Fingerprint, or None if the text is too short
+    """
+    words = tokenize(text)
+    if len(words) < MIN_WORDS:
+        return None
+    
+    shingles = Counter(
+        " ".join(words[i:i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    )
+    
+    weights = [0] * FINGERPRINT_BITS
+    for shingle, count in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(FINGERPRINT_BITS):
+            if value >> bit & 1:
+                weights[bit] += count
+            else:
+                weights[bit] -= count
+    
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def band_keys(fingerprint: int) -> List[str]:
+    """Split a fingerprint into band keys ("<band>:<hex>")."""
+    return [
+        f"{band}:{(fingerprint >> (band * BAND_BITS)) & BAND_MASK:04x}"
+        for band in range(BANDS)
+    ]
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints."""
+    return bin(a ^ b).count("1")
+
+
+def fingerprint_text(text: str) -> Optional[Dict[str, Any]]:
+    """Build the fingerprint fields stored with a document.
+    
+    Args:
+        text: Extracted document text
+    
+    Returns:
+        Dictionary with ``simhash`` (hex) and ``bands``, or None
+    """
+    value = simhash(text)
+    if value is None:
+        return None
+    return {"simhash": f"{value:016x}", "bands": band_keys(value)}
+
+
+def parse_fingerprint(fingerprint: Dict[str, Any]) -> int:
+    """Return the integer value of a stored fingerprint."""
+    return int(fingerprint["simhash"], 16)
+
+
+def _require_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(
+            "Batch near-duplicate clustering requires numpy. "
+            "Install it with: pip install elasticprinter[dedupe]"
+        )
+    return numpy
+
+
+def _popcount(np, values):
+    """Vectorized bit count of a uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    values = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    values = (values & np.uint64(0x3333333333333333)) + ((values >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    values = (values + (values >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (values * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def cluster_fingerprints(
+    fingerprints: Sequence[int],
+    max_distance: int = DEFAULT_MAX_DISTANCE,
+    chunk_size: int = 1024
+) -> List[List[int]]:
+    """Group fingerprints into near-duplicate clusters.
+    
+    Candidates are fingerprints sharing a band; their distances are
+    computed with NumPy in chunks of ``chunk_size`` rows. Clusters are
+    transitive (single linkage).
+    
+    Args:
+        fingerprints: Fingerprint values
+        max_distance: Maximum Hamming distance of near duplicates
+        chunk_size: Rows per distance matrix block (bounds memory)
+    
+    Returns:
+        Clusters of at least two fingerprints, as sorted index lists
+    """
+    np = _require_numpy()
+    values = np.array(fingerprints, dtype=np.uint64)
+    count = len(values)
+    parent = list(range(count))
+    
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    for band in range(BANDS):
+        keys = (values >> np.uint64(band * BAND_BITS)) & np.uint64(BAND_MASK)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], count]
+        
+        for start, end in zip(starts, ends):
+            if end - start < 2:
+                continue
+            members = order[start:end]
+            member_values = values[members]
+            for row in range(0, len(members), chunk_size):
+                block = member_values[row:row + chunk_size]
+                distances = _popcount(np, block[:, None] ^ member_values[None, :])
+                rows, cols = np.nonzero(distances <= max_distance)
+                for i, j in zip(rows + row, cols):
+                    if i < j:
+                        root_i, root_j = find(int(members[i])), find(int(members[j]))
+                        if root_i != root_j:
+                            parent[max(root_i, root_j)] = min(root_i, root_j)
+    
+    clusters: Dict[int, List[int]] = {}
+    for i in range(count):
+        clusters.setdefault(find(i), []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
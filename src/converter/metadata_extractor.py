@@ -1,14 +1,71 @@
 """Extract metadata from print jobs."""
 import os
 import pwd
+import re
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from PyPDF2 import PdfReader
 
+from converter.artifact import JobArtifact, extract_text
+from converter.fingerprint import fingerprint_text
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Document information keys mapped explicitly in document.pdf_metadata;
+# all other keys go to the flattened document.pdf_metadata_extra field
+PDF_METADATA_KEYS = (
+    "Title", "Author", "Subject", "Keywords", "Creator", "Producer", "CreationDate", "ModDate", "Trapped"
+)
+
+# Limits for producer-specific keys and all values
+MAX_EXTRA_PDF_METADATA_KEYS = 32
+MAX_PDF_METADATA_KEY_LENGTH = 64
+MAX_PDF_METADATA_VALUE_LENGTH = 1024
+
+_KEY_RE = re.compile(r"[^A-Za-z0-9_-]+")
+_CONTROL_RE = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_pdf_info(info: Dict[str, Any]) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Normalize a PDF document information dictionary for indexing.
+    
+    Keys lose the leading '/' and characters other than letters, digits,
+    '_' and '-' (so they cannot create object paths). Values are converted
+    to strings without control characters or repeated whitespace and
+    truncated to MAX_PDF_METADATA_VALUE_LENGTH. Empty values are dropped, and
+    only the first MAX_EXTRA_PDF_METADATA_KEYS keys outside PDF_METADATA_KEYS
+    are kept.
+    
+    Args:
+        info: Document information as returned by PdfReader.metadata
+    
+    Returns:
+        (curated keys, other keys)
+    """
+    curated: Dict[str, str] = {}
+    extra: Dict[str, str] = {}
+    dropped = 0
+    for key, value in info.items():
+        clean_key = _KEY_RE.sub("_", str(key).lstrip('/')).strip("_")[:MAX_PDF_METADATA_KEY_LENGTH]
+        if isinstance(value, bytes):
+            value = value.decode("utf-8", errors="replace")
+        clean_value = _SPACE_RE.sub(" ", _CONTROL_RE.sub("", str(value) if value is not None else "")).strip()
+        if not clean_key or not clean_value:
+            continue
+        clean_value = clean_value[:MAX_PDF_METADATA_VALUE_LENGTH]
+        
+        if clean_key in PDF_METADATA_KEYS:
+            curated[clean_key] = clean_value
+        elif clean_key in extra or len(extra) < MAX_EXTRA_PDF_METADATA_KEYS:
+            extra[clean_key] = clean_value
+        else:
+            dropped += 1
+    if dropped:
+        logger.warning(f"Dropped {dropped} PDF metadata keys beyond the limit of {MAX_EXTRA_PDF_METADATA_KEYS}")
+    return curated, extra
+
 
 class MetadataExtractor:
     """Extract metadata from print jobs and PDFs."""
@@ -69,11 +126,19 @@ class MetadataExtractor:
         return metadata
     
     @staticmethod
-    def extract_from_pdf(pdf_path: str) -> Dict[str, Any]:
+    def extract_from_pdf(
+        pdf_path: str,
+        artifact: Optional[JobArtifact] = None,
+        fingerprint: bool = True
+    ) -> Dict[str, Any]:
         """Extract metadata from PDF file.
         
         Args:
             pdf_path: Path to PDF file
+            artifact: Already analyzed content of ``pdf_path``; the file is
+                      not read again when given
+            fingerprint: Fingerprint the text for near-duplicate detection
+                         (extracts the text of up to 50 pages)
             
         Returns:
             Dictionary containing PDF metadata
@@ -85,23 +150,20 @@ class MetadataExtractor:
         }
         
         try:
-            # Get file size
-            metadata["file_size"] = os.path.getsize(pdf_path)
-            
-            # Read PDF metadata
-            with open(pdf_path, 'rb') as f:
-                reader = PdfReader(f)
-                metadata["page_count"] = len(reader.pages)
+            if artifact is not None:
+                metadata["file_size"] = artifact.size
+                metadata["content_hash"] = artifact.sha256
+                metadata["format"] = artifact.format
+                reader = artifact.pdf_reader()
+                if reader is not None:
+                    MetadataExtractor._read_pdf(reader, metadata, artifact, fingerprint)
+            else:
+                # Get file size
+                metadata["file_size"] = os.path.getsize(pdf_path)
                 
-                # Extract PDF document information
-                if reader.metadata:
-                    pdf_meta = {}
-                    for key, value in reader.metadata.items():
-                        # Remove the leading '/' from PDF metadata keys
-                        clean_key = key.lstrip('/')
-                        pdf_meta[clean_key] = str(value) if value else ""
-                    
-                    metadata["pdf_metadata"] = pdf_meta
+                # Read PDF metadata
+                with open(pdf_path, 'rb') as f:
+                    MetadataExtractor._read_pdf(PdfReader(f), metadata, fingerprint=fingerprint)
             
             logger.info(f"Extracted PDF metadata from {pdf_path}: {metadata}")
         except Exception as e:
@@ -109,6 +171,40 @@ class MetadataExtractor:
         
         return metadata
     
+    @staticmethod
+    def _read_pdf(
+        reader: PdfReader,
+        metadata: Dict[str, Any],
+        artifact: Optional[JobArtifact] = None,
+        fingerprint: bool = True
+    ) -> None:
+        """Add page count, document information and (optionally) fingerprint to ``metadata``."""
+        metadata["page_count"] = len(reader.pages)
+        
+        # Extract PDF document information
+        if reader.metadata:
+            curated, extra = normalize_pdf_info(reader.metadata)
+            metadata["pdf_metadata"] = curated
+            if extra:
+                metadata["pdf_metadata_extra"] = extra
+        
+        if not fingerprint:
+            return
+        value = MetadataExtractor._fingerprint(reader, artifact)
+        if value:
+            metadata["fingerprint"] = value
+    
+    @staticmethod
+    def _fingerprint(reader: PdfReader, artifact: Optional[JobArtifact] = None) -> Optional[Dict[str, Any]]:
+        """Fingerprint the text of the first pages for near-duplicate detection."""
+        try:
+            # The artifact keeps the text for later stages (local mirror)
+            text = artifact.text() if artifact is not None else extract_text(reader)
+            return fingerprint_text(text)
+        except Exception as e:
+            logger.warning(f"Failed to extract text for fingerprint: {e}")
+            return None
+    
     @staticmethod
     def combine_metadata(
         job_metadata: Dict[str, Any],
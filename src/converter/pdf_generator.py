@@ -3,27 +3,82 @@ import os
 import subprocess
 import tempfile
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from pathlib import Path
 
+from converter.artifact import JobArtifact, detect_format
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Slimming modes: drop all raster images, or keep them at a low resolution
+SLIM_MODES = ("drop_images", "downsample")
+
+DEFAULT_SLIM_THRESHOLD_MB = 20
+DEFAULT_SLIM_RESOLUTION = 72
+DEFAULT_SLIM_TIMEOUT = 300
+
+# Formats Ghostscript can read
+SLIMMABLE_FORMATS = ("pdf", "postscript")
+
+MB = 1024 * 1024
+
 
 class PDFGenerator:
     """Generate PDFs from print job data."""
     
-    def __init__(self, temp_dir: str = "/tmp/elasticprinter"):
+    def __init__(
+        self,
+        temp_dir: str = "/tmp/elasticprinter",
+        slim_threshold_mb: Optional[float] = None,
+        slim_mode: str = "drop_images",
+        slim_resolution: int = DEFAULT_SLIM_RESOLUTION,
+        slim_timeout: float = DEFAULT_SLIM_TIMEOUT
+    ):
         """Initialize PDF generator.
         
         Args:
             temp_dir: Directory for temporary PDF files
+            slim_threshold_mb: Jobs larger than this get a slimmed copy for
+                               indexing (None disables slimming)
+            slim_mode: "drop_images" or "downsample" (see SLIM_MODES)
+            slim_resolution: Image resolution in DPI for "downsample"
+            slim_timeout: Seconds before a Ghostscript run is given up
         """
+        if slim_mode not in SLIM_MODES:
+            raise ValueError(f"Unknown slimming mode {slim_mode!r} (expected one of {', '.join(SLIM_MODES)})")
         self.temp_dir = Path(temp_dir)
         self.temp_dir.mkdir(parents=True, exist_ok=True)
+        self.slim_threshold_bytes = int(slim_threshold_mb * MB) if slim_threshold_mb is not None else None
+        self.slim_mode = slim_mode
+        self.slim_resolution = slim_resolution
+        self.slim_timeout = slim_timeout
         logger.info(f"PDFGenerator initialized with temp_dir: {self.temp_dir}")
     
+    @classmethod
+    def from_config(cls, config) -> "PDFGenerator":
+        """Create a generator from the ``processing`` config section.
+        
+        Slimming is configured in ``processing.slimming`` and off unless
+        ``enabled`` is set.
+        
+        Args:
+            config: Configuration loader
+            
+        Returns:
+            PDFGenerator
+        """
+        processing_config = config.processing
+        slimming = processing_config.get('slimming') or {}
+        threshold_mb = slimming.get('threshold_mb', DEFAULT_SLIM_THRESHOLD_MB) if slimming.get('enabled') else None
+        return cls(
+            temp_dir=processing_config.get('temp_dir', '/tmp/elasticprinter'),
+            slim_threshold_mb=threshold_mb,
+            slim_mode=slimming.get('mode', "drop_images"),
+            slim_resolution=slimming.get('resolution', DEFAULT_SLIM_RESOLUTION),
+            slim_timeout=slimming.get('timeout', DEFAULT_SLIM_TIMEOUT)
+        )
+    
     def generate_filename(self, job_id: str, user: str) -> str:
         """Generate unique filename for PDF.
         
@@ -42,7 +97,8 @@ class PDFGenerator:
         input_file: str,
         output_file: Optional[str] = None,
         job_id: str = "unknown",
-        user: str = "unknown"
+        user: str = "unknown",
+        artifact: Optional[JobArtifact] = None
     ) -> str:
         """Convert print job to PDF.
         
@@ -51,6 +107,8 @@ class PDFGenerator:
             output_file: Path to output PDF file. If None, generates one.
             job_id: Print job ID for naming
             user: Username for naming
+            artifact: Already analyzed content of ``input_file``; written
+                      out from memory instead of reading the file again
             
         Returns:
             Path to generated PDF file
@@ -68,7 +126,11 @@ class PDFGenerator:
         # TODO: Implement proper PDF conversion when needed
         import shutil
         try:
-            shutil.copy2(input_file, output_file)
+            if artifact is not None:
+                # The output is a byte-for-byte copy, so the artifact describes it as well
+                artifact.write_to(output_file)
+            else:
+                shutil.copy2(input_file, output_file)
             if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
                 logger.info(f"Saved print job as: {output_file}")
                 return output_file
@@ -143,25 +205,139 @@ class PDFGenerator:
         Returns:
             True if successful, False otherwise
         """
+        return self._run_ghostscript(
+            ['-sDEVICE=pdfwrite', '-dCompatibilityLevel=1.4', '-dPDFSETTINGS=/printer'],
+            input_file,
+            output_file
+        )
+    
+    def slim_pdf(
+        self,
+        input_file: str,
+        artifact: Optional[JobArtifact] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Write a copy of a large job without (or with downsampled) images.
+        
+        Only the text matters for search, so image-heavy jobs (web pages
+        printed with their pictures) are indexed from the slimmed copy.
+        ``input_file`` itself is left untouched.
+        
+        Args:
+            input_file: Converted job (PDF or PostScript)
+            artifact: Already analyzed content of ``input_file`` (for its
+                      size and format)
+            
+        Returns:
+            None if the job is below the threshold, not readable by
+            Ghostscript or not smaller after slimming; otherwise a dict
+            with path (the slimmed PDF), mode, original_bytes,
+            indexed_bytes and reduction (fraction of bytes saved)
+        """
+        if self.slim_threshold_bytes is None:
+            return None
+        if artifact is not None:
+            original_bytes, file_format = artifact.size, artifact.format
+        else:
+            with open(input_file, 'rb') as f:
+                file_format = detect_format(f.read(16))
+            original_bytes = os.path.getsize(input_file)
+        if original_bytes <= self.slim_threshold_bytes or file_format not in SLIMMABLE_FORMATS:
+            return None
+        
+        output_file = f"{os.path.splitext(input_file)[0]}.slim.pdf"
+        if self.slim_mode == "drop_images":
+            # Text and vector graphics are kept
+            arguments = ['-dFILTERIMAGE']
+        else:
+            arguments = [
+                '-dDownsampleColorImages=true',
+                '-dDownsampleGrayImages=true',
+                '-dDownsampleMonoImages=true',
+                f'-dColorImageResolution={self.slim_resolution}',
+                f'-dGrayImageResolution={self.slim_resolution}',
+                f'-dMonoImageResolution={self.slim_resolution}',
+            ]
+        slimmed = self._run_ghostscript(
+            ['-dSAFER', '-sDEVICE=pdfwrite', '-dCompatibilityLevel=1.4', *arguments],
+            input_file,
+            output_file,
+            timeout=self.slim_timeout
+        )
+        indexed_bytes = os.path.getsize(output_file) if slimmed else 0
+        if not slimmed or indexed_bytes >= original_bytes:
+            logger.info(f"Not slimming {input_file}: " + (
+                "Ghostscript failed" if not slimmed else f"{self.slim_mode} saves nothing"
+            ))
+            self.cleanup(output_file)
+            return None
+        
+        reduction = 1 - indexed_bytes / original_bytes
+        logger.info(
+            f"Slimmed {input_file} ({self.slim_mode}): {original_bytes / MB:.1f} MB -> "
+            f"{indexed_bytes / MB:.1f} MB ({reduction:.0%} smaller)"
+        )
+        return {
+            "path": output_file,
+            "mode": self.slim_mode,
+            "original_bytes": original_bytes,
+            "indexed_bytes": indexed_bytes,
+            "reduction": round(reduction, 4),
+        }
+    
+    def render_thumbnail(self, input_file: str, output_file: str, resolution: int = 24) -> bool:
+        """Render the first page of a PDF as a PNG image using Ghostscript.
+        
+        Args:
+            input_file: Input PDF path
+            output_file: Output PNG path
+            resolution: Resolution in DPI (24 gives about 200 pixels across a letter page)
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        return self._run_ghostscript(
+            [
+                '-dSAFER',
+                '-sDEVICE=png16m',
+                '-dFirstPage=1',
+                '-dLastPage=1',
+                f'-r{resolution}',
+                '-dTextAlphaBits=4',
+                '-dGraphicsAlphaBits=4'
+            ],
+            input_file,
+            output_file
+        )
+    
+    def _run_ghostscript(self, arguments: List[str], input_file: str, output_file: str, timeout: float = 60) -> bool:
+        """Run Ghostscript in batch mode with device ``arguments``.
+        
+        Args:
+            arguments: Device and output options
+            input_file: Input file path
+            output_file: Output file path
+            timeout: Seconds before Ghostscript is killed
+            
+        Returns:
+            True if a non-empty output file was written, False otherwise
+        """
         try:
             result = subprocess.run(
                 [
                     'gs',
                     '-dBATCH',
                     '-dNOPAUSE',
-                    '-sDEVICE=pdfwrite',
-                    '-dCompatibilityLevel=1.4',
-                    '-dPDFSETTINGS=/printer',
+                    *arguments,
                     f'-sOutputFile={output_file}',
                     input_file
                 ],
                 capture_output=True,
                 check=True,
-                timeout=60
+                timeout=timeout
             )
             return os.path.exists(output_file) and os.path.getsize(output_file) > 0
         except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired) as e:
-            logger.debug(f"Ghostscript conversion failed: {e}")
+            logger.debug(f"Ghostscript failed: {e}")
             return False
     
     def cleanup(self, pdf_path: str) -> None:
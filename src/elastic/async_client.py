@@ -0,0 +1,448 @@
+"""Asynchronous Elasticsearch client wrapper."""
+import asyncio
+from concurrent.futures import Executor
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import ApiError, ConnectionError
+
+from converter.artifact import JobArtifact
+from converter.fingerprint import DEFAULT_MAX_DISTANCE
+from elastic.client import (
+    PIPELINE_VERSION,
+    attachment_pipeline_body,
+    build_auth_config,
+    build_index_body,
+    client_kwargs_from_config,
+    create_ingest_client,
+    encode_pdf,
+    latest_query,
+    near_duplicate_matches,
+    near_duplicate_query,
+    normalize_hosts,
+    pipeline_is_current,
+    routing_for_document,
+    routing_key,
+    routing_required,
+)
+from elastic.query_cache import QueryCache
+from elastic.retry import CircuitBreaker, RetryPolicy
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AsyncElasticClient:
+    """asyncio counterpart of ElasticClient built on AsyncElasticsearch.
+    
+    Requires the ``aiohttp`` package. CPU-bound work (reading and base64
+    encoding PDFs) runs in ``executor`` so the event loop stays responsive.
+    
+    Usage:
+        async with AsyncElasticClient(host=...) as client:
+            await client.index_pdf(pdf_path, metadata, doc_id)
+    """
+    
+    def __init__(
+        self,
+        host: Union[str, List[str]],
+        index: str = "print-jobs",
+        pipeline: str = "attachment",
+        api_key_id: Optional[str] = None,
+        api_key: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        verify_certs: bool = True,
+        max_retries: int = 3,
+        timeout: Optional[float] = None,
+        retry_backoff: float = 0.5,
+        retry_backoff_max: float = 30.0,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        query_cache: Optional[QueryCache] = None,
+        transport_options: Optional[Dict[str, Any]] = None,
+        ingest_hosts: Optional[Union[str, List[str]]] = None,
+        sniff_ingest_nodes: bool = False,
+        ingest_timeout: Optional[float] = None,
+        route_by_user: bool = False,
+        routing_partition_size: Optional[int] = None,
+        index_settings: Optional[Dict[str, Any]] = None,
+        executor: Optional[Executor] = None
+    ):
+        """Initialize asynchronous Elasticsearch client.
+        
+        The connection is not tested until connect() is awaited.
+        
+        Args:
+            host: Elasticsearch host URL, or a list of node URLs to balance across
+            index: Index name for print jobs
+            pipeline: Ingest pipeline name
+            api_key_id: API key ID for authentication
+            api_key: API key secret
+            username: Username for basic auth (if not using API key)
+            password: Password for basic auth (if not using API key)
+            verify_certs: Whether to verify SSL certificates
+            max_retries: Retries for transient failures (429, 5xx, connection errors)
+            timeout: Per-request timeout in seconds
+            retry_backoff: Base delay in seconds for exponential backoff
+            retry_backoff_max: Maximum delay in seconds between retries
+            circuit_breaker: Optional circuit breaker shared by all requests
+            query_cache: Optional search result cache (may be shared between clients)
+            transport_options: Connection pool settings (see TRANSPORT_OPTIONS)
+            ingest_hosts: Dedicated ingest node URLs for indexing requests
+            sniff_ingest_nodes: Discover ingest nodes for indexing requests
+            ingest_timeout: Request timeout in seconds for indexing requests
+            route_by_user: Route documents by ``print_job.user`` so per-user
+                           requests only hit that user's shard
+            routing_partition_size: Shards each user's documents are spread over
+                                    (applied when the index is created)
+            index_settings: Settings overriding the shipped ones when the index is created
+            executor: Executor for CPU-bound work (default: loop's default executor)
+        """
+        self.host = host
+        self.index = index
+        self.pipeline = pipeline
+        self.route_by_user = route_by_user
+        self.routing_partition_size = routing_partition_size
+        self.index_settings = index_settings
+        self.executor = executor
+        self.retry_policy = RetryPolicy(
+            max_retries=max_retries,
+            backoff_base=retry_backoff,
+            backoff_max=retry_backoff_max
+        )
+        self.circuit_breaker = circuit_breaker
+        self.query_cache = query_cache
+        
+        auth_config = build_auth_config(api_key_id, api_key, username, password)
+        
+        # Retries are handled by our own policy, so the transport must not retry as well
+        client_args = {
+            **auth_config,
+            'verify_certs': verify_certs,
+            'request_timeout': timeout,
+            'max_retries': 0,
+            'retry_on_timeout': False,
+            **(transport_options or {}),
+        }
+        hosts = normalize_hosts(host)
+        self.es = AsyncElasticsearch(hosts, **client_args)
+        self.ingest_es = create_ingest_client(
+            AsyncElasticsearch,
+            self.es,
+            hosts,
+            client_args,
+            ingest_hosts=ingest_hosts,
+            sniff_ingest_nodes=sniff_ingest_nodes,
+            ingest_timeout=ingest_timeout
+        )
+    
+    @classmethod
+    def from_config(cls, config, executor: Optional[Executor] = None) -> "AsyncElasticClient":
+        """Create a client from the ``elasticsearch`` and ``processing`` config sections.
+        
+        Args:
+            config: Configuration loader
+            executor: Executor for CPU-bound work
+        
+        Returns:
+            AsyncElasticClient (not yet connected)
+        """
+        return cls(**client_kwargs_from_config(config), executor=executor)
+    
+    async def __aenter__(self) -> "AsyncElasticClient":
+        try:
+            await self.connect()
+        except Exception:
+            await self.close()
+            raise
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+    
+    async def _call(self, description: str, func, *args, **kwargs) -> Any:
+        """Send a request through the retry policy and circuit breaker."""
+        return await self.retry_policy.call_async(
+            func,
+            *args,
+            breaker=self.circuit_breaker,
+            description=description,
+            **kwargs
+        )
+    
+    async def _run_in_executor(self, func, *args) -> Any:
+        """Run CPU-bound work off the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+    
+    async def connect(self) -> Dict[str, Any]:
+        """Test the connection to Elasticsearch.
+        
+        Returns:
+            Cluster info
+        
+        Raises:
+            ConnectionError: If the cluster cannot be reached
+        """
+        try:
+            info = await self._call("connection test", self.es.info)
+            logger.info(f"Successfully connected to Elasticsearch at {self.host}")
+            logger.info(f"Cluster: {info.get('cluster_name', 'unknown')}, Version: {info.get('version', {}).get('number', 'unknown')}")
+            return info
+        except (ApiError, ConnectionError) as e:
+            logger.error(f"Connection test failed with error: {type(e).__name__}: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Connection test failed with error: {type(e).__name__}: {e}")
+            raise ConnectionError(f"Cannot connect to Elasticsearch: {e}")
+    
+    async def ensure_index_exists(self) -> bool:
+        """Ensure the index exists with proper mapping.
+        
+        Returns:
+            True if index exists or was created successfully
+        """
+        try:
+            if await self._call("index check", self.es.indices.exists, index=self.index):
+                logger.info(f"Index {self.index} already exists")
+                if self.route_by_user and not routing_required(
+                    await self._call("mapping lookup", self.es.indices.get_mapping, index=self.index)
+                ):
+                    logger.error(
+                        f"Index {self.index} was created without required routing; "
+                        f"ignoring elasticsearch.routing until it is reindexed"
+                    )
+                    self.route_by_user = False
+                return True
+            
+            mapping = build_index_body(self.route_by_user, self.routing_partition_size, self.index_settings)
+            await self._call("index creation", self.es.indices.create, index=self.index, body=mapping)
+            logger.info(f"Created index {self.index} with mapping")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to ensure index exists: {e}")
+            return False
+    
+    async def ensure_pipeline_exists(self) -> bool:
+        """Ensure the ingest attachment pipeline exists.
+        
+        Returns:
+            True if pipeline exists or was created successfully
+        """
+        try:
+            response = await self._call(
+                "pipeline lookup",
+                self.es.options(ignore_status=404).ingest.get_pipeline,
+                id=self.pipeline
+            )
+            if pipeline_is_current(response, self.pipeline):
+                logger.info(f"Pipeline {self.pipeline} already exists")
+                return True
+        except Exception as e:
+            logger.warning(f"Failed to look up pipeline {self.pipeline}, creating it: {e}")
+        
+        try:
+            pipeline_body = attachment_pipeline_body()
+            await self._call("pipeline creation", self.es.ingest.put_pipeline, id=self.pipeline, body=pipeline_body)
+            logger.info(f"Created ingest pipeline {self.pipeline} (version {PIPELINE_VERSION})")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to create pipeline: {e}")
+            return False
+    
+    async def index_pdf(
+        self,
+        pdf_path: str,
+        metadata: Dict[str, Any],
+        doc_id: Optional[str] = None,
+        artifact: Optional[JobArtifact] = None,
+        content: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Index a PDF document with metadata.
+        
+        Args:
+            pdf_path: Path to PDF file
+            metadata: Document metadata
+            doc_id: Optional document ID (if None, auto-generated)
+            artifact: Already analyzed content of ``pdf_path`` (reuses its base64)
+            content: Cleaned text replacing the extracted attachment.content
+        
+        Returns:
+            Elasticsearch response
+        
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+            Exception: If indexing fails after retries, or fails permanently
+        """
+        try:
+            if artifact is not None:
+                encoded_pdf = await self._run_in_executor(lambda: artifact.base64)
+            else:
+                encoded_pdf = await self._run_in_executor(encode_pdf, pdf_path)
+            
+            document = {
+                "data": encoded_pdf,
+                **metadata
+            }
+            if content is not None:
+                document["clean_content"] = content
+            
+            response = await self._call(
+                f"indexing of {pdf_path}",
+                self.ingest_es.index,
+                index=self.index,
+                id=doc_id,
+                document=document,
+                pipeline=self.pipeline,
+                routing=routing_for_document(metadata) if self.route_by_user else None
+            )
+            if self.query_cache is not None:
+                self.query_cache.invalidate(self.index)
+            
+            logger.info(f"Indexed PDF {pdf_path} as document {response['_id']}")
+            return response
+        except Exception as e:
+            logger.error(f"Failed to index PDF {pdf_path}: {e}")
+            raise
+    
+    async def search(self, query: Dict[str, Any], size: int = 10, user: Optional[str] = None) -> Dict[str, Any]:
+        """Search for documents.
+        
+        Args:
+            query: Elasticsearch query DSL
+            size: Number of results to return
+            user: Owner of all wanted documents; with user routing only that
+                  user's shard is searched (the query must still filter by user)
+        
+        Returns:
+            Search results
+        """
+        routing = user if self.route_by_user else None
+        generation = None
+        if self.query_cache is not None:
+            cached = self.query_cache.get(self.index, query, size, routing)
+            if cached is not None:
+                return cached
+            generation = self.query_cache.generation(self.index)
+        
+        try:
+            response = await self._call(
+                "search",
+                self.es.search,
+                index=self.index,
+                # The client adds parameters to the body; keep the caller's (and the cache key's) query intact
+                body=dict(query),
+                size=size,
+                routing=routing
+            )
+            if self.query_cache is not None:
+                self.query_cache.put(self.index, query, size, response, generation, routing)
+            return response
+        except Exception as e:
+            logger.error(f"Search failed: {e}")
+            raise
+    
+    async def latest(
+        self,
+        size: int = 10,
+        user: Optional[str] = None,
+        source: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Get the most recently indexed jobs, newest first (see latest_query).
+        
+        Args:
+            size: Number of jobs to return
+            user: Only jobs printed by this user
+            source: Source fields to return (default: all but the file data)
+        
+        Returns:
+            Search results
+        """
+        return await self.search(latest_query(user, source), size=size, user=user)
+    
+    async def find_near_duplicates(
+        self,
+        fingerprint: Dict[str, Any],
+        max_distance: int = DEFAULT_MAX_DISTANCE,
+        size: int = 50
+    ) -> List[Tuple[str, int]]:
+        """Find documents whose text fingerprint is close to ``fingerprint``.
+        
+        Args:
+            fingerprint: Fingerprint fields (simhash and bands)
+            max_distance: Maximum Hamming distance
+            size: Maximum number of candidates to check
+        
+        Returns:
+            (document ID, distance) pairs, closest first
+        """
+        response = await self.search(near_duplicate_query(fingerprint), size=size)
+        return near_duplicate_matches(response, fingerprint, max_distance)
+    
+    async def get_document(self, doc_id: str, user: Optional[str] = None) -> Dict[str, Any]:
+        """Retrieve a document by ID.
+        
+        Args:
+            doc_id: Document ID
+            user: Owner of the document (required with user routing)
+        
+        Returns:
+            Document data
+        """
+        try:
+            return await self._call(
+                f"get {doc_id}",
+                self.es.get,
+                index=self.index,
+                id=doc_id,
+                routing=routing_key(user) if self.route_by_user else None
+            )
+        except Exception as e:
+            logger.error(f"Failed to get document {doc_id}: {e}")
+            raise
+    
+    async def mget(
+        self,
+        doc_ids: List[str],
+        users: Optional[List[Optional[str]]] = None,
+        source: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Retrieve several documents by ID in one request.
+        
+        Args:
+            doc_ids: Document IDs
+            users: Owner of each document (required with user routing)
+            source: Whether to return the document sources
+        
+        Returns:
+            One result per ID, in order, each with a ``found`` flag
+        """
+        docs = []
+        for position, doc_id in enumerate(doc_ids):
+            doc = {"_id": doc_id}
+            if self.route_by_user:
+                doc["routing"] = routing_key(users[position] if users else None)
+            docs.append(doc)
+        
+        try:
+            response = await self._call(
+                f"mget of {len(docs)} documents",
+                self.es.mget,
+                index=self.index,
+                docs=docs,
+                source=source
+            )
+            return response["docs"]
+        except Exception as e:
+            logger.error(f"Failed to get {len(docs)} documents: {e}")
+            raise
+    
+    async def close(self) -> None:
+        """Close the Elasticsearch connection."""
+        try:
+            if self.ingest_es.transport is not self.es.transport:
+                await self.ingest_es.close()
+            await self.es.close()
+            logger.info("Closed Elasticsearch connection")
+        except Exception as e:
+            logger.error(f"Error closing connection: {e}")
@@ -1,35 +1,582 @@
 """Elasticsearch client wrapper."""
 import base64
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
 from pathlib import Path
 
+from elastic_transport import NodePool
 from elasticsearch import Elasticsearch
-from elasticsearch.exceptions import ConnectionError, AuthenticationException
+from elasticsearch.exceptions import ApiError, ConnectionError, AuthenticationException
 
+from converter.artifact import JobArtifact
+from converter.fingerprint import DEFAULT_MAX_DISTANCE, hamming_distance, parse_fingerprint
+from elastic.query_cache import QueryCache
+from elastic.retry import CircuitBreaker, RetryPolicy
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+MAPPING_FILE = Path(__file__).parent / "index_mapping.json"
+
+# Bumped whenever attachment_pipeline_body changes; older pipelines are replaced
+PIPELINE_VERSION = 2
+
+TOTAL_FIELDS_LIMIT_SETTING = "index.mapping.total_fields.limit"
+DEFAULT_TOTAL_FIELDS_LIMIT = 1000
+
+# field_usage warns when the mapping reaches this fraction of the field limit
+DEFAULT_FIELD_WARN_RATIO = 0.8
+
+# Routing key of documents without a print_job.user (see routing_key)
+UNKNOWN_USER_ROUTING = "unknown"
+
+# Connection pool settings accepted in the ``elasticsearch.transport`` config section
+TRANSPORT_OPTIONS = (
+    "connections_per_node",
+    "http_compress",
+    "node_selector_class",
+    "randomize_nodes_in_pool",
+    "dead_node_backoff_factor",
+    "max_dead_node_backoff",
+    "sniff_on_start",
+    "sniff_before_requests",
+    "sniff_on_node_failure",
+    "sniff_timeout",
+    "min_delay_between_sniffing",
+)
+
+
+def build_auth_config(
+    api_key_id: Optional[str] = None,
+    api_key: Optional[str] = None,
+    username: Optional[str] = None,
+    password: Optional[str] = None
+) -> Dict[str, Any]:
+    """Build authentication keyword arguments for the Elasticsearch client.
+    
+    Args:
+        api_key_id: API key ID for authentication
+        api_key: API key secret
+        username: Username for basic auth (if not using API key)
+        password: Password for basic auth (if not using API key)
+        
+    Returns:
+        Keyword arguments for Elasticsearch/AsyncElasticsearch
+    """
+    auth_config = {}
+    if api_key:
+        # For Elasticsearch Python client, use the encoded API key directly
+        # If api_key looks like an encoded key (no colon, longer than 20 chars), use it directly
+        # Otherwise combine id:secret and encode
+        if api_key_id:
+            # Both ID and secret provided - use tuple format
+            auth_config['api_key'] = (api_key_id, api_key)
+            logger.info("Using API key authentication (id + secret)")
+        elif ':' not in api_key and len(api_key) > 20:
+            # Already encoded - use directly
+            auth_config['api_key'] = api_key
+            logger.info("Using API key authentication (encoded)")
+        else:
+            # Assume it's just the secret, no ID - use directly
+            auth_config['api_key'] = api_key
+            logger.info("Using API key authentication (secret only)")
+    elif username and password:
+        auth_config['basic_auth'] = (username, password)
+        logger.info("Using basic authentication")
+    else:
+        logger.warning("No authentication configured")
+    
+    return auth_config
+
+
+def normalize_hosts(host: Union[str, List[str]]) -> List[str]:
+    """Accept a single host URL or a list of node URLs.
+    
+    Args:
+        host: Host URL or list of host URLs
+        
+    Returns:
+        List of host URLs
+    """
+    if isinstance(host, str):
+        return [host]
+    return list(host)
+
+
+def transport_options_from_config(es_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Read connection pool settings from the ``elasticsearch.transport`` section.
+    
+    Args:
+        es_config: ``elasticsearch`` config section
+        
+    Returns:
+        Keyword arguments for Elasticsearch/AsyncElasticsearch
+    """
+    options = {}
+    for key, value in (es_config.get('transport') or {}).items():
+        if key in TRANSPORT_OPTIONS:
+            options[key] = value
+        else:
+            logger.warning(f"Ignoring unknown elasticsearch.transport option {key!r}")
+    return options
+
+
+def ingest_node_callback(node_info: Dict[str, Any], node_config: Any) -> Optional[Any]:
+    """Keep only sniffed nodes with the ingest role.
+    
+    Args:
+        node_info: Node entry from the nodes info API
+        node_config: Connection settings for the node
+        
+    Returns:
+        ``node_config`` for ingest nodes, None to skip the node
+    """
+    if "ingest" in node_info.get("roles", []):
+        return node_config
+    return None
+
+
+class IngestNodePool(NodePool):
+    """Node pool that stops using its seed nodes once ingest nodes are sniffed.
+    
+    The transport never removes seed nodes from its pool, so a
+    coordinating-only seed would keep receiving indexing requests. When the
+    first sniffed node is added, the seeds are removed; a seed that sniffing
+    returns as an ingest node is added back.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._seeds_dropped = False
+    
+    def add(self, node_config) -> None:
+        """Add a sniffed ingest node (see NodePool.add)."""
+        if not self._seeds_dropped:
+            self._seeds_dropped = True
+            # NodePool.remove refuses seed nodes
+            self._removed_nodes.update(self._seed_nodes)
+        super().add(node_config)
+
+
+def create_ingest_client(
+    client_class,
+    es,
+    hosts: List[str],
+    client_args: Dict[str, Any],
+    ingest_hosts: Optional[Union[str, List[str]]] = None,
+    sniff_ingest_nodes: bool = False,
+    ingest_timeout: Optional[float] = None
+):
+    """Build the client that sends requests through the ingest pipeline.
+    
+    Args:
+        client_class: Elasticsearch or AsyncElasticsearch
+        es: Client for all other requests
+        hosts: Hosts of ``es``
+        client_args: Keyword arguments ``es`` was created with
+        ingest_hosts: Dedicated ingest node URLs
+        sniff_ingest_nodes: Discover ingest nodes from ``hosts`` instead
+        ingest_timeout: Request timeout for indexing (defaults to the client's)
+        
+    Returns:
+        ``es`` itself, a view of it with another timeout, or a separate client
+    """
+    args = dict(client_args)
+    if ingest_timeout is not None:
+        args['request_timeout'] = ingest_timeout
+    
+    if ingest_hosts:
+        logger.info(f"Sending ingest requests to {normalize_hosts(ingest_hosts)}")
+        return client_class(normalize_hosts(ingest_hosts), **args)
+    if sniff_ingest_nodes:
+        logger.info("Sending ingest requests to sniffed ingest nodes")
+        args.update(
+            sniff_on_start=True,
+            sniff_on_node_failure=True,
+            sniffed_node_callback=ingest_node_callback,
+            node_pool_class=IngestNodePool
+        )
+        return client_class(hosts, **args)
+    if ingest_timeout is not None:
+        return es.options(request_timeout=ingest_timeout)
+    return es
+
+
+def client_kwargs_from_config(config) -> Dict[str, Any]:
+    """Build client constructor arguments from configuration.
+    
+    Args:
+        config: Configuration loader
+        
+    Returns:
+        Keyword arguments for ElasticClient/AsyncElasticClient
+    """
+    es_config = config.elasticsearch
+    processing_config = config.processing
+    
+    breaker_config = processing_config.get('circuit_breaker') or {}
+    circuit_breaker = None
+    if breaker_config.get('enabled', True):
+        circuit_breaker = CircuitBreaker(
+            failure_threshold=breaker_config.get('failure_threshold', 5),
+            reset_timeout=breaker_config.get('reset_timeout', 60),
+            state_file=breaker_config.get('state_file')
+        )
+    
+    routing_config = es_config.get('routing') or {}
+    
+    cache_config = es_config.get('query_cache') or {}
+    query_cache = None
+    if cache_config.get('enabled', False):
+        query_cache = QueryCache(
+            max_entries=cache_config.get('max_entries', 256),
+            ttl=cache_config.get('ttl', 30)
+        )
+    
+    return {
+        'host': es_config.get('hosts') or es_config.get('host'),
+        'index': es_config.get('index', 'print-jobs'),
+        'pipeline': es_config.get('pipeline', 'attachment'),
+        'api_key_id': es_config.get('api_key_id'),
+        'api_key': es_config.get('api_key'),
+        'username': es_config.get('username'),
+        'password': es_config.get('password'),
+        'verify_certs': es_config.get('verify_certs', True),
+        'max_retries': processing_config.get('max_retries', 3),
+        'timeout': processing_config.get('timeout', 30),
+        'retry_backoff': processing_config.get('retry_backoff', 0.5),
+        'retry_backoff_max': processing_config.get('retry_backoff_max', 30),
+        'circuit_breaker': circuit_breaker,
+        'query_cache': query_cache,
+        'transport_options': transport_options_from_config(es_config),
+        'ingest_hosts': es_config.get('ingest_hosts'),
+        'sniff_ingest_nodes': es_config.get('sniff_ingest_nodes', False),
+        'ingest_timeout': processing_config.get('ingest_timeout'),
+        'route_by_user': routing_config.get('enabled', False),
+        'routing_partition_size': routing_config.get('partition_size'),
+        'index_settings': es_config.get('index_settings'),
+    }
+
+
+def load_index_mapping() -> Dict[str, Any]:
+    """Load the index mapping and settings shipped with the package.
+    
+    Returns:
+        Index creation body
+    """
+    with open(MAPPING_FILE, 'r') as f:
+        return json.load(f)
+
+
+def build_index_body(
+    route_by_user: bool = False,
+    routing_partition_size: Optional[int] = None,
+    index_settings: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Build the index creation body from the shipped mapping.
+    
+    Args:
+        route_by_user: Require a routing key on every document
+        routing_partition_size: Shards each routing key is spread over
+        index_settings: Settings overriding the shipped ones (e.g. number_of_shards)
+        
+    Returns:
+        Index creation body
+    """
+    body = load_index_mapping()
+    body["settings"].update(index_settings or {})
+    if route_by_user:
+        body["mappings"]["_routing"] = {"required": True}
+        if routing_partition_size and routing_partition_size > 1:
+            body["settings"]["routing_partition_size"] = routing_partition_size
+    return body
+
+
+def latest_query(user: Optional[str] = None, source: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Build the search body for the most recently indexed jobs.
+    
+    The index is sorted on ``indexed_at`` descending, so with
+    ``track_total_hits`` disabled every shard stops after the first
+    ``size`` documents of each segment instead of sorting all matches.
+    
+    Args:
+        user: Only jobs printed by this user
+        source: Source fields to return (default: all but the file data)
+    
+    Returns:
+        Search request body
+    """
+    query: Dict[str, Any] = {"match_all": {}}
+    if user is not None:
+        query = {"bool": {"filter": [{"term": {"print_job.user": user}}]}}
+    return {
+        "query": query,
+        "sort": [{"indexed_at": {"order": "desc"}}],
+        "track_total_hits": False,
+        "_source": source if source is not None else {"excludes": ["data"]},
+    }
+
+
+def near_duplicate_query(fingerprint: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the search body for near-duplicate candidates of a fingerprint.
+    
+    Args:
+        fingerprint: Fingerprint fields (simhash and bands)
+    
+    Returns:
+        Search request body matching documents that share a band
+    """
+    return {
+        "query": {"terms": {"document.fingerprint.bands": fingerprint["bands"]}},
+        "_source": ["document.fingerprint.simhash"]
+    }
+
+
+def near_duplicate_matches(
+    response: Dict[str, Any],
+    fingerprint: Dict[str, Any],
+    max_distance: int = DEFAULT_MAX_DISTANCE
+) -> List[Tuple[str, int]]:
+    """Keep the candidates of near_duplicate_query within ``max_distance``.
+    
+    Args:
+        response: Search response
+        fingerprint: Fingerprint the candidates were searched for
+        max_distance: Maximum Hamming distance
+    
+    Returns:
+        (document ID, distance) pairs, closest first
+    """
+    value = parse_fingerprint(fingerprint)
+    matches = []
+    for hit in response["hits"]["hits"]:
+        stored = hit["_source"].get("document", {}).get("fingerprint")
+        if not stored:
+            continue
+        distance = hamming_distance(value, parse_fingerprint(stored))
+        if distance <= max_distance:
+            matches.append((hit["_id"], distance))
+    return sorted(matches, key=lambda match: match[1])
+
+
+def count_mapped_fields(properties: Dict[str, Any]) -> int:
+    """Count fields the way index.mapping.total_fields.limit does.
+    
+    Objects, leaf fields and multi-fields each count as one field.
+    
+    Args:
+        properties: ``properties`` of a mapping
+    
+    Returns:
+        Number of mapped fields
+    """
+    count = 0
+    for field in properties.values():
+        count += 1
+        count += count_mapped_fields(field.get("properties") or {})
+        count += count_mapped_fields(field.get("fields") or {})
+    return count
+
+
+def metadata_mapping_update() -> Dict[str, Any]:
+    """Mapping changes that stop PDF metadata from adding fields to an existing index.
+    
+    Only ``dynamic`` and the new flattened field are sent; the curated
+    keys of an existing index keep their dynamically created mappings.
+    
+    Returns:
+        Body for the put mapping API
+    """
+    document = load_index_mapping()["mappings"]["properties"]["document"]["properties"]
+    return {
+        "properties": {
+            "document": {
+                "properties": {
+                    "pdf_metadata": {"type": "object", "dynamic": False},
+                    "pdf_metadata_extra": document["pdf_metadata_extra"],
+                }
+            }
+        }
+    }
+
+
+def routing_key(user: Optional[str]) -> str:
+    """Routing key of a user's documents.
+    
+    Documents without a user are routed by UNKNOWN_USER_ROUTING (as the
+    fair scheduler queues them), since the mapping requires a key.
+    
+    Args:
+        user: Owner of the documents
+        
+    Returns:
+        Routing key
+    """
+    return str(user) if user else UNKNOWN_USER_ROUTING
+
+
+def routing_for_document(document: Dict[str, Any]) -> str:
+    """Derive the routing key of a document from ``print_job.user``.
+    
+    Args:
+        document: Document source
+        
+    Returns:
+        Routing key
+    """
+    return routing_key((document.get("print_job") or {}).get("user"))
+
+
+def routing_required(mappings: Dict[str, Any]) -> bool:
+    """Check whether an existing index requires routing.
+    
+    Args:
+        mappings: ``indices.get_mapping`` response
+        
+    Returns:
+        True if every index in the response has ``_routing.required``
+    """
+    return bool(mappings) and all(
+        ((entry.get("mappings") or {}).get("_routing") or {}).get("required", False)
+        for entry in mappings.values()
+    )
+
+
+def add_bulk_routing(operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Add user routing to the actions of a bulk request.
+    
+    Actions that already carry a routing key are left alone; updates are
+    routed by the user in their partial document, if any (a partial
+    document without a user may belong to any user's document).
+    
+    Args:
+        operations: Alternating action and source entries
+        
+    Returns:
+        Operations with routing (the input list is not modified)
+    """
+    routed = []
+    i = 0
+    while i < len(operations):
+        action = operations[i]
+        (op, meta), = action.items()
+        if op == "delete":
+            routed.append(action)
+            i += 1
+            continue
+        
+        source = operations[i + 1]
+        if op == "update":
+            user = ((source.get("doc") or source.get("upsert") or {}).get("print_job") or {}).get("user")
+            routing = str(user) if user else None
+        else:
+            routing = routing_for_document(source)
+        if routing is not None and "routing" not in meta:
+            action = {op: {**meta, "routing": routing}}
+        routed.extend([action, source])
+        i += 2
+    return routed
+
+
+def attachment_pipeline_body() -> Dict[str, Any]:
+    """Build the ingest pipeline that extracts text from the PDF.
+    
+    Text cleaned on the client (``clean_content``, see
+    converter.boilerplate) replaces the extracted ``attachment.content``.
+    
+    Returns:
+        Pipeline definition
+    """
+    return {
+        "description": "Extract attachment information from PDFs",
+        "version": PIPELINE_VERSION,
+        "processors": [
+            {
+                "attachment": {
+                    "field": "data",
+                    "target_field": "attachment",
+                    "indexed_chars": -1,
+                    "ignore_missing": True
+                }
+            },
+            {
+                "set": {
+                    "if": "ctx.clean_content != null",
+                    "field": "attachment.content",
+                    "copy_from": "clean_content",
+                    "override": True
+                }
+            },
+            {
+                "remove": {
+                    "field": ["data", "clean_content"],
+                    "ignore_missing": True
+                }
+            }
+        ]
+    }
+
+
+def pipeline_is_current(response: Any, pipeline_id: str) -> bool:
+    """Check whether a get-pipeline response holds PIPELINE_VERSION or newer.
+    
+    Args:
+        response: Response of the get pipeline API
+        pipeline_id: Pipeline name
+    
+    Returns:
+        False if the pipeline is missing or older (it is replaced then)
+    """
+    body = response.get(pipeline_id) if response else None
+    return bool(body) and body.get("version", 0) >= PIPELINE_VERSION
+
+
+def encode_pdf(pdf_path: str) -> str:
+    """Read a PDF and encode it as base64 for the attachment processor.
+    
+    Args:
+        pdf_path: Path to PDF file
+        
+    Returns:
+        Base64-encoded file content
+    """
+    with open(pdf_path, 'rb') as f:
+        pdf_data = f.read()
+    
+    return base64.b64encode(pdf_data).decode('utf-8')
+
 
 class ElasticClient:
     """Elasticsearch client for indexing print jobs."""
     
     def __init__(
         self,
-        host: str,
+        host: Union[str, List[str]],
         index: str = "print-jobs",
         pipeline: str = "attachment",
         api_key_id: Optional[str] = None,
         api_key: Optional[str] = None,
         username: Optional[str] = None,
         password: Optional[str] = None,
-        verify_certs: bool = True
+        verify_certs: bool = True,
+        max_retries: int = 3,
+        timeout: Optional[float] = None,
+        retry_backoff: float = 0.5,
+        retry_backoff_max: float = 30.0,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        query_cache: Optional[QueryCache] = None,
+        transport_options: Optional[Dict[str, Any]] = None,
+        ingest_hosts: Optional[Union[str, List[str]]] = None,
+        sniff_ingest_nodes: bool = False,
+        ingest_timeout: Optional[float] = None,
+        route_by_user: bool = False,
+        routing_partition_size: Optional[int] = None,
+        index_settings: Optional[Dict[str, Any]] = None
     ):
         """Initialize Elasticsearch client.
         
         Args:
-            host: Elasticsearch host URL
+            host: Elasticsearch host URL, or a list of node URLs to balance across
             index: Index name for print jobs
             pipeline: Ingest pipeline name
             api_key_id: API key ID for authentication
@@ -37,48 +584,71 @@ class ElasticClient:
             username: Username for basic auth (if not using API key)
             password: Password for basic auth (if not using API key)
             verify_certs: Whether to verify SSL certificates
+            max_retries: Retries for transient failures (429, 5xx, connection errors)
+            timeout: Per-request timeout in seconds
+            retry_backoff: Base delay in seconds for exponential backoff
+            retry_backoff_max: Maximum delay in seconds between retries
+            circuit_breaker: Optional circuit breaker shared by all requests
+            query_cache: Optional search result cache (may be shared between clients)
+            transport_options: Connection pool settings (see TRANSPORT_OPTIONS)
+            ingest_hosts: Dedicated ingest node URLs for indexing requests
+            sniff_ingest_nodes: Discover ingest nodes for indexing requests
+            ingest_timeout: Request timeout in seconds for indexing requests
+            route_by_user: Route documents by ``print_job.user`` so per-user
+                           requests only hit that user's shard
+            routing_partition_size: Shards each user's documents are spread over
+                                    (applied when the index is created)
+            index_settings: Settings overriding the shipped ones when the index is created
         """
         self.host = host
         self.index = index
         self.pipeline = pipeline
+        self.route_by_user = route_by_user
+        self.routing_partition_size = routing_partition_size
+        self.index_settings = index_settings
+        self.retry_policy = RetryPolicy(
+            max_retries=max_retries,
+            backoff_base=retry_backoff,
+            backoff_max=retry_backoff_max
+        )
+        self.circuit_breaker = circuit_breaker
+        self.query_cache = query_cache
         
         # Configure authentication
-        auth_config = {}
-        if api_key:
-            # For Elasticsearch Python client, use the encoded API key directly
-            # If api_key looks like an encoded key (no colon, longer than 20 chars), use it directly
-            # Otherwise combine id:secret and encode
-            if api_key_id:
-                # Both ID and secret provided - use tuple format
-                auth_config['api_key'] = (api_key_id, api_key)
-                logger.info("Using API key authentication (id + secret)")
-            elif ':' not in api_key and len(api_key) > 20:
-                # Already encoded - use directly
-                auth_config['api_key'] = api_key
-                logger.info("Using API key authentication (encoded)")
-            else:
-                # Assume it's just the secret, no ID - use directly
-                auth_config['api_key'] = api_key
-                logger.info("Using API key authentication (secret only)")
-        elif username and password:
-            auth_config['basic_auth'] = (username, password)
-            logger.info("Using basic authentication")
-        else:
-            logger.warning("No authentication configured")
+        auth_config = build_auth_config(api_key_id, api_key, username, password)
         
         # Create Elasticsearch client
+        # Retries are handled by our own policy, so the transport must not retry as well
+        client_args = {
+            **auth_config,
+            'verify_certs': verify_certs,
+            'request_timeout': timeout,
+            'max_retries': 0,
+            'retry_on_timeout': False,
+            **(transport_options or {}),
+        }
+        hosts = normalize_hosts(host)
         try:
-            self.es = Elasticsearch(
-                [host],
-                **auth_config,
-                verify_certs=verify_certs
+            self.es = Elasticsearch(hosts, **client_args)
+            self.ingest_es = create_ingest_client(
+                Elasticsearch,
+                self.es,
+                hosts,
+                client_args,
+                ingest_hosts=ingest_hosts,
+                sniff_ingest_nodes=sniff_ingest_nodes,
+                ingest_timeout=ingest_timeout
             )
             
             # Test connection - use info() instead of ping() for serverless compatibility
             try:
-                info = self.es.info()
+                info = self._call("connection test", self.es.info)
                 logger.info(f"Successfully connected to Elasticsearch at {host}")
                 logger.info(f"Cluster: {info.get('cluster_name', 'unknown')}, Version: {info.get('version', {}).get('number', 'unknown')}")
+            except (ApiError, ConnectionError) as ping_error:
+                # Keep the original type so callers can classify the failure
+                logger.error(f"Connection test failed with error: {type(ping_error).__name__}: {ping_error}")
+                raise
             except Exception as ping_error:
                 logger.error(f"Connection test failed with error: {type(ping_error).__name__}: {ping_error}")
                 raise ConnectionError(f"Cannot connect to Elasticsearch: {ping_error}")
@@ -86,6 +656,36 @@ class ElasticClient:
             logger.error(f"Failed to initialize Elasticsearch client: {type(e).__name__}: {e}")
             raise
     
+    @classmethod
+    def from_config(cls, config) -> "ElasticClient":
+        """Create a client from the ``elasticsearch`` and ``processing`` config sections.
+        
+        Args:
+            config: Configuration loader
+            
+        Returns:
+            Connected ElasticClient
+        """
+        return cls(**client_kwargs_from_config(config))
+    
+    def _call(self, description: str, func, *args, **kwargs) -> Any:
+        """Send a request through the retry policy and circuit breaker.
+        
+        Args:
+            description: Human-readable name for log messages
+            func: Client method performing the request
+            
+        Returns:
+            Result of ``func``
+        """
+        return self.retry_policy.call(
+            func,
+            *args,
+            breaker=self.circuit_breaker,
+            description=description,
+            **kwargs
+        )
+    
     def ensure_index_exists(self) -> bool:
         """Ensure the index exists with proper mapping.
         
@@ -93,23 +693,99 @@ class ElasticClient:
             True if index exists or was created successfully
         """
         try:
-            if self.es.indices.exists(index=self.index):
+            if self._call("index check", self.es.indices.exists, index=self.index):
                 logger.info(f"Index {self.index} already exists")
+                if self.route_by_user:
+                    self._check_routing(self._call("mapping lookup", self.es.indices.get_mapping, index=self.index))
                 return True
             
             # Load mapping from JSON file
-            mapping_file = Path(__file__).parent / "index_mapping.json"
-            with open(mapping_file, 'r') as f:
-                mapping = json.load(f)
+            mapping = build_index_body(self.route_by_user, self.routing_partition_size, self.index_settings)
             
             # Create index with mapping
-            self.es.indices.create(index=self.index, body=mapping)
+            self._call("index creation", self.es.indices.create, index=self.index, body=mapping)
             logger.info(f"Created index {self.index} with mapping")
             return True
         except Exception as e:
             logger.error(f"Failed to ensure index exists: {e}")
             return False
     
+    def _check_routing(self, mappings: Dict[str, Any]) -> None:
+        """Turn user routing off for an existing index that was created without it.
+        
+        Documents in such an index are placed by ID, so routed reads would
+        miss them; the index has to be re-created with routing first.
+        """
+        if not routing_required(mappings):
+            logger.error(
+                f"Index {self.index} was created without required routing; "
+                f"ignoring elasticsearch.routing until it is reindexed"
+            )
+            self.route_by_user = False
+    
+    def update_mapping(self) -> bool:
+        """Apply metadata_mapping_update to an existing index.
+        
+        Returns:
+            True if the mapping was updated
+        """
+        try:
+            self._call(
+                "mapping update",
+                self.es.indices.put_mapping,
+                index=self.index,
+                body=metadata_mapping_update()
+            )
+            logger.info(f"Updated PDF metadata mapping of {self.index}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to update mapping of {self.index}: {e}")
+            return False
+    
+    def field_usage(self, warn_ratio: float = DEFAULT_FIELD_WARN_RATIO) -> Dict[str, Any]:
+        """Compare the number of mapped fields with index.mapping.total_fields.limit.
+        
+        A warning is logged when the count reaches ``warn_ratio`` of the
+        limit; at the limit, documents with new fields are rejected.
+        
+        Args:
+            warn_ratio: Fraction of the limit that triggers the warning
+        
+        Returns:
+            Dict with fields, limit, ratio and warning (bool)
+        """
+        mappings = self._call("mapping lookup", self.es.indices.get_mapping, index=self.index)
+        fields = 0
+        for index_mapping in mappings.values():
+            fields = max(fields, count_mapped_fields(index_mapping["mappings"].get("properties") or {}))
+        
+        settings = self._call(
+            "settings lookup",
+            self.es.indices.get_settings,
+            index=self.index,
+            name=TOTAL_FIELDS_LIMIT_SETTING,
+            include_defaults=True,
+            flat_settings=True
+        )
+        limit = DEFAULT_TOTAL_FIELDS_LIMIT
+        for index_settings in settings.values():
+            value = (index_settings.get("settings") or {}).get(TOTAL_FIELDS_LIMIT_SETTING)
+            if value is None:
+                value = (index_settings.get("defaults") or {}).get(TOTAL_FIELDS_LIMIT_SETTING)
+            if value is not None:
+                limit = int(value)
+        
+        ratio = fields / limit if limit else 0.0
+        usage = {"fields": fields, "limit": limit, "ratio": round(ratio, 3), "warning": ratio >= warn_ratio}
+        if usage["warning"]:
+            logger.warning(
+                f"Index {self.index} maps {fields} fields, {ratio:.0%} of {TOTAL_FIELDS_LIMIT_SETTING}={limit}; "
+                f"documents adding fields will be rejected at the limit"
+            )
+        else:
+            logger.info(f"Index {self.index} maps {fields} of {limit} allowed fields")
+        return usage
+    
     def ensure_pipeline_exists(self) -> bool:
         """Ensure the ingest attachment pipeline exists.
         
@@ -117,37 +793,24 @@ class ElasticClient:
             True if pipeline exists or was created successfully
         """
         try:
-            # Check if pipeline exists
-            if self.es.ingest.get_pipeline(id=self.pipeline, ignore=[404]):
+            # Check if pipeline exists (older versions are replaced)
+            response = self._call(
+                "pipeline lookup",
+                self.es.options(ignore_status=404).ingest.get_pipeline,
+                id=self.pipeline
+            )
+            if pipeline_is_current(response, self.pipeline):
                 logger.info(f"Pipeline {self.pipeline} already exists")
                 return True
-        except:
-            pass
+        except Exception as e:
+            logger.warning(f"Failed to look up pipeline {self.pipeline}, creating it: {e}")
         
         try:
             # Create attachment pipeline
-            pipeline_body = {
-                "description": "Extract attachment information from PDFs",
-                "processors": [
-                    {
-                        "attachment": {
-                            "field": "data",
-                            "target_field": "attachment",
-                            "indexed_chars": -1,
-                            "ignore_missing": True
-                        }
-                    },
-                    {
-                        "remove": {
-                            "field": "data",
-                            "ignore_missing": True
-                        }
-                    }
-                ]
-            }
+            pipeline_body = attachment_pipeline_body()
             
-            self.es.ingest.put_pipeline(id=self.pipeline, body=pipeline_body)
-            logger.info(f"Created ingest pipeline {self.pipeline}")
+            self._call("pipeline creation", self.es.ingest.put_pipeline, id=self.pipeline, body=pipeline_body)
+            logger.info(f"Created ingest pipeline {self.pipeline} (version {PIPELINE_VERSION})")
             return True
         except Exception as e:
             logger.error(f"Failed to create pipeline: {e}")
@@ -157,7 +820,9 @@ class ElasticClient:
         self,
         pdf_path: str,
         metadata: Dict[str, Any],
-        doc_id: Optional[str] = None
+        doc_id: Optional[str] = None,
+        artifact: Optional[JobArtifact] = None,
+        content: Optional[str] = None
     ) -> Dict[str, Any]:
         """Index a PDF document with metadata.
         
@@ -165,33 +830,39 @@ class ElasticClient:
             pdf_path: Path to PDF file
             metadata: Document metadata
             doc_id: Optional document ID (if None, auto-generated)
+            artifact: Already analyzed content of ``pdf_path`` (reuses its base64)
+            content: Cleaned text replacing the extracted attachment.content
             
         Returns:
             Elasticsearch response
             
         Raises:
-            Exception: If indexing fails
+            CircuitOpenError: If the circuit breaker is open
+            Exception: If indexing fails after retries, or fails permanently
         """
         try:
             # Read PDF and encode as base64
-            with open(pdf_path, 'rb') as f:
-                pdf_data = f.read()
-            
-            encoded_pdf = base64.b64encode(pdf_data).decode('utf-8')
+            encoded_pdf = artifact.base64 if artifact is not None else encode_pdf(pdf_path)
             
             # Prepare document
             document = {
                 "data": encoded_pdf,
                 **metadata
             }
+            if content is not None:
+                document["clean_content"] = content
             
             # Index document with pipeline
-            response = self.es.index(
+            response = self._call(
+                f"indexing of {pdf_path}",
+                self.ingest_es.index,
                 index=self.index,
                 id=doc_id,
                 document=document,
-                pipeline=self.pipeline
+                pipeline=self.pipeline,
+                routing=self._routing(metadata)
             )
+            self._invalidate_cache()
             
             logger.info(f"Indexed PDF {pdf_path} as document {response['_id']}")
             return response
@@ -199,46 +870,290 @@ class ElasticClient:
             logger.error(f"Failed to index PDF {pdf_path}: {e}")
             raise
     
-    def search(self, query: Dict[str, Any], size: int = 10) -> Dict[str, Any]:
+    def bulk(
+        self,
+        operations: List[Dict[str, Any]],
+        pipeline: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Send a bulk request to the print job index.
+        
+        Item-level failures do not raise; check ``errors`` and ``items``
+        in the response. With user routing, actions are routed by the
+        ``print_job.user`` of their document.
+        
+        Args:
+            operations: Alternating action and source entries
+            pipeline: Ingest pipeline (defaults to the client's pipeline)
+            
+        Returns:
+            Elasticsearch bulk response
+        """
+        if self.route_by_user:
+            operations = add_bulk_routing(operations)
+        
+        try:
+            response = self._call(
+                f"bulk request of {len(operations)} entries",
+                self.ingest_es.bulk,
+                index=self.index,
+                operations=operations,
+                pipeline=pipeline or self.pipeline
+            )
+            # Some items may have been written even if others failed
+            self._invalidate_cache()
+            return response
+        except Exception as e:
+            logger.error(f"Bulk request failed: {e}")
+            raise
+    
+    def search(self, query: Dict[str, Any], size: int = 10, user: Optional[str] = None) -> Dict[str, Any]:
         """Search for documents.
         
         Args:
             query: Elasticsearch query DSL
             size: Number of results to return
+            user: Owner of all wanted documents; with user routing only that
+                  user's shard is searched (the query must still filter by user)
             
         Returns:
             Search results
         """
+        routing = user if self.route_by_user else None
+        generation = None
+        if self.query_cache is not None:
+            cached = self.query_cache.get(self.index, query, size, routing)
+            if cached is not None:
+                return cached
+            generation = self.query_cache.generation(self.index)
+        
         try:
-            response = self.es.search(
+            response = self._call(
+                "search",
+                self.es.search,
                 index=self.index,
-                body=query,
-                size=size
+                # The client adds parameters to the body; keep the caller's (and the cache key's) query intact
+                body=dict(query),
+                size=size,
+                routing=routing
             )
+            if self.query_cache is not None:
+                self.query_cache.put(self.index, query, size, response, generation, routing)
             return response
         except Exception as e:
             logger.error(f"Search failed: {e}")
             raise
     
-    def get_document(self, doc_id: str) -> Dict[str, Any]:
+    def latest(
+        self,
+        size: int = 10,
+        user: Optional[str] = None,
+        source: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Get the most recently indexed jobs, newest first.
+        
+        The response has no hit count (see latest_query).
+        
+        Args:
+            size: Number of jobs to return
+            user: Only jobs printed by this user
+            source: Source fields to return (default: all but the file data)
+            
+        Returns:
+            Search results
+        """
+        return self.search(latest_query(user, source), size=size, user=user)
+    
+    def aggregate(
+        self,
+        aggs: Dict[str, Any],
+        query: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Run aggregations without fetching any hits.
+        
+        Args:
+            aggs: Aggregations DSL
+            query: Optional query restricting the aggregated documents
+            
+        Returns:
+            The ``aggregations`` section of the response
+        """
+        try:
+            response = self._call(
+                "aggregation",
+                self.es.search,
+                index=self.index,
+                size=0,
+                track_total_hits=False,
+                request_cache=True,
+                aggs=aggs,
+                query=query
+            )
+            return response["aggregations"]
+        except Exception as e:
+            logger.error(f"Aggregation failed: {e}")
+            raise
+    
+    def get_document(self, doc_id: str, user: Optional[str] = None) -> Dict[str, Any]:
         """Retrieve a document by ID.
         
         Args:
             doc_id: Document ID
+            user: Owner of the document (required with user routing)
             
         Returns:
             Document data
         """
         try:
-            response = self.es.get(index=self.index, id=doc_id)
+            response = self._call(
+                f"get {doc_id}",
+                self.es.get,
+                index=self.index,
+                id=doc_id,
+                routing=routing_key(user) if self.route_by_user else None
+            )
             return response
         except Exception as e:
             logger.error(f"Failed to get document {doc_id}: {e}")
             raise
     
+    def mget(
+        self,
+        doc_ids: List[str],
+        users: Optional[List[Optional[str]]] = None,
+        source: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Retrieve several documents by ID in one request.
+        
+        Args:
+            doc_ids: Document IDs
+            users: Owner of each document (required with user routing)
+            source: Whether to return the document sources
+            
+        Returns:
+            One result per ID, in order, each with a ``found`` flag
+        """
+        docs = []
+        for position, doc_id in enumerate(doc_ids):
+            doc = {"_id": doc_id}
+            if self.route_by_user:
+                doc["routing"] = routing_key(users[position] if users else None)
+            docs.append(doc)
+        
+        try:
+            response = self._call(
+                f"mget of {len(docs)} documents",
+                self.es.mget,
+                index=self.index,
+                docs=docs,
+                source=source
+            )
+            return response["docs"]
+        except Exception as e:
+            logger.error(f"Failed to get {len(docs)} documents: {e}")
+            raise
+    
+    def put_pipeline(self, pipeline_id: str, body: Dict[str, Any]) -> None:
+        """Create or replace an ingest pipeline.
+        
+        Args:
+            pipeline_id: Pipeline name
+            body: Pipeline definition
+        """
+        self._call(f"pipeline creation of {pipeline_id}", self.es.ingest.put_pipeline, id=pipeline_id, body=body)
+    
+    def delete_pipeline(self, pipeline_id: str) -> None:
+        """Delete an ingest pipeline (missing pipelines are ignored)."""
+        self._call(
+            f"pipeline deletion of {pipeline_id}",
+            self.es.options(ignore_status=404).ingest.delete_pipeline,
+            id=pipeline_id
+        )
+    
+    def simulate_pipeline(
+        self,
+        docs: List[Dict[str, Any]],
+        pipeline_id: Optional[str] = None,
+        verbose: bool = False
+    ) -> Dict[str, Any]:
+        """Run documents through a stored ingest pipeline without indexing them.
+        
+        Args:
+            docs: Simulated documents, each with a ``_source``
+            pipeline_id: Pipeline name (defaults to the client's pipeline)
+            verbose: Return the result of every processor
+            
+        Returns:
+            Simulate response with one entry per document in ``docs``
+        """
+        return self._call(
+            f"pipeline simulation of {len(docs)} documents",
+            self.ingest_es.ingest.simulate,
+            id=pipeline_id or self.pipeline,
+            docs=docs,
+            verbose=verbose
+        )
+    
+    def ingest_stats(self) -> Dict[str, Any]:
+        """Get the ingest statistics of all nodes.
+        
+        Returns:
+            Nodes stats response with the ``ingest`` metric
+        """
+        return self._call("ingest statistics", self.es.nodes.stats, metric="ingest")
+    
+    def _routing(self, document: Dict[str, Any]) -> Optional[str]:
+        """Routing key for writing ``document`` (None without user routing)."""
+        return routing_for_document(document) if self.route_by_user else None
+    
+    def _invalidate_cache(self) -> None:
+        """Drop cached search results after a successful write."""
+        if self.query_cache is not None:
+            self.query_cache.invalidate(self.index)
+    
+    def find_near_duplicates(
+        self,
+        fingerprint: Dict[str, Any],
+        max_distance: int = DEFAULT_MAX_DISTANCE,
+        size: int = 50
+    ) -> List[Tuple[str, int]]:
+        """Find documents whose text fingerprint is close to ``fingerprint``.
+        
+        Args:
+            fingerprint: Fingerprint fields (simhash and bands)
+            max_distance: Maximum Hamming distance
+            size: Maximum number of candidates to check
+            
+        Returns:
+            (document ID, distance) pairs, closest first
+        """
+        response = self.search(near_duplicate_query(fingerprint), size=size)
+        return near_duplicate_matches(response, fingerprint, max_distance)
+    
+    def scan(
+        self,
+        query: Dict[str, Any],
+        source: Optional[List[str]] = None,
+        page_size: int = 500
+    ) -> Iterator[Dict[str, Any]]:
+        """Iterate over all documents matching a query with the scroll API.
+        
+        Args:
+            query: Search body (e.g. {"query": {...}})
+            source: Source fields to return (default: all)
+            page_size: Documents per scroll page
+            
+        Yields:
+            Search hits
+        """
+        from elasticsearch.helpers import scan
+        
+        yield from scan(self.es, index=self.index, query=query, _source=source, size=page_size)
+    
     def close(self) -> None:
         """Close the Elasticsearch connection."""
         try:
+            if self.ingest_es.transport is not self.es.transport:
+                self.ingest_es.close()
             self.es.close()
             logger.info("Closed Elasticsearch connection")
         except Exception as e:
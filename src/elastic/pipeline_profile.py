@@ -0,0 +1,309 @@
+"""Cluster cost of attachment pipeline variants.
+
+Text extraction by the ``attachment`` processor is the most expensive part
+of indexing a print job, and its cost depends on how it is configured. The
+profiler stores each pipeline variant under a temporary name, runs sample
+job files through it with the simulate API and reads the time the nodes
+spent in the pipeline and in each processor from the node ingest stats.
+Non-verbose simulations of a stored pipeline are counted in those stats;
+if a cluster does not count them, the wall-clock time of the simulate
+requests is reported instead. One verbose simulation per batch records
+how much text each variant still extracts.
+
+Variants:
+    current: the pipeline created by ensure_pipeline_exists
+    capped: ``indexed_chars`` limited (default 100,000 characters)
+    properties: only the attachment properties the index needs
+    remove_binary: the attachment processor drops ``data`` itself
+    combined: all of the above
+"""
+import copy
+import time
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from converter.artifact import JobArtifact
+from elastic.client import attachment_pipeline_body
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+VARIANTS = ("current", "capped", "properties", "remove_binary", "combined")
+
+DEFAULT_INDEXED_CHARS = 100000
+DEFAULT_PROPERTIES = ("content", "title", "content_type", "content_length")
+DEFAULT_ROUNDS = 3
+DEFAULT_BATCH_MB = 20
+
+MB = 1024 * 1024
+
+
+def pipeline_variant(
+    name: str,
+    indexed_chars: int = DEFAULT_INDEXED_CHARS,
+    properties: Sequence[str] = DEFAULT_PROPERTIES
+) -> Dict[str, Any]:
+    """Build a variant of the attachment pipeline.
+    
+    Args:
+        name: Variant name (see VARIANTS)
+        indexed_chars: Characters extracted by the capped variants
+        properties: Attachment properties kept by the restricted variants
+    
+    Returns:
+        Pipeline definition
+    
+    Raises:
+        ValueError: For unknown variants
+    """
+    if name not in VARIANTS:
+        raise ValueError(f"Unknown pipeline variant {name!r} (expected one of {', '.join(VARIANTS)})")
+    
+    body = copy.deepcopy(attachment_pipeline_body())
+    body["description"] = f"{body['description']} (profiling variant {name})"
+    attachment = next(p["attachment"] for p in body["processors"] if "attachment" in p)
+    remove = next(p["remove"] for p in body["processors"] if "remove" in p)
+    
+    if name in ("capped", "combined"):
+        attachment["indexed_chars"] = indexed_chars
+    if name in ("properties", "combined"):
+        attachment["properties"] = list(properties)
+    if name in ("remove_binary", "combined"):
+        attachment["remove_binary"] = True
+        remove["field"] = [field for field in remove["field"] if field != attachment["field"]]
+    return body
+
+
+def pipeline_stats(response: Dict[str, Any], pipeline_id: str) -> Dict[str, Any]:
+    """Sum the ingest stats of one pipeline over all nodes.
+    
+    Args:
+        response: Nodes stats response with the ``ingest`` metric
+        pipeline_id: Pipeline name
+    
+    Returns:
+        Dict with count, time_in_millis and per-processor ``processors``
+        (type, count, time_in_millis) in pipeline order
+    """
+    total = {"count": 0, "time_in_millis": 0, "processors": []}
+    for node in (response.get("nodes") or {}).values():
+        stats = ((node.get("ingest") or {}).get("pipelines") or {}).get(pipeline_id)
+        if not stats:
+            continue
+        total["count"] += stats.get("count", 0)
+        total["time_in_millis"] += stats.get("time_in_millis", 0)
+        for position, entry in enumerate(stats.get("processors") or []):
+            processor = next(iter(entry.values()))
+            if position == len(total["processors"]):
+                total["processors"].append({"type": processor.get("type"), "count": 0, "time_in_millis": 0})
+            total["processors"][position]["count"] += processor["stats"].get("count", 0)
+            total["processors"][position]["time_in_millis"] += processor["stats"].get("time_in_millis", 0)
+    return total
+
+
+def _stats_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    processors = []
+    for position, processor in enumerate(after["processors"]):
+        previous = before["processors"][position] if position < len(before["processors"]) else {}
+        processors.append({
+            "type": processor["type"],
+            "count": processor["count"] - previous.get("count", 0),
+            "time_in_millis": processor["time_in_millis"] - previous.get("time_in_millis", 0),
+        })
+    return {
+        "count": after["count"] - before["count"],
+        "time_in_millis": after["time_in_millis"] - before["time_in_millis"],
+        "processors": processors,
+    }
+
+
+def extraction_summary(response: Dict[str, Any]) -> Tuple[int, int]:
+    """Characters extracted and failed documents in a verbose simulate response.
+    
+    Returns:
+        (extracted characters, documents with a failed processor)
+    """
+    chars = 0
+    errors = 0
+    for doc in response.get("docs") or []:
+        failed = False
+        for result in doc.get("processor_results") or []:
+            if result.get("status") == "error" or "error" in result:
+                failed = True
+            if result.get("processor_type") == "attachment":
+                source = (result.get("doc") or {}).get("_source") or {}
+                chars += len((source.get("attachment") or {}).get("content") or "")
+        errors += failed
+    return chars, errors
+
+
+def group_samples(paths: Sequence[str]) -> Dict[str, List[Tuple[str, int]]]:
+    """Group sample files by print job format.
+    
+    Returns:
+        format -> [(path, size)], in the order given
+    """
+    groups: Dict[str, List[Tuple[str, int]]] = {}
+    for path in paths:
+        with JobArtifact.load(path) as artifact:
+            groups.setdefault(artifact.format, []).append((path, artifact.size))
+    return groups
+
+
+def _batches(samples: List[Tuple[str, int]], batch_bytes: int) -> Iterator[List[Tuple[str, int]]]:
+    batch: List[Tuple[str, int]] = []
+    size = 0
+    for sample in samples:
+        if batch and size + sample[1] > batch_bytes:
+            yield batch
+            batch, size = [], 0
+        batch.append(sample)
+        size += sample[1]
+    if batch:
+        yield batch
+
+
+class PipelineProfiler:
+    """Measure the ingest cost of pipeline variants on sample files."""
+    
+    def __init__(
+        self,
+        client,
+        rounds: int = DEFAULT_ROUNDS,
+        batch_mb: float = DEFAULT_BATCH_MB,
+        indexed_chars: int = DEFAULT_INDEXED_CHARS,
+        properties: Sequence[str] = DEFAULT_PROPERTIES
+    ):
+        """Initialize profiler.
+        
+        Args:
+            client: ElasticClient
+            rounds: Simulations of every sample per variant (the cost is averaged)
+            batch_mb: Sample data per simulate request in MB
+            indexed_chars: Characters extracted by the capped variants
+            properties: Attachment properties kept by the restricted variants
+        """
+        self.client = client
+        self.rounds = max(1, rounds)
+        self.batch_bytes = int(batch_mb * MB)
+        self.indexed_chars = indexed_chars
+        self.properties = tuple(properties)
+    
+    def profile(self, paths: Sequence[str], variants: Sequence[str] = VARIANTS) -> List[Dict[str, Any]]:
+        """Profile every variant on every sample format.
+        
+        Args:
+            paths: Sample job files (spool files or PDFs)
+            variants: Variants to compare
+        
+        Returns:
+            One row per variant and format (see profile_variant)
+        """
+        groups = group_samples(paths)
+        rows = []
+        for variant in variants:
+            body = pipeline_variant(variant, self.indexed_chars, self.properties)
+            pipeline_id = f"{self.client.pipeline}-profile-{variant}"
+            self.client.put_pipeline(pipeline_id, body)
+            try:
+                for file_format, samples in sorted(groups.items()):
+                    rows.append(self.profile_variant(variant, pipeline_id, file_format, samples))
+            finally:
+                self.client.delete_pipeline(pipeline_id)
+        return rows
+    
+    def _docs(self, samples: List[Tuple[str, int]]) -> Iterator[List[Dict[str, Any]]]:
+        """Simulate request documents, about batch_mb of samples at a time."""
+        for batch in _batches(samples, self.batch_bytes):
+            docs = []
+            for path, _ in batch:
+                with JobArtifact.load(path) as artifact:
+                    docs.append({"_source": {"data": artifact.base64}})
+            yield docs
+    
+    def profile_variant(
+        self,
+        variant: str,
+        pipeline_id: str,
+        file_format: str,
+        samples: List[Tuple[str, int]]
+    ) -> Dict[str, Any]:
+        """Simulate one format's samples through a stored variant.
+        
+        Returns:
+            Row with variant, format, documents, mb, pipeline_ms,
+            ms_per_mb, processors (type -> ms per MB), chars_per_doc,
+            errors and timing ("node stats" or "wall clock")
+        """
+        chars = 0
+        errors = 0
+        for docs in self._docs(samples):
+            batch_chars, batch_errors = extraction_summary(
+                self.client.simulate_pipeline(docs, pipeline_id, verbose=True)
+            )
+            chars += batch_chars
+            errors += batch_errors
+        
+        # Only the timed simulations fall between the two stats snapshots
+        before = pipeline_stats(self.client.ingest_stats(), pipeline_id)
+        wall_seconds = 0.0
+        for docs in self._docs(samples):
+            start = time.perf_counter()
+            for _ in range(self.rounds):
+                self.client.simulate_pipeline(docs, pipeline_id)
+            wall_seconds += time.perf_counter() - start
+        after = pipeline_stats(self.client.ingest_stats(), pipeline_id)
+        delta = _stats_delta(before, after)
+        
+        processed_mb = sum(size for _, size in samples) * self.rounds / MB
+        if delta["count"] > 0:
+            pipeline_ms = delta["time_in_millis"]
+            timing = "node stats"
+        else:
+            pipeline_ms = wall_seconds * 1000
+            timing = "wall clock"
+        processor_ms: Dict[str, int] = {}
+        for processor in delta["processors"]:
+            processor_ms[processor["type"]] = processor_ms.get(processor["type"], 0) + processor["time_in_millis"]
+        processors = {name: _per_mb(millis, processed_mb) for name, millis in processor_ms.items()}
+        
+        row = {
+            "variant": variant,
+            "format": file_format,
+            "documents": len(samples),
+            "mb": round(processed_mb / self.rounds, 3),
+            "pipeline_ms": round(pipeline_ms / self.rounds, 1),
+            "ms_per_mb": _per_mb(pipeline_ms, processed_mb),
+            "processors": processors,
+            "chars_per_doc": chars // len(samples) if samples else 0,
+            "errors": errors,
+            "timing": timing,
+        }
+        logger.info(f"Variant {variant} on {len(samples)} {file_format} samples: {row['ms_per_mb']} ms/MB ({timing})")
+        return row
+
+
+def _per_mb(millis: float, mb: float) -> float:
+    return round(millis / mb, 2) if mb else 0.0
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    """Render profile rows as a text table, cheapest variant first per format.
+    
+    Args:
+        rows: Rows returned by PipelineProfiler.profile
+    
+    Returns:
+        Table text
+    """
+    lines = [
+        f"{'format':<11} {'variant':<14} {'docs':>5} {'MB':>8} {'ms/MB':>9} "
+        f"{'attach ms/MB':>12} {'chars/doc':>10} {'errors':>6}  timing"
+    ]
+    for row in sorted(rows, key=lambda row: (row["format"], row["ms_per_mb"])):
+        attachment = row["processors"].get("attachment")
+        lines.append(
+            f"{row['format']:<11} {row['variant']:<14} {row['documents']:>5} {row['mb']:>8.2f} "
+            f"{row['ms_per_mb']:>9.2f} {'-' if attachment is None else f'{attachment:.2f}':>12} "
+            f"{row['chars_per_doc']:>10} {row['errors']:>6}  {row['timing']}"
+        )
+    return "\n".join(lines)
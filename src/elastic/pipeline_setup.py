@@ -26,18 +26,7 @@ def setup_elasticsearch(config: ConfigLoader) -> bool:
     """
     try:
         # Create Elasticsearch client
-        es_config = config.elasticsearch
-        
-        client = ElasticClient(
-            host=es_config.get('host'),
-            index=es_config.get('index', 'print-jobs'),
-            pipeline=es_config.get('pipeline', 'attachment'),
-            api_key_id=es_config.get('api_key_id'),
-            api_key=es_config.get('api_key'),
-            username=es_config.get('username'),
-            password=es_config.get('password'),
-            verify_certs=es_config.get('verify_certs', True)
-        )
+        client = ElasticClient.from_config(config)
         
         # Ensure index exists
         if not client.ensure_index_exists():
@@ -49,6 +38,12 @@ def setup_elasticsearch(config: ConfigLoader) -> bool:
             logger.error("Failed to create/verify pipeline")
             return False
         
+        # Only warns; the index still works until the limit is reached
+        try:
+            client.field_usage()
+        except Exception as e:
+            logger.warning(f"Could not check the index field count: {e}")
+        
         logger.info("Elasticsearch setup completed successfully")
         client.close()
         return True
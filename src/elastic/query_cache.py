@@ -0,0 +1,170 @@
+"""Bounded LRU/TTL cache for search results.
+
+Entries are keyed on the index, the normalized query body and the result
+size. Writes through ElasticClient invalidate all entries of the written
+index. Each index has a generation counter that is bumped on
+invalidation, so a search that was already running when a write finished
+does not store its (possibly stale) result.
+"""
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class QueryCache:
+    """Thread-safe search result cache."""
+    
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """Initialize cache.
+        
+        Args:
+            max_entries: Maximum cached results (least recently used are evicted)
+            ttl: Seconds a result stays valid
+            clock: Time source (for tests)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        
+        # key -> (expiry time, index, response)
+        self._entries: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+    
+    @staticmethod
+    def make_key(index: str, query: Dict[str, Any], size: int, routing: Optional[str] = None) -> str:
+        """Build the cache key for a search.
+        
+        Args:
+            index: Index name
+            query: Search body
+            size: Number of results
+            routing: Routing key of the search
+        
+        Returns:
+            Key that is independent of the order of keys in the body
+        """
+        body = json.dumps(query, sort_keys=True, separators=(",", ":"), default=str)
+        return f"{index}\0{size}\0{routing or ''}\0{body}"
+    
+    def generation(self, index: str) -> int:
+        """Return the current write generation of an index."""
+        with self._lock:
+            return self._generation(index)
+    
+    def _generation(self, index: str) -> int:
+        # Both counters only grow, so their sum changes whenever either does
+        return self._epoch + self._generations.get(index, 0)
+    
+    def get(self, index: str, query: Dict[str, Any], size: int, routing: Optional[str] = None) -> Optional[Any]:
+        """Look up a cached search result.
+        
+        Args:
+            index: Index name
+            query: Search body
+            size: Number of results
+            routing: Routing key of the search
+        
+        Returns:
+            Copy of the cached response, or None
+        """
+        key = self.make_key(index, query, size, routing)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            response = entry[2]
+        
+        # Callers may modify the result
+        return copy.deepcopy(response)
+    
+    def put(
+        self,
+        index: str,
+        query: Dict[str, Any],
+        size: int,
+        response: Any,
+        generation: Optional[int] = None,
+        routing: Optional[str] = None
+    ) -> None:
+        """Store a search result.
+        
+        Args:
+            index: Index name
+            query: Search body
+            size: Number of results
+            response: Search response
+            generation: Index generation read before the search was sent;
+                        the result is dropped if the index was written since
+            routing: Routing key of the search
+        """
+        key = self.make_key(index, query, size, routing)
+        response = copy.deepcopy(response)
+        with self._lock:
+            if generation is not None and generation != self._generation(index):
+                return
+            self._entries[key] = (self.clock() + self.ttl, index, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+    
+    def invalidate(self, index: Optional[str] = None) -> int:
+        """Drop cached results after a write.
+        
+        Args:
+            index: Written index (None drops everything)
+        
+        Returns:
+            Number of dropped entries
+        """
+        with self._lock:
+            if index is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                self._epoch += 1
+            else:
+                keys = [key for key, entry in self._entries.items() if entry[1] == index]
+                for key in keys:
+                    del self._entries[key]
+                dropped = len(keys)
+                self._generations[index] = self._generations.get(index, 0) + 1
+            self._stats["invalidations"] += 1
+        
+        if dropped:
+            logger.debug(f"Invalidated {dropped} cached search results for {index or 'all indices'}")
+        return dropped
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss statistics.
+        
+        Returns:
+            Counters plus current size and hit ratio
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
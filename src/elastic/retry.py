@@ -0,0 +1,403 @@
+"""Retry, backoff and circuit breaking for Elasticsearch requests."""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Optional
+
+from elasticsearch.exceptions import (
+    ApiError,
+    AuthenticationException,
+    AuthorizationException,
+    ConnectionError,
+    ConnectionTimeout,
+)
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# HTTP status codes that indicate a transient cluster condition
+RETRYABLE_STATUS_CODES = (429, 502, 503, 504)
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised when the circuit breaker rejects a request without sending it."""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Classify an error as retryable (transient) or fatal.
+    
+    Args:
+        error: Exception raised by the Elasticsearch client
+    
+    Returns:
+        True if the request may succeed when retried later
+    """
+    if isinstance(error, (ConnectionError, ConnectionTimeout)):
+        return True
+    if isinstance(error, ApiError):
+        return error.meta.status in RETRYABLE_STATUS_CODES
+    return False
+
+
+def is_auth_error(error: Exception) -> bool:
+    """Check whether an error is caused by rejected credentials.
+    
+    Args:
+        error: Exception raised by the Elasticsearch client
+    
+    Returns:
+        True for 401/403 responses
+    """
+    return isinstance(error, (AuthenticationException, AuthorizationException))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Extract the delay requested by a ``Retry-After`` response header.
+    
+    Args:
+        error: Exception raised by the Elasticsearch client
+    
+    Returns:
+        Delay in seconds, or None if the server did not request one
+    """
+    if not isinstance(error, ApiError) or error.meta is None:
+        return None
+    
+    headers = error.meta.headers or {}
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    if not value:
+        return None
+    
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    
+    try:
+        # HTTP-date form
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Stop sending requests to a cluster that keeps failing.
+    
+    The breaker opens after ``failure_threshold`` consecutive retryable
+    failures. While open, calls are rejected immediately. After
+    ``reset_timeout`` seconds a single trial call is let through
+    (half-open); its outcome closes or re-opens the breaker. A trial that
+    never reports back (e.g. its backend process was killed) is given up
+    after another ``reset_timeout`` and a new trial is allowed.
+    
+    CUPS starts a new backend process per job, so the state can be kept in
+    ``state_file`` to share it between consecutive jobs.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+    
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        state_file: Optional[str] = None
+    ):
+        """Initialize circuit breaker.
+        
+        Args:
+            failure_threshold: Consecutive failures before the breaker opens
+            reset_timeout: Seconds to wait before allowing a trial request
+            state_file: Optional JSON file to persist state across processes
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state_file = state_file
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_started_at = 0.0
+        self._state = self.CLOSED
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self) -> None:
+        """Load persisted state, ignoring missing or corrupt files."""
+        if not self.state_file:
+            return
+        try:
+            with open(self.state_file, 'r') as f:
+                data = json.load(f)
+            self._failures = int(data.get('failures', 0))
+            self._opened_at = float(data.get('opened_at', 0.0))
+            self._trial_started_at = float(data.get('trial_started_at', 0.0))
+            self._state = data.get('state', self.CLOSED)
+        except (OSError, ValueError, TypeError):
+            pass
+    
+    def _save(self) -> None:
+        """Persist state if a state file is configured."""
+        if not self.state_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+            tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    'failures': self._failures,
+                    'opened_at': self._opened_at,
+                    'trial_started_at': self._trial_started_at,
+                    'state': self._state
+                }, f)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            logger.debug(f"Could not persist circuit breaker state: {e}")
+    
+    def _reset_elapsed(self) -> bool:
+        return time.time() - self._opened_at >= self.reset_timeout
+    
+    def _trial_expired(self) -> bool:
+        return time.time() - self._trial_started_at >= self.reset_timeout
+    
+    @property
+    def state(self) -> str:
+        """Current breaker state."""
+        with self._lock:
+            if self._state == self.OPEN and self._reset_elapsed():
+                return self.HALF_OPEN
+            return self._state
+    
+    def allow_request(self) -> bool:
+        """Check whether a request may be sent now.
+        
+        Returns:
+            True if the request may proceed
+        """
+        with self._lock:
+            self._load()
+            if self._state == self.CLOSED:
+                return True
+            if (self._state == self.OPEN and self._reset_elapsed()) or (
+                self._state == self.HALF_OPEN and self._trial_expired()
+            ):
+                # Let one trial request through
+                self._state = self.HALF_OPEN
+                self._trial_started_at = time.time()
+                self._save()
+                return True
+            return False
+    
+    def record_success(self) -> None:
+        """Record a request that reached the cluster."""
+        with self._lock:
+            if self._state == self.CLOSED and self._failures == 0:
+                return
+            if self._state != self.CLOSED:
+                logger.info("Circuit breaker closed")
+            self._failures = 0
+            self._state = self.CLOSED
+            self._save()
+    
+    def record_abandoned(self) -> None:
+        """Record a request that ended without telling anything about the cluster.
+        
+        A pending trial is given up and the breaker re-opens, so the next
+        trial is allowed after ``reset_timeout``.
+        """
+        with self._lock:
+            self._load()
+            if self._state != self.HALF_OPEN:
+                return
+            self._state = self.OPEN
+            self._opened_at = time.time()
+            self._save()
+    
+    def record_failure(self) -> None:
+        """Record a retryable failure."""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(
+                        f"Circuit breaker opened after {self._failures} consecutive failures"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.time()
+            self._save()
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter."""
+    
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """Initialize retry policy.
+        
+        Args:
+            max_retries: Retries after the first attempt (0 disables retrying)
+            backoff_base: Base delay in seconds for the first retry
+            backoff_max: Upper bound for a single delay in seconds
+            sleep: Sleep function (injectable for tests)
+        """
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+    
+    def delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Compute the delay before the given retry attempt.
+        
+        Args:
+            attempt: Retry number, starting at 1
+            error: Error that triggered the retry
+        
+        Returns:
+            Delay in seconds
+        """
+        requested = retry_after(error) if error is not None else None
+        if requested is not None:
+            return min(requested, self.backoff_max)
+        
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+    
+    def call(
+        self,
+        func: Callable[..., Any],
+        *args,
+        breaker: Optional[CircuitBreaker] = None,
+        description: str = "request",
+        **kwargs
+    ) -> Any:
+        """Call ``func`` and retry retryable failures.
+        
+        Args:
+            func: Callable performing the request
+            breaker: Optional circuit breaker guarding the call
+            description: Human-readable name for log messages
+        
+        Returns:
+            Result of ``func``
+        
+        Raises:
+            CircuitOpenError: If the breaker rejects the call
+            Exception: The last error once retries are exhausted, or any fatal error
+        """
+        attempt = 0
+        while True:
+            self._check_breaker(breaker, description)
+            
+            recorded = False
+            try:
+                result = func(*args, **kwargs)
+                if breaker is not None:
+                    breaker.record_success()
+                recorded = True
+                return result
+            except Exception as e:
+                attempt += 1
+                recorded = True
+                delay = self._on_failure(e, attempt, breaker, description)
+            finally:
+                if not recorded and breaker is not None:
+                    # Interrupted (e.g. the backend is being stopped)
+                    breaker.record_abandoned()
+            self.sleep(delay)
+    
+    async def call_async(
+        self,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        breaker: Optional[CircuitBreaker] = None,
+        description: str = "request",
+        **kwargs
+    ) -> Any:
+        """Await ``func`` and retry retryable failures without blocking the event loop.
+        
+        Args:
+            func: Coroutine function performing the request
+            breaker: Optional circuit breaker guarding the call
+            description: Human-readable name for log messages
+        
+        Returns:
+            Result of ``func``
+        
+        Raises:
+            CircuitOpenError: If the breaker rejects the call
+            Exception: The last error once retries are exhausted, or any fatal error
+        """
+        attempt = 0
+        while True:
+            self._check_breaker(breaker, description)
+            
+            recorded = False
+            try:
+                result = await func(*args, **kwargs)
+                if breaker is not None:
+                    breaker.record_success()
+                recorded = True
+                return result
+            except Exception as e:
+                attempt += 1
+                recorded = True
+                delay = self._on_failure(e, attempt, breaker, description)
+            finally:
+                if not recorded and breaker is not None:
+                    # Interrupted or cancelled
+                    breaker.record_abandoned()
+            await asyncio.sleep(delay)
+    
+    def _check_breaker(self, breaker: Optional[CircuitBreaker], description: str) -> None:
+        """Raise CircuitOpenError if the breaker rejects the request."""
+        if breaker is not None and not breaker.allow_request():
+            raise CircuitOpenError(
+                f"Circuit breaker open, not sending {description}"
+            )
+    
+    def _on_failure(
+        self,
+        error: Exception,
+        attempt: int,
+        breaker: Optional[CircuitBreaker],
+        description: str
+    ) -> float:
+        """Record a failed attempt and decide whether to retry.
+        
+        Must be called from within the ``except`` block so fatal errors can
+        be re-raised with their original traceback.
+        
+        Returns:
+            Delay in seconds before the next attempt
+        """
+        if not is_retryable(error):
+            if breaker is not None:
+                if isinstance(error, ApiError):
+                    # The cluster answered, it is just rejecting this request
+                    breaker.record_success()
+                else:
+                    breaker.record_abandoned()
+            raise
+        
+        if breaker is not None:
+            breaker.record_failure()
+        
+        if attempt > self.max_retries:
+            logger.error(f"Giving up on {description} after {attempt} attempts: {error}")
+            raise
+        
+        delay = self.delay(attempt, error)
+        logger.warning(
+            f"{description} failed ({type(error).__name__}: {error}), "
+            f"retry {attempt}/{self.max_retries} in {delay:.2f}s"
+        )
+        return delay
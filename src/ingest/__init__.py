@@ -0,0 +1 @@
+"""Bulk and background ingestion of print jobs and documents."""
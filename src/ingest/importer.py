@@ -0,0 +1,345 @@
+"""Resumable parallel backfill of existing PDF collections.
+
+Walks a directory tree, extracts metadata with MetadataExtractor in a
+process pool and uploads documents through bulk requests into the print
+job index. The amount of file data being processed or uploaded at any time
+is bounded by ``max_in_flight_bytes``.
+
+Progress is appended to a checkpoint file after every successful bulk
+request, so an interrupted import resumes where it stopped. Document IDs
+are derived from the file path and content, which makes re-runs
+idempotent.
+"""
+import hashlib
+import json
+import os
+import pwd
+import socket
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from converter.artifact import JobArtifact
+from converter.metadata_extractor import MetadataExtractor
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MB = 1024 * 1024
+
+# Chunk size for hashing files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Bulk item statuses worth retrying on a later run
+RETRYABLE_ITEM_STATUSES = (429, 502, 503, 504)
+
+
+def import_doc_id(path: str, content_hash: str) -> str:
+    """Derive a stable document ID from a file's path and content.
+    
+    Args:
+        path: Absolute file path
+        content_hash: SHA-256 of the file content
+    
+    Returns:
+        Document ID
+    """
+    digest = hashlib.sha256(f"{path}\0{content_hash}".encode('utf-8')).hexdigest()
+    return f"import-{digest[:40]}"
+
+
+def hash_file(path: str) -> str:
+    """Compute the SHA-256 of a file without loading it whole.
+    
+    Args:
+        path: File path
+    
+    Returns:
+        Hex digest
+    """
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _file_owner(path: str) -> str:
+    try:
+        return pwd.getpwuid(os.stat(path).st_uid).pw_name
+    except (KeyError, OSError):
+        return "unknown"
+
+
+def analyze_file(path: str, user: Optional[str] = None) -> Dict[str, Any]:
+    """Extract metadata and encode one file (runs in a worker process).
+    
+    Args:
+        path: Absolute file path
+        user: User to record (default: file owner)
+    
+    Returns:
+        Dictionary with path, doc_id, size, mtime, encoded data and metadata
+    """
+    stat = os.stat(path)
+    with JobArtifact.load(path) as artifact:
+        doc_id = import_doc_id(path, artifact.sha256)
+        pdf_metadata = MetadataExtractor.extract_from_pdf(path, artifact=artifact)
+        encoded = artifact.base64
+    
+    job_metadata = {
+        "job_id": doc_id,
+        "user": user or _file_owner(path),
+        "title": os.path.splitext(os.path.basename(path))[0],
+        "copies": 1,
+        "timestamp": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+        "printer": "import",
+        "hostname": socket.gethostname(),
+        "source_path": path,
+    }
+    
+    return {
+        "path": path,
+        "doc_id": doc_id,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "data": encoded,
+        "metadata": MetadataExtractor.combine_metadata(job_metadata, pdf_metadata),
+    }
+
+
+class Checkpoint:
+    """Append-only record of imported files."""
+    
+    def __init__(self, path: str):
+        """Load an existing checkpoint or start a new one.
+        
+        Args:
+            path: Checkpoint file path
+        """
+        self.path = path
+        self.entries: Dict[str, Tuple[int, float]] = {}
+        
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.entries[entry["path"]] = (entry["size"], entry["mtime"])
+                    except (ValueError, KeyError):
+                        # Partially written last line after a crash
+                        continue
+            logger.info(f"Loaded checkpoint {path} with {len(self.entries)} imported files")
+        
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a')
+    
+    def is_done(self, path: str, size: int, mtime: float) -> bool:
+        """Check whether a file was imported and has not changed since."""
+        return self.entries.get(path) == (size, mtime)
+    
+    def record(self, results: List[Dict[str, Any]]) -> None:
+        """Record imported files and flush them to disk."""
+        for result in results:
+            entry = {
+                "path": result["path"],
+                "size": result["size"],
+                "mtime": result["mtime"],
+                "doc_id": result["doc_id"],
+            }
+            self._file.write(json.dumps(entry) + "\n")
+            self.entries[result["path"]] = (result["size"], result["mtime"])
+        self._file.flush()
+        os.fsync(self._file.fileno())
+    
+    def close(self) -> None:
+        """Close the checkpoint file."""
+        self._file.close()
+
+
+class BackfillImporter:
+    """Import a directory tree of PDFs into the print job index."""
+    
+    def __init__(
+        self,
+        client,
+        checkpoint_path: str,
+        workers: Optional[int] = None,
+        upload_threads: int = 2,
+        batch_bytes: int = 20 * MB,
+        batch_docs: int = 500,
+        max_in_flight_bytes: int = 256 * MB,
+        extensions: Tuple[str, ...] = (".pdf",),
+        user: Optional[str] = None
+    ):
+        """Initialize importer.
+        
+        Args:
+            client: ElasticClient for the target index
+            checkpoint_path: File recording imported files
+            workers: Metadata extraction processes (default: CPU count)
+            upload_threads: Concurrent bulk requests
+            batch_bytes: Target encoded size of one bulk request
+            batch_docs: Maximum documents per bulk request
+            max_in_flight_bytes: Maximum file bytes being processed or uploaded
+            extensions: File extensions to import (case-insensitive)
+            user: User to record for all files (default: file owner)
+        """
+        self.client = client
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers or os.cpu_count() or 1
+        self.upload_threads = upload_threads
+        self.batch_bytes = batch_bytes
+        self.batch_docs = batch_docs
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.user = user
+        
+        self.stats = {"found": 0, "skipped": 0, "imported": 0, "failed": 0, "bytes": 0}
+        self._in_flight = 0
+        self._batch: List[Dict[str, Any]] = []
+        self._batch_size = 0
+    
+    def iter_files(self, root: str) -> Iterator[Tuple[str, int, float]]:
+        """Walk a directory tree in a stable order.
+        
+        Args:
+            root: Directory to walk
+        
+        Yields:
+            (absolute path, size, mtime) of candidate files
+        """
+        for dirpath, dirnames, filenames in os.walk(os.path.abspath(root)):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not filename.lower().endswith(self.extensions):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError as e:
+                    logger.warning(f"Cannot stat {path}: {e}")
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+    
+    def run(self, root: str) -> Dict[str, int]:
+        """Import all files below ``root``.
+        
+        Args:
+            root: Directory to import
+        
+        Returns:
+            Statistics (found, skipped, imported, failed, bytes)
+        """
+        checkpoint = Checkpoint(self.checkpoint_path)
+        analysis: Dict[Future, int] = {}
+        uploads: Dict[Future, Tuple[List[Dict[str, Any]], int]] = {}
+        
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool, \
+                    ThreadPoolExecutor(max_workers=self.upload_threads) as uploader:
+                for path, size, mtime in self.iter_files(root):
+                    self.stats["found"] += 1
+                    if checkpoint.is_done(path, size, mtime):
+                        self.stats["skipped"] += 1
+                        continue
+                    
+                    # Bound the amount of data held by workers, batches and uploads
+                    while self._in_flight + size > self.max_in_flight_bytes:
+                        if self._batch and not analysis:
+                            self._flush(uploads, uploader)
+                        if not (analysis or uploads):
+                            break
+                        self._drain(analysis, uploads, uploader, checkpoint)
+                    
+                    analysis[pool.submit(analyze_file, path, self.user)] = size
+                    self._in_flight += size
+                
+                while analysis or uploads or self._batch:
+                    if not analysis and self._batch:
+                        self._flush(uploads, uploader)
+                    if analysis or uploads:
+                        self._drain(analysis, uploads, uploader, checkpoint)
+        finally:
+            checkpoint.close()
+        
+        logger.info(
+            f"Import finished: {self.stats['imported']} imported, {self.stats['skipped']} skipped, "
+            f"{self.stats['failed']} failed of {self.stats['found']} files"
+        )
+        return self.stats
+    
+    def _drain(
+        self,
+        analysis: Dict[Future, int],
+        uploads: Dict[Future, Tuple[List[Dict[str, Any]], int]],
+        uploader: ThreadPoolExecutor,
+        checkpoint: Checkpoint
+    ) -> None:
+        """Wait for at least one analysis or upload to finish and handle it."""
+        done, _ = wait(list(analysis) + list(uploads), return_when=FIRST_COMPLETED)
+        
+        for future in done:
+            if future in analysis:
+                size = analysis.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to analyze file: {e}")
+                    self.stats["failed"] += 1
+                    self._in_flight -= size
+                    continue
+                
+                self._batch.append(result)
+                self._batch_size += len(result["data"])
+                if self._batch_size >= self.batch_bytes or len(self._batch) >= self.batch_docs:
+                    self._flush(uploads, uploader)
+            else:
+                batch, batch_bytes = uploads.pop(future)
+                self._in_flight -= batch_bytes
+                self._handle_upload(future, batch, checkpoint)
+    
+    def _flush(
+        self,
+        uploads: Dict[Future, Tuple[List[Dict[str, Any]], int]],
+        uploader: ThreadPoolExecutor
+    ) -> None:
+        """Submit the current batch as one bulk request."""
+        batch = self._batch
+        self._batch = []
+        self._batch_size = 0
+        
+        operations: List[Dict[str, Any]] = []
+        for result in batch:
+            operations.append({"index": {"_id": result["doc_id"]}})
+            operations.append({"data": result.pop("data"), **result.pop("metadata")})
+        
+        batch_bytes = sum(result["size"] for result in batch)
+        uploads[uploader.submit(self.client.bulk, operations)] = (batch, batch_bytes)
+    
+    def _handle_upload(self, future: Future, batch: List[Dict[str, Any]], checkpoint: Checkpoint) -> None:
+        """Record the outcome of a bulk request."""
+        try:
+            response = future.result()
+        except Exception as e:
+            logger.error(f"Bulk request for {len(batch)} files failed: {e}")
+            self.stats["failed"] += len(batch)
+            return
+        
+        succeeded = []
+        for result, item in zip(batch, response["items"]):
+            outcome = next(iter(item.values()))
+            if outcome.get("status", 500) < 300:
+                succeeded.append(result)
+                continue
+            
+            self.stats["failed"] += 1
+            if outcome.get("status") in RETRYABLE_ITEM_STATUSES:
+                logger.warning(f"Cluster rejected {result['path']} temporarily, it will be retried on the next run")
+            else:
+                logger.error(f"Failed to import {result['path']}: {outcome.get('error')}")
+        
+        checkpoint.record(succeeded)
+        self.stats["imported"] += len(succeeded)
+        self.stats["bytes"] += sum(result["size"] for result in succeeded)
+        logger.info(f"Imported {self.stats['imported']} files ({self.stats['bytes'] / MB:.1f} MB)")
@@ -0,0 +1,484 @@
+"""Reconciliation of locally kept print jobs with the index.
+
+A print job can fail to reach Elasticsearch without leaving a trace in the
+index: process_print_job only logs errors and scripts/process_queue.sh
+cancels jobs that keep failing. The reconciler enumerates the local copies
+of jobs (kept PDFs in the processing temp_dir, the CUPS spool, the hot
+folder's done and failed directories and files recorded by the backfill
+importer), derives the document ID each of them is indexed under and checks
+those IDs with batched _mget requests. Missing documents are re-indexed on
+a thread pool; document IDs are stable, so re-indexing is idempotent.
+"""
+import json
+import os
+import re
+import socket
+import struct
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from converter.artifact import JobArtifact
+from converter.metadata_extractor import MetadataExtractor
+from ingest.importer import _file_owner, hash_file, import_doc_id
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SOURCES = ("temp_dir", "spool", "hotfolder", "archive")
+
+# PDFGenerator.generate_filename: print_job_{user}_{job_id}_{YYYYmmdd_HHMMSS}.pdf
+KEPT_PDF_PATTERN = re.compile(r"^print_job_(?P<user>.+)_(?P<job_id>[^_]+)_(?P<timestamp>\d{8}_\d{6})\.pdf$")
+
+# CUPS control files (cNNNNN) and the first document of each job (dNNNNN-001)
+CONTROL_FILE_PATTERN = re.compile(r"^c(?P<number>\d{5,})$")
+
+# IPP delimiter tags below this value start an attribute group (RFC 8010)
+IPP_MAX_DELIMITER_TAG = 0x0f
+IPP_END_OF_ATTRIBUTES = 0x03
+IPP_INTEGER_TAGS = (0x21, 0x23)
+_IPP_HEADER = struct.Struct(">bbhi")
+_IPP_LENGTH = struct.Struct(">h")
+_IPP_INTEGER = struct.Struct(">i")
+
+
+def parse_ipp_attributes(data: bytes) -> Dict[str, Any]:
+    """Parse the attributes of an IPP message, such as a CUPS control file.
+    
+    Only the first value of each attribute is kept. Integer and enum values
+    are decoded to int, everything else to str.
+    
+    Args:
+        data: Encoded IPP message
+    
+    Returns:
+        Attribute values by name
+    
+    Raises:
+        ValueError: If the message is truncated
+    """
+    attributes: Dict[str, Any] = {}
+    offset = _IPP_HEADER.size
+    try:
+        while offset < len(data):
+            tag = data[offset]
+            offset += 1
+            if tag == IPP_END_OF_ATTRIBUTES:
+                break
+            if tag <= IPP_MAX_DELIMITER_TAG:
+                continue
+            
+            (name_length,) = _IPP_LENGTH.unpack_from(data, offset)
+            offset += _IPP_LENGTH.size
+            name = data[offset:offset + name_length].decode("utf-8", errors="replace")
+            offset += name_length
+            (value_length,) = _IPP_LENGTH.unpack_from(data, offset)
+            offset += _IPP_LENGTH.size
+            raw = data[offset:offset + value_length]
+            offset += value_length
+            if len(raw) != value_length:
+                raise ValueError("truncated value")
+            
+            # An empty name continues the previous attribute (additional value)
+            if not name or name in attributes:
+                continue
+            if tag in IPP_INTEGER_TAGS and value_length == _IPP_INTEGER.size:
+                attributes[name] = _IPP_INTEGER.unpack(raw)[0]
+            else:
+                attributes[name] = raw.decode("utf-8", errors="replace")
+    except struct.error as e:
+        raise ValueError(f"Truncated IPP message: {e}")
+    return attributes
+
+
+def _item(
+    source: str,
+    path: str,
+    doc_id: str,
+    job_id: str,
+    user: str,
+    title: str,
+    timestamp: datetime,
+    printer: str
+) -> Dict[str, Any]:
+    return {
+        "source": source,
+        "path": path,
+        "doc_id": doc_id,
+        "job_id": job_id,
+        "user": user,
+        "title": title,
+        "timestamp": timestamp.isoformat(),
+        "printer": printer,
+    }
+
+
+def _mtime(path: str) -> datetime:
+    return datetime.fromtimestamp(os.stat(path).st_mtime)
+
+
+def iter_kept_pdfs(temp_dir: str, printer: str = "ElasticPrinter") -> Iterator[Dict[str, Any]]:
+    """Enumerate PDFs kept by the backend (processing.keep_pdfs).
+    
+    Args:
+        temp_dir: Processing temp_dir
+        printer: Printer name recorded when re-indexing
+    
+    Yields:
+        Reconciliation items
+    """
+    if not os.path.isdir(temp_dir):
+        return
+    for filename in sorted(os.listdir(temp_dir)):
+        match = KEPT_PDF_PATTERN.match(filename)
+        if not match:
+            continue
+        job_id = match.group("job_id")
+        yield _item(
+            "temp_dir",
+            os.path.join(temp_dir, filename),
+            f"print-job-{job_id}",
+            job_id,
+            match.group("user"),
+            f"Print job {job_id}",
+            datetime.strptime(match.group("timestamp"), "%Y%m%d_%H%M%S"),
+            printer
+        )
+
+
+def iter_spool(spool_dir: str, printer: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Enumerate jobs left in the CUPS spool directory.
+    
+    CUPS only keeps document files of finished jobs with PreserveJobFiles
+    enabled; jobs whose document file is gone are skipped.
+    
+    Args:
+        spool_dir: CUPS spool directory (normally /var/spool/cups)
+        printer: Only jobs sent to this queue (default: all queues)
+    
+    Yields:
+        Reconciliation items
+    """
+    if not os.path.isdir(spool_dir):
+        return
+    for filename in sorted(os.listdir(spool_dir)):
+        match = CONTROL_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        number = int(match.group("number"))
+        data_path = os.path.join(spool_dir, f"d{number:05d}-001")
+        if not os.path.exists(data_path):
+            continue
+        
+        try:
+            with open(os.path.join(spool_dir, filename), 'rb') as f:
+                attributes = parse_ipp_attributes(f.read())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot read CUPS control file {filename}: {e}")
+            continue
+        
+        queue = str(attributes.get("job-printer-uri", "")).rstrip("/").rsplit("/", 1)[-1]
+        if printer and queue != printer:
+            continue
+        
+        created = attributes.get("time-at-creation")
+        job_id = str(number)
+        yield _item(
+            "spool",
+            data_path,
+            f"print-job-{job_id}",
+            job_id,
+            attributes.get("job-originating-user-name") or _file_owner(data_path),
+            attributes.get("job-name") or f"Print job {job_id}",
+            datetime.fromtimestamp(created) if isinstance(created, int) else _mtime(data_path),
+            queue or "ElasticPrinter"
+        )
+
+
+def iter_hotfolder(
+    directories: List[str],
+    printer: str = "ElasticPrinter",
+    job_ids: Optional[Dict[str, Tuple[float, int, str]]] = None
+) -> Iterator[Dict[str, Any]]:
+    """Enumerate files the hot-folder watcher moved to its done or failed directory.
+    
+    Args:
+        directories: Done and failed directories
+        printer: Printer name recorded when re-indexing
+        job_ids: Cache of path -> (mtime, size, job ID); files with an
+                 unchanged mtime and size are not hashed again, and the
+                 cache is updated in place
+    
+    Yields:
+        Reconciliation items
+    """
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            if not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            cached = job_ids.get(path) if job_ids is not None else None
+            if cached is not None and cached[:2] == (stat.st_mtime, stat.st_size):
+                job_id = cached[2]
+            else:
+                # Same job ID as HotFolderWatcher.process_file
+                job_id = f"hotfolder-{hash_file(path)[:16]}"
+                if job_ids is not None:
+                    job_ids[path] = (stat.st_mtime, stat.st_size, job_id)
+            yield _item(
+                "hotfolder",
+                path,
+                f"print-job-{job_id}",
+                job_id,
+                _file_owner(path),
+                os.path.splitext(filename)[0],
+                _mtime(path),
+                printer
+            )
+
+
+def iter_archive(
+    checkpoint_path: Optional[str] = None,
+    directories: Tuple[str, ...] = (),
+    extensions: Tuple[str, ...] = (".pdf",),
+    user: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """Enumerate files imported by the backfill importer.
+    
+    Files recorded in the import checkpoint keep their recorded document ID
+    as long as they are unchanged. Files below ``directories`` are hashed to
+    derive the ID the importer gives them.
+    
+    Args:
+        checkpoint_path: Import checkpoint file
+        directories: Archive directories to walk
+        extensions: File extensions in the archive directories
+        user: User to record (default: file owner)
+    
+    Yields:
+        Reconciliation items
+    """
+    recorded: Dict[str, Tuple[int, float, str]] = {}
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    recorded[entry["path"]] = (entry["size"], entry["mtime"], entry["doc_id"])
+                except (ValueError, KeyError):
+                    continue
+    
+    paths = list(recorded)
+    for directory in directories:
+        for dirpath, dirnames, filenames in os.walk(os.path.abspath(directory)):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                if filename.lower().endswith(extensions) and path not in recorded:
+                    paths.append(path)
+    
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Imported files that were deleted since cannot be re-indexed
+            continue
+        entry = recorded.get(path)
+        if entry and entry[:2] == (stat.st_size, stat.st_mtime):
+            doc_id = entry[2]
+        else:
+            doc_id = import_doc_id(path, hash_file(path))
+        yield _item(
+            "archive",
+            path,
+            doc_id,
+            doc_id,
+            user or _file_owner(path),
+            os.path.splitext(os.path.basename(path))[0],
+            datetime.fromtimestamp(stat.st_mtime),
+            "import"
+        )
+
+
+def local_items(
+    config,
+    sources: Tuple[str, ...] = SOURCES,
+    spool_dir: str = "/var/spool/cups",
+    archive_dirs: Tuple[str, ...] = (),
+    hotfolder_ids: Optional[Dict[str, Tuple[float, int, str]]] = None
+) -> Iterator[Dict[str, Any]]:
+    """Enumerate the configured local sources.
+    
+    Args:
+        config: Configuration loader
+        sources: Sources to enumerate (see SOURCES)
+        spool_dir: CUPS spool directory
+        archive_dirs: Archive directories in addition to the import checkpoint
+        hotfolder_ids: Job ID cache of hot-folder files (see iter_hotfolder)
+    
+    Yields:
+        Reconciliation items
+    """
+    printer = config.printer.get('name', 'ElasticPrinter')
+    
+    if "temp_dir" in sources:
+        yield from iter_kept_pdfs(config.processing.get('temp_dir', '/tmp/elasticprinter'), printer)
+    
+    if "spool" in sources:
+        yield from iter_spool(spool_dir, printer)
+    
+    if "hotfolder" in sources:
+        watch_config = config.get('watch', {}) or {}
+        directory = watch_config.get('directory')
+        if directory:
+            yield from iter_hotfolder([
+                watch_config.get('done_dir') or os.path.join(directory, "done"),
+                watch_config.get('failed_dir') or os.path.join(directory, "failed"),
+            ], printer, hotfolder_ids)
+    
+    if "archive" in sources:
+        import_config = config.get('import', {}) or {}
+        yield from iter_archive(
+            import_config.get('checkpoint_file', '/var/lib/elasticprinter/import-checkpoint.jsonl'),
+            tuple(archive_dirs),
+            tuple(ext.lower() for ext in import_config.get('extensions', ['.pdf']))
+        )
+
+
+def reingest(client, item: Dict[str, Any]) -> Dict[str, Any]:
+    """Index a local copy of a job under its expected document ID.
+    
+    The file is indexed as it is; kept PDFs and hot-folder files are not
+    copied into temp_dir again.
+    
+    Args:
+        client: ElasticClient for the print job index
+        item: Reconciliation item
+    
+    Returns:
+        Elasticsearch index response
+    """
+    with JobArtifact.load(item["path"]) as artifact:
+        job_metadata = {
+            "job_id": item["job_id"],
+            "user": item["user"],
+            "title": item["title"],
+            "copies": 1,
+            "timestamp": item["timestamp"],
+            "printer": item["printer"],
+            "hostname": socket.gethostname(),
+            "source_path": item["path"],
+        }
+        pdf_metadata = MetadataExtractor.extract_from_pdf(item["path"], artifact=artifact)
+        return client.index_pdf(
+            pdf_path=item["path"],
+            metadata=MetadataExtractor.combine_metadata(job_metadata, pdf_metadata),
+            doc_id=item["doc_id"],
+            artifact=artifact
+        )
+
+
+class Reconciler:
+    """Check local jobs against the index and re-index missing ones."""
+    
+    def __init__(self, client, batch_size: int = 500, workers: int = 4, dry_run: bool = False):
+        """Initialize reconciler.
+        
+        Args:
+            client: ElasticClient for the print job index
+            batch_size: Document IDs per _mget request
+            workers: Documents re-indexed in parallel
+            dry_run: Only report missing documents
+        """
+        self.client = client
+        self.batch_size = batch_size
+        self.workers = workers
+        self.dry_run = dry_run
+    
+    def find_missing(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Check which items are not in the index.
+        
+        Args:
+            items: Reconciliation items with distinct document IDs
+        
+        Returns:
+            Missing items
+        """
+        missing = []
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            docs = self.client.mget(
+                [item["doc_id"] for item in batch],
+                users=[item["user"] for item in batch]
+            )
+            for item, doc in zip(batch, docs):
+                if "error" in doc:
+                    # Re-indexing under the same ID is harmless, so check failures count as missing
+                    logger.warning(f"Could not check {item['doc_id']}: {doc['error']}")
+                if not doc.get("found"):
+                    missing.append(item)
+            logger.info(f"Checked {min(start + self.batch_size, len(items))} of {len(items)} documents")
+        return missing
+    
+    def run(self, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Reconcile local items with the index.
+        
+        Items sharing a document ID (e.g. a kept PDF of a job that is still
+        in the spool) are checked once, using the first source.
+        
+        Args:
+            items: Reconciliation items (see local_items)
+        
+        Returns:
+            Summary report with totals, per-source counts and missing documents
+        """
+        unique: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            unique.setdefault(item["doc_id"], item)
+        items = list(unique.values())
+        
+        sources: Dict[str, Dict[str, int]] = {}
+        for item in items:
+            counts = sources.setdefault(item["source"], {"checked": 0, "missing": 0, "reingested": 0, "failed": 0})
+            counts["checked"] += 1
+        
+        missing = self.find_missing(items)
+        for item in missing:
+            sources[item["source"]]["missing"] += 1
+            item["status"] = "missing"
+        
+        if missing and not self.dry_run:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(reingest, self.client, item): item for item in missing}
+                for future in as_completed(futures):
+                    item = futures[future]
+                    try:
+                        future.result()
+                        item["status"] = "reingested"
+                    except Exception as e:
+                        logger.error(f"Failed to re-index {item['path']} as {item['doc_id']}: {e}")
+                        item["status"] = "failed"
+                        item["error"] = str(e)
+                    sources[item["source"]][item["status"]] += 1
+        
+        report = {
+            "checked": len(items),
+            "present": len(items) - len(missing),
+            "missing": len(missing),
+            "reingested": sum(counts["reingested"] for counts in sources.values()),
+            "failed": sum(counts["failed"] for counts in sources.values()),
+            "dry_run": self.dry_run,
+            "sources": sources,
+            "missing_documents": [
+                {key: item[key] for key in ("source", "path", "doc_id", "status", "error") if key in item}
+                for item in missing
+            ],
+        }
+        logger.info(
+            f"Reconciled {report['checked']} documents: {report['missing']} missing, "
+            f"{report['reingested']} re-indexed, {report['failed']} failed"
+        )
+        return report
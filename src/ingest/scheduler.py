@@ -0,0 +1,365 @@
+"""Per-user weighted fair scheduling of queued print jobs.
+
+Without a scheduler, jobs run in arrival order: one user's 2000-page PDF or
+a script flooding the printer delays everyone else's one-page jobs.
+FairScheduler keeps one queue per user, ordered by job size so each user's
+small jobs go first, and picks between users with self-clocked weighted
+fair queueing: a user's start tag is set to the virtual time when their
+queue becomes non-empty and advances by ``size / weight`` with every job
+dispatched, and the next job is the one with the smallest finish tag
+(start + size / weight). Small jobs therefore overtake large ones, and a
+user with many queued jobs gets their weighted share instead of the whole
+printer.
+
+Optional per-user quotas (jobs per minute and bytes per hour) are token
+buckets. A user over quota keeps their jobs queued until the bucket
+refills; other users are served in the meantime. A job larger than the
+byte bucket is let through when the bucket is full and leaves it in debt.
+"""
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Jobs smaller than this are charged as this size, so tiny jobs cannot game the queue
+MIN_JOB_COST = 64 * 1024
+
+# Recent wait times kept per user for statistics
+WAIT_SAMPLES = 1000
+
+
+class QuotaExceededError(Exception):
+    """A user has too many jobs or bytes queued."""
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``rate`` tokens per second."""
+    
+    def __init__(self, rate: float, capacity: float, now: float):
+        """Create a full bucket.
+        
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum tokens
+            now: Current monotonic time
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+    
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` tokens (at most a full bucket) are available."""
+        self._refill(now)
+        needed = min(amount, self.capacity) - self.tokens
+        return max(0.0, needed / self.rate) if needed > 0 else 0.0
+    
+    def take(self, amount: float, now: float) -> None:
+        """Remove tokens (the balance may go negative for oversized amounts)."""
+        self._refill(now)
+        self.tokens -= amount
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))]
+
+
+class _UserQueue:
+    """Queued jobs, quota buckets and counters of one user."""
+    
+    def __init__(self, weight: float, job_bucket: Optional[TokenBucket], byte_bucket: Optional[TokenBucket]):
+        self.weight = weight
+        self.job_bucket = job_bucket
+        self.byte_bucket = byte_bucket
+        self.jobs: List[Tuple[int, int, float, Dict[str, Any]]] = []
+        self.queued_bytes = 0
+        self.start = 0.0
+        self.submitted = 0
+        self.dispatched = 0
+        self.throttled = 0
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+    
+    def quota_wait(self, size: int, now: float) -> float:
+        """Seconds until the quotas allow a job of ``size`` bytes."""
+        wait = 0.0
+        if self.job_bucket is not None:
+            wait = max(wait, self.job_bucket.wait_time(1, now))
+        if self.byte_bucket is not None:
+            wait = max(wait, self.byte_bucket.wait_time(size, now))
+        return wait
+
+
+class FairScheduler:
+    """Thread-safe weighted fair queue of print jobs with per-user quotas."""
+    
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        default_weight: float = 1.0,
+        jobs_per_minute: Optional[float] = None,
+        job_burst: Optional[int] = None,
+        bytes_per_hour: Optional[float] = None,
+        byte_burst: Optional[float] = None,
+        max_queued_jobs: Optional[int] = None,
+        stats_file: Optional[str] = None,
+        stats_interval: float = 10.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """Initialize scheduler.
+        
+        Args:
+            weights: Share per user (default_weight for users not listed)
+            default_weight: Share of users without an explicit weight
+            jobs_per_minute: Per-user job rate quota (None: unlimited)
+            job_burst: Jobs a user may start at once (default: jobs_per_minute)
+            bytes_per_hour: Per-user byte quota (None: unlimited)
+            byte_burst: Bytes a user may start at once (default: bytes_per_hour)
+            max_queued_jobs: Jobs a user may have queued; submit() raises beyond it
+            stats_file: JSON file updated with stats() while jobs are dispatched
+            stats_interval: Minimum seconds between stats file updates
+            clock: Monotonic time source
+        """
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self.jobs_per_minute = jobs_per_minute
+        self.job_burst = job_burst or jobs_per_minute
+        self.bytes_per_hour = bytes_per_hour
+        self.byte_burst = byte_burst or bytes_per_hour
+        self.max_queued_jobs = max_queued_jobs
+        self.stats_file = stats_file
+        self.stats_interval = stats_interval
+        self.clock = clock
+        self._stats_written: Optional[float] = None
+        
+        self._users: Dict[str, _UserQueue] = {}
+        self._virtual_time = 0.0
+        self._sequence = itertools.count()
+        # Reentrant, so stats() can be called with the lock held
+        self._condition = threading.Condition(threading.RLock())
+        self._closed = False
+        self._in_flight = 0
+    
+    def _user(self, user: str, now: float) -> _UserQueue:
+        queue = self._users.get(user)
+        if queue is None:
+            job_bucket = byte_bucket = None
+            if self.jobs_per_minute:
+                job_bucket = TokenBucket(self.jobs_per_minute / 60.0, self.job_burst, now)
+            if self.bytes_per_hour:
+                byte_bucket = TokenBucket(self.bytes_per_hour / 3600.0, self.byte_burst, now)
+            queue = _UserQueue(self.weights.get(user, self.default_weight), job_bucket, byte_bucket)
+            self._users[user] = queue
+        return queue
+    
+    def submit(self, job: Dict[str, Any], size: Optional[int] = None) -> None:
+        """Queue a job.
+        
+        Args:
+            job: Job description with at least ``user`` (e.g. the keyword
+                 arguments of process_print_job)
+            size: Job size in bytes (default: size of ``job["input_file"]``)
+        
+        Raises:
+            QuotaExceededError: If the user already has max_queued_jobs queued
+            RuntimeError: If the scheduler was closed
+        """
+        if size is None:
+            try:
+                size = os.path.getsize(job["input_file"])
+            except (KeyError, OSError):
+                size = 0
+        user = job.get("user") or "unknown"
+        
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Scheduler is closed")
+            now = self.clock()
+            queue = self._user(user, now)
+            if self.max_queued_jobs is not None and len(queue.jobs) >= self.max_queued_jobs:
+                raise QuotaExceededError(f"User {user} already has {len(queue.jobs)} jobs queued")
+            if not queue.jobs:
+                # Idle users do not bank credit for the time they had nothing queued
+                queue.start = max(queue.start, self._virtual_time)
+            heapq.heappush(queue.jobs, (size, next(self._sequence), now, job))
+            queue.queued_bytes += size
+            queue.submitted += 1
+            self._condition.notify()
+    
+    def _select(self, now: float) -> Tuple[Optional[Dict[str, Any]], Optional[float]]:
+        """Dispatch the eligible job with the smallest finish tag.
+        
+        Returns:
+            (job, None) or (None, seconds until a throttled job becomes eligible)
+        """
+        best = None
+        retry_in = None
+        for user, queue in self._users.items():
+            if not queue.jobs:
+                continue
+            size = queue.jobs[0][0]
+            wait = queue.quota_wait(size, now)
+            if wait > 0:
+                retry_in = wait if retry_in is None else min(retry_in, wait)
+                continue
+            finish = queue.start + max(size, MIN_JOB_COST) / queue.weight
+            if best is None or finish < best[0]:
+                best = (finish, user, queue)
+        
+        if best is None:
+            return None, retry_in
+        
+        finish, user, queue = best
+        size, _, submitted_at, job = heapq.heappop(queue.jobs)
+        self._virtual_time = queue.start = finish
+        queue.queued_bytes -= size
+        queue.dispatched += 1
+        queue.waits.append(now - submitted_at)
+        if queue.job_bucket is not None:
+            queue.job_bucket.take(1, now)
+        if queue.byte_bucket is not None:
+            queue.byte_bucket.take(size, now)
+        
+        # Count users held back while this job was dispatched
+        for other in self._users.values():
+            if other is not queue and other.jobs and other.quota_wait(other.jobs[0][0], now) > 0:
+                other.throttled += 1
+        self._in_flight += 1
+        return job, None
+    
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for the next job.
+        
+        Call done() when the job finished.
+        
+        Args:
+            timeout: Maximum wait in seconds (None: until a job or close())
+        
+        Returns:
+            Job, or None on timeout or when the scheduler is closed and drained
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._condition:
+            while True:
+                now = self.clock()
+                job, retry_in = self._select(now)
+                if job is not None:
+                    self._maybe_write_stats(now)
+                    return job
+                if self._closed and retry_in is None:
+                    return None
+                
+                wait = retry_in
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._condition.wait(wait)
+    
+    def done(self) -> None:
+        """Mark a job returned by get() as finished."""
+        with self._condition:
+            self._in_flight -= 1
+            self._maybe_write_stats(self.clock())
+    
+    def close(self) -> None:
+        """Stop accepting jobs; get() returns None once the queue is drained."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, throughput and wait times per user.
+        
+        Returns:
+            Statistics with totals and a ``users`` mapping
+        """
+        with self._condition:
+            now = self.clock()
+            users = {}
+            all_waits: List[float] = []
+            for user, queue in sorted(self._users.items()):
+                waits = list(queue.waits)
+                all_waits.extend(waits)
+                users[user] = {
+                    "weight": queue.weight,
+                    "queued": len(queue.jobs),
+                    "queued_bytes": queue.queued_bytes,
+                    "oldest_wait": max((now - job[2] for job in queue.jobs), default=0.0),
+                    "submitted": queue.submitted,
+                    "dispatched": queue.dispatched,
+                    "throttled": queue.throttled,
+                    "wait_p50": _percentile(waits, 50),
+                    "wait_max": max(waits, default=None),
+                }
+            return {
+                "queued": sum(user["queued"] for user in users.values()),
+                "in_flight": self._in_flight,
+                "wait_p50": _percentile(all_waits, 50),
+                "wait_p90": _percentile(all_waits, 90),
+                "users": users,
+            }
+    
+    def _maybe_write_stats(self, now: float) -> None:
+        if self.stats_file and (self._stats_written is None or now - self._stats_written >= self.stats_interval):
+            self._stats_written = now
+            self.write_stats(self.stats_file)
+    
+    def write_stats(self, path: str) -> None:
+        """Write stats() to a JSON file (replaced atomically).
+        
+        Args:
+            path: Statistics file
+        """
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"updated_at": time.time(), **self.stats()}, f, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write scheduler statistics to {path}: {e}")
+
+
+def scheduler_from_config(config) -> Optional[FairScheduler]:
+    """Build the scheduler from ``processing.scheduler``.
+    
+    Args:
+        config: Configuration loader
+    
+    Returns:
+        FairScheduler, or None if scheduling is disabled (jobs run in arrival order)
+    """
+    settings = config.processing.get('scheduler') or {}
+    if not settings.get('enabled', False):
+        return None
+    
+    quotas = settings.get('quotas') or {}
+    bytes_per_hour = quotas.get('mb_per_hour')
+    byte_burst = quotas.get('burst_mb')
+    return FairScheduler(
+        weights=settings.get('weights') or {},
+        default_weight=settings.get('default_weight', 1.0),
+        jobs_per_minute=quotas.get('jobs_per_minute'),
+        job_burst=quotas.get('job_burst'),
+        bytes_per_hour=bytes_per_hour * 1024 * 1024 if bytes_per_hour else None,
+        byte_burst=byte_burst * 1024 * 1024 if byte_burst else None,
+        max_queued_jobs=quotas.get('max_queued_jobs'),
+        stats_file=settings.get('stats_file'),
+        stats_interval=settings.get('stats_interval', 10.0)
+    )
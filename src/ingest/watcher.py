@@ -0,0 +1,384 @@
+"""Event-driven hot-folder ingestion (Linux).
+
+Files dropped into a watched directory are indexed with process_print_job.
+The directory is watched with inotify instead of polling. A file is only
+picked up after it was closed for writing (or moved into the directory)
+and has not changed for ``settle_seconds``. Files that become ready close
+together are coalesced into one batch, and batches are processed on a
+bounded worker pool. Finished files are moved to the done or failed
+directory.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import shutil
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ingest.importer import _file_owner, hash_file
+from ingest.scheduler import FairScheduler, QuotaExceededError
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """Thin ctypes wrapper around the Linux inotify API."""
+    
+    def __init__(self):
+        """Create an inotify instance.
+        
+        Raises:
+            RuntimeError: If inotify is not available on this platform
+        """
+        if not sys.platform.startswith("linux"):
+            raise RuntimeError("Hot-folder mode requires Linux inotify")
+        
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+    
+    def add_watch(self, path: str, mask: int) -> int:
+        """Watch a directory.
+        
+        Args:
+            path: Directory to watch
+            mask: Event mask
+        
+        Returns:
+            Watch descriptor
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch failed for {path}: {os.strerror(err)}")
+        return wd
+    
+    def read_events(self, timeout: float) -> List[Tuple[int, int, str]]:
+        """Wait up to ``timeout`` seconds for events.
+        
+        Args:
+            timeout: Maximum wait in seconds
+        
+        Returns:
+            List of (watch descriptor, mask, name)
+        """
+        readable, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not readable:
+            return []
+        
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", errors="surrogateescape")
+            offset += length
+            events.append((wd, mask, name))
+        return events
+    
+    def close(self) -> None:
+        """Close the inotify file descriptor."""
+        os.close(self.fd)
+
+
+class HotFolderWatcher:
+    """Index files dropped into a directory."""
+    
+    def __init__(
+        self,
+        config,
+        logger_,
+        watch_dir: str,
+        done_dir: Optional[str] = None,
+        failed_dir: Optional[str] = None,
+        settle_seconds: float = 2.0,
+        batch_window: float = 1.0,
+        max_batch: int = 20,
+        workers: int = 2,
+        extensions: Tuple[str, ...] = (".pdf", ".ps"),
+        processor: Optional[Callable[..., bool]] = None,
+        scheduler: Optional[FairScheduler] = None
+    ):
+        """Initialize watcher.
+        
+        Args:
+            config: Configuration loader
+            logger_: Logger passed to process_print_job
+            watch_dir: Directory to watch
+            done_dir: Where processed files are moved (default: watch_dir/done)
+            failed_dir: Where failed files are moved (default: watch_dir/failed)
+            settle_seconds: Quiet time after the last write before a file is processed
+            batch_window: Time to wait for more ready files before submitting a batch
+            max_batch: Maximum files per batch
+            workers: Maximum files processed in parallel
+            extensions: File extensions to pick up (case-insensitive)
+            processor: Job function with process_print_job's signature (default: process_print_job)
+            scheduler: Fair scheduler ordering ready files by owner and size
+                       (default: files are processed in batch order)
+        """
+        self.config = config
+        self.job_logger = logger_
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.done_dir = done_dir or os.path.join(self.watch_dir, "done")
+        self.failed_dir = failed_dir or os.path.join(self.watch_dir, "failed")
+        self.settle_seconds = settle_seconds
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.workers = workers
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        
+        if processor is None:
+            from main import process_print_job
+            processor = process_print_job
+        self.processor = processor
+        self.scheduler = scheduler
+        
+        # path -> (time of last write event, size at that time)
+        self._pending: Dict[str, Tuple[float, int]] = {}
+        self._ready: List[str] = []
+        self._ready_since: Optional[float] = None
+        self._in_progress = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.stats = {"processed": 0, "failed": 0, "batches": 0}
+    
+    def stop(self) -> None:
+        """Ask the watch loop to exit."""
+        self._stop.set()
+    
+    def _wanted(self, name: str) -> bool:
+        return not name.startswith(".") and name.lower().endswith(self.extensions)
+    
+    def note_written(self, path: str, now: Optional[float] = None) -> None:
+        """Record that a file was written (restarts its settle timer).
+        
+        Args:
+            path: File path
+            now: Event time (default: current monotonic time)
+        """
+        with self._lock:
+            if path in self._in_progress or path in self._ready:
+                return
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        self._pending[path] = (time.monotonic() if now is None else now, size)
+    
+    def collect_settled(self, now: Optional[float] = None) -> List[str]:
+        """Move files whose settle timer expired to the ready list.
+        
+        Args:
+            now: Current monotonic time
+        
+        Returns:
+            Files that became ready
+        """
+        now = time.monotonic() if now is None else now
+        settled = []
+        for path, (written_at, size) in list(self._pending.items()):
+            if now - written_at < self.settle_seconds:
+                continue
+            try:
+                current_size = os.path.getsize(path)
+            except OSError:
+                # Removed before it settled
+                del self._pending[path]
+                continue
+            if current_size != size:
+                # Still growing without close-write events (e.g. network filesystems)
+                self._pending[path] = (now, current_size)
+                continue
+            del self._pending[path]
+            settled.append(path)
+        
+        if settled:
+            if not self._ready:
+                self._ready_since = now
+            self._ready.extend(settled)
+        return settled
+    
+    def take_batch(self, now: Optional[float] = None, force: bool = False) -> List[str]:
+        """Return the next batch if the batch window elapsed or the batch is full.
+        
+        Args:
+            now: Current monotonic time
+            force: Return ready files regardless of the window
+        
+        Returns:
+            Files to submit (empty if none are due)
+        """
+        now = time.monotonic() if now is None else now
+        if not self._ready:
+            return []
+        if not force and len(self._ready) < self.max_batch and now - self._ready_since < self.batch_window:
+            return []
+        
+        batch = self._ready[:self.max_batch]
+        self._ready = self._ready[self.max_batch:]
+        self._ready_since = now if self._ready else None
+        return batch
+    
+    def _next_timeout(self, now: float) -> float:
+        deadlines = [written_at + self.settle_seconds for written_at, _ in self._pending.values()]
+        if self._ready:
+            deadlines.append(self._ready_since + self.batch_window)
+        if not deadlines:
+            return 1.0
+        return min(1.0, max(0.0, min(deadlines) - now))
+    
+    def _move(self, path: str, target_dir: str) -> str:
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, os.path.basename(path))
+        if os.path.exists(target):
+            stem, ext = os.path.splitext(os.path.basename(path))
+            target = os.path.join(target_dir, f"{stem}-{time.strftime('%Y%m%d_%H%M%S')}-{os.getpid()}{ext}")
+        shutil.move(path, target)
+        return target
+    
+    def process_file(self, path: str) -> bool:
+        """Index one file and move it to the done or failed directory.
+        
+        Args:
+            path: File in the watched directory
+        
+        Returns:
+            True if the file was indexed
+        """
+        try:
+            # Content-derived job ID: dropping the same file twice updates one document
+            job_id = f"hotfolder-{hash_file(path)[:16]}"
+            success = self.processor(
+                input_file=path,
+                job_id=job_id,
+                user=_file_owner(path),
+                title=os.path.splitext(os.path.basename(path))[0],
+                copies=1,
+                config=self.config,
+                logger=self.job_logger
+            )
+        except Exception as e:
+            logger.error(f"Failed to process {path}: {e}", exc_info=True)
+            success = False
+        
+        try:
+            target = self._move(path, self.done_dir if success else self.failed_dir)
+            logger.info(f"{'Indexed' if success else 'Failed'} {path} -> {target}")
+        except OSError as e:
+            logger.error(f"Could not move {path}: {e}")
+        
+        with self._lock:
+            self._in_progress.discard(path)
+            self.stats["processed" if success else "failed"] += 1
+        return success
+    
+    def _submit(self, executor: ThreadPoolExecutor, batch: List[str]) -> None:
+        with self._lock:
+            self._in_progress.update(batch)
+            self.stats["batches"] += 1
+        logger.info(f"Submitting batch of {len(batch)} file(s)")
+        for path in batch:
+            if self.scheduler is None:
+                executor.submit(self.process_file, path)
+                continue
+            try:
+                self.scheduler.submit({"path": path, "user": _file_owner(path)}, size=os.path.getsize(path))
+            except (QuotaExceededError, OSError) as e:
+                # Not through the executor: with a scheduler its workers never pick up other tasks
+                logger.warning(f"Not queueing {path}: {e}")
+                self._reject(path)
+    
+    def _reject(self, path: str) -> None:
+        """Move a file that could not be queued to the failed directory."""
+        try:
+            target = self._move(path, self.failed_dir)
+            logger.info(f"Rejected {path} -> {target}")
+        except OSError as e:
+            logger.error(f"Could not move {path}: {e}")
+        with self._lock:
+            self._in_progress.discard(path)
+            self.stats["failed"] += 1
+    
+    def _scheduled_worker(self) -> None:
+        """Process files in the order chosen by the scheduler until it is closed and drained."""
+        while True:
+            job = self.scheduler.get(timeout=1.0)
+            if job is None:
+                if self._stop.is_set():
+                    return
+                continue
+            try:
+                self.process_file(job["path"])
+            finally:
+                self.scheduler.done()
+    
+    def run(self) -> None:
+        """Watch the directory until stop() is called."""
+        os.makedirs(self.watch_dir, exist_ok=True)
+        inotify = Inotify()
+        inotify.add_watch(self.watch_dir, IN_CLOSE_WRITE | IN_MOVED_TO | IN_MODIFY)
+        logger.info(f"Watching {self.watch_dir} (settle {self.settle_seconds}s, {self.workers} workers)")
+        
+        # Pick up files dropped while the watcher was not running
+        for name in sorted(os.listdir(self.watch_dir)):
+            path = os.path.join(self.watch_dir, name)
+            if self._wanted(name) and os.path.isfile(path):
+                self.note_written(path)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                if self.scheduler is not None:
+                    for _ in range(self.workers):
+                        executor.submit(self._scheduled_worker)
+                while not self._stop.is_set():
+                    now = time.monotonic()
+                    for _wd, mask, name in inotify.read_events(self._next_timeout(now)):
+                        if mask & IN_Q_OVERFLOW:
+                            logger.warning("inotify queue overflow, rescanning directory")
+                            for entry in os.listdir(self.watch_dir):
+                                if self._wanted(entry):
+                                    self.note_written(os.path.join(self.watch_dir, entry))
+                            continue
+                        if mask & IN_ISDIR or not name or not self._wanted(name):
+                            continue
+                        self.note_written(os.path.join(self.watch_dir, name))
+                    
+                    now = time.monotonic()
+                    self.collect_settled(now)
+                    batch = self.take_batch(now)
+                    while batch:
+                        self._submit(executor, batch)
+                        batch = self.take_batch(now)
+        finally:
+            inotify.close()
+            logger.info(f"Stopped watching {self.watch_dir}: {self.stats}")
+            if self.scheduler is not None:
+                logger.info(f"Scheduler statistics: {self.scheduler.stats()}")
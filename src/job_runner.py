@@ -0,0 +1,263 @@
+"""Concurrent asyncio job runner for ElasticPrinter.
+
+Processes many print jobs in one process (e.g. when draining a backlog or
+running as a daemon) with a single shared AsyncElasticClient. Conversion,
+PDF parsing and base64 encoding run in an executor; indexing requests of
+different jobs overlap on the event loop. Jobs go through the same stages
+as in the CUPS backend (main.run_print_job), sharing its helpers.
+"""
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.config_loader import ConfigLoader
+from converter.artifact import JobArtifact
+from converter.boilerplate import strip_job_text
+from converter.fingerprint import DEFAULT_MAX_DISTANCE
+from converter.pdf_generator import PDFGenerator
+from converter.metadata_extractor import MetadataExtractor
+from elastic.async_client import AsyncElasticClient
+from ingest.scheduler import FairScheduler, QuotaExceededError, scheduler_from_config
+from main import cleanup_job_files, near_duplicate_ids, slim_for_upload, upload_arguments, write_to_mirror
+
+
+async def process_print_job_async(
+    input_file: str,
+    job_id: str,
+    user: str,
+    title: str,
+    copies: int,
+    config: ConfigLoader,
+    logger,
+    client: AsyncElasticClient,
+    executor: Optional[Executor] = None
+) -> bool:
+    """Process a print job without blocking the event loop.
+    
+    Args:
+        input_file: Path to print job input file
+        job_id: Print job ID
+        user: Username
+        title: Job title
+        copies: Number of copies
+        config: Configuration loader
+        logger: Logger instance
+        client: Connected AsyncElasticClient (index and pipeline already ensured)
+        executor: Executor for CPU-bound and blocking file work
+    
+    Returns:
+        True if successful, False otherwise
+    """
+    loop = asyncio.get_running_loop()
+    pdf_path = None
+    artifact = None
+    slimmed = None
+    doc_id = f"print-job-{job_id}"
+    dedupe_config = config.processing.get('near_duplicates', {}) or {}
+    dedupe_enabled = dedupe_config.get('enabled', False)
+    pdf_generator = PDFGenerator.from_config(config)
+    
+    async def find_duplicates(metadata: Dict[str, Any]) -> List[str]:
+        fingerprint = (metadata.get("document") or {}).get("fingerprint")
+        if not fingerprint or not dedupe_enabled:
+            return []
+        try:
+            matches = await client.find_near_duplicates(
+                fingerprint,
+                max_distance=dedupe_config.get('max_distance', DEFAULT_MAX_DISTANCE)
+            )
+        except Exception as e:
+            logger.warning(f"Near-duplicate lookup failed: {e}")
+            return []
+        return near_duplicate_ids(matches, doc_id, logger)
+    
+    try:
+        logger.info(f"Processing print job {job_id} from user {user}")
+        artifact = await loop.run_in_executor(executor, JobArtifact.load, input_file)
+        pdf_path = await loop.run_in_executor(
+            executor,
+            pdf_generator.convert_to_pdf,
+            input_file,
+            None,
+            job_id,
+            user,
+            artifact
+        )
+        
+        metadata_extractor = MetadataExtractor()
+        job_metadata = metadata_extractor.extract_from_environment(
+            job_id=job_id,
+            user=user,
+            title=title,
+            copies=copies
+        )
+        pdf_metadata = await loop.run_in_executor(
+            executor,
+            metadata_extractor.extract_from_pdf,
+            pdf_path,
+            artifact,
+            dedupe_enabled
+        )
+        combined_metadata = metadata_extractor.combine_metadata(
+            job_metadata,
+            pdf_metadata
+        )
+        content = await loop.run_in_executor(
+            executor,
+            strip_job_text,
+            config,
+            artifact,
+            combined_metadata
+        )
+        
+        # None of these fail the job; the mirror keeps it searchable if indexing does
+        _, duplicates, slimmed = await asyncio.gather(
+            loop.run_in_executor(
+                executor, write_to_mirror, config, doc_id, combined_metadata, artifact, logger, content
+            ),
+            find_duplicates(combined_metadata),
+            loop.run_in_executor(executor, slim_for_upload, pdf_generator, pdf_path, artifact, job_id, logger)
+        )
+        
+        metadata, upload_path, upload_artifact = upload_arguments(
+            combined_metadata, pdf_path, artifact, duplicates=duplicates, slimmed=slimmed
+        )
+        response = await client.index_pdf(
+            pdf_path=upload_path,
+            metadata=metadata,
+            doc_id=doc_id,
+            artifact=upload_artifact,
+            content=content
+        )
+        logger.info(f"Successfully indexed document: {response['_id']}")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to process print job {job_id}: {e}", exc_info=True)
+        return False
+    finally:
+        if artifact is not None:
+            artifact.close()
+        cleanup_job_files(config, pdf_generator, pdf_path, slimmed)
+
+
+class AsyncJobRunner:
+    """Run many print jobs concurrently in one process."""
+    
+    def __init__(
+        self,
+        config: ConfigLoader,
+        logger,
+        concurrency: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        scheduler: Optional[FairScheduler] = None
+    ):
+        """Initialize job runner.
+        
+        Args:
+            config: Configuration loader
+            logger: Logger instance
+            concurrency: Maximum jobs in flight (default: processing.concurrency or 4)
+            executor: Executor for CPU-bound work (default: thread pool sized to concurrency)
+            scheduler: Fair scheduler for one run() (default: a new one per run
+                       from processing.scheduler, or arrival order if disabled)
+        """
+        self.config = config
+        self.logger = logger
+        self.concurrency = concurrency or config.processing.get('concurrency', 4)
+        self.executor = executor
+        self.scheduler = scheduler
+        self.scheduler_stats: Optional[Dict[str, Any]] = None
+    
+    async def run(self, jobs: Iterable[Dict[str, Any]]) -> List[bool]:
+        """Process jobs concurrently.
+        
+        Args:
+            jobs: Job descriptions with the keyword arguments of process_print_job
+                  (input_file, job_id, user, title, copies)
+        
+        Returns:
+            Success flag per job, in input order
+        """
+        executor = self.executor or ThreadPoolExecutor(max_workers=self.concurrency)
+        scheduler = self.scheduler or scheduler_from_config(self.config)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        try:
+            async with AsyncElasticClient.from_config(self.config, executor=executor) as client:
+                # Bootstrap once for all jobs instead of once per job
+                await client.ensure_index_exists()
+                await client.ensure_pipeline_exists()
+                
+                async def run_one(job: Dict[str, Any]) -> bool:
+                    async with semaphore:
+                        return await process_print_job_async(
+                            **job,
+                            config=self.config,
+                            logger=self.logger,
+                            client=client,
+                            executor=executor
+                        )
+                
+                if scheduler is None:
+                    return list(await asyncio.gather(*(run_one(job) for job in jobs)))
+                return await self._run_scheduled(scheduler, list(jobs), run_one)
+        finally:
+            if self.executor is None:
+                executor.shutdown(wait=False)
+    
+    async def _run_scheduled(
+        self,
+        scheduler: FairScheduler,
+        jobs: List[Dict[str, Any]],
+        run_one
+    ) -> List[bool]:
+        """Run jobs in the order chosen by the fair scheduler.
+        
+        Jobs over their user's queue limit are not run and fail.
+        """
+        loop = asyncio.get_running_loop()
+        results: List[bool] = [False] * len(jobs)
+        for position, job in enumerate(jobs):
+            try:
+                scheduler.submit({**job, "_position": position})
+            except QuotaExceededError as e:
+                self.logger.warning(f"Not queueing job {job.get('job_id')}: {e}")
+        scheduler.close()
+        
+        async def worker() -> None:
+            while True:
+                # Blocks while every queued user is over quota
+                job = await loop.run_in_executor(None, scheduler.get)
+                if job is None:
+                    return
+                position = job.pop("_position")
+                try:
+                    results[position] = await run_one(job)
+                finally:
+                    scheduler.done()
+        
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        self.scheduler_stats = scheduler.stats()
+        self.logger.info(f"Scheduler statistics: {self.scheduler_stats}")
+        return results
+
+
+def run_jobs(
+    jobs: Iterable[Dict[str, Any]],
+    config: ConfigLoader,
+    logger,
+    concurrency: Optional[int] = None
+) -> List[bool]:
+    """Process jobs concurrently from synchronous code.
+    
+    Args:
+        jobs: Job descriptions (see AsyncJobRunner.run)
+        config: Configuration loader
+        logger: Logger instance
+        concurrency: Maximum jobs in flight
+    
+    Returns:
+        Success flag per job, in input order
+    """
+    runner = AsyncJobRunner(config, logger, concurrency=concurrency)
+    return asyncio.run(runner.run(jobs))
@@ -2,13 +2,403 @@
 import sys
 import os
 import logging
-from typing import Optional
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
 
 from utils.config_loader import ConfigLoader
+from utils.cups import (
+    CUPS_BACKEND_CANCEL,
+    CUPS_BACKEND_FAILED,
+    CUPS_BACKEND_OK,
+    CUPS_BACKEND_RETRY,
+    CUPS_BACKEND_STOP,
+)
+from utils.capture import capture_from_config
 from utils.logger import setup_logger
+from utils.profiling import profiler_from_config
+from utils.stage_graph import DEFAULT_STAGE_WORKERS, StageGraph
+from utils.stages import stage
+from converter.artifact import JobArtifact
+from converter.boilerplate import strip_job_text
+from converter.fingerprint import DEFAULT_MAX_DISTANCE
 from converter.pdf_generator import PDFGenerator
 from converter.metadata_extractor import MetadataExtractor
 from elastic.client import ElasticClient
+from elastic.retry import is_auth_error, is_retryable
+from mirror.local_mirror import mirror_from_config
+
+# Chunk size used when spooling jobs from stdin
+STDIN_CHUNK_SIZE = 1024 * 1024
+
+
+def link_near_duplicates(
+    elastic_client: ElasticClient,
+    metadata: Dict[str, Any],
+    doc_id: str,
+    max_distance: int,
+    logger
+) -> List[str]:
+    """Record near duplicates of a job in its metadata.
+    
+    A failed lookup is logged and does not fail the job.
+    
+    Args:
+        elastic_client: Connected client
+        metadata: Combined job metadata (updated in place)
+        doc_id: Document ID of this job (excluded from matches)
+        max_distance: Maximum fingerprint Hamming distance
+        logger: Logger instance
+        
+    Returns:
+        IDs of near-duplicate documents
+    """
+    try:
+        matches = elastic_client.find_near_duplicates(
+            metadata["document"]["fingerprint"],
+            max_distance=max_distance
+        )
+    except Exception as e:
+        logger.warning(f"Near-duplicate lookup failed: {e}")
+        return []
+    
+    duplicates = near_duplicate_ids(matches, doc_id, logger)
+    if duplicates:
+        metadata["document"]["near_duplicate_of"] = duplicates
+    return duplicates
+
+
+def near_duplicate_ids(matches: List[Tuple[str, int]], doc_id: str, logger) -> List[str]:
+    """IDs of the near-duplicate matches of a job, other than the job itself.
+    
+    Args:
+        matches: Result of find_near_duplicates
+        doc_id: Document ID of this job
+        logger: Logger instance
+        
+    Returns:
+        IDs of near-duplicate documents
+    """
+    duplicates = [match_id for match_id, _ in matches if match_id != doc_id]
+    if duplicates:
+        logger.info(f"Job {doc_id} is a near duplicate of {', '.join(duplicates)}")
+    return duplicates
+
+
+def slim_for_upload(
+    pdf_generator: PDFGenerator,
+    pdf_path: str,
+    artifact: JobArtifact,
+    job_id: str,
+    logger
+) -> Optional[Dict[str, Any]]:
+    """Slim a large job for indexing (see PDFGenerator.slim_pdf).
+    
+    A failure is logged and the original is indexed.
+    
+    Args:
+        pdf_generator: Generator configured with the slimming settings
+        pdf_path: Converted job
+        artifact: Analyzed job
+        job_id: Print job ID
+        logger: Logger instance
+        
+    Returns:
+        None to index the original, otherwise a dict with the slim report
+        and the analyzed slimmed copy (artifact)
+    """
+    try:
+        report = pdf_generator.slim_pdf(pdf_path, artifact=artifact)
+        if report is None:
+            return None
+        return {"report": report, "artifact": JobArtifact.load(report["path"])}
+    except Exception as e:
+        logger.warning(f"Failed to slim job {job_id}, indexing the original: {e}")
+        return None
+
+
+def upload_arguments(
+    metadata: Dict[str, Any],
+    pdf_path: str,
+    artifact: JobArtifact,
+    duplicates: Optional[List[str]] = None,
+    slimmed: Optional[Dict[str, Any]] = None
+) -> Tuple[Dict[str, Any], str, JobArtifact]:
+    """Metadata, PDF and artifact to index a job with.
+    
+    Args:
+        metadata: Combined job metadata (not modified)
+        pdf_path: Converted job
+        artifact: Analyzed job
+        duplicates: IDs of near-duplicate documents
+        slimmed: Result of slim_for_upload
+        
+    Returns:
+        (metadata, pdf_path, artifact), with near duplicates and slimming
+        recorded in ``document`` and the slimmed copy replacing the original
+    """
+    updates = {}
+    if duplicates:
+        updates["near_duplicate_of"] = duplicates
+    if slimmed:
+        updates["slimming"] = {key: value for key, value in slimmed["report"].items() if key != "path"}
+        pdf_path, artifact = slimmed["report"]["path"], slimmed["artifact"]
+    if updates:
+        metadata = {**metadata, "document": {**(metadata.get("document") or {}), **updates}}
+    return metadata, pdf_path, artifact
+
+
+def cleanup_job_files(
+    config: ConfigLoader,
+    pdf_generator: PDFGenerator,
+    pdf_path: Optional[str],
+    slimmed: Optional[Dict[str, Any]] = None
+) -> None:
+    """Delete the converted and slimmed PDFs of a finished job, unless kept.
+    
+    Args:
+        config: Configuration loader (processing.keep_pdfs and slimming.keep_original)
+        pdf_generator: Generator that wrote the files
+        pdf_path: Converted job, if conversion finished
+        slimmed: Result of slim_for_upload
+    """
+    keep_pdfs = config.processing.get('keep_pdfs', False)
+    keep_original = (config.processing.get('slimming') or {}).get('keep_original', False)
+    if slimmed:
+        slimmed["artifact"].close()
+        if not keep_pdfs:
+            pdf_generator.cleanup(slimmed["report"]["path"])
+    
+    # With keep_original, slimmed jobs keep their full PDF locally only
+    if pdf_path and not keep_pdfs and not (slimmed and keep_original):
+        pdf_generator.cleanup(pdf_path)
+
+
+def write_to_mirror(
+    config: ConfigLoader,
+    doc_id: str,
+    metadata: Dict[str, Any],
+    artifact: JobArtifact,
+    logger,
+    text: Optional[str] = None
+) -> bool:
+    """Store a job in the local search mirror, if enabled.
+    
+    A failed write is logged and does not fail the job.
+    
+    Args:
+        config: Configuration loader
+        doc_id: Document ID of this job
+        metadata: Combined job metadata
+        artifact: Analyzed job (its extracted text is stored)
+        logger: Logger instance
+        text: Text to store instead of the extracted text (boilerplate removed)
+        
+    Returns:
+        True if the job was mirrored
+    """
+    try:
+        mirror = mirror_from_config(config)
+        if mirror is None:
+            return False
+        with mirror:
+            mirror.add(doc_id, metadata, text if text is not None else artifact.text())
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to write job {doc_id} to the local mirror: {e}")
+        return False
+
+
+def run_print_job(
+    input_file: str,
+    job_id: str,
+    user: str,
+    title: str,
+    copies: int,
+    config: ConfigLoader,
+    logger
+) -> Dict[str, Any]:
+    """Convert a print job to PDF and index it in Elasticsearch.
+    
+    Unlike process_print_job, errors are raised so the caller can decide
+    how to report them (e.g. as a CUPS backend status).
+    
+    Args:
+        input_file: Path to print job input file
+        job_id: Print job ID
+        user: Username
+        title: Job title
+        copies: Number of copies
+        config: Configuration loader
+        logger: Logger instance
+        
+    Returns:
+        Elasticsearch index response
+        
+    Raises:
+        Exception: If any stage of the job fails
+    """
+    # Opt-in profiling, re-read for every job (see utils.profiling)
+    profiler = profiler_from_config(config)
+    stage_workers = config.processing.get('stage_workers', DEFAULT_STAGE_WORKERS)
+    if profiler:
+        with profiler.profile(job_id) as profiled:
+            # cProfile only sees the calling thread, so profiled jobs run their stages there
+            workers = 1 if profiled else stage_workers
+            return _run_print_job(input_file, job_id, user, title, copies, config, logger, workers)
+    return _run_print_job(input_file, job_id, user, title, copies, config, logger, stage_workers)
+
+
+def _run_print_job(
+    input_file: str,
+    job_id: str,
+    user: str,
+    title: str,
+    copies: int,
+    config: ConfigLoader,
+    logger,
+    stage_workers: int = DEFAULT_STAGE_WORKERS
+) -> Dict[str, Any]:
+    """Run the stages of a print job (see run_print_job).
+    
+    The PDF branch (analyze, convert, metadata, boilerplate) and the
+    cluster branch (connect, bootstrap) run concurrently; the mirror write
+    and the near-duplicate lookup overlap as well, and indexing starts once
+    both branches are done. Indexing needs the finished metadata and text,
+    since they are part of the indexed document. Large jobs are slimmed
+    for upload while their metadata is extracted from the original.
+    When a stage fails, only the mirror write and the stages it needs are
+    still started; a stage already running (e.g. connect retrying an
+    unreachable cluster) is waited for.
+    """
+    processing_config = config.processing
+    dedupe_config = processing_config.get('near_duplicates', {}) or {}
+    dedupe_enabled = dedupe_config.get('enabled', False)
+    doc_id = f"print-job-{job_id}"
+    
+    logger.info(f"Processing print job {job_id} from user {user}")
+    pdf_generator = PDFGenerator.from_config(config)
+    
+    def analyze(results):
+        # Read the job once; every later stage works from this analysis
+        with stage("analyze"):
+            return JobArtifact.load(input_file)
+    
+    def convert(results):
+        with stage("convert"):
+            return pdf_generator.convert_to_pdf(
+                input_file=input_file,
+                job_id=job_id,
+                user=user,
+                artifact=results["analyze"]
+            )
+    
+    def extract_metadata(results):
+        logger.info(f"Extracting metadata from job and PDF")
+        with stage("metadata"):
+            metadata_extractor = MetadataExtractor()
+            job_metadata = metadata_extractor.extract_from_environment(
+                job_id=job_id,
+                user=user,
+                title=title,
+                copies=copies
+            )
+            pdf_metadata = metadata_extractor.extract_from_pdf(
+                results["convert"], artifact=results["analyze"], fingerprint=dedupe_enabled
+            )
+            return metadata_extractor.combine_metadata(job_metadata, pdf_metadata)
+    
+    def boilerplate(results):
+        # Drop repeated headers, footers and banners from the indexed text
+        with stage("boilerplate"):
+            return strip_job_text(config, results["analyze"], results["metadata"])
+    
+    def slim(results):
+        # Index an image-free copy of large jobs
+        with stage("slim"):
+            return slim_for_upload(pdf_generator, results["convert"], results["analyze"], job_id, logger)
+    
+    def mirror(results):
+        # Keep the job searchable locally even if the cluster is unreachable
+        with stage("mirror"):
+            return write_to_mirror(
+                config, doc_id, results["metadata"], results["analyze"], logger, text=results["boilerplate"]
+            )
+    
+    def connect(results):
+        logger.info(f"Connecting to Elasticsearch")
+        with stage("connect"):
+            return ElasticClient.from_config(config)
+    
+    def bootstrap(results):
+        # Ensure index and pipeline exist
+        with stage("bootstrap"):
+            results["connect"].ensure_index_exists()
+            results["connect"].ensure_pipeline_exists()
+    
+    def dedupe(results):
+        # Link near duplicates already in the index. The mirror reads the
+        # metadata at the same time, so matches are merged when indexing.
+        fingerprint = (results["metadata"].get("document") or {}).get("fingerprint")
+        if not fingerprint:
+            return []
+        with stage("dedupe"):
+            return link_near_duplicates(
+                results["connect"],
+                {"document": {"fingerprint": fingerprint}},
+                doc_id,
+                dedupe_config.get('max_distance', DEFAULT_MAX_DISTANCE),
+                logger
+            )
+    
+    def index(results):
+        metadata, pdf_path, artifact = upload_arguments(
+            results["metadata"],
+            results["convert"],
+            results["analyze"],
+            duplicates=results.get("dedupe"),
+            slimmed=results.get("slim")
+        )
+        logger.info(f"Indexing PDF in Elasticsearch")
+        with stage("index"):
+            return results["connect"].index_pdf(
+                pdf_path=pdf_path,
+                metadata=metadata,
+                doc_id=doc_id,
+                artifact=artifact,
+                content=results["boilerplate"]
+            )
+    
+    graph = StageGraph()
+    graph.add("analyze", analyze)
+    graph.add("convert", convert, after=["analyze"])
+    graph.add("metadata", extract_metadata, after=["convert"])
+    graph.add("boilerplate", boilerplate, after=["metadata"])
+    index_after = ["boilerplate", "bootstrap"]
+    if pdf_generator.slim_threshold_bytes is not None:
+        graph.add("slim", slim, after=["convert"])
+        index_after.append("slim")
+    graph.add("connect", connect)
+    graph.add("bootstrap", bootstrap, after=["connect"])
+    graph.add("mirror", mirror, after=["boilerplate"], keep=True)
+    if dedupe_enabled:
+        graph.add("dedupe", dedupe, after=["metadata", "bootstrap"])
+        index_after.append("dedupe")
+    graph.add("index", index, after=index_after)
+    
+    try:
+        response = graph.run(stage_workers)["index"]
+        logger.info(f"Successfully indexed document: {response['_id']}")
+        return response
+    finally:
+        # Every started stage has finished here, whether the job failed or not
+        artifact = graph.results.get("analyze")
+        if artifact is not None:
+            artifact.close()
+        elastic_client = graph.results.get("connect")
+        if elastic_client is not None:
+            elastic_client.close()
+        cleanup_job_files(config, pdf_generator, graph.results.get("convert"), graph.results.get("slim"))
 
 
 def process_print_job(
@@ -34,82 +424,57 @@ def process_print_job(
     Returns:
         True if successful, False otherwise
     """
-    pdf_path = None
-    
     try:
-        # Initialize components
-        processing_config = config.processing
-        temp_dir = processing_config.get('temp_dir', '/tmp/elasticprinter')
-        keep_pdfs = processing_config.get('keep_pdfs', False)
-        
-        # Generate PDF
-        logger.info(f"Processing print job {job_id} from user {user}")
-        pdf_generator = PDFGenerator(temp_dir=temp_dir)
-        pdf_path = pdf_generator.convert_to_pdf(
+        run_print_job(
             input_file=input_file,
-            job_id=job_id,
-            user=user
-        )
-        
-        # Extract metadata
-        logger.info(f"Extracting metadata from job and PDF")
-        metadata_extractor = MetadataExtractor()
-        job_metadata = metadata_extractor.extract_from_environment(
             job_id=job_id,
             user=user,
             title=title,
-            copies=copies
-        )
-        pdf_metadata = metadata_extractor.extract_from_pdf(pdf_path)
-        combined_metadata = metadata_extractor.combine_metadata(
-            job_metadata,
-            pdf_metadata
+            copies=copies,
+            config=config,
+            logger=logger
         )
-        
-        # Index in Elasticsearch
-        logger.info(f"Indexing PDF in Elasticsearch")
-        es_config = config.elasticsearch
-        elastic_client = ElasticClient(
-            host=es_config.get('host'),
-            index=es_config.get('index', 'print-jobs'),
-            pipeline=es_config.get('pipeline', 'attachment'),
-            api_key_id=es_config.get('api_key_id'),
-            api_key=es_config.get('api_key'),
-            username=es_config.get('username'),
-            password=es_config.get('password'),
-            verify_certs=es_config.get('verify_certs', True)
-        )
-        
-        # Ensure index and pipeline exist
-        elastic_client.ensure_index_exists()
-        elastic_client.ensure_pipeline_exists()
-        
-        # Index the document
-        response = elastic_client.index_pdf(
-            pdf_path=pdf_path,
-            metadata=combined_metadata,
-            doc_id=f"print-job-{job_id}"
-        )
-        
-        logger.info(f"Successfully indexed document: {response['_id']}")
-        elastic_client.close()
-        
-        # Cleanup
-        if not keep_pdfs and pdf_path:
-            pdf_generator.cleanup(pdf_path)
-        
         return True
     except Exception as e:
         logger.error(f"Failed to process print job: {e}", exc_info=True)
         return False
-    finally:
-        # Cleanup on error if configured
-        if pdf_path and not config.processing.get('keep_pdfs', False):
-            try:
-                if os.path.exists(pdf_path):
-                    os.remove(pdf_path)
-            except:
-                pass
+
+
+def backend_status_for_error(error: Exception) -> int:
+    """Map a job failure to a CUPS backend exit status.
+    
+    Transient cluster problems ask CUPS to retry the job later, rejected
+    credentials stop the queue so jobs are kept until the configuration is
+    fixed, and anything else aborts the job.
+    
+    Args:
+        error: Exception raised while processing the job
+        
+    Returns:
+        CUPS backend exit status
+    """
+    if is_auth_error(error):
+        return CUPS_BACKEND_STOP
+    if is_retryable(error):
+        return CUPS_BACKEND_RETRY
+    return CUPS_BACKEND_CANCEL
+
+
+def spool_stdin(stream) -> str:
+    """Copy a print job from stdin to a temporary file.
+    
+    The job is copied in chunks so large jobs never have to fit in memory.
+    
+    Args:
+        stream: Binary input stream (normally sys.stdin.buffer)
+        
+    Returns:
+        Path to the temporary file
+    """
+    with stage("stdin"):
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.ps') as tmp:
+            shutil.copyfileobj(stream, tmp, STDIN_CHUNK_SIZE)
+            return tmp.name
 
 
 def main():
@@ -140,7 +505,7 @@ def main():
     # Check if called correctly
     if len(sys.argv) < 6:
         logger.error("Usage: elasticprinter job-id user title copies options [file]")
-        sys.exit(1)
+        sys.exit(CUPS_BACKEND_FAILED)
     
     # Parse arguments
     job_id = sys.argv[1]
@@ -149,6 +514,10 @@ def main():
     copies = int(sys.argv[4])
     # options = sys.argv[5]  # Not used currently
     
+    # Opt-in capture of the run for tools.replay (see utils.capture)
+    capture = capture_from_config(config)
+    session = capture.start(sys.argv, os.environ) if capture else None
+    
     # Determine input source
     if len(sys.argv) == 7:
         # File provided as argument
@@ -156,22 +525,32 @@ def main():
         logger.info(f"Reading from file: {input_file}")
     else:
         # Read from stdin
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.ps') as tmp:
-            tmp.write(sys.stdin.buffer.read())
-            input_file = tmp.name
+        input_file = spool_stdin(sys.stdin.buffer)
         logger.info(f"Reading from stdin, saved to: {input_file}")
     
+    if session:
+        session.add_spool(input_file)
+    
     # Process the print job
-    success = process_print_job(
-        input_file=input_file,
-        job_id=job_id,
-        user=user,
-        title=title,
-        copies=copies,
-        config=config,
-        logger=logger
-    )
+    error = None
+    try:
+        run_print_job(
+            input_file=input_file,
+            job_id=job_id,
+            user=user,
+            title=title,
+            copies=copies,
+            config=config,
+            logger=logger
+        )
+        status = CUPS_BACKEND_OK
+    except Exception as e:
+        logger.error(f"Failed to process print job: {e}", exc_info=True)
+        status = backend_status_for_error(e)
+        error = e
+    
+    if session:
+        session.finish(status, error)
     
     # Cleanup temp file if created from stdin
     if len(sys.argv) != 7:
@@ -180,13 +559,14 @@ def main():
         except:
             pass
     
-    # Exit with appropriate code
-    if success:
+    # Exit with the CUPS backend status
+    if status == CUPS_BACKEND_OK:
         logger.info("Print job processed successfully")
-        sys.exit(0)
+    elif status == CUPS_BACKEND_RETRY:
+        logger.error("Print job processing failed, asking CUPS to retry later")
     else:
-        logger.error("Print job processing failed")
-        sys.exit(1)
+        logger.error(f"Print job processing failed (backend status {status})")
+    sys.exit(status)
 
 
 if __name__ == "__main__":
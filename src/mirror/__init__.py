@@ -0,0 +1 @@
+"""Local copies of indexed print jobs."""
@@ -0,0 +1,443 @@
+"""Local SQLite FTS5 mirror of recent print jobs.
+
+The backend writes the metadata and extracted text of every job to a SQLite
+database before sending it to Elasticsearch, so recent prints stay
+searchable in milliseconds when the cluster is slow or unreachable. The
+mirror is bounded by age and size; the oldest jobs are dropped first.
+
+LocalMirror.search() takes the same request body as ElasticClient.search()
+and returns a response of the same shape, ranked by BM25 with highlighted
+snippets of the text. Only a subset of the query DSL is understood:
+match_all, match, match_phrase, multi_match, query_string and
+simple_query_string (as plain terms), term/terms and range on job fields,
+and bool combining these with must, filter and should.
+"""
+import json
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MB = 1024 * 1024
+
+# Index name reported in search hits
+MIRROR_INDEX = "local-mirror"
+
+DEFAULT_MIRROR_PATH = "/var/lib/elasticprinter/mirror.db"
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_MAX_SIZE_MB = 200
+
+# Seconds to wait for another backend process holding the write lock
+BUSY_TIMEOUT = 30.0
+
+# Tokens around each match in highlighted snippets
+SNIPPET_TOKENS = 16
+
+# Document fields -> full-text columns
+TEXT_COLUMNS = {
+    "print_job.title": "title",
+    "print_job.user": "user",
+    "attachment.content": "content",
+}
+
+# Document fields -> columns usable in term and range filters
+FILTER_COLUMNS = {
+    "print_job.user": "user",
+    "print_job.job_id": "job_id",
+    "print_job.hostname": "hostname",
+    "indexed_at": "indexed_at",
+}
+
+RANGE_OPERATORS = {"gte": ">=", "gt": ">", "lte": "<=", "lt": "<"}
+
+_TOKEN = re.compile(r"\w+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    doc_id TEXT NOT NULL UNIQUE,
+    indexed_at TEXT NOT NULL,
+    user TEXT,
+    job_id TEXT,
+    hostname TEXT,
+    source TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_indexed_at ON jobs (indexed_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(
+    title, user, content, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+class _NoMatch(Exception):
+    """The query cannot match any document (e.g. a match without terms)."""
+
+
+def _field_name(field: str) -> str:
+    """Strip the ``.keyword`` sub-field used in Elasticsearch term queries."""
+    return field[:-len(".keyword")] if field.endswith(".keyword") else field
+
+
+def _fts_expression(text: str, columns: Optional[List[str]], operator: str = "or", phrase: bool = False) -> str:
+    """Build an FTS5 MATCH expression from free text.
+    
+    Args:
+        text: User input (operators and quotes are not interpreted)
+        columns: Columns to search (None for all)
+        operator: "or" or "and" between terms
+        phrase: Match the terms as one phrase
+    
+    Returns:
+        FTS5 expression
+    """
+    tokens = _TOKEN.findall(str(text))
+    if not tokens:
+        raise _NoMatch()
+    if phrase:
+        expression = '"' + " ".join(tokens) + '"'
+    else:
+        joiner = " AND " if operator.lower() == "and" else " OR "
+        expression = joiner.join(f'"{token}"' for token in tokens)
+    if columns:
+        expression = "{" + " ".join(columns) + "} : (" + expression + ")"
+    return expression
+
+
+def _text_columns(fields: Optional[List[str]]) -> Optional[List[str]]:
+    """Map document fields (with optional ^boost) to full-text columns."""
+    if not fields:
+        return None
+    columns = []
+    for field in fields:
+        name = _field_name(field.split("^")[0])
+        if name == "*":
+            return None
+        if name not in TEXT_COLUMNS:
+            raise ValueError(f"Field {name!r} is not searchable in the local mirror")
+        columns.append(TEXT_COLUMNS[name])
+    return columns
+
+
+def _filter_column(field: str) -> str:
+    name = _field_name(field)
+    if name not in FILTER_COLUMNS:
+        raise ValueError(f"Field {name!r} cannot be filtered in the local mirror")
+    return FILTER_COLUMNS[name]
+
+
+def translate_query(query: Dict[str, Any]) -> Tuple[List[str], List[str], List[Any]]:
+    """Translate a query DSL clause into FTS5 expressions and SQL conditions.
+    
+    Args:
+        query: Elasticsearch query clause
+    
+    Returns:
+        (MATCH expressions to AND, SQL conditions to AND, SQL parameters)
+    
+    Raises:
+        ValueError: If the query uses unsupported clauses or fields
+    """
+    if not isinstance(query, dict) or len(query) != 1:
+        raise ValueError(f"Unsupported query for the local mirror: {query!r}")
+    (kind, spec), = query.items()
+    
+    if kind == "match_all":
+        return [], [], []
+    
+    if kind in ("match", "match_phrase"):
+        (field, value), = spec.items()
+        options = value if isinstance(value, dict) else {"query": value}
+        columns = _text_columns([field])
+        return [_fts_expression(
+            options["query"],
+            columns,
+            options.get("operator", "or"),
+            phrase=kind == "match_phrase"
+        )], [], []
+    
+    if kind == "multi_match":
+        return [_fts_expression(
+            spec["query"],
+            _text_columns(spec.get("fields")),
+            spec.get("operator", "or"),
+            phrase=spec.get("type") == "phrase"
+        )], [], []
+    
+    if kind in ("query_string", "simple_query_string"):
+        return [_fts_expression(
+            spec["query"],
+            _text_columns(spec.get("fields")),
+            spec.get("default_operator", "or")
+        )], [], []
+    
+    if kind in ("term", "terms"):
+        (field, value), = spec.items()
+        if kind == "term":
+            values = [value["value"] if isinstance(value, dict) else value]
+        else:
+            values = list(value)
+        if not values:
+            raise _NoMatch()
+        placeholders = ", ".join("?" for _ in values)
+        return [], [f"jobs.{_filter_column(field)} IN ({placeholders})"], values
+    
+    if kind == "range":
+        (field, bounds), = spec.items()
+        column = _filter_column(field)
+        conditions, params = [], []
+        for name, operator in RANGE_OPERATORS.items():
+            if name in bounds:
+                conditions.append(f"jobs.{column} {operator} ?")
+                params.append(bounds[name])
+        return [], conditions, params
+    
+    if kind == "bool":
+        if spec.get("must_not"):
+            raise ValueError("must_not is not supported by the local mirror")
+        expressions, conditions, params = [], [], []
+        for occur in ("must", "filter"):
+            clauses = spec.get(occur) or []
+            for clause in clauses if isinstance(clauses, list) else [clauses]:
+                clause_expressions, clause_conditions, clause_params = translate_query(clause)
+                expressions.extend(clause_expressions)
+                conditions.extend(clause_conditions)
+                params.extend(clause_params)
+        
+        should = spec.get("should") or []
+        should = should if isinstance(should, list) else [should]
+        # Like Elasticsearch, should clauses are only required without must/filter
+        if should and not expressions and not conditions:
+            alternatives = []
+            for clause in should:
+                clause_expressions, clause_conditions, _ = translate_query(clause)
+                if clause_conditions or not clause_expressions:
+                    raise ValueError("should clauses in the local mirror must be full-text queries")
+                alternatives.append(" AND ".join(f"({e})" for e in clause_expressions))
+            expressions.append(" OR ".join(f"({a})" for a in alternatives))
+        return expressions, conditions, params
+    
+    raise ValueError(f"Unsupported query for the local mirror: {kind}")
+
+
+class LocalMirror:
+    """Bounded SQLite FTS5 copy of recent print jobs."""
+    
+    def __init__(
+        self,
+        path: str = DEFAULT_MIRROR_PATH,
+        max_age_days: Optional[float] = DEFAULT_MAX_AGE_DAYS,
+        max_size_mb: Optional[float] = DEFAULT_MAX_SIZE_MB
+    ):
+        """Open (and create) the mirror database.
+        
+        Args:
+            path: SQLite database file
+            max_age_days: Drop jobs indexed longer ago than this (None: keep)
+            max_size_mb: Drop the oldest jobs beyond this much stored text and
+                         metadata (None: unbounded)
+        
+        Raises:
+            RuntimeError: If SQLite was built without FTS5
+        """
+        self.path = path
+        self.max_age_days = max_age_days
+        self.max_bytes = int(max_size_mb * MB) if max_size_mb is not None else None
+        
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        try:
+            # auto_vacuum only takes effect before the first table is created
+            self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            self._conn.close()
+            if "fts5" in str(e):
+                raise RuntimeError("SQLite was built without FTS5; the local mirror is unavailable") from e
+            raise
+    
+    def add(self, doc_id: str, document: Dict[str, Any], text: str = "") -> None:
+        """Store or replace a job and prune the mirror.
+        
+        Args:
+            doc_id: Elasticsearch document ID
+            document: Indexed document (print_job, document, indexed_at)
+            text: Extracted text of the job
+        """
+        print_job = document.get("print_job") or {}
+        source = json.dumps(document, default=str)
+        indexed_at = document.get("indexed_at") or datetime.now().isoformat()
+        
+        with self._conn:
+            row = self._conn.execute("SELECT id FROM jobs WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is not None:
+                self._delete([row[0]])
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (doc_id, indexed_at, user, job_id, hostname, source, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    doc_id,
+                    str(indexed_at),
+                    print_job.get("user"),
+                    print_job.get("job_id"),
+                    print_job.get("hostname"),
+                    source,
+                    len(source) + len(text.encode("utf-8")),
+                )
+            )
+            self._conn.execute(
+                "INSERT INTO jobs_fts (rowid, title, user, content) VALUES (?, ?, ?, ?)",
+                (cursor.lastrowid, print_job.get("title") or "", print_job.get("user") or "", text)
+            )
+        self.prune()
+    
+    def _delete(self, ids: List[int]) -> None:
+        rows = [(row_id,) for row_id in ids]
+        self._conn.executemany("DELETE FROM jobs_fts WHERE rowid = ?", rows)
+        self._conn.executemany("DELETE FROM jobs WHERE id = ?", rows)
+    
+    def prune(self, now: Optional[datetime] = None) -> int:
+        """Drop jobs beyond the age and size bounds, oldest first.
+        
+        Args:
+            now: Current time (for tests)
+        
+        Returns:
+            Number of jobs removed
+        """
+        removed = 0
+        with self._conn:
+            if self.max_age_days is not None:
+                cutoff = ((now or datetime.now()) - timedelta(days=self.max_age_days)).isoformat()
+                ids = [row[0] for row in self._conn.execute(
+                    "SELECT id FROM jobs WHERE indexed_at < ?", (cutoff,)
+                )]
+                self._delete(ids)
+                removed += len(ids)
+            
+            if self.max_bytes is not None:
+                excess = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM jobs").fetchone()[0] - self.max_bytes
+                ids = []
+                if excess > 0:
+                    for row_id, size in self._conn.execute("SELECT id, size FROM jobs ORDER BY indexed_at, id"):
+                        ids.append(row_id)
+                        excess -= size
+                        if excess <= 0:
+                            break
+                self._delete(ids)
+                removed += len(ids)
+        
+        if removed:
+            self._conn.execute("PRAGMA incremental_vacuum")
+            logger.info(f"Pruned {removed} jobs from the local mirror")
+        return removed
+    
+    def search(self, query: Dict[str, Any], size: int = 10) -> Dict[str, Any]:
+        """Search the mirror like ElasticClient.search.
+        
+        Args:
+            query: Search request body (``query`` and ``from`` are used)
+            size: Number of results to return
+        
+        Returns:
+            Search response with BM25-ranked hits and ``attachment.content``
+            highlights
+        
+        Raises:
+            ValueError: If the query is not supported by the mirror
+        """
+        start = time.monotonic()
+        try:
+            expressions, conditions, params = translate_query(query.get("query") or {"match_all": {}})
+        except _NoMatch:
+            return self._response([], 0, start)
+        
+        if expressions:
+            match = " AND ".join(f"({e})" for e in expressions)
+            select = (
+                "SELECT jobs.doc_id, jobs.source, bm25(jobs_fts), "
+                f"snippet(jobs_fts, 2, '<em>', '</em>', '…', {SNIPPET_TOKENS})"
+            )
+            source = "FROM jobs_fts JOIN jobs ON jobs.id = jobs_fts.rowid WHERE jobs_fts MATCH ?"
+            params = [match] + params
+            order = "ORDER BY bm25(jobs_fts)"
+        else:
+            select = "SELECT jobs.doc_id, jobs.source, NULL, NULL"
+            source = "FROM jobs WHERE 1 = 1"
+            order = "ORDER BY jobs.indexed_at DESC"
+        source += "".join(f" AND {condition}" for condition in conditions)
+        
+        total = self._conn.execute(f"SELECT COUNT(*) {source}", params).fetchone()[0]
+        rows = self._conn.execute(
+            f"{select} {source} {order} LIMIT ? OFFSET ?",
+            params + [size, int(query.get("from", 0))]
+        ).fetchall()
+        
+        hits = []
+        for doc_id, document, rank, snippet in rows:
+            hit = {
+                "_index": MIRROR_INDEX,
+                "_id": doc_id,
+                # bm25() is lower for better matches
+                "_score": -rank if rank is not None else 1.0,
+                "_source": json.loads(document),
+            }
+            if snippet and "<em>" in snippet:
+                hit["highlight"] = {"attachment.content": [snippet]}
+            hits.append(hit)
+        return self._response(hits, total, start)
+    
+    @staticmethod
+    def _response(hits: List[Dict[str, Any]], total: int, start: float) -> Dict[str, Any]:
+        return {
+            "took": int((time.monotonic() - start) * 1000),
+            "timed_out": False,
+            "hits": {
+                "total": {"value": total, "relation": "eq"},
+                "max_score": max((hit["_score"] for hit in hits), default=None),
+                "hits": hits
+            }
+        }
+    
+    def count(self) -> int:
+        """Number of jobs in the mirror."""
+        return self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+    
+    def close(self) -> None:
+        """Close the database."""
+        self._conn.close()
+    
+    def __enter__(self) -> "LocalMirror":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def mirror_from_config(config) -> Optional[LocalMirror]:
+    """Open the local mirror configured in the ``mirror`` section.
+    
+    Args:
+        config: Configuration loader
+    
+    Returns:
+        LocalMirror, or None if the mirror is disabled
+    """
+    settings = config.get('mirror', {}) or {}
+    if not settings.get('enabled', False):
+        return None
+    return LocalMirror(
+        path=settings.get('path', DEFAULT_MIRROR_PATH),
+        max_age_days=settings.get('max_age_days', DEFAULT_MAX_AGE_DAYS),
+        max_size_mb=settings.get('max_size_mb', DEFAULT_MAX_SIZE_MB)
+    )
@@ -0,0 +1 @@
+"""Previews of indexed print jobs."""
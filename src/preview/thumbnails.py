@@ -0,0 +1,455 @@
+"""First-page thumbnails of kept print jobs, rendered on demand.
+
+The search UI shows a small image of page one next to each hit. Thumbnails
+are rendered lazily from the kept PDF (processing.keep_pdfs or the hot
+folder's done directory) with Ghostscript, the first time a document is
+asked for, and stored in an on-disk cache bounded in size; the least
+recently used thumbnails are evicted first.
+
+Rendering runs on a small pool of its own, so at most ``max_renders``
+Ghostscript processes run at a time and print jobs are never held up by
+previews. A request for a thumbnail that is not rendered yet returns at
+once with "pending" (HTTP 202 from the preview server) while the render
+continues in the background; concurrent requests for the same document
+share one render. The kept PDFs are listed in the background as well.
+
+Usage:
+    service = thumbnail_service_from_config(config)
+    status, path = service.thumbnail("print-job-42")
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from converter.pdf_generator import PDFGenerator
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_CACHE_DIR = "/var/cache/elasticprinter/thumbnails"
+DEFAULT_MAX_CACHE_MB = 200
+DEFAULT_MAX_RENDERS = 2
+DEFAULT_RESOLUTION = 24
+
+# Seconds before the kept PDFs are listed again after an unknown document ID
+DEFAULT_RESCAN_INTERVAL = 30.0
+
+# Seconds before a document whose thumbnail could not be rendered is tried again
+FAILED_RETRY_SECONDS = 300.0
+
+# Thumbnail states returned by ThumbnailService.thumbnail
+READY = "ready"
+PENDING = "pending"
+MISSING = "missing"
+FAILED = "failed"
+
+_SAFE_KEY_RE = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+
+def cache_key(doc_id: str) -> str:
+    """File name stem of a document's thumbnail (document IDs that are not safe file names are hashed)."""
+    if _SAFE_KEY_RE.match(doc_id) and not doc_id.startswith("."):
+        return doc_id
+    return hashlib.sha1(doc_id.encode("utf-8")).hexdigest()
+
+
+class ThumbnailCache:
+    """Size-bounded LRU cache of PNG files in a directory."""
+    
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_CACHE_MB * 1024 * 1024):
+        """Open the cache, picking up thumbnails of earlier runs.
+        
+        Args:
+            directory: Cache directory
+            max_bytes: Total size of cached thumbnails
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> size, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(directory, exist_ok=True)
+        existing = []
+        for filename in os.listdir(directory):
+            if not filename.endswith(".png"):
+                continue
+            try:
+                stat = os.stat(os.path.join(directory, filename))
+            except OSError:
+                continue
+            existing.append((stat.st_mtime, filename[:-len(".png")], stat.st_size))
+        for _, key, size in sorted(existing):
+            self._entries[key] = size
+            self._size += size
+        self._evict()
+    
+    def path_for(self, key: str) -> str:
+        """Path of the thumbnail stored under ``key``."""
+        return os.path.join(self.directory, f"{key}.png")
+    
+    def get(self, key: str) -> Optional[str]:
+        """Look up a thumbnail and mark it as recently used.
+        
+        Returns:
+            Path of the PNG file, or None if it is not cached
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self.path_for(key)
+        try:
+            # Recency survives restarts through the modification time
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+            return None
+        return path
+    
+    def put(self, key: str, source_path: str) -> str:
+        """Move a rendered thumbnail into the cache.
+        
+        Args:
+            key: Cache key
+            source_path: Rendered PNG file (moved, so it should be on the same file system)
+        
+        Returns:
+            Path of the cached file
+        """
+        path = self.path_for(key)
+        size = os.path.getsize(source_path)
+        os.replace(source_path, path)
+        with self._lock:
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict(keep=key)
+        return path
+    
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Delete least recently used thumbnails until the cache fits (caller holds the lock)."""
+        while self._size > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            self._size -= self._entries.pop(key)
+            self.evictions += 1
+            try:
+                os.remove(self.path_for(key))
+            except OSError:
+                pass
+    
+    @property
+    def size(self) -> int:
+        """Total size of the cached thumbnails in bytes."""
+        return self._size
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class KeptPdfIndex:
+    """Map document IDs to the kept PDFs they were indexed from.
+    
+    The directories are listed on a background thread, so requests never
+    wait for a listing; hot-folder files are only hashed again when their
+    modification time or size changed.
+    """
+    
+    def __init__(self, config, rescan_interval: float = DEFAULT_RESCAN_INTERVAL):
+        """Initialize index.
+        
+        Args:
+            config: Configuration loader (processing.temp_dir and watch directories)
+            rescan_interval: Minimum seconds between listings of the directories
+        """
+        self.config = config
+        self.rescan_interval = rescan_interval
+        self._paths: Dict[str, str] = {}
+        # Hot-folder path -> (mtime, size, job ID), only used by the scan thread
+        self._hotfolder_ids: Dict[str, Tuple[float, int, str]] = {}
+        self._scanned_at: Optional[float] = None
+        self._scan_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    def _scan(self) -> None:
+        """List the kept PDFs (runs on the scan thread)."""
+        from ingest.reconcile import local_items
+        
+        paths = None
+        try:
+            paths = {
+                item["doc_id"]: item["path"]
+                for item in local_items(
+                    self.config, sources=("temp_dir", "hotfolder"), hotfolder_ids=self._hotfolder_ids
+                )
+            }
+            # Forget hot-folder files that were removed
+            seen = set(paths.values())
+            for path in [path for path in self._hotfolder_ids if path not in seen]:
+                del self._hotfolder_ids[path]
+            logger.debug(f"Found {len(paths)} kept PDFs")
+        except Exception as e:
+            logger.warning(f"Failed to list kept PDFs: {e}")
+        finally:
+            with self._lock:
+                if paths is not None:
+                    self._paths = paths
+                self._scanned_at = time.monotonic()
+                self._scan_thread = None
+    
+    def __call__(self, doc_id: str) -> Optional[str]:
+        """Path of the kept PDF of ``doc_id``.
+        
+        Returns:
+            The path, PENDING while the directories are listed, or None if
+            there is no kept PDF
+        """
+        with self._lock:
+            path = self._paths.get(doc_id)
+            if path and os.path.exists(path):
+                return path
+            if self._scan_thread is not None:
+                return PENDING
+            if self._scanned_at is None or time.monotonic() - self._scanned_at >= self.rescan_interval:
+                self._scan_thread = threading.Thread(target=self._scan, name="kept-pdf-scan", daemon=True)
+                self._scan_thread.start()
+                return PENDING
+            return None
+
+
+class ThumbnailService:
+    """Render first-page thumbnails on demand into a ThumbnailCache."""
+    
+    def __init__(
+        self,
+        cache: ThumbnailCache,
+        locate: Callable[[str], Optional[str]],
+        render: Optional[Callable[[str, str], bool]] = None,
+        max_renders: int = DEFAULT_MAX_RENDERS,
+        resolution: int = DEFAULT_RESOLUTION
+    ):
+        """Initialize service.
+        
+        Args:
+            cache: Thumbnail cache
+            locate: Returns the kept PDF of a document ID, PENDING while
+                    it is still looking, or None
+            render: Renders page one of a PDF to a PNG file (default: Ghostscript
+                    through PDFGenerator.render_thumbnail)
+            max_renders: Thumbnails rendered at the same time
+            resolution: Resolution of the thumbnails in DPI
+        """
+        self.cache = cache
+        self.locate = locate
+        if render is None:
+            generator = PDFGenerator(temp_dir=cache.directory)
+            render = lambda pdf_path, png_path: generator.render_thumbnail(pdf_path, png_path, resolution)
+        self.render = render
+        self.renders = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_renders, thread_name_prefix="thumbnail")
+        self._pending: Dict[str, Future] = {}
+        # key -> monotonic time of the failed render
+        self._failed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    def thumbnail(self, doc_id: str, wait: float = 0.0) -> Tuple[str, Optional[str]]:
+        """Get the thumbnail of a document, starting a render if needed.
+        
+        Args:
+            doc_id: Document ID
+            wait: Seconds to wait for a render that is started or running
+        
+        Returns:
+            (status, path): READY with the PNG path, PENDING while the
+            kept PDF is looked up or the thumbnail is rendered, MISSING if there is no kept PDF for the
+            document, FAILED if it could not be rendered recently
+        """
+        key = cache_key(doc_id)
+        path = self.cache.get(key)
+        if path:
+            return READY, path
+        
+        with self._lock:
+            future = self._pending.get(key)
+            failed_at = self._failed.get(key)
+        if future is None:
+            if failed_at is not None and time.monotonic() - failed_at < FAILED_RETRY_SECONDS:
+                return FAILED, None
+            pdf_path = self.locate(doc_id)
+            if pdf_path == PENDING:
+                return PENDING, None
+            if not pdf_path:
+                return MISSING, None
+            with self._lock:
+                future = self._pending.get(key)
+                if future is None:
+                    future = self._executor.submit(self._render, key, pdf_path)
+                    self._pending[key] = future
+        
+        if wait <= 0 and not future.done():
+            return PENDING, None
+        try:
+            path = future.result(timeout=wait)
+        except FutureTimeoutError:
+            return PENDING, None
+        except Exception:
+            # Only reached if the executor was shut down
+            return FAILED, None
+        return (READY, path) if path else (FAILED, None)
+    
+    def _render(self, key: str, pdf_path: str) -> Optional[str]:
+        """Render one thumbnail on the pool and store it in the cache."""
+        tmp_path = os.path.join(self.cache.directory, f".{key}.{threading.get_ident()}.tmp")
+        start = time.monotonic()
+        path = None
+        try:
+            if self.render(pdf_path, tmp_path):
+                path = self.cache.put(key, tmp_path)
+                self.renders += 1
+                logger.debug(f"Rendered thumbnail {key} in {time.monotonic() - start:.2f}s")
+            else:
+                logger.warning(f"Could not render thumbnail of {pdf_path}")
+        except Exception as e:
+            logger.warning(f"Could not render thumbnail of {pdf_path}: {e}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._lock:
+                if path:
+                    self._failed.pop(key, None)
+                else:
+                    self._failed[key] = time.monotonic()
+                self._pending.pop(key, None)
+        return path
+    
+    def stats(self) -> Dict[str, int]:
+        """Cache and render counters."""
+        return {
+            "cached": len(self.cache),
+            "cache_bytes": self.cache.size,
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "evictions": self.cache.evictions,
+            "renders": self.renders,
+            "pending": len(self._pending),
+        }
+    
+    def close(self) -> None:
+        """Wait for running renders and stop the pool."""
+        self._executor.shutdown(wait=True)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """GET /thumbnails/<doc_id>.png and GET /stats."""
+    
+    service: ThumbnailService
+    
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+    
+    def _send(self, status: int, body: bytes, content_type: str = "text/plain", headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/stats":
+            self._send(200, json.dumps(self.service.stats()).encode(), "application/json")
+            return
+        if not (path.startswith("/thumbnails/") and path.endswith(".png")):
+            self._send(404, b"Not found\n")
+            return
+        
+        doc_id = unquote(path[len("/thumbnails/"):-len(".png")])
+        status, file_path = self.service.thumbnail(doc_id)
+        if status == READY:
+            try:
+                with open(file_path, 'rb') as f:
+                    body = f.read()
+            except OSError:
+                # Evicted between lookup and read
+                self._send(503, b"Try again\n", headers={"Retry-After": "1"})
+                return
+            self._send(200, body, "image/png", {"Cache-Control": "max-age=86400"})
+        elif status == PENDING:
+            self._send(202, b"Rendering\n", headers={"Retry-After": "1"})
+        elif status == MISSING:
+            self._send(404, b"No kept PDF for this document\n")
+        else:
+            self._send(422, b"Thumbnail could not be rendered\n")
+
+
+class PreviewServer:
+    """HTTP server for thumbnails used by the search UI."""
+    
+    def __init__(self, service: ThumbnailService, host: str = "127.0.0.1", port: int = 8089):
+        """Initialize server.
+        
+        Args:
+            service: Thumbnail service
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+        """
+        self.service = service
+        handler = type("Handler", (_RequestHandler,), {"service": service})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+    
+    @property
+    def url(self) -> str:
+        """Base URL of the server."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def serve_forever(self) -> None:
+        """Serve requests until shutdown() is called."""
+        self._server.serve_forever()
+    
+    def shutdown(self) -> None:
+        """Stop serving and close the socket."""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def thumbnail_service_from_config(config) -> ThumbnailService:
+    """Build the thumbnail service from the ``preview`` section.
+    
+    Args:
+        config: Configuration loader
+    
+    Returns:
+        ThumbnailService
+    """
+    settings = config.get('preview', {}) or {}
+    cache = ThumbnailCache(
+        settings.get('cache_dir', DEFAULT_CACHE_DIR),
+        max_bytes=int(settings.get('max_cache_mb', DEFAULT_MAX_CACHE_MB) * 1024 * 1024)
+    )
+    return ThumbnailService(
+        cache,
+        KeptPdfIndex(config, rescan_interval=settings.get('rescan_interval', DEFAULT_RESCAN_INTERVAL)),
+        max_renders=settings.get('max_renders', DEFAULT_MAX_RENDERS),
+        resolution=settings.get('resolution', DEFAULT_RESOLUTION)
+    )
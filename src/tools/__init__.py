@@ -0,0 +1 @@
+"""Developer tools: fake Elasticsearch, harnesses and load generation."""
@@ -0,0 +1,827 @@
+"""Minimal in-process fake Elasticsearch server for local testing.
+
+Implements just enough of the REST API for ElasticClient and the backend:
+cluster info, index and pipeline bootstrap, single and bulk indexing,
+get, mget, scroll, pipeline simulation, node ingest stats and a very small
+subset of search and aggregations. Latency and error rates can be injected to
+exercise retry and load behavior.
+
+Usage:
+    with FakeElasticsearch() as fake_es:
+        client = ElasticClient(host=fake_es.url)
+"""
+import base64
+import binascii
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+# Size of chunks used to drain request bodies that are not stored
+DRAIN_CHUNK_SIZE = 1024 * 1024
+
+
+class FakeElasticsearch:
+    """Fake Elasticsearch cluster served over HTTP on localhost."""
+    
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        discard_bodies: bool = False,
+        ingest_millis_per_mb: float = 0.0
+    ):
+        """Initialize fake server.
+        
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            latency: Added delay in seconds for every write and search request
+            latency_jitter: Random extra delay of up to this many seconds
+            error_rate: Fraction of write/search requests answered with ``error_status``
+            error_status: Status used for injected errors (429 adds Retry-After)
+            discard_bodies: Drain document bodies without parsing or storing them,
+                            so huge uploads do not consume memory in this process
+            ingest_millis_per_mb: Attachment processor time reported in the ingest
+                                  stats per MB of simulated document data
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.discard_bodies = discard_bodies
+        self.ingest_millis_per_mb = ingest_millis_per_mb
+        
+        self.indices: Dict[str, Dict[str, Any]] = {}
+        self.documents: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.pipelines: Dict[str, Dict[str, Any]] = {}
+        # pipeline -> {"count", "time_in_millis", "processors": [count, time_in_millis] per processor}
+        self.ingest_stats: Dict[str, Dict[str, Any]] = {}
+        # scroll ID -> (remaining hits, page size)
+        self.scrolls: Dict[str, Tuple[List[Dict[str, Any]], int]] = {}
+        self.request_count = 0
+        self.error_count = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        
+        handler = type("Handler", (_RequestHandler,), {"fake": self})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def url(self) -> str:
+        """Base URL of the running server."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self) -> "FakeElasticsearch":
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self) -> None:
+        """Stop the server."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+    
+    def __enter__(self) -> "FakeElasticsearch":
+        return self.start()
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+    
+    def inject_fault(self) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """Apply configured latency and decide whether to fail a request.
+        
+        Returns:
+            (status, body) for an injected error, or None to proceed
+        """
+        delay = self.latency
+        if self.latency_jitter:
+            delay += random.uniform(0, self.latency_jitter)
+        if delay:
+            time.sleep(delay)
+        
+        if self.error_rate and random.random() < self.error_rate:
+            with self._lock:
+                self.error_count += 1
+            return self.error_status, _error_body("injected_failure", "Injected failure")
+        return None
+    
+    def store(self, index: str, doc_id: Optional[str], source: Optional[Dict[str, Any]],
+              pipeline: Optional[str] = None, routing: Optional[str] = None) -> Tuple[int, Dict[str, Any]]:
+        """Store a document and build the index response.
+        
+        Returns:
+            (status, response body)
+        """
+        doc_id = doc_id or uuid.uuid4().hex
+        mapping = self.indices.get(index, {}).get("mappings") or {}
+        if routing is None and (mapping.get("_routing") or {}).get("required"):
+            return 400, {"_index": index, "_id": doc_id,
+                         **_error_body("routing_missing_exception", f"routing is required for [{index}]/[{doc_id}]")}
+        if source is not None and pipeline:
+            source = _simulate_attachment(source)
+        
+        with self._lock:
+            docs = self.documents.setdefault(index, {})
+            self.indices.setdefault(index, {})
+            created = doc_id not in docs
+            version = 1 if created else docs[doc_id]["_version"] + 1
+            docs[doc_id] = {"_source": source or {}, "_version": version, "_routing": routing}
+        
+        return (201 if created else 200), {
+            "_index": index,
+            "_id": doc_id,
+            "_version": version,
+            "result": "created" if created else "updated",
+            "_shards": {"total": 1, "successful": 1, "failed": 0},
+            "_seq_no": 0,
+            "_primary_term": 1
+        }
+    
+    def simulate(
+        self,
+        pipeline_id: Optional[str],
+        body: Dict[str, Any],
+        verbose: bool = False
+    ) -> Tuple[int, Dict[str, Any]]:
+        """Simulate a stored or inline pipeline and build the response.
+        
+        Non-verbose simulations of a stored pipeline are counted in the
+        ingest stats, with ``ingest_millis_per_mb`` per MB of ``data``.
+        
+        Returns:
+            (status, response body)
+        """
+        pipeline = self.pipelines.get(pipeline_id) if pipeline_id else body.get("pipeline")
+        if pipeline is None:
+            return 404, _error_body("resource_not_found_exception", f"pipeline with id [{pipeline_id}] does not exist")
+        processors = [next(iter(processor)) for processor in pipeline.get("processors") or []]
+        
+        docs = []
+        for doc in body.get("docs") or []:
+            source = dict(doc.get("_source") or {})
+            data_bytes = len(source.get("data") or "") * 3 // 4
+            result = {"_index": doc.get("_index", "_index"), "_id": doc.get("_id", "_id"),
+                      "_source": _simulate_attachment(source)}
+            if verbose:
+                docs.append({"processor_results": [
+                    {"processor_type": processor, "status": "success", "doc": result} for processor in processors
+                ]})
+                continue
+            docs.append({"doc": result})
+            if pipeline_id:
+                millis = int(self.ingest_millis_per_mb * data_bytes / (1024 * 1024))
+                with self._lock:
+                    stats = self.ingest_stats.setdefault(
+                        pipeline_id, {"count": 0, "time_in_millis": 0, "processors": [[0, 0] for _ in processors]}
+                    )
+                    stats["count"] += 1
+                    stats["time_in_millis"] += millis
+                    for position, processor in enumerate(processors[:len(stats["processors"])]):
+                        stats["processors"][position][0] += 1
+                        if processor == "attachment":
+                            stats["processors"][position][1] += millis
+        return 200, {"docs": docs}
+    
+    def index_settings(self, index: str) -> Dict[str, Any]:
+        """Flat settings of an index as returned with include_defaults."""
+        settings: Dict[str, str] = {}
+        
+        def flatten(prefix: str, values: Dict[str, Any]) -> None:
+            for name, value in values.items():
+                if isinstance(value, dict):
+                    flatten(f"{prefix}{name}.", value)
+                else:
+                    settings[f"{prefix}{name}"] = str(value)
+        
+        index_settings = dict(self.indices.get(index, {}).get("settings") or {})
+        nested = index_settings.pop("index", None) or {}
+        flatten("index.", index_settings)
+        flatten("index.", nested)
+        return {"settings": settings, "defaults": {"index.mapping.total_fields.limit": "1000"}}
+    
+    def node_stats(self) -> Dict[str, Any]:
+        """Nodes stats response with the ingest metric of the single fake node."""
+        pipelines = {}
+        with self._lock:
+            for pipeline_id, stats in self.ingest_stats.items():
+                processors = [
+                    next(iter(processor)) for processor in (self.pipelines.get(pipeline_id) or {}).get("processors") or []
+                ]
+                pipelines[pipeline_id] = {
+                    "count": stats["count"],
+                    "time_in_millis": stats["time_in_millis"],
+                    "current": 0,
+                    "failed": 0,
+                    "processors": [
+                        {processor: {"type": processor, "stats": {
+                            "count": count, "time_in_millis": millis, "current": 0, "failed": 0
+                        }}}
+                        for processor, (count, millis) in zip(processors, stats["processors"])
+                    ]
+                }
+        return {
+            "_nodes": {"total": 1, "successful": 1, "failed": 0},
+            "cluster_name": "fake-elasticsearch",
+            "nodes": {"fake-node-id": {"name": "fake-node", "ingest": {"pipelines": pipelines}}}
+        }
+    
+    def update(self, index: str, doc_id: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Apply a partial ``doc`` update and build the update response.
+        
+        Returns:
+            (status, response body)
+        """
+        with self._lock:
+            doc = self.documents.get(index, {}).get(doc_id)
+            if doc is None:
+                return 404, {"_index": index, "_id": doc_id,
+                             **_error_body("document_missing_exception", f"[{doc_id}]: document missing")}
+            _merge(doc["_source"], body.get("doc") or {})
+            doc["_version"] += 1
+            version = doc["_version"]
+        return 200, {"_index": index, "_id": doc_id, "_version": version, "result": "updated"}
+    
+    def get(self, index: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Get a stored document as returned by the get API."""
+        with self._lock:
+            doc = self.documents.get(index, {}).get(doc_id)
+        if doc is None:
+            return None
+        response = {"_index": index, "_id": doc_id, "_version": doc["_version"], "found": True, "_source": doc["_source"]}
+        if doc.get("_routing") is not None:
+            response["_routing"] = doc["_routing"]
+        return response
+    
+    def search(self, index: str, body: Dict[str, Any], size: int, scroll: bool = False) -> Dict[str, Any]:
+        """Answer a search with stored documents (match_all/term/match only).
+        
+        With ``scroll`` the remaining hits are kept for scroll requests.
+        """
+        with self._lock:
+            docs = []
+            for name in _expand_indices(index, self.documents):
+                docs.extend((name, doc_id, doc) for doc_id, doc in self.documents.get(name, {}).items())
+        
+        query = body.get("query") or {"match_all": {}}
+        hits = [
+            _hit(name, doc_id, doc)
+            for name, doc_id, doc in docs
+            if _matches(query, doc["_source"])
+        ]
+        
+        for sort in reversed(body.get("sort") or []):
+            field, order = _sort_spec(sort)
+            hits.sort(
+                key=lambda hit: str(_lookup(hit["_source"], field) or ""),
+                reverse=order == "desc"
+            )
+        
+        start = int(body.get("from", 0))
+        response = self._hits_response(hits[start:start + size], len(hits))
+        if body.get("track_total_hits") is False:
+            del response["hits"]["total"]
+        aggs = body.get("aggs") or body.get("aggregations")
+        if aggs:
+            response["aggregations"] = _aggregate(aggs, [hit["_source"] for hit in hits])
+        if scroll:
+            scroll_id = uuid.uuid4().hex
+            with self._lock:
+                self.scrolls[scroll_id] = (hits[start + size:], size)
+            response["_scroll_id"] = scroll_id
+        return response
+    
+    def scroll(self, scroll_id: str) -> Optional[Dict[str, Any]]:
+        """Return the next page of a scroll (None if the scroll is unknown)."""
+        with self._lock:
+            if scroll_id not in self.scrolls:
+                return None
+            remaining, size = self.scrolls[scroll_id]
+            page = remaining[:size]
+            self.scrolls[scroll_id] = (remaining[size:], size)
+        response = self._hits_response(page, len(page))
+        response["_scroll_id"] = scroll_id
+        return response
+    
+    def _hits_response(self, hits: List[Dict[str, Any]], total: int) -> Dict[str, Any]:
+        return {
+            "took": 1,
+            "timed_out": False,
+            "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+            "hits": {
+                "total": {"value": total, "relation": "eq"},
+                "max_score": 1.0 if hits else None,
+                "hits": hits
+            }
+        }
+
+
+def _hit(index: str, doc_id: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    hit = {"_index": index, "_id": doc_id, "_score": 1.0, "_source": doc["_source"]}
+    if doc.get("_routing") is not None:
+        hit["_routing"] = doc["_routing"]
+    return hit
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler dispatching to the owning FakeElasticsearch."""
+    
+    fake: FakeElasticsearch
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, format, *args) -> None:
+        """Silence default request logging."""
+    
+    # -- plumbing --------------------------------------------------------
+    
+    def _send(self, status: int, body: Any = None, headers: Optional[Dict[str, str]] = None) -> None:
+        payload = b"" if body is None else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+    
+    def _read_body(self, keep: bool = True) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        with self.fake._lock:
+            self.fake.bytes_received += length
+        if keep:
+            return self.rfile.read(length) if length else b""
+        
+        remaining = length
+        while remaining > 0:
+            chunk = self.rfile.read(min(DRAIN_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+        return b""
+    
+    def _json_body(self) -> Dict[str, Any]:
+        raw = self._read_body()
+        return json.loads(raw) if raw else {}
+    
+    def _fault(self) -> bool:
+        fault = self.fake.inject_fault()
+        if fault is None:
+            return False
+        # Drain the request so the connection can be reused
+        self._read_body(keep=False)
+        status, body = fault
+        headers = {"Retry-After": "1"} if status == 429 else None
+        self._send(status, body, headers)
+        return True
+    
+    def _route(self) -> Tuple[List[str], Dict[str, List[str]]]:
+        parsed = urlparse(self.path)
+        parts = [unquote(p) for p in parsed.path.split("/") if p]
+        with self.fake._lock:
+            self.fake.request_count += 1
+        return parts, parse_qs(parsed.query)
+    
+    # -- verbs -----------------------------------------------------------
+    
+    def do_HEAD(self) -> None:
+        parts, _ = self._route()
+        if len(parts) == 1:
+            exists = any(name in self.fake.indices for name in _expand_indices(parts[0], self.fake.indices))
+            self._send(200 if exists else 404)
+        else:
+            self._send(200)
+    
+    def do_GET(self) -> None:
+        parts, params = self._route()
+        fake = self.fake
+        
+        if not parts:
+            self._send(200, {
+                "name": "fake-node",
+                "cluster_name": "fake-elasticsearch",
+                "version": {"number": "8.11.0", "build_flavor": "default"},
+                "tagline": "You Know, for Search"
+            })
+        elif parts[:2] == ["_nodes", "stats"]:
+            self._send(200, fake.node_stats())
+        elif parts[:2] == ["_ingest", "pipeline"] and parts[-1] == "_simulate":
+            self.do_POST()
+        elif parts[:2] == ["_ingest", "pipeline"] and len(parts) == 3:
+            if parts[2] in fake.pipelines:
+                self._send(200, {parts[2]: fake.pipelines[parts[2]]})
+            else:
+                self._send(404, {})
+        elif len(parts) in (2, 3) and parts[1] in ("_mapping", "_settings"):
+            if parts[0] not in fake.indices:
+                self._send(404, _error_body("index_not_found_exception", f"no such index [{parts[0]}]"))
+            elif parts[1] == "_mapping":
+                self._send(200, {parts[0]: {"mappings": fake.indices[parts[0]].get("mappings") or {}}})
+            else:
+                self._send(200, {parts[0]: fake.index_settings(parts[0])})
+        elif len(parts) == 3 and parts[1] == "_doc":
+            doc = fake.get(parts[0], parts[2])
+            if doc is None:
+                self._send(404, {"_index": parts[0], "_id": parts[2], "found": False})
+            else:
+                self._send(200, doc)
+        elif parts and parts[-1] in ("_search", "_mget") or parts == ["_search", "scroll"]:
+            self.do_POST()
+        elif len(parts) == 1:
+            if parts[0] in fake.indices:
+                self._send(200, {parts[0]: fake.indices[parts[0]]})
+            else:
+                self._send(404, _error_body("index_not_found_exception", f"no such index [{parts[0]}]"))
+        else:
+            self._send(404, _error_body("not_found", self.path))
+    
+    def do_PUT(self) -> None:
+        parts, params = self._route()
+        fake = self.fake
+        
+        if parts and parts[-1] == "_bulk":
+            self._bulk(parts[0] if len(parts) == 2 else None, params)
+        elif parts[:2] == ["_ingest", "pipeline"] and len(parts) == 3:
+            fake.pipelines[parts[2]] = self._json_body()
+            self._send(200, {"acknowledged": True})
+        elif len(parts) == 2 and parts[1] == "_mapping":
+            body = self._json_body()
+            if parts[0] not in fake.indices:
+                self._send(404, _error_body("index_not_found_exception", f"no such index [{parts[0]}]"))
+                return
+            with fake._lock:
+                _merge(fake.indices[parts[0]].setdefault("mappings", {}), body)
+            self._send(200, {"acknowledged": True})
+        elif len(parts) == 1:
+            body = self._json_body()
+            if parts[0] in fake.indices:
+                self._send(400, _error_body("resource_already_exists_exception", f"index [{parts[0]}] already exists"))
+                return
+            with fake._lock:
+                fake.indices[parts[0]] = body
+                fake.documents.setdefault(parts[0], {})
+            self._send(200, {"acknowledged": True, "shards_acknowledged": True, "index": parts[0]})
+        elif len(parts) == 3 and parts[1] in ("_doc", "_create"):
+            self._index(parts[0], parts[2], params)
+        else:
+            self._send(404, _error_body("not_found", self.path))
+    
+    def do_POST(self) -> None:
+        parts, params = self._route()
+        
+        if parts and parts[-1] == "_bulk":
+            self._bulk(parts[0] if len(parts) == 2 else None, params)
+        elif parts == ["_search", "scroll"]:
+            body = self._json_body()
+            scroll_id = body.get("scroll_id") or params.get("scroll_id", [""])[0]
+            response = self.fake.scroll(scroll_id)
+            if response is None:
+                self._send(404, _error_body("search_context_missing_exception", f"No search context found for id [{scroll_id}]"))
+            else:
+                self._send(200, response)
+        elif parts and parts[-1] == "_search":
+            if self._fault():
+                return
+            body = self._json_body()
+            size = int(params.get("size", [body.get("size", 10)])[0])
+            index = parts[0] if len(parts) == 2 else "_all"
+            self._send(200, self.fake.search(index, body, size, scroll="scroll" in params))
+        elif parts and parts[-1] == "_mget":
+            self._mget(parts[0] if len(parts) == 2 else None)
+        elif parts[:2] == ["_ingest", "pipeline"] and parts[-1] == "_simulate":
+            verbose = params.get("verbose", ["false"])[0] == "true"
+            status, body = self.fake.simulate(parts[2] if len(parts) == 4 else None, self._json_body(), verbose)
+            self._send(status, body)
+        elif len(parts) == 2 and parts[1] == "_doc":
+            self._index(parts[0], None, params)
+        elif len(parts) == 3 and parts[1] == "_doc":
+            self._index(parts[0], parts[2], params)
+        else:
+            self._send(404, _error_body("not_found", self.path))
+    
+    def do_DELETE(self) -> None:
+        parts, _ = self._route()
+        fake = self.fake
+        body = self._json_body() if parts == ["_search", "scroll"] else {}
+        with fake._lock:
+            if parts == ["_search", "scroll"]:
+                scroll_ids = body.get("scroll_id") or []
+                for scroll_id in [scroll_ids] if isinstance(scroll_ids, str) else scroll_ids:
+                    fake.scrolls.pop(scroll_id, None)
+            elif len(parts) == 1:
+                fake.indices.pop(parts[0], None)
+                fake.documents.pop(parts[0], None)
+            elif parts[:2] == ["_ingest", "pipeline"] and len(parts) == 3:
+                fake.pipelines.pop(parts[2], None)
+                fake.ingest_stats.pop(parts[2], None)
+        self._send(200, {"acknowledged": True})
+    
+    # -- APIs ------------------------------------------------------------
+    
+    def _index(self, index: str, doc_id: Optional[str], params: Dict[str, List[str]]) -> None:
+        if self._fault():
+            return
+        pipeline = params.get("pipeline", [None])[0]
+        routing = params.get("routing", [None])[0]
+        if self.fake.discard_bodies:
+            self._read_body(keep=False)
+            source = None
+        else:
+            source = self._json_body()
+        status, body = self.fake.store(index, doc_id, source, pipeline, routing)
+        self._send(status, body)
+    
+    def _bulk(self, default_index: Optional[str], params: Dict[str, List[str]]) -> None:
+        if self._fault():
+            return
+        default_pipeline = params.get("pipeline", [None])[0]
+        lines = [line for line in self._read_body().split(b"\n") if line.strip()]
+        items = []
+        
+        i = 0
+        while i < len(lines):
+            action = json.loads(lines[i])
+            op, meta = next(iter(action.items()))
+            index = meta.get("_index", default_index)
+            source = None
+            if op in ("index", "create", "update"):
+                i += 1
+                source = None if self.fake.discard_bodies else json.loads(lines[i])
+            i += 1
+            
+            if op == "delete":
+                with self.fake._lock:
+                    found = self.fake.documents.get(index, {}).pop(meta.get("_id"), None)
+                items.append({op: {"_index": index, "_id": meta.get("_id"), "status": 200 if found else 404,
+                                   "result": "deleted" if found else "not_found"}})
+                continue
+            
+            if op == "update":
+                status, body = self.fake.update(index, meta.get("_id"), source or {})
+                body["status"] = status
+                items.append({op: body})
+                continue
+            
+            status, body = self.fake.store(
+                index,
+                meta.get("_id"),
+                source,
+                meta.get("pipeline", default_pipeline),
+                meta.get("routing")
+            )
+            body["status"] = status
+            items.append({op: body})
+        
+        errors = any(next(iter(item.values()))["status"] >= 300 for item in items)
+        self._send(200, {"took": 1, "errors": errors, "items": items})
+    
+    def _mget(self, default_index: Optional[str]) -> None:
+        body = self._json_body()
+        if "ids" in body:
+            requests = [{"_id": doc_id, "_index": default_index} for doc_id in body["ids"]]
+        else:
+            requests = body.get("docs", [])
+        
+        docs = []
+        for request in requests:
+            index = request.get("_index") or default_index
+            doc = self.fake.get(index, request["_id"])
+            docs.append(doc or {"_index": index, "_id": request["_id"], "found": False})
+        self._send(200, {"docs": docs})
+
+
+def _error_body(error_type: str, reason: str) -> Dict[str, Any]:
+    return {"error": {"type": error_type, "reason": reason}, "status": 500}
+
+
+def _expand_indices(pattern: str, known: Dict[str, Any]) -> List[str]:
+    """Resolve comma-separated names and trailing wildcards."""
+    names = []
+    for part in pattern.split(","):
+        if part in ("_all", "*"):
+            names.extend(known)
+        elif part.endswith("*"):
+            names.extend(name for name in known if name.startswith(part[:-1]))
+        else:
+            names.append(part)
+    return names
+
+
+def _lookup(source: Dict[str, Any], field: str) -> Any:
+    """Resolve a dotted field name in a document source."""
+    value: Any = source
+    for key in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _merge(target: Dict[str, Any], changes: Dict[str, Any]) -> None:
+    """Recursively merge a partial document into a source."""
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+def _values(value: Any) -> List[Any]:
+    """Field values as a list (array fields match on any element)."""
+    if value is None:
+        return []
+    return list(value) if isinstance(value, list) else [value]
+
+
+def _sort_spec(sort: Any) -> Tuple[str, str]:
+    if isinstance(sort, str):
+        field, _, order = sort.partition(":")
+        return field, order or "asc"
+    field, spec = next(iter(sort.items()))
+    order = spec.get("order", "asc") if isinstance(spec, dict) else spec
+    return field, order
+
+
+def _clauses(value: Any) -> List[Dict[str, Any]]:
+    if not value:
+        return []
+    return [value] if isinstance(value, dict) else list(value)
+
+
+def _matches(query: Dict[str, Any], source: Dict[str, Any]) -> bool:
+    """Evaluate the small query subset used by ElasticPrinter tooling."""
+    if not query:
+        return True
+    kind, spec = next(iter(query.items()))
+    if kind == "match_all":
+        return True
+    if kind in ("term", "match", "match_phrase"):
+        field, value = next(iter(spec.items()))
+        if isinstance(value, dict):
+            value = value.get("value", value.get("query"))
+        actual = _lookup(source, field)
+        if kind == "term":
+            return value in _values(actual)
+        return str(value).lower() in str(actual or "").lower()
+    if kind == "terms":
+        field, values = next(iter(spec.items()))
+        return any(actual in values for actual in _values(_lookup(source, field)))
+    if kind == "range":
+        field, bounds = next(iter(spec.items()))
+        actual = _lookup(source, field)
+        if actual is None:
+            return False
+        checks = {"gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+                  "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b}
+        return all(
+            check(*_comparable(actual, bounds[op]))
+            for op, check in checks.items() if op in bounds
+        )
+    if kind == "exists":
+        return bool(_values(_lookup(source, spec["field"])))
+    if kind == "bool":
+        must = _clauses(spec.get("must")) + _clauses(spec.get("filter"))
+        if not all(_matches(clause, source) for clause in must):
+            return False
+        should = _clauses(spec.get("should"))
+        if should and not any(_matches(clause, source) for clause in should):
+            return False
+        return not any(_matches(clause, source) for clause in _clauses(spec.get("must_not")))
+    # Unsupported queries match everything
+    return True
+
+
+def _comparable(a: Any, b: Any) -> Tuple[Any, Any]:
+    """Compare numbers numerically and everything else (e.g. ISO dates) as strings."""
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a, b
+    return str(a), str(b)
+
+
+def _date_bucket(value: Any, interval: str) -> Optional[datetime]:
+    """Truncate a date to the start of its calendar interval."""
+    try:
+        moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    day = datetime(moment.year, moment.month, moment.day)
+    if interval in ("week", "1w"):
+        return day - timedelta(days=day.weekday())
+    if interval in ("month", "1M"):
+        return day.replace(day=1)
+    return day
+
+
+def _source_key(kind: str, spec: Dict[str, Any], source: Dict[str, Any]) -> Any:
+    """Value of one composite/terms source for a document."""
+    value = _lookup(source, spec["field"])
+    if kind == "date_histogram" and value is not None:
+        bucket = _date_bucket(value, spec.get("calendar_interval", "day"))
+        if bucket is None:
+            return None
+        if "format" in spec:
+            return bucket.date().isoformat()
+        return int(bucket.timestamp() * 1000)
+    return value
+
+
+def _metric(kind: str, spec: Dict[str, Any], sources: List[Dict[str, Any]]) -> Dict[str, Any]:
+    values = [v for source in sources for v in _values(_lookup(source, spec["field"]))]
+    numbers = [v for v in values if isinstance(v, (int, float))]
+    if kind == "value_count":
+        return {"value": len(values)}
+    if kind == "sum":
+        return {"value": float(sum(numbers))}
+    if not numbers:
+        return {"value": None}
+    if kind == "min":
+        return {"value": float(min(numbers))}
+    if kind == "max":
+        return {"value": float(max(numbers))}
+    return {"value": sum(numbers) / len(numbers)}
+
+
+def _aggregate(aggs: Dict[str, Any], sources: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Evaluate composite, terms and metric aggregations."""
+    results = {}
+    for name, agg in aggs.items():
+        sub_aggs = agg.get("aggs") or agg.get("aggregations") or {}
+        kind, spec = next((k, v) for k, v in agg.items() if k not in ("aggs", "aggregations"))
+        
+        if kind in ("sum", "min", "max", "avg", "value_count"):
+            results[name] = _metric(kind, spec, sources)
+        elif kind == "terms":
+            groups: Dict[Any, List[Dict[str, Any]]] = {}
+            for source in sources:
+                for value in _values(_lookup(source, spec["field"])):
+                    groups.setdefault(value, []).append(source)
+            ordered = sorted(groups.items(), key=lambda item: (-len(item[1]), str(item[0])))
+            results[name] = {"buckets": [
+                {"key": key, "doc_count": len(members), **_aggregate(sub_aggs, members)}
+                for key, members in ordered[:spec.get("size", 10)]
+            ]}
+        elif kind == "composite":
+            names = [next(iter(item)) for item in spec["sources"]]
+            source_specs = [next(iter(next(iter(item.values())).items())) for item in spec["sources"]]
+            groups = {}
+            for source in sources:
+                key = []
+                for source_kind, source_spec in source_specs:
+                    value = _source_key(source_kind, source_spec, source)
+                    if value is None and not source_spec.get("missing_bucket"):
+                        break
+                    key.append(value)
+                else:
+                    groups.setdefault(tuple(key), []).append(source)
+            
+            # Missing values sort first, like Elasticsearch
+            ordered = sorted(groups.items(), key=lambda item: [(v is not None, v) for v in item[0]])
+            after = spec.get("after")
+            if after:
+                after_key = [(after.get(n) is not None, after.get(n)) for n in names]
+                ordered = [item for item in ordered if [(v is not None, v) for v in item[0]] > after_key]
+            page = ordered[:spec.get("size", 10)]
+            buckets = [
+                {"key": dict(zip(names, key)), "doc_count": len(members), **_aggregate(sub_aggs, members)}
+                for key, members in page
+            ]
+            results[name] = {"buckets": buckets}
+            if buckets:
+                results[name]["after_key"] = buckets[-1]["key"]
+    return results
+
+
+def _simulate_attachment(source: Dict[str, Any]) -> Dict[str, Any]:
+    """Roughly emulate the attachment, set (clean_content) and remove processors."""
+    data = source.pop("data", None)
+    clean_content = source.pop("clean_content", None)
+    if data is None:
+        return source
+    try:
+        raw = base64.b64decode(data)
+    except (binascii.Error, ValueError):
+        raw = b""
+    content_type = "application/pdf" if raw.startswith(b"%PDF") else "application/octet-stream"
+    source["attachment"] = {
+        "content_type": content_type,
+        "content_length": len(raw)
+    }
+    if clean_content is not None:
+        source["attachment"]["content"] = clean_content
+    return source
@@ -0,0 +1,481 @@
+"""Concurrent end-to-end load generator for the CUPS backend.
+
+Starts the real backend entry point (``main.py job-id user title copies
+options``, job fed on stdin) once per job, the way CUPS does, against a
+local fake Elasticsearch with injectable latency and error rates. Jobs
+arrive open-loop at the offered rate (Poisson or evenly spaced) and at most
+``concurrency`` backends run at once; jobs that arrive while all slots are
+busy wait, and that wait counts towards their latency.
+
+Each offered rate is run for ``duration`` seconds and then drained. The
+report shows achieved throughput, latency percentiles, error rates, backend
+CPU use and the summed RSS of running backends sampled over time. A rate is
+flagged as saturated when jobs start failing or typically wait for a free
+slot longer than a backend run takes, i.e. the queue grows faster than the
+host drains it.
+
+Usage:
+    python -m tools.loadgen --rates 1,2,4,8 --concurrency 8 --duration 30
+    python -m tools.loadgen --config my.yaml --latency 0.2 --error-rate 0.05 --json run.json
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from tools.fake_elasticsearch import FakeElasticsearch
+from tools.memory_harness import MB, generate_spool_file, write_harness_config
+from utils.config_loader import CONFIG_ENV
+from utils.cups import (
+    CUPS_BACKEND_AUTH_REQUIRED,
+    CUPS_BACKEND_CANCEL,
+    CUPS_BACKEND_FAILED,
+    CUPS_BACKEND_HOLD,
+    CUPS_BACKEND_OK,
+    CUPS_BACKEND_RETRY,
+    CUPS_BACKEND_RETRY_CURRENT,
+    CUPS_BACKEND_STOP,
+)
+
+BACKEND_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+EXIT_STATUS_NAMES = {
+    CUPS_BACKEND_OK: "ok",
+    CUPS_BACKEND_FAILED: "failed",
+    CUPS_BACKEND_AUTH_REQUIRED: "auth_required",
+    CUPS_BACKEND_HOLD: "hold",
+    CUPS_BACKEND_STOP: "stop",
+    CUPS_BACKEND_CANCEL: "cancel",
+    CUPS_BACKEND_RETRY: "retry",
+    CUPS_BACKEND_RETRY_CURRENT: "retry_current",
+}
+
+DEFAULT_RATES = [1.0, 2.0, 4.0]
+DEFAULT_CONCURRENCY = 4
+DEFAULT_DURATION = 10.0
+DEFAULT_JOB_TIMEOUT = 120.0
+DEFAULT_SAMPLE_INTERVAL = 0.5
+DEFAULT_JOB_SIZE_KB = 256
+
+# Error rate above this counts as saturated
+SATURATION_ERROR_RATE = 0.01
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile.
+    
+    Args:
+        values: Samples
+        pct: Percentile between 0 and 100
+    
+    Returns:
+        Percentile value, or None without samples
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(-(-pct * len(ordered) // 100)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _children_cpu_seconds() -> float:
+    """CPU time used by terminated child processes."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _rss_bytes(pid: int) -> int:
+    """Current RSS of a process (0 if it has exited)."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def write_loadgen_config(path: str, es_url: str, temp_dir: str, base_config: Optional[str] = None) -> None:
+    """Write the backend config, pointed at the fake cluster.
+    
+    Args:
+        path: Config file to write
+        es_url: Fake Elasticsearch URL
+        temp_dir: Working directory for PDFs
+        base_config: Config file to compare (its cluster settings are replaced)
+    """
+    if base_config is None:
+        write_harness_config(path, es_url, temp_dir)
+        return
+    
+    with open(base_config, 'r') as f:
+        config = yaml.safe_load(f) or {}
+    es_config = config.setdefault("elasticsearch", {})
+    for key in ("hosts", "ingest_hosts", "sniff_ingest_nodes", "api_key", "api_key_id", "username", "password"):
+        es_config.pop(key, None)
+    es_config["host"] = es_url
+    config.setdefault("processing", {})["temp_dir"] = temp_dir
+    with open(path, 'w') as f:
+        yaml.safe_dump(config, f)
+
+
+class LoadGenerator:
+    """Offer backend jobs at a fixed rate and measure the outcome."""
+    
+    def __init__(
+        self,
+        config_path: str,
+        spool_path: str,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        job_timeout: float = DEFAULT_JOB_TIMEOUT,
+        sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+        arrival: str = "poisson",
+        backend: Optional[List[str]] = None,
+        rng: Optional[random.Random] = None
+    ):
+        """Initialize load generator.
+        
+        Args:
+            config_path: Backend config file (passed as $ELASTICPRINTER_CONFIG)
+            spool_path: Job file fed to every backend on stdin
+            concurrency: Maximum backends running at once
+            job_timeout: Seconds before a backend is killed
+            sample_interval: Seconds between CPU/RSS samples
+            arrival: "poisson" or "uniform" inter-arrival times
+            backend: Backend command (default: this checkout's main.py)
+            rng: Random source for arrival times
+        """
+        if arrival not in ("poisson", "uniform"):
+            raise ValueError(f"Unknown arrival process {arrival!r}")
+        self.config_path = config_path
+        self.spool_path = spool_path
+        self.concurrency = concurrency
+        self.job_timeout = job_timeout
+        self.sample_interval = sample_interval
+        self.arrival = arrival
+        self.backend = backend or [sys.executable, BACKEND_SCRIPT]
+        self.rng = rng or random.Random()
+        
+        self._lock = threading.Lock()
+        self._running: Dict[int, subprocess.Popen] = {}
+        self._finished = 0
+    
+    def _next_gap(self, rate: float) -> float:
+        if self.arrival == "poisson":
+            return self.rng.expovariate(rate)
+        return 1.0 / rate
+    
+    def _run_job(self, job_number: int, arrived: float) -> Dict[str, Any]:
+        """Run one backend and time it."""
+        started = time.monotonic()
+        env = dict(os.environ, **{CONFIG_ENV: self.config_path})
+        command = self.backend + [f"loadgen-{job_number}", "loadgen", f"Load test job {job_number}", "1", ""]
+        
+        with open(self.spool_path, 'rb') as stdin:
+            process = subprocess.Popen(
+                command,
+                stdin=stdin,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env=env
+            )
+            with self._lock:
+                self._running[process.pid] = process
+            try:
+                returncode = process.wait(timeout=self.job_timeout)
+                status = EXIT_STATUS_NAMES.get(returncode, f"exit_{returncode}")
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+                status = "timeout"
+            finally:
+                with self._lock:
+                    self._running.pop(process.pid, None)
+                    self._finished += 1
+        
+        finished = time.monotonic()
+        return {
+            "status": status,
+            "latency": finished - arrived,
+            "queue_wait": started - arrived,
+            "service_time": finished - started,
+        }
+    
+    def _sample(self, start: float, stop: threading.Event, samples: List[Dict[str, Any]]) -> None:
+        """Record running jobs, RSS and CPU use until stopped."""
+        cpu_count = os.cpu_count() or 1
+        last_time, last_cpu = time.monotonic(), _children_cpu_seconds()
+        while not stop.wait(self.sample_interval):
+            now, cpu = time.monotonic(), _children_cpu_seconds()
+            with self._lock:
+                pids = list(self._running)
+                finished = self._finished
+            samples.append({
+                "t": round(now - start, 3),
+                "running": len(pids),
+                "finished": finished,
+                "rss_mb": round(sum(_rss_bytes(pid) for pid in pids) / MB, 1),
+                # CPU of backends that exited during the interval, as % of all cores
+                "cpu_percent": round(100.0 * (cpu - last_cpu) / ((now - last_time) * cpu_count), 1),
+            })
+            last_time, last_cpu = now, cpu
+    
+    def run(self, rate: float, duration: float = DEFAULT_DURATION, max_jobs: Optional[int] = None) -> Dict[str, Any]:
+        """Offer jobs at ``rate`` per second for ``duration`` seconds.
+        
+        Args:
+            rate: Offered arrival rate in jobs per second
+            duration: Seconds during which new jobs arrive
+            max_jobs: Stop arrivals after this many jobs
+        
+        Returns:
+            Summary with throughput, latency percentiles, errors and samples
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        with self._lock:
+            self._finished = 0
+        
+        samples: List[Dict[str, Any]] = []
+        stop = threading.Event()
+        start = time.monotonic()
+        cpu_before = _children_cpu_seconds()
+        sampler = threading.Thread(target=self._sample, args=(start, stop, samples), daemon=True)
+        sampler.start()
+        
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            next_arrival = start
+            while next_arrival < start + duration and (max_jobs is None or len(futures) < max_jobs):
+                delay = next_arrival - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(self._run_job, len(futures), next_arrival))
+                next_arrival += self._next_gap(rate)
+        
+        elapsed = time.monotonic() - start
+        stop.set()
+        sampler.join()
+        jobs = [future.result() for future in futures]
+        return self._summarize(rate, jobs, elapsed, _children_cpu_seconds() - cpu_before, samples)
+    
+    def _summarize(
+        self,
+        rate: float,
+        jobs: List[Dict[str, Any]],
+        elapsed: float,
+        cpu_seconds: float,
+        samples: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for job in jobs:
+            statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+        
+        ok = statuses.get("ok", 0)
+        latencies = [job["latency"] for job in jobs if job["status"] == "ok"]
+        errors = len(jobs) - ok
+        throughput = ok / elapsed if elapsed else 0.0
+        error_rate = errors / len(jobs) if jobs else 0.0
+        queue_wait = percentile([job["queue_wait"] for job in jobs], 90)
+        service_time = percentile([job["service_time"] for job in jobs], 50)
+        
+        return {
+            "offered_rate": rate,
+            "concurrency": self.concurrency,
+            "jobs": len(jobs),
+            "succeeded": ok,
+            "errors": errors,
+            "error_rate": error_rate,
+            "statuses": statuses,
+            "elapsed": elapsed,
+            "throughput": throughput,
+            "latency": {
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p99": percentile(latencies, 99),
+                "max": max(latencies) if latencies else None,
+            },
+            "queue_wait_p90": queue_wait,
+            "service_time_p50": service_time,
+            "cpu_seconds_per_job": cpu_seconds / len(jobs) if jobs else 0.0,
+            "peak_rss_mb": max((sample["rss_mb"] for sample in samples), default=0.0),
+            "saturated": error_rate > SATURATION_ERROR_RATE or (
+                queue_wait is not None and service_time is not None and queue_wait > service_time
+            ),
+            "samples": samples,
+        }
+
+
+def run_sweep(
+    rates: List[float],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    duration: float = DEFAULT_DURATION,
+    job_size_kb: float = DEFAULT_JOB_SIZE_KB,
+    input_file: Optional[str] = None,
+    base_config: Optional[str] = None,
+    latency: float = 0.0,
+    latency_jitter: float = 0.0,
+    error_rate: float = 0.0,
+    error_status: int = 503,
+    arrival: str = "poisson",
+    max_jobs: Optional[int] = None,
+    job_timeout: float = DEFAULT_JOB_TIMEOUT,
+    sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+    seed: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Run the load generator at each offered rate against a fresh fake cluster.
+    
+    Args:
+        rates: Offered arrival rates in jobs per second
+        concurrency: Maximum backends running at once
+        duration: Seconds of arrivals per rate
+        job_size_kb: Size of the generated job file
+        input_file: Job file to send instead of a generated one
+        base_config: Backend config to test (cluster settings are replaced)
+        latency: Fake cluster delay per request in seconds
+        latency_jitter: Random extra delay of up to this many seconds
+        error_rate: Fraction of fake cluster requests that fail
+        error_status: HTTP status of injected failures
+        arrival: "poisson" or "uniform"
+        max_jobs: Maximum jobs per rate
+        job_timeout: Seconds before a backend is killed
+        sample_interval: Seconds between CPU/RSS samples
+        seed: Seed for arrival times
+    
+    Returns:
+        One summary per rate
+    """
+    results = []
+    rng = random.Random(seed)
+    
+    with tempfile.TemporaryDirectory(prefix="elasticprinter-loadgen-") as temp_dir:
+        spool_path = input_file
+        if spool_path is None:
+            spool_path = os.path.join(temp_dir, "job.pdf")
+            generate_spool_file(spool_path, int(job_size_kb * 1024))
+        
+        for rate in rates:
+            # A fresh cluster per rate so stored documents do not skew later steps
+            with FakeElasticsearch(
+                latency=latency,
+                latency_jitter=latency_jitter,
+                error_rate=error_rate,
+                error_status=error_status,
+                discard_bodies=True
+            ) as fake_es:
+                config_path = os.path.join(temp_dir, "config.yaml")
+                write_loadgen_config(config_path, fake_es.url, os.path.join(temp_dir, "pdfs"), base_config)
+                generator = LoadGenerator(
+                    config_path,
+                    spool_path,
+                    concurrency=concurrency,
+                    job_timeout=job_timeout,
+                    sample_interval=sample_interval,
+                    arrival=arrival,
+                    rng=rng
+                )
+                result = generator.run(rate, duration=duration, max_jobs=max_jobs)
+                result["requests"] = fake_es.request_count
+                result["injected_errors"] = fake_es.error_count
+                results.append(result)
+    
+    return results
+
+
+def _format_seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.2f}"
+
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    """Format sweep results as a table.
+    
+    Args:
+        results: Output of run_sweep
+    
+    Returns:
+        Printable table
+    """
+    lines = [
+        f"{'offered/s':>9} {'jobs':>5} {'done/s':>7} {'p50 s':>6} {'p90 s':>6} {'p99 s':>6} "
+        f"{'wait p90':>8} {'errors':>7} {'cpu s/job':>9} {'peak RSS MB':>11}  status"
+    ]
+    for result in results:
+        latency = result["latency"]
+        status = "SATURATED" if result["saturated"] else "ok"
+        failures = {name: count for name, count in result["statuses"].items() if name != "ok"}
+        if failures:
+            status += " " + ", ".join(f"{name}={count}" for name, count in sorted(failures.items()))
+        lines.append(
+            f"{result['offered_rate']:>9.2f} {result['jobs']:>5} {result['throughput']:>7.2f} "
+            f"{_format_seconds(latency['p50']):>6} {_format_seconds(latency['p90']):>6} "
+            f"{_format_seconds(latency['p99']):>6} {_format_seconds(result['queue_wait_p90']):>8} "
+            f"{result['error_rate']:>7.1%} "
+            f"{result['cpu_seconds_per_job']:>9.2f} {result['peak_rss_mb']:>11.1f}  {status}"
+        )
+    
+    saturated = [result["offered_rate"] for result in results if result["saturated"]]
+    if saturated:
+        lines.append(f"Saturation at or below {min(saturated):.2f} jobs/s")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="End-to-end load generator for the ElasticPrinter backend")
+    parser.add_argument("--rates", default=",".join(str(r) for r in DEFAULT_RATES),
+                        help="Comma-separated offered arrival rates in jobs per second")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum backends running at once")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION,
+                        help="Seconds of arrivals per rate")
+    parser.add_argument("--max-jobs", type=int, help="Maximum jobs per rate")
+    parser.add_argument("--arrival", choices=["poisson", "uniform"], default="poisson",
+                        help="Inter-arrival time distribution")
+    parser.add_argument("--size-kb", type=float, default=DEFAULT_JOB_SIZE_KB,
+                        help="Size of the generated job file")
+    parser.add_argument("--input", help="Job file to send instead of a generated PDF")
+    parser.add_argument("--config", help="Backend config to test (cluster settings are replaced)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake cluster delay per request in seconds")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="Random extra delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake cluster requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of injected failures")
+    parser.add_argument("--job-timeout", type=float, default=DEFAULT_JOB_TIMEOUT,
+                        help="Seconds before a backend is killed")
+    parser.add_argument("--seed", type=int, help="Seed for arrival times")
+    parser.add_argument("--json", dest="json_path", help="Also write full results, including samples, to this file")
+    args = parser.parse_args()
+    
+    rates = [float(rate) for rate in args.rates.split(",") if rate]
+    results = run_sweep(
+        rates,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        job_size_kb=args.size_kb,
+        input_file=args.input,
+        base_config=args.config,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        arrival=args.arrival,
+        max_jobs=args.max_jobs,
+        job_timeout=args.job_timeout,
+        seed=args.seed
+    )
+    print(format_results(results))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
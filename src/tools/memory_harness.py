@@ -0,0 +1,348 @@
+"""Memory-ceiling regression harness for the ingest path.
+
+Runs process_print_job end-to-end against a local fake Elasticsearch for
+generated spool files of increasing size. Every job runs in a fresh child
+process so its peak RSS can be measured in isolation; tracemalloc peaks are
+recorded per stage through the stage listener hooks. Stages run one at a
+time so each peak belongs to its stage.
+
+A run fails when the peak memory growth of a job exceeds
+``max_ratio * input_size + allowance``. The default ratio is the target for
+the ingest path, which the current path does not meet yet; the regression
+test checks against the measured baseline instead.
+
+Usage:
+    python -m tools.memory_harness --sizes 1,16,256,1024
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import queue as queue_module
+import resource
+import sys
+import tempfile
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from tools.fake_elasticsearch import FakeElasticsearch
+
+MB = 1024 * 1024
+
+# Target peak memory growth per byte of input: the base64 encoding (4/3)
+# and one copy of the request body
+DEFAULT_MAX_RATIO = 2.5
+
+# Fixed allowance for interpreter, client and PDF parser overhead
+DEFAULT_ALLOWANCE_MB = 64
+
+DEFAULT_SIZES_MB = [1, 16, 256, 1024]
+
+# How often the parent checks whether a job's child process is still alive
+POLL_INTERVAL = 1.0
+
+
+def generate_spool_file(path: str, size_bytes: int, chunk_size: int = MB) -> None:
+    """Write a single-page PDF padded with an incompressible image stream.
+    
+    This resembles a scanned document: small structure, one huge binary
+    object. The file is written in chunks so generating 1 GB inputs does
+    not need 1 GB of memory.
+    
+    Args:
+        path: Output file path
+        size_bytes: Approximate total file size
+        chunk_size: Write chunk size
+    """
+    offsets = []
+    with open(path, 'wb') as f:
+        def write_object(body: bytes) -> None:
+            offsets.append(f.tell())
+            f.write(body)
+        
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        write_object(b"1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+        write_object(b"2 0 obj\n<< /Type /Pages /Kids [3 0 R] /Count 1 >>\nendobj\n")
+        write_object(
+            b"3 0 obj\n<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /XObject << /Im0 4 0 R >> >> >>\nendobj\n"
+        )
+        
+        stream_length = max(0, size_bytes - 512)
+        offsets.append(f.tell())
+        f.write(
+            b"4 0 obj\n<< /Type /XObject /Subtype /Image /Width 1 /Height 1 "
+            b"/ColorSpace /DeviceGray /BitsPerComponent 8 /Length %d >>\nstream\n" % stream_length
+        )
+        remaining = stream_length
+        while remaining > 0:
+            chunk = os.urandom(min(chunk_size, remaining))
+            f.write(chunk)
+            remaining -= len(chunk)
+        f.write(b"\nendstream\nendobj\n")
+        
+        xref_offset = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(
+            b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(offsets) + 1, xref_offset)
+        )
+
+
+def _max_rss_bytes() -> int:
+    """Peak RSS of the current process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _current_rss_bytes() -> int:
+    """Current RSS of the current process in bytes (falls back to peak RSS)."""
+    try:
+        with open(f"/proc/{os.getpid()}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return _max_rss_bytes()
+
+
+class TracemallocStageListener:
+    """Record the tracemalloc peak of each stage."""
+    
+    def __init__(self):
+        """Initialize listener."""
+        self.peaks: Dict[str, int] = {}
+    
+    def stage_started(self, name: str) -> None:
+        """Reset the peak so it covers this stage only."""
+        tracemalloc.reset_peak()
+    
+    def stage_finished(self, name: str, duration: float, error: Optional[BaseException]) -> None:
+        """Record the peak traced memory of the stage."""
+        _, peak = tracemalloc.get_traced_memory()
+        self.peaks[name] = max(self.peaks.get(name, 0), peak)
+
+
+def _measure_job(spool_path: str, config_path: str) -> Dict[str, Any]:
+    """Run one job in this (child) process and measure it.
+    
+    Args:
+        spool_path: Generated spool file
+        config_path: Config file pointing at the fake Elasticsearch
+    
+    Returns:
+        Measurement results
+    """
+    from main import process_print_job, spool_stdin
+    from utils.config_loader import ConfigLoader
+    from utils.stages import add_stage_listener
+    
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger("elasticprinter.memory_harness")
+    config = ConfigLoader(config_path)
+    
+    baseline_rss = _current_rss_bytes()
+    listener = TracemallocStageListener()
+    add_stage_listener(listener)
+    tracemalloc.start()
+    
+    # Feed the job through stdin handling exactly like the backend does
+    with open(spool_path, 'rb') as stream:
+        input_file = spool_stdin(stream)
+    try:
+        success = process_print_job(
+            input_file=input_file,
+            job_id="memory-harness",
+            user="harness",
+            title="Memory harness job",
+            copies=1,
+            config=config,
+            logger=logger
+        )
+    finally:
+        os.remove(input_file)
+        tracemalloc.stop()
+    
+    return {
+        "success": success,
+        "baseline_rss": baseline_rss,
+        "peak_rss": _max_rss_bytes(),
+        "stage_peaks": listener.peaks,
+    }
+
+
+def _child_entry(spool_path: str, config_path: str, queue) -> None:
+    """Child process entry point."""
+    try:
+        queue.put(_measure_job(spool_path, config_path))
+    except BaseException as e:
+        queue.put({"success": False, "error": f"{type(e).__name__}: {e}"})
+
+
+def collect_child_result(child, queue, poll_interval: float = POLL_INTERVAL) -> Dict[str, Any]:
+    """Wait for a child's result without hanging when the child dies.
+    
+    A child killed by the OOM killer never puts a result on the queue, so
+    the queue is polled only while the child is alive.
+    
+    Args:
+        child: Started child process
+        queue: Queue the child puts its result on
+        poll_interval: Seconds between liveness checks
+    
+    Returns:
+        The child's result, or a failed result if it died or exited nonzero
+    """
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=poll_interval)
+        except queue_module.Empty:
+            if not child.is_alive():
+                # The result may have been put just before the child exited
+                try:
+                    result = queue.get(timeout=poll_interval)
+                except queue_module.Empty:
+                    break
+    child.join()
+    
+    if child.exitcode:
+        if child.exitcode < 0:
+            error = f"killed by signal {-child.exitcode}, likely OOM"
+        else:
+            error = f"exited with status {child.exitcode}"
+        result = {**(result or {}), "success": False, "error": error}
+    elif result is None:
+        result = {"success": False, "error": "exited without a result"}
+    return result
+
+
+def write_harness_config(path: str, es_url: str, temp_dir: str) -> None:
+    """Write a config file pointing the backend at the fake cluster.
+    
+    Args:
+        path: Config file to write
+        es_url: Fake Elasticsearch URL
+        temp_dir: Working directory for PDFs
+    """
+    config = {
+        "elasticsearch": {
+            "host": es_url,
+            "index": "print-jobs",
+            "pipeline": "attachment",
+            "verify_certs": False,
+        },
+        "processing": {
+            "temp_dir": temp_dir,
+            "keep_pdfs": False,
+            "max_retries": 0,
+            "timeout": 600,
+            "circuit_breaker": {"enabled": False},
+            # tracemalloc peaks are process-wide; concurrent stages would share them
+            "stage_workers": 1,
+        },
+        "logging": {"level": "WARNING"},
+    }
+    with open(path, 'w') as f:
+        yaml.safe_dump(config, f)
+
+
+def run_harness(
+    sizes_mb: List[float],
+    max_ratio: float = DEFAULT_MAX_RATIO,
+    allowance_mb: float = DEFAULT_ALLOWANCE_MB,
+    work_dir: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Measure peak memory of the ingest path for each input size.
+    
+    Args:
+        sizes_mb: Spool file sizes in MB
+        max_ratio: Allowed peak memory growth per byte of input
+        allowance_mb: Fixed allowance added to the ceiling
+        work_dir: Directory for generated files (default: a temporary directory)
+    
+    Returns:
+        One result per size, with ``within_ceiling`` set
+    """
+    results = []
+    context = multiprocessing.get_context("spawn")
+    
+    with tempfile.TemporaryDirectory(dir=work_dir) as temp_dir:
+        with FakeElasticsearch(discard_bodies=True) as fake_es:
+            config_path = os.path.join(temp_dir, "config.yaml")
+            write_harness_config(config_path, fake_es.url, os.path.join(temp_dir, "pdfs"))
+            
+            for size_mb in sizes_mb:
+                size_bytes = int(size_mb * MB)
+                spool_path = os.path.join(temp_dir, f"spool-{size_mb}mb.pdf")
+                generate_spool_file(spool_path, size_bytes)
+                
+                queue = context.Queue()
+                child = context.Process(target=_child_entry, args=(spool_path, config_path, queue))
+                child.start()
+                result = collect_child_result(child, queue)
+                os.remove(spool_path)
+                
+                result["size_bytes"] = size_bytes
+                if "peak_rss" in result:
+                    growth = result["peak_rss"] - result["baseline_rss"]
+                    ceiling = max_ratio * size_bytes + allowance_mb * MB
+                    result["rss_growth"] = growth
+                    result["ceiling"] = ceiling
+                    result["ratio"] = growth / size_bytes if size_bytes else 0.0
+                    result["within_ceiling"] = result["success"] and growth <= ceiling
+                else:
+                    result["within_ceiling"] = False
+                results.append(result)
+    
+    return results
+
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    """Format harness results as a table.
+    
+    Args:
+        results: Output of run_harness
+    
+    Returns:
+        Printable table
+    """
+    lines = [f"{'input MB':>9} {'RSS growth MB':>14} {'ratio':>6} {'ceiling MB':>11}  stage peaks (MB)  status"]
+    for result in results:
+        if "rss_growth" not in result:
+            lines.append(f"{result['size_bytes'] / MB:>9.0f}  ERROR {result.get('error', '')}")
+            continue
+        stages = ", ".join(
+            f"{name}={peak / MB:.1f}" for name, peak in result["stage_peaks"].items()
+        )
+        status = "ok" if result["within_ceiling"] else "FAIL"
+        lines.append(
+            f"{result['size_bytes'] / MB:>9.0f} {result['rss_growth'] / MB:>14.1f} "
+            f"{result['ratio']:>6.2f} {result['ceiling'] / MB:>11.0f}  {stages}  {status}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Memory-ceiling harness for the ElasticPrinter ingest path")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES_MB),
+                        help="Comma-separated spool sizes in MB")
+    parser.add_argument("--max-ratio", type=float, default=DEFAULT_MAX_RATIO,
+                        help="Allowed peak memory growth per byte of input")
+    parser.add_argument("--allowance-mb", type=float, default=DEFAULT_ALLOWANCE_MB,
+                        help="Fixed allowance added to the ceiling")
+    parser.add_argument("--work-dir", help="Directory for generated spool files")
+    args = parser.parse_args()
+    
+    sizes = [float(size) for size in args.sizes.split(",") if size]
+    results = run_harness(sizes, args.max_ratio, args.allowance_mb, args.work_dir)
+    print(format_results(results))
+    return 0 if all(result["within_ceiling"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
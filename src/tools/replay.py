@@ -0,0 +1,351 @@
+"""Deterministic replay of captured print jobs.
+
+Re-runs sessions recorded by the backend's capture mode (see
+``utils.capture``) through ``process_print_job`` against a local fake
+Elasticsearch. Every job runs in a fresh child process with the captured
+CUPS arguments and environment, the stored spool file and, for jobs that
+arrived on stdin, the same stdin spooling as the backend. Jobs start at
+their original spacing divided by ``speed`` (0 starts them back to back),
+with at most ``concurrency`` running at once.
+
+The report compares per-stage times of the replay with the captured
+times. Cluster stages (connect, bootstrap, dedupe, index) run against the
+fake cluster, so compare them between replays rather than with the
+capture: write one replay with ``--json`` and pass it as ``--baseline`` to
+a replay of another version.
+
+Sessions whose spool file was recorded by hash only are skipped.
+
+Usage:
+    python -m tools.replay /var/lib/elasticprinter/capture --speed 10
+    python -m tools.replay capture/ --speed 0 --json v2.json --baseline v1.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from tools.fake_elasticsearch import FakeElasticsearch
+from tools.loadgen import write_loadgen_config
+from utils.capture import load_sessions
+
+DEFAULT_SPEED = 1.0
+DEFAULT_CONCURRENCY = 4
+DEFAULT_JOB_TIMEOUT = 300.0
+
+
+class StageTimer:
+    """Sum the duration of each stage."""
+    
+    def __init__(self):
+        """Initialize listener."""
+        self.seconds: Dict[str, float] = {}
+    
+    def stage_started(self, name: str) -> None:
+        """Stage listener hook (durations are recorded when a stage finishes)."""
+    
+    def stage_finished(self, name: str, duration: float, error: Optional[BaseException]) -> None:
+        """Add the stage's duration."""
+        self.seconds[name] = self.seconds.get(name, 0.0) + duration
+
+
+def captured_stage_seconds(session: Dict[str, Any]) -> Dict[str, float]:
+    """Per-stage seconds recorded in a captured session."""
+    seconds: Dict[str, float] = {}
+    for entry in session.get("stages") or []:
+        seconds[entry["name"]] = seconds.get(entry["name"], 0.0) + entry["seconds"]
+    return seconds
+
+
+def _replay_in_child(session: Dict[str, Any], config_path: str) -> Dict[str, Any]:
+    """Run one captured job in this (child) process."""
+    from main import process_print_job, spool_stdin
+    from utils.config_loader import ConfigLoader
+    from utils.stages import add_stage_listener
+    
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger("elasticprinter.replay")
+    config = ConfigLoader(config_path)
+    os.environ.update(session.get("environment") or {})
+    
+    job_id, user, title, copies = session["argv"][:4]
+    timer = StageTimer()
+    add_stage_listener(timer)
+    start = time.perf_counter()
+    
+    # Jobs without a file argument arrived on stdin
+    from_stdin = len(session["argv"]) < 6
+    if from_stdin:
+        with open(session["spool_path"], 'rb') as stream:
+            input_file = spool_stdin(stream)
+    else:
+        input_file = session["spool_path"]
+    try:
+        success = process_print_job(
+            input_file=input_file,
+            job_id=job_id,
+            user=user,
+            title=title,
+            copies=int(copies),
+            config=config,
+            logger=logger
+        )
+    finally:
+        if from_stdin:
+            os.remove(input_file)
+    
+    return {
+        "success": success,
+        "duration": time.perf_counter() - start,
+        "stages": timer.seconds,
+    }
+
+
+def _child_entry(session: Dict[str, Any], config_path: str, result_queue) -> None:
+    """Child process entry point."""
+    try:
+        result_queue.put(_replay_in_child(session, config_path))
+    except BaseException as e:
+        result_queue.put({"success": False, "error": f"{type(e).__name__}: {e}"})
+
+
+class Replayer:
+    """Replay captured sessions at their original or an accelerated rate."""
+    
+    def __init__(
+        self,
+        config_path: str,
+        speed: float = DEFAULT_SPEED,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        job_timeout: float = DEFAULT_JOB_TIMEOUT
+    ):
+        """Initialize replayer.
+        
+        Args:
+            config_path: Backend config pointing at the fake cluster
+            speed: Arrival speed-up (1 is the original rate, 0 no spacing)
+            concurrency: Maximum jobs running at once
+            job_timeout: Seconds before a job is killed
+        """
+        if speed < 0:
+            raise ValueError("speed must not be negative")
+        self.config_path = config_path
+        self.speed = speed
+        self.concurrency = max(1, concurrency)
+        self.job_timeout = job_timeout
+        self._context = multiprocessing.get_context("spawn")
+    
+    def _run_job(self, session: Dict[str, Any], due: float) -> Dict[str, Any]:
+        """Replay one session in a child process and time it."""
+        started = time.monotonic()
+        result_queue = self._context.Queue()
+        child = self._context.Process(target=_child_entry, args=(session, self.config_path, result_queue))
+        child.start()
+        try:
+            result = result_queue.get(timeout=self.job_timeout)
+        except queue.Empty:
+            child.terminate()
+            result = {"success": False, "error": f"timed out after {self.job_timeout}s"}
+        child.join()
+        
+        spool = session.get("spool") or {}
+        result.update({
+            "session": os.path.basename(session["path"]),
+            "job_id": session["argv"][0],
+            "size": spool.get("size"),
+            "captured_status": session.get("status"),
+            "captured_duration": session.get("duration"),
+            "captured_stages": captured_stage_seconds(session),
+            "start_lag": started - due,
+        })
+        return result
+    
+    def run(self, sessions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Replay sessions in capture order.
+        
+        Args:
+            sessions: Sessions from utils.capture.load_sessions
+        
+        Returns:
+            Summary with per-job results, skipped sessions and per-stage totals
+        """
+        replayable = [session for session in sessions if session.get("spool_path")]
+        skipped = [os.path.basename(session["path"]) for session in sessions if not session.get("spool_path")]
+        
+        futures = []
+        start = time.monotonic()
+        first = replayable[0].get("started", 0) if replayable else 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for session in replayable:
+                offset = session.get("started", first) - first
+                due = start + (offset / self.speed if self.speed else 0.0)
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(self._run_job, session, due))
+        jobs = [future.result() for future in futures]
+        elapsed = time.monotonic() - start
+        
+        return {
+            "speed": self.speed,
+            "concurrency": self.concurrency,
+            "elapsed": elapsed,
+            "jobs": jobs,
+            "skipped": skipped,
+            "failed": sum(1 for job in jobs if not job["success"]),
+            "stages": stage_totals(jobs),
+        }
+
+
+def stage_totals(jobs: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Sum captured and replayed seconds per stage over all jobs.
+    
+    Args:
+        jobs: Per-job results of Replayer.run
+    
+    Returns:
+        stage -> {"captured": seconds, "replayed": seconds}
+    """
+    totals: Dict[str, Dict[str, float]] = {}
+    for job in jobs:
+        for key, stages in (("captured", job.get("captured_stages")), ("replayed", job.get("stages"))):
+            for name, seconds in (stages or {}).items():
+                entry = totals.setdefault(name, {"captured": 0.0, "replayed": 0.0})
+                entry[key] += seconds
+    return totals
+
+
+def replay_directory(
+    directory: str,
+    speed: float = DEFAULT_SPEED,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    latency: float = 0.0,
+    base_config: Optional[str] = None,
+    job_timeout: float = DEFAULT_JOB_TIMEOUT,
+    limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """Replay the sessions of a capture directory against a fake cluster.
+    
+    Args:
+        directory: Capture directory
+        speed: Arrival speed-up (1 is the original rate, 0 no spacing)
+        concurrency: Maximum jobs running at once
+        latency: Fake cluster delay per request in seconds
+        base_config: Backend config to replay with (cluster settings are replaced)
+        job_timeout: Seconds before a job is killed
+        limit: Replay only the first ``limit`` sessions
+    
+    Returns:
+        Summary (see Replayer.run)
+    """
+    sessions = load_sessions(directory)
+    if limit is not None:
+        sessions = sessions[:limit]
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with FakeElasticsearch(latency=latency, discard_bodies=True) as fake_es:
+            config_path = os.path.join(temp_dir, "config.yaml")
+            write_loadgen_config(config_path, fake_es.url, os.path.join(temp_dir, "pdfs"), base_config)
+            result = Replayer(config_path, speed, concurrency, job_timeout).run(sessions)
+            result["requests"] = fake_es.request_count
+    return result
+
+
+def _format_ratio(value: float, reference: Optional[float]) -> str:
+    return f"{value / reference:.2f}x" if reference else "-"
+
+
+def format_results(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> str:
+    """Format a replay as a per-job table and a per-stage comparison.
+    
+    Args:
+        result: Output of replay_directory
+        baseline: Earlier replay to compare with (e.g. of another version)
+    
+    Returns:
+        Printable report
+    """
+    lines = [f"{'session':<40} {'KB':>9} {'captured s':>10} {'replay s':>9} {'lag s':>6}  status"]
+    for job in result["jobs"]:
+        size = "-" if job["size"] is None else f"{job['size'] / 1024:.0f}"
+        captured = job["captured_duration"]
+        status = "ok" if job["success"] else f"FAILED {job.get('error', '')}".rstrip()
+        lines.append(
+            f"{job['session']:<40} {size:>9} {'-' if captured is None else f'{captured:.2f}':>10} "
+            f"{job.get('duration', 0.0):>9.2f} {job['start_lag']:>6.2f}  {status}"
+        )
+    
+    baseline_stages = (baseline or {}).get("stages") or {}
+    lines.append("")
+    header = f"{'stage':<12} {'captured s':>10} {'replay s':>9} {'vs captured':>11}"
+    if baseline:
+        header += f" {'baseline s':>10} {'vs baseline':>11}"
+    lines.append(header)
+    for name, totals in result["stages"].items():
+        line = (
+            f"{name:<12} {totals['captured']:>10.2f} {totals['replayed']:>9.2f} "
+            f"{_format_ratio(totals['replayed'], totals['captured']):>11}"
+        )
+        if baseline:
+            previous = (baseline_stages.get(name) or {}).get("replayed")
+            line += (
+                f" {'-' if previous is None else f'{previous:.2f}':>10} "
+                f"{_format_ratio(totals['replayed'], previous):>11}"
+            )
+        lines.append(line)
+    
+    lines.append("")
+    lines.append(
+        f"{len(result['jobs'])} jobs replayed in {result['elapsed']:.2f}s at speed {result['speed']:g}, "
+        f"{result['failed']} failed, {len(result['skipped'])} skipped (spool not stored)"
+    )
+    return "\n".join(lines)
+
+
+def main() -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Replay captured ElasticPrinter jobs against a fake cluster")
+    parser.add_argument("directory", help="Capture directory (processing.capture.directory)")
+    parser.add_argument("--speed", type=float, default=DEFAULT_SPEED,
+                        help="Arrival speed-up: 1 is the original rate, 0 starts jobs back to back")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum jobs running at once")
+    parser.add_argument("--limit", type=int, help="Replay only the first N sessions")
+    parser.add_argument("--config", help="Backend config to replay with (cluster settings are replaced)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake cluster delay per request in seconds")
+    parser.add_argument("--job-timeout", type=float, default=DEFAULT_JOB_TIMEOUT,
+                        help="Seconds before a job is killed")
+    parser.add_argument("--baseline", help="Replay results (--json) to compare with")
+    parser.add_argument("--json", dest="json_path", help="Also write full results to this file")
+    args = parser.parse_args()
+    
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    
+    result = replay_directory(
+        args.directory,
+        speed=args.speed,
+        concurrency=args.concurrency,
+        latency=args.latency,
+        base_config=args.config,
+        job_timeout=args.job_timeout,
+        limit=args.limit
+    )
+    print(format_results(result, baseline))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0 if result["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
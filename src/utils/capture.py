@@ -0,0 +1,304 @@
+"""Opt-in capture of real print jobs for replay.
+
+Enabled with the ``processing.capture`` config section or the
+``ELASTICPRINTER_CAPTURE`` environment variable ("1" or "0"), read for
+every job like the profiling switch. Each captured backend run gets a
+session directory ``<directory>/<timestamp>-job-<job id>-<pid>/`` with
+
+    session.json  CUPS arguments, CUPS environment, spool file size and
+                  SHA-256, per-stage timings, backend status and duration
+    spool         the spool file itself, unless larger than
+                  ``max_spool_mb`` or ``store_spool`` is off
+
+The directory is rotated to the newest ``max_sessions`` sessions and
+``max_mb`` of spool files. Captured jobs contain user names, titles and
+document contents; keep the directory private. Replay sessions with
+``python -m tools.replay``.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from utils.logger import get_logger
+from utils.stages import add_stage_listener, remove_stage_listener
+
+logger = get_logger(__name__)
+
+CAPTURE_ENV = "ELASTICPRINTER_CAPTURE"
+CAPTURE_DIR_ENV = "ELASTICPRINTER_CAPTURE_DIR"
+
+DEFAULT_CAPTURE_DIR = "/var/lib/elasticprinter/capture"
+DEFAULT_MAX_SESSIONS = 200
+DEFAULT_MAX_MB = 1024
+DEFAULT_MAX_SPOOL_MB = 100
+
+SESSION_FILE = "session.json"
+SPOOL_FILE = "spool"
+
+# Environment CUPS sets for backends that affects how a job is processed.
+# AUTH_INFO_* and other credentials are never recorded.
+CAPTURED_ENV = (
+    "CHARSET",
+    "CLASS",
+    "CONTENT_TYPE",
+    "DEVICE_URI",
+    "FINAL_CONTENT_TYPE",
+    "HOSTNAME",
+    "LANG",
+    "PPD",
+    "PRINTER",
+    "PRINTER_INFO",
+    "PRINTER_LOCATION",
+)
+CAPTURED_ENV_PREFIX = "CUPS_"
+
+MB = 1024 * 1024
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def captured_environment(environ: Mapping[str, str]) -> Dict[str, str]:
+    """The part of the environment recorded with a session.
+    
+    Args:
+        environ: Backend environment
+    
+    Returns:
+        CUPS variables in CAPTURED_ENV or starting with ``CUPS_``
+    """
+    return {
+        name: value for name, value in sorted(environ.items())
+        if name in CAPTURED_ENV or name.startswith(CAPTURED_ENV_PREFIX)
+    }
+
+
+def file_sha256(path: str, chunk_size: int = MB) -> str:
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CaptureSession:
+    """One captured backend run; records stage timings while active."""
+    
+    def __init__(self, capture: "JobCapture", path: str, argv: Sequence[str], environ: Mapping[str, str]):
+        """Initialize session (use JobCapture.start).
+        
+        Args:
+            capture: Owning JobCapture
+            path: Session directory
+            argv: Backend arguments (``sys.argv``)
+            environ: Backend environment
+        """
+        self.capture = capture
+        self.path = path
+        self.record: Dict[str, Any] = {
+            "version": 1,
+            "argv": list(argv[1:]),
+            "environment": captured_environment(environ),
+            "started": time.time(),
+            "spool": None,
+            "stages": [],
+        }
+        self._start = time.perf_counter()
+    
+    def stage_started(self, name: str) -> None:
+        """Stage listener hook (timings are recorded when a stage finishes)."""
+    
+    def stage_finished(self, name: str, duration: float, error: Optional[BaseException]) -> None:
+        """Record the duration of a finished stage."""
+        entry = {"name": name, "seconds": round(duration, 6)}
+        if error is not None:
+            entry["error"] = type(error).__name__
+        self.record["stages"].append(entry)
+    
+    def add_spool(self, spool_path: str) -> None:
+        """Record the spool file (hash always, contents if within limits).
+        
+        Call before the job runs; stdin spool files are deleted afterwards.
+        
+        Args:
+            spool_path: Job file passed to the pipeline
+        """
+        try:
+            size = os.path.getsize(spool_path)
+            spool = {"size": size, "sha256": file_sha256(spool_path), "stored": False}
+            if self.capture.store_spool and size <= self.capture.max_spool_bytes:
+                target = os.path.join(self.path, SPOOL_FILE)
+                try:
+                    # Spool files are temporary; a hard link avoids copying
+                    os.link(spool_path, target)
+                except OSError:
+                    shutil.copyfile(spool_path, target)
+                spool["stored"] = True
+            self.record["spool"] = spool
+        except OSError as e:
+            logger.warning(f"Failed to capture spool file {spool_path}: {e}")
+    
+    def finish(self, status: int, error: Optional[BaseException] = None) -> None:
+        """Write session.json, stop recording and rotate the capture directory.
+        
+        Args:
+            status: CUPS backend exit status
+            error: Exception that failed the job, if any
+        """
+        remove_stage_listener(self)
+        self.record["duration"] = round(time.perf_counter() - self._start, 6)
+        self.record["status"] = status
+        if error is not None:
+            self.record["error"] = f"{type(error).__name__}: {error}"
+        try:
+            tmp_path = os.path.join(self.path, SESSION_FILE + ".tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(self.record, f, indent=2)
+            os.replace(tmp_path, os.path.join(self.path, SESSION_FILE))
+            logger.info(f"Captured job session in {self.path}")
+            self.capture.rotate()
+        except OSError as e:
+            logger.warning(f"Failed to write capture session {self.path}: {e}")
+
+
+class JobCapture:
+    """Capture backend runs into a bounded directory."""
+    
+    def __init__(
+        self,
+        directory: str = DEFAULT_CAPTURE_DIR,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        max_mb: float = DEFAULT_MAX_MB,
+        max_spool_mb: float = DEFAULT_MAX_SPOOL_MB,
+        store_spool: bool = True
+    ):
+        """Initialize capture.
+        
+        Args:
+            directory: Where sessions are written
+            max_sessions: Maximum sessions kept in ``directory``
+            max_mb: Maximum size of all sessions in MB
+            max_spool_mb: Larger spool files are recorded by hash only
+            store_spool: Store spool files (otherwise hashes only)
+        """
+        self.directory = directory
+        self.max_sessions = max_sessions
+        self.max_bytes = int(max_mb * MB)
+        self.max_spool_bytes = int(max_spool_mb * MB)
+        self.store_spool = store_spool
+    
+    def start(self, argv: Sequence[str], environ: Mapping[str, str]) -> Optional[CaptureSession]:
+        """Start capturing a backend run.
+        
+        Args:
+            argv: Backend arguments (``sys.argv``)
+            environ: Backend environment
+        
+        Returns:
+            Active session, or None if the session directory cannot be created
+        """
+        job_id = argv[1] if len(argv) > 1 else "unknown"
+        name = f"{time.strftime('%Y%m%d_%H%M%S')}-job-{_UNSAFE_CHARS.sub('_', job_id)}-{os.getpid()}"
+        path = os.path.join(self.directory, name)
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Failed to create capture session {path}: {e}")
+            return None
+        session = CaptureSession(self, path, argv, environ)
+        add_stage_listener(session)
+        return session
+    
+    def rotate(self) -> None:
+        """Delete the oldest sessions beyond ``max_sessions`` or ``max_mb``."""
+        sessions = []
+        for entry in _scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            try:
+                size = sum(child.stat().st_size for child in _scandir(entry.path) if child.is_file())
+                sessions.append((entry.stat().st_mtime, entry.name, entry.path, size))
+            except OSError:
+                # Removed by a concurrent backend process
+                continue
+        sessions.sort(reverse=True)
+        
+        total = 0
+        for position, (_, _, path, size) in enumerate(sessions):
+            total += size
+            if position >= self.max_sessions or (position > 0 and total > self.max_bytes):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def _scandir(path: str) -> List[os.DirEntry]:
+    try:
+        with os.scandir(path) as entries:
+            return list(entries)
+    except OSError:
+        return []
+
+
+def capture_from_config(config, environ=os.environ) -> Optional[JobCapture]:
+    """Build the job capture from config and environment.
+    
+    Args:
+        config: Configuration loader
+        environ: Environment variables
+    
+    Returns:
+        JobCapture, or None if capture is disabled
+    """
+    settings = config.processing.get('capture') or {}
+    enabled = settings.get('enabled', False)
+    
+    env_value = environ.get(CAPTURE_ENV, "").strip().lower()
+    if env_value in ("1", "true", "yes", "on"):
+        enabled = True
+    elif env_value in ("0", "false", "no", "off"):
+        enabled = False
+    elif env_value:
+        logger.warning(f"Ignoring invalid {CAPTURE_ENV}={env_value!r}")
+    
+    if not enabled:
+        return None
+    
+    return JobCapture(
+        directory=environ.get(CAPTURE_DIR_ENV) or settings.get('directory', DEFAULT_CAPTURE_DIR),
+        max_sessions=settings.get('max_sessions', DEFAULT_MAX_SESSIONS),
+        max_mb=settings.get('max_mb', DEFAULT_MAX_MB),
+        max_spool_mb=settings.get('max_spool_mb', DEFAULT_MAX_SPOOL_MB),
+        store_spool=settings.get('store_spool', True)
+    )
+
+
+def load_sessions(directory: str) -> List[Dict[str, Any]]:
+    """Read the finished sessions in a capture directory.
+    
+    Args:
+        directory: Capture directory
+    
+    Returns:
+        Session records, oldest first, with ``path`` (session directory) and
+        ``spool_path`` (stored spool file or None) added
+    """
+    sessions = []
+    for entry in _scandir(directory):
+        session_file = os.path.join(entry.path, SESSION_FILE)
+        if not entry.is_dir() or not os.path.exists(session_file):
+            # Not a session, or a backend that is still running or crashed
+            continue
+        try:
+            with open(session_file) as f:
+                record = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable capture session {entry.path}: {e}")
+            continue
+        spool_path = os.path.join(entry.path, SPOOL_FILE)
+        record["path"] = entry.path
+        record["spool_path"] = spool_path if os.path.exists(spool_path) else None
+        sessions.append(record)
+    sessions.sort(key=lambda record: record.get("started", 0))
+    return sessions
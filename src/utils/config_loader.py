@@ -3,6 +3,9 @@ import os
 import yaml
 from typing import Dict, Any
 
+# Environment variable naming the config file to use instead of the default locations
+CONFIG_ENV = "ELASTICPRINTER_CONFIG"
+
 
 class ConfigLoader:
     """Load and manage configuration settings."""
@@ -11,8 +14,12 @@ class ConfigLoader:
         """Initialize config loader.
         
         Args:
-            config_path: Path to config file. If None, uses default location.
+            config_path: Path to config file. If None, uses $ELASTICPRINTER_CONFIG
+                         or the default locations.
         """
+        if config_path is None:
+            config_path = os.environ.get(CONFIG_ENV) or None
+        
         if config_path is None:
             # Look for config in multiple locations
             possible_paths = [
@@ -0,0 +1,29 @@
+"""CUPS backend exit status codes.
+
+Values match ``cups/backend.h``. CUPS decides what to do with the job and
+the queue based on the backend's exit status.
+"""
+
+# Job completed successfully
+CUPS_BACKEND_OK = 0
+
+# Job failed; CUPS applies the printer's error policy
+CUPS_BACKEND_FAILED = 1
+
+# Job failed due to authentication
+CUPS_BACKEND_AUTH_REQUIRED = 2
+
+# Hold the job
+CUPS_BACKEND_HOLD = 3
+
+# Stop the queue, keeping the job
+CUPS_BACKEND_STOP = 4
+
+# Abort (cancel) the job
+CUPS_BACKEND_CANCEL = 5
+
+# Retry the job later
+CUPS_BACKEND_RETRY = 6
+
+# Retry the job immediately
+CUPS_BACKEND_RETRY_CURRENT = 7
@@ -0,0 +1,156 @@
+"""Opt-in per-job profiling.
+
+Enabled with the ``processing.profiling`` config section or the
+``ELASTICPRINTER_PROFILE`` environment variable ("1" profiles every job,
+a number between 0 and 1 is the sampling rate, "0" disables profiling).
+Both are read for every job, so profiling can be switched on for the
+CUPS backend without restarting anything.
+
+A sampled job is run under cProfile and its stats are written to
+``<directory>/job-<job id>-<timestamp>-<pid>.prof`` (open with
+``python -m pstats`` or snakeviz). With ``slow_threshold`` set, every job is profiled
+and jobs slower than the threshold keep their profile even when they were
+not sampled. The directory is rotated to the newest ``max_files`` profiles.
+"""
+import cProfile
+import glob
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+PROFILE_ENV = "ELASTICPRINTER_PROFILE"
+PROFILE_DIR_ENV = "ELASTICPRINTER_PROFILE_DIR"
+
+DEFAULT_PROFILE_DIR = "/tmp/elasticprinter/profiles"
+DEFAULT_MAX_FILES = 50
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class JobProfiler:
+    """Profile jobs with cProfile and keep a bounded number of profiles."""
+    
+    def __init__(
+        self,
+        directory: str = DEFAULT_PROFILE_DIR,
+        sample_rate: float = 1.0,
+        slow_threshold: Optional[float] = None,
+        max_files: int = DEFAULT_MAX_FILES,
+        rng: Callable[[], float] = random.random
+    ):
+        """Initialize profiler.
+        
+        Args:
+            directory: Where profiles are written
+            sample_rate: Fraction of jobs whose profile is always kept
+            slow_threshold: Keep profiles of jobs taking longer (seconds)
+            max_files: Maximum profiles kept in ``directory``
+            rng: Random source for sampling (for tests)
+        """
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.max_files = max_files
+        self.rng = rng
+    
+    @contextmanager
+    def profile(self, job_id: str) -> Iterator[bool]:
+        """Profile the enclosed job.
+        
+        Args:
+            job_id: CUPS job ID (used in the file name)
+        
+        Yields:
+            Whether the job runs under cProfile (sampled or slow_threshold set)
+        """
+        sampled = self.rng() < self.sample_rate
+        if not sampled and self.slow_threshold is None:
+            yield False
+            return
+        
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield True
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - start
+            slow = self.slow_threshold is not None and duration >= self.slow_threshold
+            if sampled or slow:
+                self._save(profiler, job_id, duration, slow)
+    
+    def _save(self, profiler: cProfile.Profile, job_id: str, duration: float, slow: bool) -> None:
+        """Write a profile and rotate the directory (never fails the job)."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # The pid keeps profiles of a job retried within the same second apart
+            name = f"job-{_UNSAFE_CHARS.sub('_', str(job_id))}-{time.strftime('%Y%m%d_%H%M%S')}-{os.getpid()}.prof"
+            path = os.path.join(self.directory, name)
+            profiler.dump_stats(path)
+            reason = f"slower than {self.slow_threshold}s" if slow else "sampled"
+            logger.info(f"Saved profile of job {job_id} ({duration:.2f}s, {reason}) to {path}")
+            self.rotate()
+        except OSError as e:
+            logger.warning(f"Failed to save profile of job {job_id}: {e}")
+    
+    def rotate(self) -> None:
+        """Delete the oldest profiles beyond ``max_files``."""
+        profiles = []
+        for path in glob.glob(os.path.join(self.directory, "job-*.prof")):
+            try:
+                profiles.append((os.path.getmtime(path), path))
+            except OSError:
+                # Removed by a concurrent backend process
+                continue
+        profiles.sort(reverse=True)
+        for _, path in profiles[self.max_files:]:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+
+def profiler_from_config(config, environ=os.environ) -> Optional[JobProfiler]:
+    """Build the job profiler from config and environment.
+    
+    Args:
+        config: Configuration loader
+        environ: Environment variables
+    
+    Returns:
+        JobProfiler, or None if profiling is disabled
+    """
+    settings = config.processing.get('profiling') or {}
+    enabled = settings.get('enabled', False)
+    sample_rate = float(settings.get('sample_rate', 1.0))
+    
+    env_value = environ.get(PROFILE_ENV, "").strip().lower()
+    if env_value:
+        if env_value in ("1", "true", "yes", "on"):
+            enabled, sample_rate = True, 1.0
+        elif env_value in ("0", "false", "no", "off"):
+            enabled = False
+        else:
+            try:
+                sample_rate = float(env_value)
+                enabled = sample_rate > 0
+            except ValueError:
+                logger.warning(f"Ignoring invalid {PROFILE_ENV}={env_value!r}")
+    
+    if not enabled:
+        return None
+    
+    return JobProfiler(
+        directory=environ.get(PROFILE_DIR_ENV) or settings.get('directory', DEFAULT_PROFILE_DIR),
+        sample_rate=sample_rate,
+        slow_threshold=settings.get('slow_threshold'),
+        max_files=settings.get('max_files', DEFAULT_MAX_FILES)
+    )
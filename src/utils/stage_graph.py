@@ -0,0 +1,136 @@
+"""Run job stages concurrently along their dependencies.
+
+A print job is a small graph: the PDF work (analysis, conversion,
+metadata) does not depend on the cluster connection and bootstrap checks,
+so both branches can run at the same time and the job takes about as long
+as its longest branch instead of the sum of all stages.
+
+Every stage is a function taking the results of the stages finished so
+far. A stage starts once all stages it runs ``after`` have succeeded. When
+a stage fails, the stages depending on it are skipped, and so are all
+other stages not started yet, since the run will fail anyway; only stages
+added with ``keep`` (e.g. the local mirror write while the cluster is
+down) and the stages they need still run. Threads cannot be interrupted,
+so ``run`` waits for every started stage before it returns or raises and
+the caller can clean up the results of the stages that did finish.
+"""
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Sequence, Set, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_STAGE_WORKERS = 3
+
+Stage = Callable[[Dict[str, Any]], Any]
+
+
+class StageGraph:
+    """Stages with dependencies, run on a small thread pool."""
+    
+    def __init__(self):
+        """Initialize an empty graph."""
+        self._stages: Dict[str, Tuple[Stage, Tuple[str, ...]]] = {}
+        self._kept: Set[str] = set()
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self.skipped: List[str] = []
+    
+    def add(self, name: str, func: Stage, after: Sequence[str] = (), keep: bool = False) -> None:
+        """Add a stage.
+        
+        Stages can only depend on stages added before them, which keeps
+        the graph acyclic and makes insertion order a valid serial order.
+        
+        Args:
+            name: Stage name (key of its result)
+            func: Called with the results of finished stages
+            after: Stages that must succeed before this one starts
+            keep: Still start this stage (and the stages it needs) after
+                  an unrelated stage failed
+        
+        Raises:
+            ValueError: For duplicate names or unknown dependencies
+        """
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage {name!r}")
+        unknown = [dependency for dependency in after if dependency not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage {name!r} depends on unknown stages {unknown}")
+        self._stages[name] = (func, tuple(after))
+        if keep:
+            # Everything a kept stage needs is kept too
+            needed = [name]
+            while needed:
+                stage_name = needed.pop()
+                if stage_name not in self._kept:
+                    self._kept.add(stage_name)
+                    needed.extend(self._stages[stage_name][1])
+    
+    def run(self, max_workers: int = DEFAULT_STAGE_WORKERS) -> Dict[str, Any]:
+        """Run all stages.
+        
+        Args:
+            max_workers: Stages running at once; 1 runs them serially in
+                         the calling thread (e.g. under cProfile)
+        
+        Returns:
+            Stage name -> result
+        
+        Raises:
+            Exception: The error of the first stage that failed
+        """
+        self.results = {}
+        self.errors = {}
+        self.skipped = []
+        failures: List[str] = []
+        
+        if max_workers <= 1:
+            for name in self._stages:
+                if self._blocked(name, failures):
+                    continue
+                try:
+                    self.results[name] = self._stages[name][0](self.results)
+                except Exception as e:
+                    self.errors[name] = e
+                    failures.append(name)
+        else:
+            pending = list(self._stages)
+            running: Dict[Future, str] = {}
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage") as pool:
+                while pending or running:
+                    for name in list(pending):
+                        if self._blocked(name, failures):
+                            pending.remove(name)
+                        elif len(running) < max_workers and all(
+                            dependency in self.results for dependency in self._stages[name][1]
+                        ):
+                            pending.remove(name)
+                            running[pool.submit(self._stages[name][0], dict(self.results))] = name
+                    if not running:
+                        break
+                    
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        try:
+                            self.results[name] = future.result()
+                        except Exception as e:
+                            self.errors[name] = e
+                            failures.append(name)
+        
+        if failures:
+            if self.skipped:
+                logger.debug(f"Skipped stages {', '.join(self.skipped)} after {failures[0]} failed")
+            raise self.errors[failures[0]]
+        return self.results
+    
+    def _blocked(self, name: str, failures: List[str]) -> bool:
+        """Skip a stage whose dependencies failed or were skipped, or that is not needed anymore."""
+        if (failures and name not in self._kept) or any(
+            dependency in self.errors or dependency in self.skipped for dependency in self._stages[name][1]
+        ):
+            self.skipped.append(name)
+            return True
+        return False
@@ -0,0 +1,64 @@
+"""Stage instrumentation for print job processing.
+
+The job pipeline marks its stages (stdin spooling, conversion, metadata
+extraction, indexing, ...) with the ``stage`` context manager. Tools such
+as the memory harness register listeners to measure each stage without
+the pipeline knowing about them.
+
+A listener is any object with ``stage_started(name)`` and
+``stage_finished(name, duration, error)`` methods.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional
+
+_listeners: List[Any] = []
+_lock = threading.Lock()
+
+
+def add_stage_listener(listener: Any) -> None:
+    """Register a listener for stage events.
+    
+    Args:
+        listener: Object with stage_started/stage_finished methods
+    """
+    with _lock:
+        _listeners.append(listener)
+
+
+def remove_stage_listener(listener: Any) -> None:
+    """Unregister a listener.
+    
+    Args:
+        listener: Previously registered listener
+    """
+    with _lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Mark a stage of job processing.
+    
+    Args:
+        name: Stage name (e.g. "convert", "metadata", "index")
+    """
+    with _lock:
+        listeners = list(_listeners)
+    
+    for listener in listeners:
+        listener.stage_started(name)
+    
+    start = time.perf_counter()
+    error: Optional[BaseException] = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        for listener in listeners:
+            listener.stage_finished(name, duration, error)
@@ -0,0 +1,90 @@
+"""Tests for single-pass job analysis."""
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.converter import artifact as artifact_module
+from src.converter.artifact import JobArtifact, detect_format
+from src.converter.metadata_extractor import MetadataExtractor
+from src.converter.pdf_generator import PDFGenerator
+from src.tools.memory_harness import generate_spool_file
+
+
+class TestJobArtifact(unittest.TestCase):
+    """Test JobArtifact class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "job.pdf")
+        generate_spool_file(self.pdf_path, 100000)
+        with open(self.pdf_path, "rb") as f:
+            self.content = f.read()
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_single_pass_results(self):
+        """Test size, hash, format and base64 computed in chunks."""
+        with patch.object(artifact_module, "ANALYSIS_CHUNK_SIZE", 3 * 1000), JobArtifact.load(self.pdf_path) as artifact:
+            self.assertEqual(artifact.size, len(self.content))
+            self.assertEqual(artifact.sha256, hashlib.sha256(self.content).hexdigest())
+            self.assertEqual(artifact.format, "pdf")
+            self.assertEqual(artifact.base64, base64.b64encode(self.content).decode("ascii"))
+            self.assertEqual(artifact.page_count, 1)
+    
+    def test_base64_built_on_demand(self):
+        """Test that the encoding is only held once it is used (e.g. not for slimmed-away originals)."""
+        with JobArtifact.load(self.pdf_path) as artifact:
+            self.assertIsNone(artifact._base64)
+            encoded = artifact.base64
+            self.assertIs(artifact.base64, encoded)
+        self.assertEqual(artifact.base64, "")
+    
+    def test_empty_file(self):
+        """Test that empty files can be analyzed."""
+        path = os.path.join(self.temp_dir, "empty.ps")
+        open(path, "wb").close()
+        
+        with JobArtifact.load(path) as artifact:
+            self.assertEqual(artifact.size, 0)
+            self.assertEqual(artifact.base64, "")
+            self.assertEqual(artifact.format, "unknown")
+            self.assertIsNone(artifact.pdf_reader())
+    
+    def test_detect_format(self):
+        """Test format signatures."""
+        self.assertEqual(detect_format(b"%PDF-1.7\n"), "pdf")
+        self.assertEqual(detect_format(b"%!PS-Adobe-3.0\n"), "postscript")
+        self.assertEqual(detect_format(b"\x1b%-12345X@PJL"), "pjl")
+        self.assertEqual(detect_format(b"GIF89a"), "unknown")
+    
+    def test_stages_do_not_reread_file(self):
+        """Test that conversion, metadata extraction and encoding use the artifact."""
+        artifact = JobArtifact.load(self.pdf_path)
+        generator = PDFGenerator(temp_dir=self.temp_dir)
+        
+        with patch("builtins.open", wraps=open) as mock_open:
+            output = generator.convert_to_pdf(self.pdf_path, job_id="1", user="u", artifact=artifact)
+            metadata = MetadataExtractor.extract_from_pdf(output, artifact=artifact)
+        
+        opened = [call.args[0] for call in mock_open.call_args_list]
+        self.assertNotIn(self.pdf_path, opened)
+        self.assertEqual(opened, [output])
+        
+        with open(output, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(metadata["file_size"], len(self.content))
+        self.assertEqual(metadata["page_count"], 1)
+        self.assertEqual(metadata["content_hash"], artifact.sha256)
+        self.assertEqual(metadata["format"], "pdf")
+        artifact.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
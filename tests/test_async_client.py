@@ -0,0 +1,153 @@
+"""Tests for the asynchronous Elasticsearch client."""
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.converter.artifact import JobArtifact
+from src.elastic.async_client import AsyncElasticClient
+from src.job_runner import process_print_job_async
+from src.mirror.local_mirror import LocalMirror
+from tests.helpers import article, write_text_pdf
+
+
+def make_async_es():
+    """Build a mock AsyncElasticsearch instance."""
+    instance = MagicMock()
+    instance.info = AsyncMock(return_value={"cluster_name": "test", "version": {"number": "8.0.0"}})
+    instance.index = AsyncMock(return_value={"_id": "doc-1", "result": "created"})
+    instance.search = AsyncMock(return_value={"hits": {"hits": []}})
+    instance.close = AsyncMock()
+    instance.indices.exists = AsyncMock(return_value=True)
+    instance.ingest.get_pipeline = AsyncMock(return_value={"attachment": {}})
+    instance.options.return_value = instance
+    return instance
+
+
+class TestAsyncElasticClient(unittest.IsolatedAsyncioTestCase):
+    """Test AsyncElasticClient class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "job.pdf")
+        with open(self.pdf_path, "wb") as f:
+            f.write(b"%PDF-1.4 test")
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    @patch('src.elastic.async_client.AsyncElasticsearch')
+    async def test_context_manager_connects_and_closes(self, mock_es):
+        """Test that entering the client tests the connection."""
+        instance = make_async_es()
+        mock_es.return_value = instance
+        
+        async with AsyncElasticClient(host="https://localhost:9200", api_key="x" * 30) as client:
+            self.assertEqual(client.index, "print-jobs")
+        
+        instance.info.assert_awaited_once()
+        instance.close.assert_awaited_once()
+    
+    @patch('src.elastic.async_client.AsyncElasticsearch')
+    async def test_index_pdf_sends_encoded_document(self, mock_es):
+        """Test that index_pdf encodes the PDF and uses the pipeline."""
+        instance = make_async_es()
+        mock_es.return_value = instance
+        client = AsyncElasticClient(host="https://localhost:9200")
+        
+        response = await client.index_pdf(self.pdf_path, {"print_job": {"user": "alice"}}, doc_id="doc-1")
+        
+        self.assertEqual(response["_id"], "doc-1")
+        kwargs = instance.index.await_args.kwargs
+        self.assertEqual(kwargs["pipeline"], "attachment")
+        self.assertEqual(kwargs["document"]["data"], "JVBERi0xLjQgdGVzdA==")
+        self.assertEqual(kwargs["document"]["print_job"]["user"], "alice")
+    
+    @patch('src.elastic.async_client.AsyncElasticsearch')
+    async def test_index_pdf_encodes_artifact_off_the_loop(self, mock_es):
+        """Test that the artifact's base64 is built in the executor, not on the event loop."""
+        instance = make_async_es()
+        mock_es.return_value = instance
+        client = AsyncElasticClient(host="https://localhost:9200")
+        artifact = JobArtifact.load(self.pdf_path)
+        encode = JobArtifact.base64.fget
+        threads = []
+        
+        def recording_encode(job_artifact):
+            threads.append(threading.get_ident())
+            return encode(job_artifact)
+        
+        try:
+            with patch.object(JobArtifact, "base64", property(recording_encode)):
+                await client.index_pdf(self.pdf_path, {}, doc_id="doc-1", artifact=artifact)
+        finally:
+            artifact.close()
+        
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+        self.assertEqual(instance.index.await_args.kwargs["document"]["data"], "JVBERi0xLjQgdGVzdA==")
+    
+    @patch('src.elastic.async_client.AsyncElasticsearch')
+    async def test_search_passes_query(self, mock_es):
+        """Test that search forwards the query and size."""
+        instance = make_async_es()
+        mock_es.return_value = instance
+        client = AsyncElasticClient(host="https://localhost:9200", index="test-index")
+        
+        await client.search({"query": {"match_all": {}}}, size=5)
+        
+        kwargs = instance.search.await_args.kwargs
+        self.assertEqual(kwargs["index"], "test-index")
+        self.assertEqual(kwargs["size"], 5)
+
+
+class TestProcessPrintJobAsync(unittest.IsolatedAsyncioTestCase):
+    """Test the stages of process_print_job_async."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.temp_dir, "job.pdf")
+        text = article(3)
+        write_text_pdf(self.input_file, ["\n".join(text[i:i + 80] for i in range(0, len(text), 80))])
+        self.mirror_path = os.path.join(self.temp_dir, "mirror.db")
+        settings = {"mirror": {"enabled": True, "path": self.mirror_path}}
+        self.config = MagicMock()
+        self.config.processing = {
+            "temp_dir": os.path.join(self.temp_dir, "work"),
+            "near_duplicates": {"enabled": True},
+        }
+        self.config.get.side_effect = lambda key, default=None: settings.get(key, default)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    async def test_mirror_and_near_duplicates(self):
+        """Test that jobs are mirrored and linked to near duplicates like in the backend."""
+        client = MagicMock()
+        client.index_pdf = AsyncMock(return_value={"_id": "print-job-7"})
+        client.find_near_duplicates = AsyncMock(return_value=[("print-job-7", 0), ("print-job-3", 2)])
+        
+        success = await process_print_job_async(
+            self.input_file, "7", "alice", "Report", 1, self.config, MagicMock(), client
+        )
+        
+        self.assertTrue(success)
+        metadata = client.index_pdf.await_args.kwargs["metadata"]
+        self.assertEqual(metadata["document"]["near_duplicate_of"], ["print-job-3"])
+        mirror = LocalMirror(self.mirror_path, max_age_days=None, max_size_mb=None)
+        try:
+            self.assertEqual(mirror.count(), 1)
+        finally:
+            mirror.close()
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir, "work")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""Tests for boilerplate stripping."""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from src.converter.artifact import JobArtifact
+from src.converter.boilerplate import (
+    BoilerplateStripper,
+    SiteBoilerplate,
+    find_repeated_lines,
+    strip_job_text,
+)
+from src.elastic.client import PIPELINE_VERSION, ElasticClient
+from src.tools.fake_elasticsearch import FakeElasticsearch
+from tests.helpers import write_text_pdf
+
+
+BODIES = [
+    "Polls opened early in the northern districts.",
+    "Turnout was higher than in any recent election.",
+    "Results are expected late on Sunday evening.",
+]
+
+
+def _page(number, total, body):
+    return "\n".join([
+        "Example News - Top stories",
+        "Home | World | Sports | Weather",
+        body,
+        "We use cookies to improve your experience. Accept all",
+        f"https://www.example.com/news/article-42   {number}/{total}",
+    ])
+
+
+class TestBoilerplateStripper(unittest.TestCase):
+    """Test BoilerplateStripper class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.pages = [_page(n, 3, body) for n, body in enumerate(BODIES, start=1)]
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_repeated_lines_removed(self):
+        """Test that headers, footers and banners on every page are removed."""
+        cleaned, stats = BoilerplateStripper().strip(self.pages)
+        
+        self.assertEqual(cleaned.splitlines(), [
+            *BODIES
+        ])
+        self.assertEqual(stats["removed_lines"], 12)
+        self.assertEqual(stats["removed_bytes"], len("\n".join(self.pages).encode()) - len(cleaned.encode()))
+        self.assertEqual(stats["site"], "example.com")
+    
+    def test_threshold(self):
+        """Test that lines on few pages are kept and single pages are left alone."""
+        pages = ["header\nintro", "header\nbody", "body 2", "closing"]
+        self.assertEqual(find_repeated_lines(pages, 0.5), {"header"})
+        self.assertEqual(find_repeated_lines(pages, 0.75), set())
+        self.assertEqual(find_repeated_lines(["header\nheader"]), set())
+    
+    def test_site_learning(self):
+        """Test that boilerplate learned from earlier jobs is removed from single pages."""
+        path = os.path.join(self.temp_dir, "sites.json")
+        stripper = BoilerplateStripper(site_boilerplate=SiteBoilerplate(path, min_jobs=2))
+        single = [_page(1, 1, "A short single-page article.")]
+        
+        for _ in range(2):
+            _, stats = stripper.strip(single)
+            self.assertEqual(stats["removed_lines"], 0)
+            stripper.strip(self.pages)
+        
+        # A new process loads what was learned
+        stripper = BoilerplateStripper(site_boilerplate=SiteBoilerplate(path, min_jobs=2))
+        cleaned, stats = stripper.strip(single)
+        self.assertEqual(cleaned, "A short single-page article.")
+        self.assertEqual(stats["removed_lines"], 4)
+        
+        # Other sites are not affected
+        other = [single[0].replace("example.com", "example.org")]
+        self.assertEqual(stripper.strip(other)[1]["removed_lines"], 0)
+        with open(path) as f:
+            self.assertNotIn("cookies", f.read())
+
+
+class TestCleanContentIndexing(unittest.TestCase):
+    """Test that cleaned text replaces attachment.content."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.fake_es = FakeElasticsearch().start()
+        self.client = ElasticClient(host=self.fake_es.url, max_retries=0)
+        self.config = MagicMock()
+        self.config.processing = {"boilerplate": {"enabled": True, "learn_sites": False}}
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.client.close()
+        self.fake_es.stop()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_index_clean_content(self):
+        """Test stripping a PDF job and indexing the cleaned text."""
+        path = os.path.join(self.temp_dir, "job.pdf")
+        write_text_pdf(path, [_page(n, 2, body) for n, body in enumerate(BODIES[:2], start=1)])
+        metadata = {"print_job": {"user": "alice"}, "document": {}}
+        
+        with JobArtifact.load(path) as artifact:
+            content = strip_job_text(self.config, artifact, metadata)
+            self.client.index_pdf(path, metadata, doc_id="job-1", artifact=artifact, content=content)
+        
+        source = self.fake_es.documents["print-jobs"]["job-1"]["_source"]
+        self.assertEqual(source["attachment"]["content"].split(), " ".join(BODIES[:2]).split())
+        self.assertNotIn("clean_content", source)
+        self.assertEqual(source["document"]["boilerplate"]["removed_lines"], 8)
+        
+        self.config.processing = {}
+        with JobArtifact.load(path) as artifact:
+            self.assertIsNone(strip_job_text(self.config, artifact, {}))
+    
+    def test_pipeline_upgrade(self):
+        """Test that an older pipeline is replaced by the current version."""
+        self.fake_es.pipelines["attachment"] = {"processors": [{"attachment": {"field": "data"}}]}
+        
+        self.assertTrue(self.client.ensure_pipeline_exists())
+        pipeline = self.fake_es.pipelines["attachment"]
+        self.assertEqual(pipeline["version"], PIPELINE_VERSION)
+        self.assertIn("set", [next(iter(processor)) for processor in pipeline["processors"]])
+        
+        pipeline["description"] = "customized"
+        self.client.ensure_pipeline_exists()
+        self.assertEqual(self.fake_es.pipelines["attachment"]["description"], "customized")
+        
+        # A missing pipeline (404) is created
+        del self.fake_es.pipelines["attachment"]
+        self.assertTrue(self.client.ensure_pipeline_exists())
+        self.assertEqual(self.fake_es.pipelines["attachment"]["version"], PIPELINE_VERSION)
+
+
+if __name__ == '__main__':
+    unittest.main()
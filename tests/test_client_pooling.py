@@ -0,0 +1,121 @@
+"""Tests for multi-node connections and ingest node routing."""
+import unittest
+from unittest.mock import MagicMock, patch
+
+from elastic_transport import NodeConfig, Urllib3HttpNode
+
+from src.elastic.client import (
+    ElasticClient,
+    IngestNodePool,
+    client_kwargs_from_config,
+    ingest_node_callback,
+    normalize_hosts,
+)
+
+
+def _config(es_config):
+    config = MagicMock()
+    config.elasticsearch = es_config
+    config.processing = {"circuit_breaker": {"enabled": False}}
+    return config
+
+
+class TestClientPooling(unittest.TestCase):
+    """Test connection pool and ingest client setup."""
+    
+    @patch('src.elastic.client.Elasticsearch')
+    def test_hosts_and_transport_options(self, mock_es):
+        """Test that all hosts and pool settings reach the client."""
+        ElasticClient(
+            host=["http://node-1:9200", "http://node-2:9200"],
+            max_retries=0,
+            transport_options={"connections_per_node": 4, "node_selector_class": "random"}
+        )
+        
+        args, kwargs = mock_es.call_args
+        self.assertEqual(args[0], ["http://node-1:9200", "http://node-2:9200"])
+        self.assertEqual(kwargs["connections_per_node"], 4)
+        self.assertEqual(kwargs["node_selector_class"], "random")
+        self.assertEqual(kwargs["max_retries"], 0)
+        self.assertEqual(mock_es.call_count, 1)
+    
+    @patch('src.elastic.client.Elasticsearch')
+    def test_ingest_hosts(self, mock_es):
+        """Test that indexing goes to the ingest nodes and searches do not."""
+        main_es, ingest_es = MagicMock(), MagicMock()
+        mock_es.side_effect = [main_es, ingest_es]
+        ingest_es.bulk.return_value = {"errors": False, "items": []}
+        main_es.search.return_value = {"hits": {"hits": []}}
+        
+        client = ElasticClient(
+            host="http://coord:9200",
+            max_retries=0,
+            timeout=10,
+            ingest_hosts="http://ingest:9200",
+            ingest_timeout=120
+        )
+        client.bulk([{"index": {}}, {"a": 1}])
+        client.search({"match_all": {}})
+        client.close()
+        
+        self.assertEqual(mock_es.call_args_list[1].args[0], ["http://ingest:9200"])
+        self.assertEqual(mock_es.call_args_list[1].kwargs["request_timeout"], 120)
+        ingest_es.bulk.assert_called_once()
+        main_es.bulk.assert_not_called()
+        main_es.search.assert_called_once()
+        ingest_es.close.assert_called_once()
+        main_es.close.assert_called_once()
+    
+    @patch('src.elastic.client.Elasticsearch')
+    def test_sniff_ingest_nodes(self, mock_es):
+        """Test that the ingest client sniffs and keeps only ingest nodes."""
+        ElasticClient(host="http://coord:9200", max_retries=0, sniff_ingest_nodes=True)
+        
+        kwargs = mock_es.call_args_list[1].kwargs
+        self.assertTrue(kwargs["sniff_on_start"])
+        self.assertIs(kwargs["sniffed_node_callback"], ingest_node_callback)
+        self.assertIs(kwargs["node_pool_class"], IngestNodePool)
+        
+        node_config = object()
+        self.assertIs(ingest_node_callback({"roles": ["data", "ingest"]}, node_config), node_config)
+        self.assertIsNone(ingest_node_callback({"roles": ["master"]}, node_config))
+    
+    def test_non_ingest_seed_dropped(self):
+        """Test that a seed not returned as an ingest node is not used after sniffing."""
+        seed = NodeConfig("http", "coord", 9200)
+        pool = IngestNodePool([seed], Urllib3HttpNode)
+        self.assertEqual(pool.get().config, seed)
+        
+        for host in ("ingest-1", "ingest-2"):
+            pool.add(NodeConfig("http", host, 9200))
+        hosts = {pool.get().config.host for _ in range(10)}
+        self.assertEqual(hosts, {"ingest-1", "ingest-2"})
+        
+        # A seed that is an ingest node itself stays in use
+        pool = IngestNodePool([seed, NodeConfig("http", "data", 9200)], Urllib3HttpNode)
+        pool.add(seed)
+        self.assertEqual({pool.get().config.host for _ in range(10)}, {"coord"})
+    
+    @patch('src.elastic.client.Elasticsearch')
+    def test_shared_client_without_ingest_settings(self, mock_es):
+        """Test that one client is used when no ingest routing is configured."""
+        client = ElasticClient(host="http://coord:9200", max_retries=0)
+        self.assertIs(client.ingest_es, client.es)
+    
+    def test_config(self):
+        """Test hosts and transport settings from the config file."""
+        kwargs = client_kwargs_from_config(_config({
+            "host": "http://ignored:9200",
+            "hosts": ["http://node-1:9200", "http://node-2:9200"],
+            "transport": {"connections_per_node": 8, "no_such_option": 1},
+            "ingest_hosts": ["http://ingest:9200"],
+        }))
+        
+        self.assertEqual(kwargs["host"], ["http://node-1:9200", "http://node-2:9200"])
+        self.assertEqual(kwargs["transport_options"], {"connections_per_node": 8})
+        self.assertEqual(kwargs["ingest_hosts"], ["http://ingest:9200"])
+        self.assertEqual(normalize_hosts("http://one:9200"), ["http://one:9200"])
+
+
+if __name__ == '__main__':
+    unittest.main()
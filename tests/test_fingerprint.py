@@ -0,0 +1,150 @@
+"""Tests for near-duplicate fingerprints."""
+import os
+import random
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.converter.artifact import JobArtifact
+from src.converter.fingerprint import (
+    BANDS,
+    band_keys,
+    cluster_fingerprints,
+    fingerprint_text,
+    hamming_distance,
+    simhash,
+)
+from src.converter.metadata_extractor import MetadataExtractor
+from src.elastic.client import ElasticClient
+from src.tools.fake_elasticsearch import FakeElasticsearch
+from tests.helpers import article, write_text_pdf
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TestFingerprint(unittest.TestCase):
+    """Test SimHash fingerprints."""
+    
+    def test_numbers_ignored(self):
+        """Test that timestamps and page numbers do not change the fingerprint."""
+        text = article(1)
+        first = simhash(f"Printed 2024-01-05 10:31 page 1 of 3\n{text}")
+        second = simhash(f"Printed 2025-06-30 17:02 page 2 of 9\n{text}")
+        self.assertEqual(first, second)
+    
+    def test_small_edit_is_close(self):
+        """Test that a changed header keeps the fingerprint close."""
+        text = article(2)
+        first = simhash(f"Daily news special offer today {text}")
+        second = simhash(f"Weekly gazette buy one get one free {text}")
+        self.assertLessEqual(hamming_distance(first, second), 8)
+    
+    def test_unrelated_texts_are_far(self):
+        """Test that different documents differ in many bits."""
+        self.assertGreater(hamming_distance(simhash(article(3)), simhash(article(4))), 15)
+    
+    def test_short_text_has_no_fingerprint(self):
+        """Test that very short texts are not fingerprinted."""
+        self.assertIsNone(simhash("hello world"))
+        self.assertIsNone(fingerprint_text(""))
+    
+    def test_close_fingerprints_share_band(self):
+        """Test that fingerprints within BANDS - 1 bits share a band key."""
+        value = simhash(article(5))
+        rng = random.Random(0)
+        for _ in range(50):
+            flipped = value
+            for bit in rng.sample(range(64), BANDS - 1):
+                flipped ^= 1 << bit
+            self.assertTrue(set(band_keys(value)) & set(band_keys(flipped)))
+    
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_cluster_fingerprints(self):
+        """Test batch clustering of near duplicates."""
+        base = [simhash(article(seed)) for seed in range(10, 15)]
+        fingerprints = base + [base[0] ^ 0b101, base[0] ^ (1 << 63), base[3] ^ (1 << 20)]
+        
+        clusters = sorted(cluster_fingerprints(fingerprints, max_distance=3))
+        self.assertEqual(clusters, [[0, 5, 6], [3, 7]])
+
+
+class TestMetadataFingerprint(unittest.TestCase):
+    """Test fingerprinting during metadata extraction."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.pdf_path = os.path.join(self.temp_dir.name, "job.pdf")
+        text = article(6)
+        write_text_pdf(self.pdf_path, ["\n".join(text[i:i + 80] for i in range(0, len(text), 80))])
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.temp_dir.cleanup()
+    
+    def test_fingerprint_extracted(self):
+        """Test that the text fingerprint is part of the PDF metadata by default."""
+        with JobArtifact.load(self.pdf_path) as artifact:
+            metadata = MetadataExtractor.extract_from_pdf(self.pdf_path, artifact=artifact)
+            self.assertEqual(metadata["fingerprint"], fingerprint_text(artifact.text()))
+    
+    def test_fingerprint_skipped(self):
+        """Test that no text is extracted when fingerprinting is disabled."""
+        with JobArtifact.load(self.pdf_path) as artifact:
+            with patch.object(JobArtifact, "text") as mock_text:
+                metadata = MetadataExtractor.extract_from_pdf(self.pdf_path, artifact=artifact, fingerprint=False)
+        
+        mock_text.assert_not_called()
+        self.assertNotIn("fingerprint", metadata)
+        self.assertEqual(metadata["page_count"], 1)
+
+
+class TestNearDuplicateLookup(unittest.TestCase):
+    """Test near-duplicate lookup against the index."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.fake_es = FakeElasticsearch().start()
+        self.client = ElasticClient(host=self.fake_es.url, max_retries=0)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.client.close()
+        self.fake_es.stop()
+    
+    def test_find_near_duplicates(self):
+        """Test that only documents within the distance are returned."""
+        original = simhash(article(20))
+        documents = {
+            "same": original,
+            "close": original ^ 0b11,
+            "far": original ^ 0xFFFF0000FFFF,
+            "other": simhash(article(21)),
+        }
+        operations = []
+        for doc_id, value in documents.items():
+            operations.append({"index": {"_id": doc_id}})
+            operations.append({"document": {"fingerprint": {"simhash": f"{value:016x}", "bands": band_keys(value)}}})
+        self.client.bulk(operations)
+        
+        matches = self.client.find_near_duplicates(fingerprint_text(article(20)))
+        self.assertEqual(matches, [("same", 0), ("close", 2)])
+    
+    def test_scan(self):
+        """Test that scan returns all matching documents across pages."""
+        operations = []
+        for i in range(25):
+            operations.append({"index": {"_id": f"doc-{i}"}})
+            operations.append({"n": i})
+        self.client.bulk(operations)
+        
+        hits = list(self.client.scan({"query": {"match_all": {}}}, page_size=10))
+        self.assertEqual(len(hits), 25)
+        self.assertEqual(self.fake_es.scrolls, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""Tests for the backfill importer."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.elastic.client import ElasticClient
+from src.ingest.importer import BackfillImporter, hash_file, import_doc_id
+from src.tools.fake_elasticsearch import FakeElasticsearch
+from src.tools.memory_harness import generate_spool_file
+
+
+class TestBackfillImporter(unittest.TestCase):
+    """Test BackfillImporter class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.source_dir = os.path.join(self.temp_dir, "archive")
+        os.makedirs(os.path.join(self.source_dir, "2023"))
+        self.paths = [
+            os.path.join(self.source_dir, "a.pdf"),
+            os.path.join(self.source_dir, "2023", "b.PDF"),
+            os.path.join(self.source_dir, "2023", "c.pdf"),
+        ]
+        for i, path in enumerate(self.paths):
+            generate_spool_file(path, 4096 * (i + 1))
+        with open(os.path.join(self.source_dir, "notes.txt"), "w") as f:
+            f.write("not a pdf")
+        
+        self.checkpoint = os.path.join(self.temp_dir, "checkpoint.jsonl")
+        self.fake_es = FakeElasticsearch().start()
+        self.client = ElasticClient(host=self.fake_es.url, max_retries=0)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.client.close()
+        self.fake_es.stop()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def make_importer(self):
+        """Create an importer with small batches."""
+        return BackfillImporter(
+            client=self.client,
+            checkpoint_path=self.checkpoint,
+            workers=1,
+            batch_docs=2,
+            max_in_flight_bytes=16384
+        )
+    
+    def test_imports_all_pdfs(self):
+        """Test that every PDF is uploaded with a stable ID."""
+        stats = self.make_importer().run(self.source_dir)
+        
+        self.assertEqual(stats["imported"], 3)
+        self.assertEqual(stats["failed"], 0)
+        documents = self.fake_es.documents["print-jobs"]
+        for path in self.paths:
+            doc_id = import_doc_id(path, hash_file(path))
+            self.assertIn(doc_id, documents)
+            self.assertEqual(documents[doc_id]["_source"]["print_job"]["source_path"], path)
+    
+    def test_rerun_resumes_from_checkpoint(self):
+        """Test that a second run skips files already imported."""
+        self.make_importer().run(self.source_dir)
+        generate_spool_file(os.path.join(self.source_dir, "d.pdf"), 2048)
+        
+        stats = self.make_importer().run(self.source_dir)
+        
+        self.assertEqual(stats["skipped"], 3)
+        self.assertEqual(stats["imported"], 1)
+        self.assertEqual(len(self.fake_es.documents["print-jobs"]), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Tests for index sorting and latest-jobs queries."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.elastic.client import ElasticClient, build_index_body, latest_query
+from src.mirror.local_mirror import LocalMirror
+from src.tools.fake_elasticsearch import FakeElasticsearch
+
+
+class TestLatest(unittest.TestCase):
+    """Test ElasticClient.latest against the fake Elasticsearch."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.fake_es = FakeElasticsearch().start()
+        self.client = ElasticClient(host=self.fake_es.url, max_retries=0)
+        self.client.ensure_index_exists()
+        for number, (user, day) in enumerate([("alice", 2), ("bob", 3), ("alice", 1), ("alice", 4)]):
+            self.fake_es.store("print-jobs", f"print-job-{number}", {
+                "print_job": {"user": user, "title": f"Job {number}"},
+                "indexed_at": f"2024-03-0{day}T09:00:00",
+            })
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.client.close()
+        self.fake_es.stop()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_index_sorted_on_indexed_at(self):
+        """Test that new indices are sorted newest first and rarely aggregated IDs skip doc values."""
+        settings = self.fake_es.indices["print-jobs"]["settings"]
+        self.assertEqual(settings["sort.field"], "indexed_at")
+        self.assertEqual(settings["sort.order"], "desc")
+        
+        properties = build_index_body()["mappings"]["properties"]
+        self.assertFalse(properties["print_job"]["properties"]["job_id"]["doc_values"])
+        self.assertNotIn("doc_values", properties["print_job"]["properties"]["user"])
+    
+    def test_latest(self):
+        """Test newest-first results without a total hit count."""
+        response = self.client.latest(size=2)
+        self.assertEqual([hit["_id"] for hit in response["hits"]["hits"]], ["print-job-3", "print-job-1"])
+        self.assertNotIn("total", response["hits"])
+        
+        response = self.client.latest(size=5, user="alice")
+        self.assertEqual([hit["_id"] for hit in response["hits"]["hits"]],
+                         ["print-job-3", "print-job-0", "print-job-2"])
+    
+    def test_latest_query_in_mirror(self):
+        """Test that the same body works against the local mirror."""
+        mirror = LocalMirror(os.path.join(self.temp_dir, "mirror.db"), max_age_days=None, max_size_mb=None)
+        for doc_id, doc in self.fake_es.documents["print-jobs"].items():
+            mirror.add(doc_id, doc["_source"])
+        
+        response = mirror.search(latest_query("alice"), size=2)
+        mirror.close()
+        self.assertEqual([hit["_id"] for hit in response["hits"]["hits"]], ["print-job-3", "print-job-0"])
+
+
+if __name__ == '__main__':
+    unittest.main()
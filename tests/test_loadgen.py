@@ -0,0 +1,62 @@
+"""Tests for the end-to-end load generator."""
+import os
+import unittest
+from unittest.mock import patch
+
+from src.tools import loadgen
+from src.utils.config_loader import ConfigLoader
+
+
+class TestLoadGenerator(unittest.TestCase):
+    """Run a few real backend jobs through the load generator."""
+    
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = [float(v) for v in range(1, 11)]
+        self.assertEqual(loadgen.percentile(values, 50), 5.0)
+        self.assertEqual(loadgen.percentile(values, 90), 9.0)
+        self.assertEqual(loadgen.percentile(values, 100), 10.0)
+        self.assertIsNone(loadgen.percentile([], 50))
+    
+    def test_successful_jobs(self):
+        """Test that jobs are run through the backend and measured."""
+        results = loadgen.run_sweep(
+            [50.0], concurrency=2, duration=5, max_jobs=2, job_size_kb=16,
+            arrival="uniform", sample_interval=0.1
+        )
+        
+        result = results[0]
+        self.assertEqual(result["jobs"], 2)
+        self.assertEqual(result["statuses"], {"ok": 2})
+        self.assertGreater(result["throughput"], 0)
+        self.assertIsNotNone(result["latency"]["p99"])
+        self.assertGreater(result["requests"], 0)
+        self.assertIn("offered/s", loadgen.format_results(results))
+    
+    def test_injected_errors(self):
+        """Test that cluster failures show up as backend errors."""
+        results = loadgen.run_sweep(
+            [50.0], concurrency=2, duration=5, max_jobs=2, job_size_kb=16,
+            error_rate=1.0, sample_interval=0.1
+        )
+        
+        result = results[0]
+        self.assertEqual(result["errors"], 2)
+        self.assertEqual(result["statuses"], {"retry": 2})
+        self.assertTrue(result["saturated"])
+
+
+class TestConfigEnvironment(unittest.TestCase):
+    """Test the config file override."""
+    
+    def test_config_from_environment(self):
+        """Test that $ELASTICPRINTER_CONFIG selects the config file."""
+        path = os.path.join(os.path.dirname(__file__), "..", "config", "config.yaml.example")
+        with patch.dict(os.environ, {"ELASTICPRINTER_CONFIG": path}):
+            config = ConfigLoader()
+        self.assertEqual(config.config_path, path)
+        self.assertEqual(config.elasticsearch["index"], "print-jobs")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Tests for the local SQLite FTS5 mirror."""
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from src.mirror.local_mirror import LocalMirror, mirror_from_config, translate_query
+
+
+def _document(user, title, indexed_at):
+    return {
+        "print_job": {"job_id": title.lower(), "user": user, "title": title, "hostname": "mac-1"},
+        "document": {"page_count": 1},
+        "indexed_at": indexed_at,
+    }
+
+
+class TestLocalMirror(unittest.TestCase):
+    """Test LocalMirror class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.mirror = LocalMirror(os.path.join(self.temp_dir, "mirror.db"), max_age_days=None, max_size_mb=None)
+        self.mirror.add(
+            "print-job-1",
+            _document("alice", "Quarterly report", "2024-03-01T09:00:00"),
+            "Revenue grew in the third quarter of the year."
+        )
+        self.mirror.add(
+            "print-job-2",
+            _document("bob", "Lunch menu", "2024-03-02T09:00:00"),
+            "Soup and salad for the quarter-end party."
+        )
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.mirror.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_ranked_search_with_snippets(self):
+        """Test that matches are ranked and highlighted."""
+        response = self.mirror.search({"query": {"match": {"attachment.content": "revenue quarter"}}})
+        
+        hits = response["hits"]["hits"]
+        self.assertEqual(response["hits"]["total"]["value"], 2)
+        self.assertEqual(hits[0]["_id"], "print-job-1")
+        self.assertGreater(hits[0]["_score"], hits[1]["_score"])
+        self.assertEqual(hits[0]["_source"]["print_job"]["user"], "alice")
+        self.assertIn("<em>Revenue</em>", hits[0]["highlight"]["attachment.content"][0])
+    
+    def test_filters_and_phrases(self):
+        """Test bool queries with term filters, phrases and operators."""
+        response = self.mirror.search({"query": {"bool": {
+            "must": [{"multi_match": {"query": "quarter", "fields": ["attachment.content", "print_job.title"]}}],
+            "filter": [{"term": {"print_job.user": "bob"}}],
+        }}})
+        self.assertEqual([hit["_id"] for hit in response["hits"]["hits"]], ["print-job-2"])
+        
+        response = self.mirror.search({"query": {"match_phrase": {"attachment.content": "third quarter"}}})
+        self.assertEqual(response["hits"]["total"]["value"], 1)
+        
+        response = self.mirror.search({"query": {"match": {
+            "attachment.content": {"query": "soup revenue", "operator": "and"}
+        }}})
+        self.assertEqual(response["hits"]["total"]["value"], 0)
+        
+        response = self.mirror.search({"query": {"range": {"indexed_at": {"gte": "2024-03-02"}}}})
+        self.assertEqual([hit["_id"] for hit in response["hits"]["hits"]], ["print-job-2"])
+    
+    def test_unsupported_query(self):
+        """Test that unsupported queries are rejected."""
+        with self.assertRaises(ValueError):
+            self.mirror.search({"query": {"fuzzy": {"attachment.content": "revnue"}}})
+        with self.assertRaises(ValueError):
+            translate_query({"match": {"document.pdf_metadata.Author": "x"}})
+    
+    def test_replace_document(self):
+        """Test that writing a job again replaces it."""
+        self.mirror.add("print-job-1", _document("alice", "Quarterly report", "2024-03-01T09:00:00"), "Updated text")
+        
+        self.assertEqual(self.mirror.count(), 2)
+        response = self.mirror.search({"query": {"match": {"attachment.content": "revenue"}}})
+        self.assertEqual(response["hits"]["total"]["value"], 0)
+    
+    def test_prune_by_age_and_size(self):
+        """Test that the oldest jobs are dropped first."""
+        self.mirror.max_age_days = 30
+        removed = self.mirror.prune(now=datetime(2024, 4, 1))
+        self.assertEqual(removed, 1)
+        self.assertEqual(self.mirror.count(), 1)
+        
+        now = datetime.now()
+        self.mirror.max_age_days = None
+        self.mirror.add("new-1", _document("carol", "New", (now - timedelta(hours=2)).isoformat()), "x" * 1000)
+        self.mirror.max_bytes = 1500
+        self.mirror.add("new-2", _document("carol", "Newer", now.isoformat()), "y" * 1000)
+        
+        response = self.mirror.search({"query": {"match_all": {}}})
+        self.assertEqual([hit["_id"] for hit in response["hits"]["hits"]], ["new-2"])
+    
+    def test_mirror_from_config(self):
+        """Test that the mirror is opt-in."""
+        config = MagicMock()
+        config.get.return_value = {}
+        self.assertIsNone(mirror_from_config(config))
+        
+        config.get.return_value = {"enabled": True, "path": os.path.join(self.temp_dir, "sub", "m.db")}
+        with mirror_from_config(config) as mirror:
+            self.assertEqual(mirror.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""Memory-ceiling regression tests for the ingest path.
+
+Sizes and the allowed ratio can be changed for a full run, e.g.:
+    
+    ELASTICPRINTER_MEMORY_SIZES_MB=1,16,256,1024 python -m pytest tests/test_memory_ceiling.py
+"""
+import multiprocessing
+import os
+import signal
+import tempfile
+import unittest
+
+import yaml
+
+from src.tools import memory_harness
+
+# Peak RSS growth per input byte measured for 64 and 256 MB inputs (5.06 and
+# 5.02; the index stage accounts for 4 of it). Lower it as the ingest path
+# approaches memory_harness.DEFAULT_MAX_RATIO.
+MEASURED_MAX_RATIO = 5.1
+
+
+class TestMemoryCeiling(unittest.TestCase):
+    """Run the ingest path and check peak memory against the ceiling."""
+    
+    def test_peak_memory_within_ceiling(self):
+        """Test that peak memory grows no more than the measured baseline."""
+        sizes = [
+            float(size)
+            for size in os.environ.get("ELASTICPRINTER_MEMORY_SIZES_MB", "1,16").split(",")
+            if size
+        ]
+        max_ratio = float(os.environ.get(
+            "ELASTICPRINTER_MEMORY_MAX_RATIO",
+            MEASURED_MAX_RATIO
+        ))
+        
+        results = memory_harness.run_harness(sizes, max_ratio=max_ratio)
+        
+        for result in results:
+            self.assertTrue(result["within_ceiling"], memory_harness.format_results(results))
+            self.assertIn("index", result["stage_peaks"])
+            self.assertIn("stdin", result["stage_peaks"])
+    
+    def test_killed_child(self):
+        """Test that a child killed before reporting fails its case instead of hanging."""
+        context = multiprocessing.get_context("fork")
+        queue = context.Queue()
+        child = context.Process(target=lambda: os.kill(os.getpid(), signal.SIGKILL))
+        child.start()
+        
+        result = memory_harness.collect_child_result(child, queue, poll_interval=0.1)
+        
+        self.assertFalse(result["success"])
+        self.assertIn("likely OOM", result["error"])
+    
+    def test_stages_run_one_at_a_time(self):
+        """Test that the harness config disables concurrent stages, so stage peaks are attributable."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "config.yaml")
+            memory_harness.write_harness_config(path, "http://127.0.0.1:9200", temp_dir)
+            with open(path) as f:
+                config = yaml.safe_load(f)
+        
+        self.assertEqual(config["processing"]["stage_workers"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Tests for PDF metadata normalization and the field count check."""
+import unittest
+
+from src.converter.metadata_extractor import (
+    MAX_EXTRA_PDF_METADATA_KEYS,
+    MAX_PDF_METADATA_VALUE_LENGTH,
+    normalize_pdf_info,
+)
+from src.elastic.client import ElasticClient, count_mapped_fields, load_index_mapping
+from src.tools.fake_elasticsearch import FakeElasticsearch
+
+
+class TestNormalizePdfInfo(unittest.TestCase):
+    """Test normalize_pdf_info function."""
+    
+    def test_curated_and_extra_keys(self):
+        """Test that curated keys are split from producer keys and cleaned."""
+        curated, extra = normalize_pdf_info({
+            "/Title": "  Quarterly\x00 report\n\n2024 ",
+            "/Producer": "Skia/PDF m120",
+            "/Author": None,
+            "/SourceModified": "D:20240301120000",
+            "/ns:a.b c": "x" * (MAX_PDF_METADATA_VALUE_LENGTH + 10),
+        })
+        
+        self.assertEqual(curated, {"Title": "Quarterly report 2024", "Producer": "Skia/PDF m120"})
+        self.assertEqual(extra["SourceModified"], "D:20240301120000")
+        self.assertEqual(len(extra["ns_a_b_c"]), MAX_PDF_METADATA_VALUE_LENGTH)
+    
+    def test_key_cap(self):
+        """Test that producer keys beyond the limit are dropped."""
+        info = {f"/Custom{i}": str(i) for i in range(MAX_EXTRA_PDF_METADATA_KEYS + 5)}
+        info["/Title"] = "kept"
+        
+        curated, extra = normalize_pdf_info(info)
+        
+        self.assertEqual(curated, {"Title": "kept"})
+        self.assertEqual(len(extra), MAX_EXTRA_PDF_METADATA_KEYS)
+        self.assertIn("Custom0", extra)
+
+
+class TestFieldUsage(unittest.TestCase):
+    """Test the mapping field count check against the fake Elasticsearch."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.fake_es = FakeElasticsearch().start()
+        self.client = ElasticClient(host=self.fake_es.url, max_retries=0)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.client.close()
+        self.fake_es.stop()
+    
+    def test_count_mapped_fields(self):
+        """Test that objects and multi-fields count like in Elasticsearch."""
+        properties = {
+            "a": {"type": "keyword"},
+            "b": {"properties": {"c": {"type": "text", "fields": {"raw": {"type": "keyword"}}}}},
+        }
+        self.assertEqual(count_mapped_fields(properties), 4)
+    
+    def test_field_usage(self):
+        """Test the warning threshold with the default and a lowered field limit."""
+        self.client.ensure_index_exists()
+        usage = self.client.field_usage()
+        expected = count_mapped_fields(load_index_mapping()["mappings"]["properties"])
+        self.assertEqual(usage, {"fields": expected, "limit": 1000, "ratio": round(expected / 1000, 3), "warning": False})
+        
+        self.fake_es.indices["print-jobs"]["settings"]["mapping.total_fields.limit"] = expected
+        self.assertTrue(self.client.field_usage()["warning"])
+    
+    def test_update_existing_index(self):
+        """Test that an index with a dynamic pdf_metadata object gets the flattened field."""
+        self.fake_es.indices["print-jobs"] = {"mappings": {"properties": {"document": {"properties": {
+            "pdf_metadata": {"properties": {"Title": {"type": "text"}}}
+        }}}}}
+        
+        self.assertTrue(self.client.update_mapping())
+        
+        document = self.fake_es.indices["print-jobs"]["mappings"]["properties"]["document"]["properties"]
+        self.assertFalse(document["pdf_metadata"]["dynamic"])
+        self.assertEqual(document["pdf_metadata"]["properties"]["Title"], {"type": "text"})
+        self.assertEqual(document["pdf_metadata_extra"]["type"], "flattened")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,8 +3,9 @@ import unittest
 import os
 import tempfile
 from pathlib import Path
+from unittest.mock import MagicMock, patch
 
-from src.converter.pdf_generator import PDFGenerator
+from src.converter.pdf_generator import MB, PDFGenerator
 
 
 class TestPDFGenerator(unittest.TestCase):
@@ -39,5 +40,73 @@ class TestPDFGenerator(unittest.TestCase):
         self.assertTrue(os.path.isdir(self.temp_dir))
 
 
+
+class TestSlimming(unittest.TestCase):
+    """Test slimming of large jobs for indexing."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "job.pdf")
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b"%PDF-1.4\n" + b"\0" * (2 * MB))
+        self.calls = []
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _ghostscript(self, output_size):
+        def run(arguments, input_file, output_file, timeout=60):
+            self.calls.append(arguments)
+            with open(output_file, 'wb') as f:
+                f.write(b"%PDF-1.4\n" + b"\0" * output_size)
+            return True
+        return run
+    
+    def test_slim_large_job(self):
+        """Test that large jobs get an image-free copy and the reduction is reported."""
+        generator = PDFGenerator(temp_dir=self.temp_dir, slim_threshold_mb=1)
+        with patch.object(generator, "_run_ghostscript", side_effect=self._ghostscript(MB // 2 - 9)):
+            report = generator.slim_pdf(self.pdf_path)
+        
+        self.assertIn("-dFILTERIMAGE", self.calls[0])
+        self.assertEqual(report["path"], os.path.join(self.temp_dir, "job.slim.pdf"))
+        self.assertEqual(report["original_bytes"], 2 * MB + 9)
+        self.assertEqual(report["indexed_bytes"], MB // 2)
+        self.assertAlmostEqual(report["reduction"], 0.75, places=2)
+        self.assertEqual(os.path.getsize(self.pdf_path), 2 * MB + 9)
+    
+    def test_small_or_unreadable_jobs_skipped(self):
+        """Test the size threshold, the format check and results that are not smaller."""
+        generator = PDFGenerator(temp_dir=self.temp_dir, slim_threshold_mb=4)
+        with patch.object(generator, "_run_ghostscript", side_effect=self._ghostscript(10)):
+            self.assertIsNone(generator.slim_pdf(self.pdf_path))
+        self.assertEqual(self.calls, [])
+        
+        artifact = MagicMock(size=8 * MB, format="pjl")
+        self.assertIsNone(generator.slim_pdf(self.pdf_path, artifact=artifact))
+        
+        generator = PDFGenerator(temp_dir=self.temp_dir, slim_threshold_mb=1, slim_mode="downsample")
+        with patch.object(generator, "_run_ghostscript", side_effect=self._ghostscript(3 * MB)):
+            self.assertIsNone(generator.slim_pdf(self.pdf_path))
+        self.assertIn("-dColorImageResolution=72", self.calls[0])
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "job.slim.pdf")))
+    
+    def test_from_config(self):
+        """Test that slimming is off unless enabled in processing.slimming."""
+        config = MagicMock()
+        config.processing = {"temp_dir": self.temp_dir}
+        self.assertIsNone(PDFGenerator.from_config(config).slim_threshold_bytes)
+        
+        config.processing["slimming"] = {"enabled": True, "threshold_mb": 50, "mode": "downsample"}
+        generator = PDFGenerator.from_config(config)
+        self.assertEqual(generator.slim_threshold_bytes, 50 * MB)
+        self.assertEqual(generator.slim_mode, "downsample")
+        with self.assertRaises(ValueError):
+            PDFGenerator(temp_dir=self.temp_dir, slim_mode="shrink")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,103 @@
+"""Tests for ingest pipeline profiling."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.elastic.client import ElasticClient
+from src.elastic.pipeline_profile import (
+    PipelineProfiler,
+    extraction_summary,
+    format_table,
+    pipeline_stats,
+    pipeline_variant,
+)
+from src.tools.fake_elasticsearch import FakeElasticsearch
+from src.tools.memory_harness import generate_spool_file
+
+MB = 1024 * 1024
+
+
+class TestPipelineVariants(unittest.TestCase):
+    """Test pipeline variant construction and stats parsing."""
+    
+    def test_variants(self):
+        """Test that variants change only the attachment and remove processors."""
+        combined = pipeline_variant("combined", indexed_chars=5000, properties=["content"])
+        attachment = combined["processors"][0]["attachment"]
+        self.assertEqual(attachment["indexed_chars"], 5000)
+        self.assertEqual(attachment["properties"], ["content"])
+        self.assertTrue(attachment["remove_binary"])
+        self.assertEqual(combined["processors"][-1]["remove"]["field"], ["clean_content"])
+        
+        current = pipeline_variant("current")
+        self.assertEqual(current["processors"][0]["attachment"]["indexed_chars"], -1)
+        self.assertEqual(current["processors"][-1]["remove"]["field"], ["data", "clean_content"])
+        with self.assertRaises(ValueError):
+            pipeline_variant("fastest")
+    
+    def test_stats_summed_over_nodes(self):
+        """Test that per-processor stats of all nodes are added up."""
+        def node(count, millis):
+            return {"ingest": {"pipelines": {"p": {
+                "count": count, "time_in_millis": millis,
+                "processors": [{"attachment": {"type": "attachment", "stats": {"count": count, "time_in_millis": millis}}}]
+            }}}}
+        
+        stats = pipeline_stats({"nodes": {"a": node(2, 30), "b": node(1, 12), "c": {"ingest": {}}}}, "p")
+        self.assertEqual(stats["count"], 3)
+        self.assertEqual(stats["time_in_millis"], 42)
+        self.assertEqual(stats["processors"], [{"type": "attachment", "count": 3, "time_in_millis": 42}])
+        
+        chars, errors = extraction_summary({"docs": [
+            {"processor_results": [{"processor_type": "attachment", "status": "success",
+                                    "doc": {"_source": {"attachment": {"content": "abc"}}}}]},
+            {"processor_results": [{"processor_type": "attachment", "status": "error", "error": {}}]},
+        ]})
+        self.assertEqual((chars, errors), (3, 1))
+
+
+class TestPipelineProfiler(unittest.TestCase):
+    """Test PipelineProfiler against the fake Elasticsearch."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.fake_es = FakeElasticsearch(ingest_millis_per_mb=40).start()
+        self.client = ElasticClient(host=self.fake_es.url, max_retries=0)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.client.close()
+        self.fake_es.stop()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_profile(self):
+        """Test cost per MB from node ingest stats, per variant and format."""
+        paths = []
+        for name in ("a.pdf", "b.pdf"):
+            paths.append(os.path.join(self.temp_dir, name))
+            generate_spool_file(paths[-1], MB)
+        paths.append(os.path.join(self.temp_dir, "c.ps"))
+        with open(paths[-1], "wb") as f:
+            f.write(b"%!PS-Adobe-3.0\n" + b"%" * (MB - 15))
+        
+        rows = PipelineProfiler(self.client, rounds=2, batch_mb=1).profile(paths, ["current", "capped"])
+        
+        self.assertEqual([(row["variant"], row["format"]) for row in rows], [
+            ("current", "pdf"), ("current", "postscript"), ("capped", "pdf"), ("capped", "postscript")
+        ])
+        pdf = rows[0]
+        self.assertEqual(pdf["documents"], 2)
+        self.assertEqual(pdf["timing"], "node stats")
+        self.assertAlmostEqual(pdf["ms_per_mb"], 40, delta=1)
+        self.assertAlmostEqual(pdf["processors"]["attachment"], 40, delta=1)
+        self.assertEqual(pdf["processors"]["remove"], 0)
+        
+        # Temporary pipelines are removed
+        self.assertEqual(self.fake_es.pipelines, {})
+        self.assertIn("capped", format_table(rows))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Tests for per-job profiling."""
+import os
+import pstats
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src.utils.profiling import JobProfiler, profiler_from_config
+
+
+def _config(profiling=None):
+    config = MagicMock()
+    config.processing = {"profiling": profiling} if profiling is not None else {}
+    return config
+
+
+class TestJobProfiler(unittest.TestCase):
+    """Test JobProfiler class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _profiles(self):
+        return sorted(os.listdir(self.temp_dir)) if os.path.isdir(self.temp_dir) else []
+    
+    def test_sampled_job_writes_profile(self):
+        """Test that a sampled job leaves a readable profile named after the job."""
+        profiler = JobProfiler(directory=self.temp_dir, sample_rate=0.5, rng=lambda: 0.1)
+        with profiler.profile("42") as profiled:
+            sum(range(1000))
+        self.assertTrue(profiled)
+        
+        profiles = self._profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0].startswith("job-42-"))
+        pstats.Stats(os.path.join(self.temp_dir, profiles[0]))
+    
+    def test_unsampled_job_skipped(self):
+        """Test that jobs outside the sample are not profiled."""
+        profiler = JobProfiler(directory=self.temp_dir, sample_rate=0.5, rng=lambda: 0.9)
+        with profiler.profile("42") as profiled:
+            pass
+        self.assertFalse(profiled)
+        self.assertEqual(self._profiles(), [])
+    
+    def test_slow_job_kept(self):
+        """Test that slow jobs keep their profile even if not sampled."""
+        profiler = JobProfiler(directory=self.temp_dir, sample_rate=0.0, slow_threshold=0.05)
+        with profiler.profile("fast"):
+            pass
+        with profiler.profile("slow"):
+            time.sleep(0.06)
+        
+        profiles = self._profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0].startswith("job-slow-"))
+    
+    def test_retried_job_keeps_both_profiles(self):
+        """Test that profiles of the same job in the same second do not overwrite each other."""
+        profiler = JobProfiler(directory=self.temp_dir)
+        with patch("os.getpid", side_effect=[100, 101]), patch("time.strftime", return_value="20240101_120000"):
+            for _ in range(2):
+                with profiler.profile("42"):
+                    pass
+        self.assertEqual(self._profiles(), ["job-42-20240101_120000-100.prof", "job-42-20240101_120000-101.prof"])
+    
+    def test_profile_kept_when_job_fails(self):
+        """Test that failing jobs are profiled and the error propagates."""
+        profiler = JobProfiler(directory=self.temp_dir)
+        with self.assertRaises(RuntimeError):
+            with profiler.profile("failing"):
+                raise RuntimeError("boom")
+        self.assertEqual(len(self._profiles()), 1)
+    
+    def test_rotation(self):
+        """Test that only the newest profiles are kept."""
+        profiler = JobProfiler(directory=self.temp_dir, max_files=2)
+        for i in range(4):
+            path = os.path.join(self.temp_dir, f"job-{i}-x.prof")
+            open(path, "w").close()
+            os.utime(path, (1000 + i, 1000 + i))
+        
+        profiler.rotate()
+        self.assertEqual(self._profiles(), ["job-2-x.prof", "job-3-x.prof"])
+    
+    def test_unsafe_job_id(self):
+        """Test that job IDs cannot escape the profile directory."""
+        profiler = JobProfiler(directory=self.temp_dir)
+        with profiler.profile("../../etc/x"):
+            pass
+        self.assertTrue(self._profiles()[0].startswith("job-.._.._etc_x-"))
+
+
+class TestProfilerFromConfig(unittest.TestCase):
+    """Test profiler_from_config function."""
+    
+    def test_disabled_by_default(self):
+        """Test that profiling is off without config or environment."""
+        self.assertIsNone(profiler_from_config(_config(), environ={}))
+    
+    def test_config(self):
+        """Test settings from the config section."""
+        profiler = profiler_from_config(
+            _config({"enabled": True, "sample_rate": 0.1, "slow_threshold": 5, "directory": "/p", "max_files": 3}),
+            environ={}
+        )
+        self.assertEqual(profiler.sample_rate, 0.1)
+        self.assertEqual(profiler.slow_threshold, 5)
+        self.assertEqual(profiler.directory, "/p")
+        self.assertEqual(profiler.max_files, 3)
+    
+    def test_environment_overrides(self):
+        """Test the environment switches."""
+        profiler = profiler_from_config(_config(), environ={"ELASTICPRINTER_PROFILE": "1"})
+        self.assertEqual(profiler.sample_rate, 1.0)
+        
+        profiler = profiler_from_config(
+            _config(),
+            environ={"ELASTICPRINTER_PROFILE": "0.25", "ELASTICPRINTER_PROFILE_DIR": "/env"}
+        )
+        self.assertEqual(profiler.sample_rate, 0.25)
+        self.assertEqual(profiler.directory, "/env")
+        
+        self.assertIsNone(profiler_from_config(
+            _config({"enabled": True}),
+            environ={"ELASTICPRINTER_PROFILE": "off"}
+        ))
+
+
+if __name__ == '__main__':
+    unittest.main()
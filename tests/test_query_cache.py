@@ -0,0 +1,120 @@
+"""Tests for the search result cache."""
+import unittest
+
+from src.elastic.client import ElasticClient
+from src.elastic.query_cache import QueryCache
+from src.tools.fake_elasticsearch import FakeElasticsearch
+
+
+class FakeClock:
+    """Manually advanced clock."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestQueryCache(unittest.TestCase):
+    """Test QueryCache class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.clock = FakeClock()
+        self.cache = QueryCache(max_entries=2, ttl=10, clock=self.clock)
+        self.query = {"query": {"term": {"print_job.user": "alice"}}, "sort": [{"indexed_at": "desc"}]}
+    
+    def test_key_normalizes_body(self):
+        """Test that key order in the body does not matter."""
+        reordered = {"sort": [{"indexed_at": "desc"}], "query": {"term": {"print_job.user": "alice"}}}
+        self.assertEqual(QueryCache.make_key("idx", self.query, 10), QueryCache.make_key("idx", reordered, 10))
+        self.assertNotEqual(QueryCache.make_key("idx", self.query, 10), QueryCache.make_key("idx", self.query, 20))
+        self.assertNotEqual(QueryCache.make_key("idx", self.query, 10), QueryCache.make_key("other", self.query, 10))
+    
+    def test_hit_returns_copy(self):
+        """Test that callers cannot modify cached results."""
+        self.cache.put("idx", self.query, 10, {"hits": {"hits": [1]}})
+        first = self.cache.get("idx", self.query, 10)
+        first["hits"]["hits"].append(2)
+        
+        self.assertEqual(self.cache.get("idx", self.query, 10), {"hits": {"hits": [1]}})
+        self.assertEqual(self.cache.stats()["hits"], 2)
+    
+    def test_ttl_expiry(self):
+        """Test that entries expire after the TTL."""
+        self.cache.put("idx", self.query, 10, {"n": 1})
+        self.clock.now = 10.5
+        
+        self.assertIsNone(self.cache.get("idx", self.query, 10))
+        stats = self.cache.stats()
+        self.assertEqual(stats["expirations"], 1)
+        self.assertEqual(stats["misses"], 1)
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted."""
+        self.cache.put("idx", {"q": 1}, 10, "one")
+        self.cache.put("idx", {"q": 2}, 10, "two")
+        self.cache.get("idx", {"q": 1}, 10)
+        self.cache.put("idx", {"q": 3}, 10, "three")
+        
+        self.assertEqual(self.cache.get("idx", {"q": 1}, 10), "one")
+        self.assertIsNone(self.cache.get("idx", {"q": 2}, 10))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+    
+    def test_invalidate_index(self):
+        """Test that invalidation only drops entries of the written index."""
+        self.cache.put("idx", {"q": 1}, 10, "one")
+        self.cache.put("other", {"q": 1}, 10, "other")
+        
+        self.assertEqual(self.cache.invalidate("idx"), 1)
+        self.assertIsNone(self.cache.get("idx", {"q": 1}, 10))
+        self.assertEqual(self.cache.get("other", {"q": 1}, 10), "other")
+    
+    def test_stale_put_dropped(self):
+        """Test that a result read before a write is not cached."""
+        generation = self.cache.generation("idx")
+        self.cache.invalidate("idx")
+        self.cache.put("idx", self.query, 10, "stale", generation)
+        self.assertIsNone(self.cache.get("idx", self.query, 10))
+        
+        generation = self.cache.generation("idx")
+        self.cache.invalidate()
+        self.cache.put("idx", self.query, 10, "stale", generation)
+        self.assertIsNone(self.cache.get("idx", self.query, 10))
+
+
+class TestElasticClientCache(unittest.TestCase):
+    """Test the cache integration in ElasticClient."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.fake_es = FakeElasticsearch().start()
+        self.cache = QueryCache()
+        self.client = ElasticClient(host=self.fake_es.url, max_retries=0, query_cache=self.cache)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.client.close()
+        self.fake_es.stop()
+    
+    def test_search_cached_until_write(self):
+        """Test that repeated searches hit the cache until a bulk write."""
+        query = {"query": {"match_all": {}}}
+        self.client.bulk([{"index": {"_id": "a"}}, {"n": 1}])
+        
+        self.assertEqual(self.client.search(query)["hits"]["total"]["value"], 1)
+        requests = self.fake_es.request_count
+        self.assertEqual(self.client.search(query)["hits"]["total"]["value"], 1)
+        self.assertEqual(self.fake_es.request_count, requests)
+        
+        self.client.bulk([{"index": {"_id": "b"}}, {"n": 2}])
+        self.assertEqual(self.client.search(query)["hits"]["total"]["value"], 2)
+        
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+"""Tests for reconciling local jobs with the index."""
+import json
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import yaml
+
+from src.cli import main as cli_main
+from src.elastic.client import ElasticClient
+from src.ingest.importer import hash_file, import_doc_id
+from src.ingest.reconcile import Reconciler, iter_spool, local_items, parse_ipp_attributes
+from src.tools.fake_elasticsearch import FakeElasticsearch
+from src.tools.memory_harness import generate_spool_file
+from src.utils.config_loader import ConfigLoader
+
+
+def _ipp_attribute(tag, name, value):
+    if isinstance(value, int):
+        value = struct.pack(">i", value)
+    else:
+        value = value.encode("utf-8")
+    name = name.encode("utf-8")
+    return struct.pack(">bh", tag, len(name)) + name + struct.pack(">h", len(value)) + value
+
+
+def _control_file(user, title, printer, created):
+    return b"".join([
+        struct.pack(">bbhi", 2, 0, 0, 1),
+        b"\x01",
+        _ipp_attribute(0x47, "attributes-charset", "utf-8"),
+        b"\x02",
+        _ipp_attribute(0x42, "job-originating-user-name", user),
+        _ipp_attribute(0x42, "job-name", title),
+        _ipp_attribute(0x45, "job-printer-uri", f"ipp://localhost/printers/{printer}"),
+        _ipp_attribute(0x21, "time-at-creation", created),
+        _ipp_attribute(0x21, "", created + 1),
+        b"\x03",
+    ])
+
+
+class TestReconcile(unittest.TestCase):
+    """Test reconciliation against the fake Elasticsearch."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.fake_es = FakeElasticsearch().start()
+        self.client = ElasticClient(host=self.fake_es.url, max_retries=0)
+        self.client.ensure_index_exists()
+        self.client.ensure_pipeline_exists()
+        
+        self.kept_dir = os.path.join(self.temp_dir, "kept")
+        self.spool_dir = os.path.join(self.temp_dir, "spool")
+        self.hotfolder = os.path.join(self.temp_dir, "hotfolder")
+        for directory in (self.kept_dir, self.spool_dir, os.path.join(self.hotfolder, "failed")):
+            os.makedirs(directory)
+        
+        self.config_path = os.path.join(self.temp_dir, "config.yaml")
+        with open(self.config_path, "w") as f:
+            yaml.safe_dump({
+                "elasticsearch": {"host": self.fake_es.url, "index": "print-jobs", "pipeline": "attachment"},
+                "printer": {"name": "ElasticPrinter"},
+                "processing": {"temp_dir": self.kept_dir, "max_retries": 0},
+                "watch": {"directory": self.hotfolder},
+                "import": {"checkpoint_file": os.path.join(self.temp_dir, "checkpoint.jsonl")},
+                "logging": {"level": "WARNING"},
+            }, f)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.client.close()
+        self.fake_es.stop()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _pdf(self, *parts):
+        path = os.path.join(self.temp_dir, *parts)
+        generate_spool_file(path, 4096)
+        return path
+    
+    def _spool_job(self, number, printer="ElasticPrinter"):
+        with open(os.path.join(self.spool_dir, f"c{number:05d}"), "wb") as f:
+            f.write(_control_file("alice", f"Report {number}", printer, 1700000000))
+        return self._pdf("spool", f"d{number:05d}-001")
+    
+    def test_parse_ipp_attributes(self):
+        """Test decoding of a CUPS control file."""
+        attributes = parse_ipp_attributes(_control_file("alice", "Report", "ElasticPrinter", 1700000000))
+        self.assertEqual(attributes["job-originating-user-name"], "alice")
+        self.assertEqual(attributes["job-name"], "Report")
+        self.assertEqual(attributes["time-at-creation"], 1700000000)
+        
+        with self.assertRaises(ValueError):
+            parse_ipp_attributes(_control_file("alice", "Report", "ElasticPrinter", 1700000000)[:40])
+    
+    def test_spool_filters_printer(self):
+        """Test that only jobs of the configured queue with a document file are found."""
+        self._spool_job(7)
+        self._spool_job(8, printer="Office")
+        with open(os.path.join(self.spool_dir, "c00009"), "wb") as f:
+            f.write(_control_file("bob", "Gone", "ElasticPrinter", 1700000000))
+        
+        items = list(iter_spool(self.spool_dir, "ElasticPrinter"))
+        self.assertEqual([item["doc_id"] for item in items], ["print-job-7"])
+        self.assertEqual(items[0]["user"], "alice")
+        self.assertEqual(items[0]["title"], "Report 7")
+    
+    def test_reingest_missing(self):
+        """Test that missing documents from every source are re-indexed."""
+        self._pdf("kept", "print_job_alice_smith_41_20240301_120000.pdf")
+        present = self._pdf("kept", "print_job_bob_42_20240301_120500.pdf")
+        self.client.index_pdf(present, {"print_job": {"user": "bob"}}, doc_id="print-job-42")
+        self._spool_job(43)
+        failed = self._pdf("hotfolder", "failed", "scan.pdf")
+        archived = self._pdf("archive.pdf")
+        with open(os.path.join(self.temp_dir, "checkpoint.jsonl"), "w") as f:
+            stat = os.stat(archived)
+            f.write(json.dumps({
+                "path": archived, "size": stat.st_size, "mtime": stat.st_mtime, "doc_id": "import-abc"
+            }) + "\n")
+        
+        items = list(local_items(ConfigLoader(self.config_path), spool_dir=self.spool_dir))
+        report = Reconciler(self.client, batch_size=2, workers=2).run(items)
+        
+        self.assertEqual(report["checked"], 5)
+        self.assertEqual(report["present"], 1)
+        self.assertEqual(report["reingested"], 4)
+        self.assertEqual(report["failed"], 0)
+        self.assertEqual(report["sources"]["temp_dir"], {"checked": 2, "missing": 1, "reingested": 1, "failed": 0})
+        
+        documents = self.fake_es.documents["print-jobs"]
+        hotfolder_id = f"print-job-hotfolder-{hash_file(failed)[:16]}"
+        for doc_id in ("print-job-41", "print-job-43", hotfolder_id, "import-abc"):
+            self.assertIn(doc_id, documents)
+        job = documents["print-job-41"]["_source"]["print_job"]
+        self.assertEqual(job["user"], "alice_smith")
+        self.assertEqual(job["timestamp"], "2024-03-01T12:00:00")
+        self.assertEqual(documents["print-job-43"]["_source"]["print_job"]["title"], "Report 43")
+        
+        # A second run finds nothing to do
+        items = list(local_items(ConfigLoader(self.config_path), spool_dir=self.spool_dir))
+        report = Reconciler(self.client).run(items)
+        self.assertEqual(report["missing"], 0)
+    
+    def test_dry_run_and_archive_dirs(self):
+        """Test that a dry run only reports and archive files get importer IDs."""
+        archived = self._pdf("archive.pdf")
+        items = list(local_items(
+            ConfigLoader(self.config_path), sources=("archive",), archive_dirs=(self.temp_dir,)
+        ))
+        
+        report = Reconciler(self.client, dry_run=True).run(items)
+        
+        expected = import_doc_id(archived, hash_file(archived))
+        self.assertEqual(report["missing_documents"], [
+            {"source": "archive", "path": archived, "doc_id": expected, "status": "missing"}
+        ])
+        self.assertNotIn(expected, self.fake_es.documents["print-jobs"])
+    
+    def test_cli_report(self):
+        """Test the reconcile command writes its report."""
+        self._pdf("kept", "print_job_alice_41_20240301_120000.pdf")
+        output = os.path.join(self.temp_dir, "report.json")
+        
+        status = cli_main([
+            "--config", self.config_path, "reconcile", "--source", "temp_dir", "--output", output
+        ])
+        
+        self.assertEqual(status, 0)
+        with open(output) as f:
+            self.assertEqual(json.load(f)["reingested"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""Tests for job capture and replay."""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from src.tools import replay
+from src.tools.fake_elasticsearch import FakeElasticsearch
+from src.tools.loadgen import BACKEND_SCRIPT
+from src.tools.memory_harness import generate_spool_file, write_harness_config
+from src.utils.capture import JobCapture, capture_from_config, captured_environment, load_sessions
+
+
+def _config(capture=None):
+    config = MagicMock()
+    config.processing = {"capture": capture} if capture is not None else {}
+    return config
+
+
+class TestJobCapture(unittest.TestCase):
+    """Test JobCapture class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.capture_dir = os.path.join(self.temp_dir, "capture")
+        self.spool_path = os.path.join(self.temp_dir, "job.pdf")
+        generate_spool_file(self.spool_path, 4096)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_session(self):
+        """Test that arguments, CUPS environment, spool file and stage timings are recorded."""
+        capture = JobCapture(self.capture_dir)
+        session = capture.start(
+            ["backend", "42", "alice", "Report", "1", ""],
+            {"PRINTER": "office", "CUPS_SERVERROOT": "/etc/cups", "AUTH_INFO_REQUIRED": "x", "HOME": "/root"}
+        )
+        session.add_spool(self.spool_path)
+        session.stage_finished("convert", 0.25, None)
+        session.finish(0)
+        
+        sessions = load_sessions(self.capture_dir)
+        self.assertEqual(len(sessions), 1)
+        record = sessions[0]
+        self.assertEqual(record["argv"], ["42", "alice", "Report", "1", ""])
+        self.assertEqual(record["environment"], {"CUPS_SERVERROOT": "/etc/cups", "PRINTER": "office"})
+        self.assertEqual(record["spool"]["size"], os.path.getsize(self.spool_path))
+        self.assertTrue(record["spool"]["stored"])
+        self.assertEqual([entry["name"] for entry in record["stages"]], ["convert"])
+        self.assertEqual(record["status"], 0)
+        with open(record["spool_path"], 'rb') as f, open(self.spool_path, 'rb') as original:
+            self.assertEqual(f.read(), original.read())
+    
+    def test_large_spool_hash_only(self):
+        """Test that spool files over the limit are recorded by hash only."""
+        capture = JobCapture(self.capture_dir, max_spool_mb=0.001)
+        session = capture.start(["backend", "42", "alice", "Report", "1", ""], {})
+        session.add_spool(self.spool_path)
+        session.finish(0)
+        
+        record = load_sessions(self.capture_dir)[0]
+        self.assertFalse(record["spool"]["stored"])
+        self.assertEqual(len(record["spool"]["sha256"]), 64)
+        self.assertIsNone(record["spool_path"])
+    
+    def test_rotation(self):
+        """Test that the oldest sessions are deleted beyond the session and size limits."""
+        capture = JobCapture(self.capture_dir, max_sessions=2)
+        for job_id in ("1", "2", "3"):
+            session = capture.start(["backend", job_id, "alice", "Report", "1", ""], {})
+            session.add_spool(self.spool_path)
+            os.utime(session.path, (0, int(job_id)))
+            session.finish(0)
+            os.utime(session.path, (0, int(job_id)))
+        self.assertEqual([record["argv"][0] for record in load_sessions(self.capture_dir)], ["2", "3"])
+        
+        capture = JobCapture(self.capture_dir, max_mb=6000 / 1024 / 1024)
+        capture.rotate()
+        self.assertEqual([record["argv"][0] for record in load_sessions(self.capture_dir)], ["3"])
+    
+    def test_from_config(self):
+        """Test the config switch and its environment override."""
+        self.assertIsNone(capture_from_config(_config()))
+        capture = capture_from_config(_config({"enabled": True, "max_sessions": 5}))
+        self.assertEqual(capture.max_sessions, 5)
+        self.assertIsNone(capture_from_config(_config({"enabled": True}), {"ELASTICPRINTER_CAPTURE": "0"}))
+        capture = capture_from_config(_config(), {
+            "ELASTICPRINTER_CAPTURE": "1", "ELASTICPRINTER_CAPTURE_DIR": self.capture_dir
+        })
+        self.assertEqual(capture.directory, self.capture_dir)
+        self.assertEqual(captured_environment({"LANG": "C", "PATH": "/bin"}), {"LANG": "C"})
+
+
+class TestReplay(unittest.TestCase):
+    """Capture real backend runs and replay them."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.capture_dir = os.path.join(self.temp_dir, "capture")
+        self.fake_es = FakeElasticsearch().start()
+        self.config_path = os.path.join(self.temp_dir, "config.yaml")
+        write_harness_config(self.config_path, self.fake_es.url, os.path.join(self.temp_dir, "pdfs"))
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.fake_es.stop()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _run_backend(self, job_id, spool_path):
+        env = dict(
+            os.environ,
+            ELASTICPRINTER_CONFIG=self.config_path,
+            ELASTICPRINTER_CAPTURE="1",
+            ELASTICPRINTER_CAPTURE_DIR=self.capture_dir,
+            PRINTER="office"
+        )
+        with open(spool_path, 'rb') as stdin:
+            return subprocess.run(
+                [sys.executable, BACKEND_SCRIPT, job_id, "alice", f"Job {job_id}", "1", ""],
+                stdin=stdin, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env
+            ).returncode
+    
+    def test_capture_and_replay(self):
+        """Test that backend runs are captured and replayed against a fresh fake cluster."""
+        spool_path = os.path.join(self.temp_dir, "job.pdf")
+        generate_spool_file(spool_path, 16 * 1024)
+        for job_id in ("7", "8"):
+            self.assertEqual(self._run_backend(job_id, spool_path), 0)
+        
+        sessions = load_sessions(self.capture_dir)
+        self.assertEqual([record["argv"][0] for record in sessions], ["7", "8"])
+        self.assertIn("stdin", [entry["name"] for entry in sessions[0]["stages"]])
+        self.assertEqual(sessions[0]["environment"]["PRINTER"], "office")
+        
+        result = replay.replay_directory(self.capture_dir, speed=0, concurrency=2)
+        
+        self.assertEqual(result["failed"], 0)
+        self.assertEqual([job["job_id"] for job in result["jobs"]], ["7", "8"])
+        self.assertGreater(result["stages"]["index"]["replayed"], 0)
+        self.assertGreater(result["stages"]["index"]["captured"], 0)
+        self.assertGreater(result["requests"], 0)
+        report = replay.format_results(result, baseline=result)
+        self.assertIn("vs baseline", report)
+        self.assertIn("2 jobs replayed", report)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""Tests for usage reports."""
+import io
+import json
+import unittest
+
+from src.elastic.client import ElasticClient
+from src.elastic.reporting import build_sources, iter_usage, write_csv, write_json
+from src.tools.fake_elasticsearch import FakeElasticsearch
+
+
+class TestReporting(unittest.TestCase):
+    """Test composite aggregation reports."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.fake_es = FakeElasticsearch().start()
+        self.client = ElasticClient(host=self.fake_es.url, max_retries=0)
+        
+        jobs = [
+            ("alice", "mac-1", "2024-03-01T09:00:00", 3, 1000),
+            ("alice", "mac-1", "2024-03-01T17:30:00", 2, 500),
+            ("alice", "mac-2", "2024-03-02T08:00:00", 1, 100),
+            ("bob", "mac-1", "2024-03-01T10:00:00", 10, 4000),
+            ("bob", None, "2024-03-05T10:00:00", 4, 50),
+        ]
+        operations = []
+        for i, (user, host, indexed_at, pages, size) in enumerate(jobs):
+            operations.append({"index": {"_id": f"job-{i}"}})
+            operations.append({
+                "print_job": {"user": user, "hostname": host},
+                "document": {"page_count": pages, "file_size": size},
+                "indexed_at": indexed_at,
+            })
+        self.client.bulk(operations)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.client.close()
+        self.fake_es.stop()
+    
+    def test_build_sources(self):
+        """Test composite sources for the requested dimensions."""
+        sources = build_sources(["user", "day"], interval="month", time_zone="Europe/Berlin")
+        self.assertEqual(list(sources[0]), ["user"])
+        histogram = sources[1]["day"]["date_histogram"]
+        self.assertEqual(histogram["calendar_interval"], "month")
+        self.assertEqual(histogram["time_zone"], "Europe/Berlin")
+        
+        with self.assertRaises(ValueError):
+            build_sources(["printer"])
+        with self.assertRaises(ValueError):
+            build_sources(["day"], interval="hour")
+    
+    def test_iter_usage_pages_through_buckets(self):
+        """Test that all buckets are returned across pages."""
+        rows = list(iter_usage(self.client, page_size=2))
+        
+        self.assertEqual(len(rows), 4)
+        self.assertIn(
+            {"user": "alice", "host": "mac-1", "day": "2024-03-01", "jobs": 2, "pages": 5, "bytes": 1500},
+            rows
+        )
+        self.assertIn(
+            {"user": "bob", "host": None, "day": "2024-03-05", "jobs": 1, "pages": 4, "bytes": 50},
+            rows
+        )
+    
+    def test_iter_usage_time_filter(self):
+        """Test grouping by user within a time range."""
+        rows = list(iter_usage(self.client, group_by=["user"], start="2024-03-01", end="2024-03-02"))
+        
+        self.assertEqual(rows, [
+            {"user": "alice", "jobs": 2, "pages": 5, "bytes": 1500},
+            {"user": "bob", "jobs": 1, "pages": 10, "bytes": 4000},
+        ])
+    
+    def test_aggregate(self):
+        """Test that aggregate returns only the aggregations."""
+        aggregations = self.client.aggregate(
+            {"pages": {"sum": {"field": "document.page_count"}}},
+            query={"term": {"print_job.user": "bob"}}
+        )
+        self.assertEqual(aggregations, {"pages": {"value": 14.0}})
+    
+    def test_write_formats(self):
+        """Test CSV and JSON output."""
+        rows = [{"user": "alice", "jobs": 2, "pages": 5, "bytes": 1500}]
+        
+        csv_output = io.StringIO()
+        self.assertEqual(write_csv(iter(rows), csv_output, ["user"]), 1)
+        self.assertEqual(csv_output.getvalue().splitlines(), ["user,jobs,pages,bytes", "alice,2,5,1500"])
+        
+        json_output = io.StringIO()
+        self.assertEqual(write_json(iter(rows), json_output), 1)
+        self.assertEqual(json.loads(json_output.getvalue()), rows)
+        
+        empty_output = io.StringIO()
+        write_json(iter([]), empty_output)
+        self.assertEqual(json.loads(empty_output.getvalue()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
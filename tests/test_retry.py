@@ -0,0 +1,159 @@
+"""Tests for retry policy and circuit breaker."""
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock
+
+from elastic_transport import ApiResponseMeta, HttpHeaders
+
+from src.elastic import retry
+
+
+def make_api_error(status, headers=None):
+    """Build an ApiError with the given status and headers."""
+    meta = ApiResponseMeta(
+        status=status,
+        http_version="1.1",
+        headers=HttpHeaders(headers or {}),
+        duration=0.0,
+        node=None
+    )
+    return retry.ApiError(message="error", meta=meta, body={})
+
+
+class TestErrorClassification(unittest.TestCase):
+    """Test retryable/fatal classification."""
+    
+    def test_transient_errors_are_retryable(self):
+        """Test that 429/5xx and connection errors are retryable."""
+        self.assertTrue(retry.is_retryable(make_api_error(429)))
+        self.assertTrue(retry.is_retryable(make_api_error(503)))
+        self.assertTrue(retry.is_retryable(retry.ConnectionError("down")))
+    
+    def test_client_errors_are_fatal(self):
+        """Test that 4xx errors and other exceptions are fatal."""
+        self.assertFalse(retry.is_retryable(make_api_error(400)))
+        self.assertFalse(retry.is_retryable(ValueError("bad")))
+    
+    def test_retry_after_header(self):
+        """Test that Retry-After is parsed in seconds."""
+        self.assertEqual(retry.retry_after(make_api_error(429, {"Retry-After": "7"})), 7.0)
+        self.assertIsNone(retry.retry_after(make_api_error(429)))
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """Test RetryPolicy class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.sleeps = []
+        self.policy = retry.RetryPolicy(
+            max_retries=3,
+            backoff_base=0.5,
+            backoff_max=30,
+            sleep=self.sleeps.append
+        )
+    
+    def test_retries_then_succeeds(self):
+        """Test that transient failures are retried."""
+        func = Mock(side_effect=[make_api_error(503), make_api_error(503), "ok"])
+        
+        self.assertEqual(self.policy.call(func), "ok")
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(len(self.sleeps), 2)
+    
+    def test_fatal_error_not_retried(self):
+        """Test that fatal errors are raised immediately."""
+        func = Mock(side_effect=make_api_error(400))
+        
+        with self.assertRaises(retry.ApiError):
+            self.policy.call(func)
+        self.assertEqual(func.call_count, 1)
+    
+    def test_gives_up_after_max_retries(self):
+        """Test that the last error is raised once retries are exhausted."""
+        func = Mock(side_effect=make_api_error(502))
+        
+        with self.assertRaises(retry.ApiError):
+            self.policy.call(func)
+        self.assertEqual(func.call_count, 4)
+    
+    def test_honors_retry_after(self):
+        """Test that Retry-After overrides the computed backoff."""
+        func = Mock(side_effect=[make_api_error(429, {"Retry-After": "2"}), "ok"])
+        
+        self.policy.call(func)
+        self.assertEqual(self.sleeps, [2.0])
+    
+    def test_backoff_is_bounded(self):
+        """Test that jittered delays stay within the exponential ceiling."""
+        for attempt in range(1, 10):
+            delay = self.policy.delay(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(self.policy.backoff_max, 0.5 * 2 ** (attempt - 1)))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test CircuitBreaker class."""
+    
+    def test_opens_after_threshold(self):
+        """Test that the breaker rejects calls after repeated failures."""
+        breaker = retry.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        policy = retry.RetryPolicy(max_retries=5, sleep=lambda _: None)
+        func = Mock(side_effect=retry.ConnectionError("down"))
+        
+        with self.assertRaises(retry.CircuitOpenError):
+            policy.call(func, breaker=breaker)
+        self.assertEqual(func.call_count, 2)
+        self.assertEqual(breaker.state, retry.CircuitBreaker.OPEN)
+    
+    def test_half_open_after_timeout(self):
+        """Test that a trial request closes the breaker on success."""
+        breaker = retry.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, retry.CircuitBreaker.CLOSED)
+    
+    def test_stale_trial_expires(self):
+        """Test that a trial that never reports back does not block the breaker forever."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            state_file = os.path.join(temp_dir, "breaker.json")
+            killed = retry.CircuitBreaker(failure_threshold=1, reset_timeout=0.05, state_file=state_file)
+            killed.record_failure()
+            time.sleep(0.06)
+            self.assertTrue(killed.allow_request())
+            
+            # The trial's process died; the next process waits, then tries again
+            later = retry.CircuitBreaker(failure_threshold=1, reset_timeout=0.05, state_file=state_file)
+            self.assertFalse(later.allow_request())
+            time.sleep(0.06)
+            self.assertTrue(later.allow_request())
+    
+    def test_every_outcome_recorded(self):
+        """Test that trials failing with local or interrupting errors release the breaker."""
+        breaker = retry.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        policy = retry.RetryPolicy(max_retries=0, sleep=lambda _: None)
+        for error in (ValueError("bad body"), KeyboardInterrupt()):
+            breaker.record_failure()
+            with self.assertRaises(type(error)):
+                policy.call(Mock(side_effect=error), breaker=breaker)
+            self.assertEqual(breaker._state, retry.CircuitBreaker.OPEN)
+            self.assertTrue(breaker.allow_request())
+            breaker.record_success()
+    
+    def test_state_shared_through_file(self):
+        """Test that breaker state persists across instances."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            state_file = os.path.join(temp_dir, "breaker.json")
+            first = retry.CircuitBreaker(failure_threshold=1, reset_timeout=60, state_file=state_file)
+            first.record_failure()
+            
+            second = retry.CircuitBreaker(failure_threshold=1, reset_timeout=60, state_file=state_file)
+            self.assertFalse(second.allow_request())
+
+
+if __name__ == "__main__":
+    unittest.main()
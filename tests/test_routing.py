@@ -0,0 +1,121 @@
+"""Tests for routing documents by user."""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.elastic.client import ElasticClient, add_bulk_routing, build_index_body
+from src.elastic.query_cache import QueryCache
+from src.tools.fake_elasticsearch import FakeElasticsearch
+
+
+def _job(user):
+    return {"print_job": {"user": user, "title": f"{user}'s job"}, "document": {}}
+
+
+class TestUserRouting(unittest.TestCase):
+    """Test ElasticClient with route_by_user."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.fake_es = FakeElasticsearch().start()
+        self.client = ElasticClient(
+            host=self.fake_es.url,
+            max_retries=0,
+            route_by_user=True,
+            routing_partition_size=2,
+            index_settings={"number_of_shards": 4},
+            query_cache=QueryCache()
+        )
+        self.client.ensure_index_exists()
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.client.close()
+        self.fake_es.stop()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _routing(self, doc_id):
+        return self.fake_es.documents["print-jobs"][doc_id]["_routing"]
+    
+    def test_index_body(self):
+        """Test that routing is required and partitioned when the index is created."""
+        body = self.fake_es.indices["print-jobs"]
+        self.assertEqual(body["mappings"]["_routing"], {"required": True})
+        self.assertEqual(body["settings"]["routing_partition_size"], 2)
+        self.assertEqual(body["settings"]["number_of_shards"], 4)
+        
+        self.assertNotIn("_routing", build_index_body()["mappings"])
+    
+    def test_writes_are_routed(self):
+        """Test that index_pdf and bulk route by print_job.user."""
+        pdf_path = os.path.join(self.temp_dir, "job.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(b"%PDF-1.4\n")
+        self.client.index_pdf(pdf_path, _job("alice"), doc_id="job-1")
+        
+        response = self.client.bulk([
+            {"index": {"_id": "job-2"}}, _job("bob"),
+            {"index": {"_id": "job-3", "routing": "explicit"}}, _job("carol"),
+            {"index": {"_id": "job-4"}}, {"document": {}},
+        ])
+        
+        self.assertEqual(self._routing("job-1"), "alice")
+        self.assertEqual(self._routing("job-2"), "bob")
+        self.assertEqual(self._routing("job-3"), "explicit")
+        # Documents without a user share a fallback routing key
+        self.assertFalse(response["errors"])
+        self.assertEqual(self._routing("job-4"), "unknown")
+    
+    def test_documents_without_user(self):
+        """Test that documents without a user can be written, read and reconciled."""
+        self.client.bulk([{"index": {"_id": "job-1"}}, {"document": {}}])
+        
+        self.assertEqual(self.client.get_document("job-1")["_routing"], "unknown")
+        docs = self.client.mget(["job-1", "job-2"], users=[None, None])
+        self.assertEqual([doc["found"] for doc in docs], [True, False])
+    
+    def test_existing_index_without_routing(self):
+        """Test that user routing is refused for an index created without required routing."""
+        self.fake_es.indices["legacy"] = build_index_body()
+        client = ElasticClient(host=self.fake_es.url, index="legacy", max_retries=0, route_by_user=True)
+        try:
+            self.assertTrue(client.ensure_index_exists())
+            self.assertFalse(client.route_by_user)
+        finally:
+            client.close()
+        
+        self.assertTrue(self.client.ensure_index_exists())
+        self.assertTrue(self.client.route_by_user)
+    
+    def test_reads_are_routed(self):
+        """Test that get_document and per-user searches pass the routing key."""
+        self.client.bulk([{"index": {"_id": "job-1"}}, _job("alice")])
+        
+        self.assertEqual(self.client.get_document("job-1", user="alice")["_routing"], "alice")
+        
+        query = {"query": {"term": {"print_job.user": "alice"}}}
+        with patch.object(self.client.es, "search", wraps=self.client.es.search) as search:
+            self.client.search(query, user="alice")
+            self.client.search(query, user="alice")
+            self.client.search(query)
+        self.assertEqual([call.kwargs["routing"] for call in search.call_args_list], ["alice", None])
+    
+    def test_add_bulk_routing(self):
+        """Test routing of update and delete actions."""
+        operations = [
+            {"update": {"_id": "1"}}, {"doc": {"print_job": {"user": "alice"}}},
+            {"delete": {"_id": "2"}},
+            {"update": {"_id": "3"}}, {"doc": {"document": {}}},
+        ]
+        routed = add_bulk_routing(operations)
+        self.assertEqual(routed[0], {"update": {"_id": "1", "routing": "alice"}})
+        self.assertEqual(routed[2], {"delete": {"_id": "2"}})
+        self.assertEqual(routed[3], {"update": {"_id": "3"}})
+        self.assertEqual(operations[0], {"update": {"_id": "1"}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,245 @@
+"""Tests for the per-user fair scheduler."""
+import json
+import os
+import shutil
+import tempfile
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import src.ingest.watcher as watcher_module
+import src.job_runner as job_runner_module
+from src.ingest.scheduler import MIN_JOB_COST, FairScheduler, QuotaExceededError
+from src.ingest.watcher import HotFolderWatcher
+from src.job_runner import AsyncJobRunner
+
+MB = 1024 * 1024
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+def _job(user, name):
+    return {"user": user, "job_id": name}
+
+
+class TestFairScheduler(unittest.TestCase):
+    """Test FairScheduler class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.clock = FakeClock()
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _drain(self, scheduler):
+        order = []
+        while True:
+            job = scheduler.get(timeout=0)
+            if job is None:
+                return order
+            order.append(job["job_id"])
+            scheduler.done()
+    
+    def test_small_jobs_overtake_large_ones(self):
+        """Test that a huge job does not block other users' small jobs."""
+        scheduler = FairScheduler(clock=self.clock)
+        scheduler.submit(_job("alice", "alice-huge"), size=500 * MB)
+        scheduler.submit(_job("alice", "alice-small"), size=10 * 1024)
+        scheduler.submit(_job("bob", "bob-1"), size=20 * 1024)
+        scheduler.submit(_job("carol", "carol-1"), size=2 * MB)
+        
+        self.assertEqual(self._drain(scheduler), ["alice-small", "bob-1", "carol-1", "alice-huge"])
+    
+    def test_weighted_share(self):
+        """Test that a flooding user gets their share, not the whole queue."""
+        scheduler = FairScheduler(weights={"bob": 2.0}, clock=self.clock)
+        for i in range(6):
+            scheduler.submit(_job("script", f"script-{i}"), size=MIN_JOB_COST)
+        for i in range(4):
+            scheduler.submit(_job("bob", f"bob-{i}"), size=MIN_JOB_COST)
+        
+        order = self._drain(scheduler)
+        self.assertEqual([name.split("-")[0] for name in order[:6]],
+                         ["bob", "script", "bob", "bob", "script", "bob"])
+        # Each user's jobs stay in submission order when sizes are equal
+        self.assertEqual([name for name in order if name.startswith("script")], [f"script-{i}" for i in range(6)])
+    
+    def test_job_rate_quota(self):
+        """Test that a user over the job rate waits while others are served."""
+        scheduler = FairScheduler(jobs_per_minute=1, clock=self.clock)
+        scheduler.submit(_job("alice", "alice-1"), size=1024)
+        scheduler.submit(_job("alice", "alice-2"), size=1024)
+        scheduler.submit(_job("bob", "bob-1"), size=4096)
+        
+        self.assertEqual(self._drain(scheduler), ["alice-1", "bob-1"])
+        stats = scheduler.stats()
+        self.assertEqual(stats["users"]["alice"]["queued"], 1)
+        self.assertEqual(stats["users"]["alice"]["throttled"], 1)
+        
+        self.clock.now += 60
+        self.assertEqual(self._drain(scheduler), ["alice-2"])
+    
+    def test_byte_quota(self):
+        """Test that an oversized job passes on a full bucket and leaves it in debt."""
+        scheduler = FairScheduler(bytes_per_hour=10 * MB, clock=self.clock)
+        scheduler.submit(_job("alice", "alice-big"), size=30 * MB)
+        self.assertEqual(self._drain(scheduler), ["alice-big"])
+        
+        scheduler.submit(_job("alice", "alice-next"), size=MB)
+        self.clock.now += 3600
+        self.assertEqual(self._drain(scheduler), [])
+        self.clock.now += 3 * 3600
+        self.assertEqual(self._drain(scheduler), ["alice-next"])
+    
+    def test_max_queued_and_close(self):
+        """Test queue limits and that close() lets workers finish the queue."""
+        scheduler = FairScheduler(max_queued_jobs=1, clock=self.clock)
+        scheduler.submit(_job("alice", "alice-1"), size=1)
+        with self.assertRaises(QuotaExceededError):
+            scheduler.submit(_job("alice", "alice-2"), size=1)
+        
+        scheduler.close()
+        self.assertEqual(scheduler.get()["job_id"], "alice-1")
+        self.assertIsNone(scheduler.get())
+        with self.assertRaises(RuntimeError):
+            scheduler.submit(_job("bob", "bob-1"), size=1)
+    
+    def test_stats_file(self):
+        """Test that wait times and queue depth are written to the stats file."""
+        path = os.path.join(self.temp_dir, "stats.json")
+        scheduler = FairScheduler(stats_file=path, clock=self.clock)
+        scheduler.submit(_job("alice", "alice-1"), size=1)
+        scheduler.submit(_job("bob", "bob-1"), size=2)
+        self.clock.now += 5
+        scheduler.get()
+        
+        with open(path) as f:
+            stats = json.load(f)
+        self.assertEqual(stats["queued"], 1)
+        self.assertEqual(stats["in_flight"], 1)
+        self.assertEqual(stats["users"]["alice"]["wait_p50"], 5.0)
+        self.assertEqual(stats["users"]["bob"]["oldest_wait"], 5.0)
+
+
+class TestSchedulerIntegration(unittest.TestCase):
+    """Test the hot-folder watcher and async job runner with a scheduler."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.processed = []
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _processor(self, input_file, job_id, user, title, copies, config, logger):
+        self.processed.append(title)
+        return True
+    
+    def test_files_processed_smallest_first(self):
+        """Test that ready files are processed in scheduler order."""
+        watcher = HotFolderWatcher(
+            config=None,
+            logger_=None,
+            watch_dir=self.temp_dir,
+            workers=1,
+            processor=self._processor,
+            scheduler=FairScheduler()
+        )
+        paths = []
+        for name, size in (("large", 3 * MB), ("small", 1024), ("medium", MB)):
+            path = os.path.join(self.temp_dir, f"{name}.pdf")
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.4\n" + b"\0" * size)
+            paths.append(path)
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            watcher._submit(executor, paths)
+            watcher.stop()
+            watcher._scheduled_worker()
+        
+        self.assertEqual(self.processed, ["small", "medium", "large"])
+        self.assertEqual(watcher.stats["processed"], 3)
+    
+    def test_files_over_queue_limit_fail(self):
+        """Test that files the scheduler refuses are moved to the failed directory."""
+        watcher = HotFolderWatcher(
+            config=None,
+            logger_=None,
+            watch_dir=self.temp_dir,
+            workers=1,
+            processor=self._processor,
+            # The class the watcher imports, so that it catches its QuotaExceededError
+            scheduler=watcher_module.FairScheduler(max_queued_jobs=1)
+        )
+        paths = []
+        for name in ("first", "second"):
+            path = os.path.join(self.temp_dir, f"{name}.pdf")
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.4\n")
+            paths.append(path)
+        
+        # The worker occupies the only executor slot until stopped, as in run()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            worker = executor.submit(watcher._scheduled_worker)
+            try:
+                watcher._submit(executor, paths)
+                rejected = os.path.exists(os.path.join(watcher.failed_dir, "second.pdf"))
+            finally:
+                watcher.stop()
+            worker.result(timeout=10)
+        
+        self.assertTrue(rejected)
+        self.assertEqual(self.processed, ["first"])
+        self.assertEqual(watcher.stats["failed"], 1)
+    
+    def test_async_runner_order(self):
+        """Test that the async runner returns results in input order but runs jobs fairly."""
+        runner = AsyncJobRunner(config=MagicMock(), logger=MagicMock(), concurrency=1)
+        started = []
+        
+        async def run_one(job):
+            started.append(job["job_id"])
+            return job["job_id"] != "bob-1"
+        
+        jobs = [{**_job("alice", f"alice-{i}"), "input_file": os.devnull} for i in range(3)]
+        jobs.append({**_job("bob", "bob-1"), "input_file": os.devnull})
+        results = asyncio.run(runner._run_scheduled(FairScheduler(), jobs, run_one))
+        
+        self.assertEqual(started, ["alice-0", "bob-1", "alice-1", "alice-2"])
+        self.assertEqual(results, [True, True, True, False])
+        self.assertEqual(runner.scheduler_stats["users"]["alice"]["dispatched"], 3)
+    
+    def test_async_runner_jobs_over_queue_limit_fail(self):
+        """Test that jobs over the queue limit fail without stopping the others."""
+        runner = AsyncJobRunner(config=MagicMock(), logger=MagicMock(), concurrency=1)
+        started = []
+        
+        async def run_one(job):
+            started.append(job["job_id"])
+            return True
+        
+        jobs = [_job("alice", "alice-0"), _job("alice", "alice-1"), _job("bob", "bob-0")]
+        scheduler = job_runner_module.FairScheduler(max_queued_jobs=1)
+        results = asyncio.run(runner._run_scheduled(scheduler, jobs, run_one))
+        
+        self.assertEqual(sorted(started), ["alice-0", "bob-0"])
+        self.assertEqual(results, [True, False, True])
+        runner.logger.warning.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
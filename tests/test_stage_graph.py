@@ -0,0 +1,102 @@
+"""Tests for concurrent job stages."""
+import threading
+import time
+import unittest
+
+from src.utils.stage_graph import StageGraph
+
+
+class TestStageGraph(unittest.TestCase):
+    """Test StageGraph class."""
+    
+    def test_independent_branches_overlap(self):
+        """Test that independent stages run at the same time and results flow along dependencies."""
+        def sleeper(value):
+            def run(results):
+                time.sleep(0.2)
+                return value
+            return run
+        
+        graph = StageGraph()
+        graph.add("convert", sleeper("pdf"))
+        graph.add("metadata", lambda results: results["convert"] + "+meta", after=["convert"])
+        graph.add("connect", sleeper("client"))
+        graph.add("index", lambda results: (results["metadata"], results["connect"]), after=["metadata", "connect"])
+        
+        start = time.perf_counter()
+        results = graph.run(max_workers=3)
+        elapsed = time.perf_counter() - start
+        
+        self.assertEqual(results["index"], ("pdf+meta", "client"))
+        self.assertLess(elapsed, 0.35)
+    
+    def test_failure_skips_dependents_only(self):
+        """Test that a failed stage skips its dependents while kept stages finish."""
+        ran = []
+        
+        def fail(results):
+            raise ConnectionError("cluster down")
+        
+        def mirror(results):
+            time.sleep(0.1)
+            ran.append("mirror")
+            return True
+        
+        for workers in (1, 3):
+            ran.clear()
+            graph = StageGraph()
+            graph.add("connect", fail)
+            graph.add("bootstrap", lambda results: ran.append("bootstrap"), after=["connect"])
+            graph.add("mirror", mirror, keep=True)
+            graph.add("index", lambda results: ran.append("index"), after=["bootstrap", "mirror"])
+            
+            with self.assertRaises(ConnectionError):
+                graph.run(max_workers=workers)
+            self.assertEqual(ran, ["mirror"])
+            self.assertEqual(graph.results, {"mirror": True})
+            self.assertEqual(graph.skipped, ["bootstrap", "index"])
+    
+    def test_failure_cancels_pending_stages(self):
+        """Test that stages not needed by kept stages are not started after a failure."""
+        ran = []
+        
+        def fail(results):
+            raise ValueError("unreadable job")
+        
+        def connect(results):
+            time.sleep(0.1)
+            ran.append("connect")
+        
+        for workers in (1, 2):
+            ran.clear()
+            graph = StageGraph()
+            graph.add("analyze", fail)
+            graph.add("mirror", lambda results: ran.append("mirror"), after=["analyze"], keep=True)
+            graph.add("connect", connect)
+            graph.add("bootstrap", lambda results: ran.append("bootstrap"), after=["connect"])
+            
+            with self.assertRaises(ValueError):
+                graph.run(max_workers=workers)
+            self.assertNotIn("bootstrap", ran)
+            self.assertIn("bootstrap", graph.skipped)
+            # Serially, connect is only reached after analyze failed; in parallel it was already running
+            self.assertEqual(ran, [] if workers == 1 else ["connect"])
+    
+    def test_serial_runs_in_calling_thread(self):
+        """Test that one worker runs every stage in insertion order in the caller's thread."""
+        threads = []
+        graph = StageGraph()
+        for name in ("a", "b", "c"):
+            graph.add(name, lambda results, name=name: threads.append((name, threading.get_ident())))
+        graph.run(max_workers=1)
+        self.assertEqual(threads, [(name, threading.get_ident()) for name in ("a", "b", "c")])
+    
+    def test_unknown_dependency(self):
+        """Test that stages can only depend on stages added before them."""
+        graph = StageGraph()
+        with self.assertRaises(ValueError):
+            graph.add("index", lambda results: None, after=["connect"])
+
+
+if __name__ == '__main__':
+    unittest.main()
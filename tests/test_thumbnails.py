@@ -0,0 +1,259 @@
+"""Tests for on-demand thumbnails."""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from unittest.mock import MagicMock
+
+from src.preview.thumbnails import (
+    FAILED,
+    MISSING,
+    PENDING,
+    READY,
+    KeptPdfIndex,
+    PreviewServer,
+    ThumbnailCache,
+    ThumbnailService,
+    cache_key,
+)
+
+
+class FakeRenderer:
+    """Writes a fake PNG of ``size`` bytes, optionally waiting for a release."""
+    
+    def __init__(self, size=100, block=False):
+        self.size = size
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+        self._lock = threading.Lock()
+    
+    def __call__(self, pdf_path, png_path):
+        with self._lock:
+            self.calls.append(pdf_path)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        self.release.wait(5)
+        with self._lock:
+            self.running -= 1
+        if pdf_path.endswith("broken.pdf"):
+            return False
+        with open(png_path, "wb") as f:
+            f.write(b"\x89PNG" + b"\0" * (self.size - 4))
+        return True
+
+
+class TestThumbnailCache(unittest.TestCase):
+    """Test ThumbnailCache class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _png(self, name, size=100):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "wb") as f:
+            f.write(b"\0" * size)
+        return path
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used thumbnail is evicted first."""
+        cache = ThumbnailCache(self.cache_dir, max_bytes=250)
+        cache.put("a", self._png("a"))
+        cache.put("b", self._png("b"))
+        self.assertIsNotNone(cache.get("a"))
+        cache.put("c", self._png("c"))
+        
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.size, 200)
+        self.assertEqual(cache.evictions, 1)
+        self.assertFalse(os.path.exists(cache.path_for("b")))
+    
+    def test_reopen(self):
+        """Test that a new process picks up cached thumbnails and the size bound."""
+        cache = ThumbnailCache(self.cache_dir, max_bytes=1000)
+        for name in ("a", "b", "c"):
+            cache.put(name, self._png(name))
+            os.utime(cache.path_for(name), (0, {"a": 3, "b": 1, "c": 2}[name]))
+        
+        cache = ThumbnailCache(self.cache_dir, max_bytes=250)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+    
+    def test_cache_key(self):
+        """Test that unsafe document IDs are hashed."""
+        self.assertEqual(cache_key("print-job-42"), "print-job-42")
+        self.assertEqual(len(cache_key("../etc/passwd")), 40)
+        self.assertEqual(len(cache_key(".hidden")), 40)
+
+
+class TestThumbnailService(unittest.TestCase):
+    """Test ThumbnailService class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdfs = {
+            f"print-job-{n}": os.path.join(self.temp_dir, f"job{n}.pdf") for n in range(4)
+        }
+        self.pdfs["print-job-broken"] = os.path.join(self.temp_dir, "broken.pdf")
+        self.cache = ThumbnailCache(os.path.join(self.temp_dir, "cache"))
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_render_once_and_cache(self):
+        """Test that a thumbnail is rendered once and then served from the cache."""
+        renderer = FakeRenderer()
+        service = ThumbnailService(self.cache, self.pdfs.get, render=renderer)
+        
+        status, path = service.thumbnail("print-job-1", wait=5)
+        self.assertEqual(status, READY)
+        self.assertEqual(service.thumbnail("print-job-1"), (READY, path))
+        self.assertEqual(renderer.calls, [self.pdfs["print-job-1"]])
+        self.assertEqual(service.thumbnail("print-job-9"), (MISSING, None))
+        self.assertEqual(service.thumbnail("print-job-broken", wait=5), (FAILED, None))
+        self.assertEqual(service.thumbnail("print-job-broken"), (FAILED, None))
+        self.assertEqual(len(renderer.calls), 2)
+        service.close()
+    
+    def test_first_request_does_not_block(self):
+        """Test that requests return while rendering and renders are limited."""
+        renderer = FakeRenderer(block=True)
+        service = ThumbnailService(self.cache, self.pdfs.get, render=renderer, max_renders=2)
+        
+        for n in range(4):
+            self.assertEqual(service.thumbnail(f"print-job-{n}"), (PENDING, None))
+        # A second request for the same document shares the running render
+        self.assertEqual(service.thumbnail("print-job-0"), (PENDING, None))
+        
+        renderer.release.set()
+        service.close()
+        self.assertEqual(len(renderer.calls), 4)
+        self.assertEqual(renderer.max_running, 2)
+        self.assertEqual(service.stats()["cached"], 4)
+
+
+class TestKeptPdfIndex(unittest.TestCase):
+    """Test KeptPdfIndex class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.done_dir = os.path.join(self.temp_dir, "hot", "done")
+        os.makedirs(self.done_dir)
+        self.config = MagicMock()
+        self.config.processing = {"temp_dir": os.path.join(self.temp_dir, "tmp")}
+        self.config.printer = {}
+        self.config.get.side_effect = lambda key, default=None: (
+            {"directory": os.path.join(self.temp_dir, "hot")} if key == "watch" else default
+        )
+        self.index = KeptPdfIndex(self.config, rescan_interval=60)
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _write(self, name, content):
+        path = os.path.join(self.done_dir, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        os.utime(path, (1000, 1000))
+        return path
+    
+    def _rescan(self):
+        """List the directories again and wait for the scan."""
+        self.index._scanned_at = None
+        self.assertEqual(self.index("print-job-x"), PENDING)
+        self.index._scan_thread.join(5)
+    
+    def test_scan_in_background(self):
+        """Test that unknown documents are pending while the directories are listed."""
+        path = self._write("report.pdf", b"%PDF-1.4 report")
+        self.assertEqual(self.index("print-job-x"), PENDING)
+        self.assertEqual(self.index("print-job-y"), PENDING)
+        self.index._scan_thread.join(5)
+        
+        (_, _, job_id), = self.index._hotfolder_ids.values()
+        self.assertEqual(self.index(f"print-job-{job_id}"), path)
+        # Not listed again before rescan_interval
+        self.assertIsNone(self.index("print-job-x"))
+    
+    def test_unchanged_files_not_rehashed(self):
+        """Test that files with the same mtime and size keep their cached job ID."""
+        path = self._write("report.pdf", b"%PDF-1.4 aaaaaa")
+        self._rescan()
+        (_, _, job_id), = self.index._hotfolder_ids.values()
+        
+        # Same size and mtime: not hashed again
+        self._write("report.pdf", b"%PDF-1.4 bbbbbb")
+        self._rescan()
+        self.assertEqual(self.index(f"print-job-{job_id}"), path)
+        
+        os.remove(path)
+        self._rescan()
+        self.assertEqual(self.index._hotfolder_ids, {})
+
+
+class TestPreviewServer(unittest.TestCase):
+    """Test the thumbnail HTTP endpoint."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.renderer = FakeRenderer(block=True)
+        self.service = ThumbnailService(
+            ThumbnailCache(os.path.join(self.temp_dir, "cache")),
+            {"print-job-1": os.path.join(self.temp_dir, "job1.pdf")}.get,
+            render=self.renderer
+        )
+        self.server = PreviewServer(self.service, port=0)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.renderer.release.set()
+        self.server.shutdown()
+        self.service.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _get(self, path):
+        try:
+            with urllib.request.urlopen(self.server.url + path) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+    
+    def test_pending_then_ready(self):
+        """Test 202 while rendering, then the PNG."""
+        status, headers, _ = self._get("/thumbnails/print-job-1.png")
+        self.assertEqual(status, 202)
+        self.assertEqual(headers["Retry-After"], "1")
+        
+        self.renderer.release.set()
+        self.service.thumbnail("print-job-1", wait=5)
+        status, headers, body = self._get("/thumbnails/print-job-1.png")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["Content-Type"], "image/png")
+        self.assertTrue(body.startswith(b"\x89PNG"))
+        
+        self.assertEqual(self._get("/thumbnails/print-job-2.png")[0], 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
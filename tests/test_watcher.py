@@ -0,0 +1,134 @@
+"""Tests for the hot-folder watcher."""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from src.ingest.watcher import HotFolderWatcher
+
+
+class TestHotFolderWatcher(unittest.TestCase):
+    """Test HotFolderWatcher class."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.calls = []
+        self.lock = threading.Lock()
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _processor(self, input_file, job_id, user, title, copies, config, logger):
+        with self.lock:
+            self.calls.append((input_file, job_id, title))
+        return not title.startswith("bad")
+    
+    def _watcher(self, **kwargs):
+        return HotFolderWatcher(
+            config=None,
+            logger_=None,
+            watch_dir=self.temp_dir,
+            processor=self._processor,
+            **kwargs
+        )
+    
+    def _write(self, name, data=b"%PDF-1.4\n"):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+    
+    def test_settle_timer(self):
+        """Test that files are only ready after the settle time."""
+        watcher = self._watcher(settle_seconds=2.0)
+        path = self._write("a.pdf")
+        
+        watcher.note_written(path, now=100.0)
+        self.assertEqual(watcher.collect_settled(now=101.0), [])
+        
+        # A new write restarts the timer
+        watcher.note_written(path, now=101.5)
+        self.assertEqual(watcher.collect_settled(now=102.5), [])
+        self.assertEqual(watcher.collect_settled(now=103.5), [path])
+    
+    def test_growing_file_not_ready(self):
+        """Test that a file whose size changed is not picked up."""
+        watcher = self._watcher(settle_seconds=1.0)
+        path = self._write("a.pdf")
+        watcher.note_written(path, now=100.0)
+        
+        with open(path, "ab") as f:
+            f.write(b"more data")
+        
+        self.assertEqual(watcher.collect_settled(now=102.0), [])
+        self.assertEqual(watcher.collect_settled(now=103.0), [path])
+    
+    def test_batches_coalesced(self):
+        """Test that ready files are submitted together after the batch window."""
+        watcher = self._watcher(settle_seconds=0.0, batch_window=1.0, max_batch=2)
+        paths = [self._write(f"{i}.pdf") for i in range(3)]
+        
+        watcher.note_written(paths[0], now=100.0)
+        watcher.collect_settled(now=100.0)
+        self.assertEqual(watcher.take_batch(now=100.5), [])
+        
+        watcher.note_written(paths[1], now=100.6)
+        watcher.note_written(paths[2], now=100.6)
+        watcher.collect_settled(now=100.6)
+        
+        # Full batch is released before the window ends
+        self.assertEqual(watcher.take_batch(now=100.6), paths[:2])
+        self.assertEqual(watcher.take_batch(now=100.7), [])
+        self.assertEqual(watcher.take_batch(now=101.7), paths[2:])
+    
+    def test_process_file_moves_to_done_and_failed(self):
+        """Test that processed files are moved by outcome."""
+        watcher = self._watcher()
+        good = self._write("good.pdf")
+        bad = self._write("bad.pdf")
+        
+        self.assertTrue(watcher.process_file(good))
+        self.assertFalse(watcher.process_file(bad))
+        
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "done", "good.pdf")))
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "failed", "bad.pdf")))
+        self.assertTrue(self.calls[0][1].startswith("hotfolder-"))
+        self.assertEqual(watcher.stats["processed"], 1)
+        self.assertEqual(watcher.stats["failed"], 1)
+    
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_run_picks_up_dropped_files(self):
+        """Test the inotify loop end to end."""
+        existing = self._write("existing.pdf")
+        watcher = self._watcher(settle_seconds=0.2, batch_window=0.1, workers=2)
+        thread = threading.Thread(target=watcher.run)
+        thread.start()
+        try:
+            time.sleep(0.2)
+            # Move into place, as well-behaved producers do
+            staging = os.path.join(self.temp_dir, ".new.pdf")
+            with open(staging, "wb") as f:
+                f.write(b"%PDF-1.4\n")
+            os.rename(staging, os.path.join(self.temp_dir, "dropped.pdf"))
+            self._write("ignored.txt")
+            
+            deadline = time.time() + 10
+            while time.time() < deadline and watcher.stats["processed"] < 2:
+                time.sleep(0.05)
+        finally:
+            watcher.stop()
+            thread.join(timeout=10)
+        
+        done = sorted(os.listdir(os.path.join(self.temp_dir, "done")))
+        self.assertEqual(done, ["dropped.pdf", "existing.pdf"])
+        self.assertFalse(os.path.exists(existing))
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "ignored.txt")))
+
+
+if __name__ == '__main__':
+    unittest.main()